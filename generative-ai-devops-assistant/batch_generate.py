@@ -0,0 +1,4 @@
+from bot.app import batch_main
+
+if __name__ == "__main__":
+    batch_main()
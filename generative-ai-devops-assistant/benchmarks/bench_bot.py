@@ -0,0 +1,94 @@
+"""
+Load benchmark for the Discord handlers, fully offline (fake Gemini, local GitHub/CDN stub).
+
+Run from the project root:
+    python -m benchmarks.bench_bot [--scenario chat --scenario cicd] [--requests 200] [--concurrency 20]
+                                   [--latency 0.05] [--jitter 0.2] [--error-rate 0.0]
+
+Record a baseline, then compare a later run against it:
+    python -m benchmarks.bench_bot --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_bot --check benchmarks/baseline.json [--tolerance 0.5]
+
+The check fails (exit 1) when more requests fail, or fewer are answered, than in the baseline.
+Latency, throughput and RSS beyond the tolerance are reported only, since they depend on the
+machine.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+
+from benchmarks.harness import SCENARIOS, ProfiledBackend, compare_counts, compare_timings, run_load
+
+COLUMNS = ("requests", "ok", "errors", "rejected", "p50_ms", "p95_ms", "p99_ms", "throughput_rps", "peak_rss_mb")
+
+
+async def run_all(args) -> dict:
+    results = {}
+    for scenario in args.scenario or list(SCENARIOS):
+        backend = ProfiledBackend(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                  chunk_size=args.chunk_size, chunk_latency=args.chunk_latency, seed=args.seed)
+        # The handlers log every message; keep the report readable.
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            result = await run_load(scenario, requests=args.requests, concurrency=args.concurrency,
+                                    users=args.users, backend=backend, cache=args.cache)
+        results[scenario] = result.summary()
+    return results
+
+
+def print_table(results: dict) -> None:
+    print(f"{'scenario':<18}" + "".join(f"{column:>16}" for column in COLUMNS))
+    for scenario, summary in results.items():
+        print(f"{scenario:<18}" + "".join(f"{summary[column]:>16}" for column in COLUMNS))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="repeat to run several; default: all")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--users", type=int, default=20, help="distinct authors the messages rotate through")
+    parser.add_argument("--latency", type=float, default=0.05, help="mean fake Gemini latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency spread as a fraction of the mean")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of Gemini calls failing with a 503")
+    parser.add_argument("--chunk-size", type=int, default=64, help="characters per streamed chunk")
+    parser.add_argument("--chunk-latency", type=float, default=0.005, help="delay before each streamed chunk")
+    parser.add_argument("--cache", action="store_true", help="leave the LLM response cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results to PATH")
+    parser.add_argument("--check", metavar="PATH", help="compare against the baseline at PATH; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="relative slowdown reported when checking")
+    parser.add_argument("--verbose", action="store_true", help="show the bot's own log output")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_all(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_table(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"baseline written to {args.save_baseline}")
+
+    if args.check:
+        with open(args.check) as f:
+            baseline = json.load(f)
+        for slowdown in compare_timings(results, baseline, args.tolerance):
+            print(f"SLOWER {slowdown}")
+        regressions = compare_counts(results, baseline)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions against {args.check}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Fingerprinting benchmark: one pass over a synthetic 100k-entry monorepo file list.
+
+Run from the project root:
+    python -m benchmarks.bench_fingerprint [--files 100000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+
+from bot.fingerprint import fingerprint_repository
+
+
+def synthetic_file_list(count: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    dirs = ["src", "lib", "docs", "tests", "web/static", "services/api", "services/worker", "vendor/pkg"]
+    exts = [".py", ".py", ".py", ".md", ".js", ".css", ".json", ".yaml", ".txt", ".html"]
+    files = ["monorepo-main/requirements.txt", "monorepo-main/pyproject.toml", "monorepo-main/package.json"]
+    while len(files) < count:
+        depth = rng.randint(1, 4)
+        parts = [rng.choice(dirs)] + [f"m{rng.randint(0, 500)}" for _ in range(depth)]
+        files.append(f"monorepo-main/{'/'.join(parts)}/f{len(files)}{rng.choice(exts)}")
+    return files
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    file_list = synthetic_file_list(args.files)
+    manifests = {"monorepo-main/requirements.txt": "fastapi==0.110\nuvicorn\n"}
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        fingerprint = fingerprint_repository(file_list, manifests.get)
+        timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    print(f"files:   {len(file_list)}")
+    print(f"result:  {fingerprint.describe()}")
+    print(f"best:    {timings[0] * 1000:.1f} ms")
+    print(f"median:  {timings[len(timings) // 2] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Import-time benchmark: how long a cold `import bot.discord_bot` takes, and what it pulls in.
+
+Each run imports the module in a fresh interpreter with no credentials set, so it also checks
+that importing needs neither a .env file nor network access.
+
+Run from the project root:
+    python -m benchmarks.bench_import [--module bot.discord_bot] [--repeat 5] [--top 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+# Heavy SDKs that must not be imported until first use.
+LAZY_MODULES = ("google.generativeai", "numpy")
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(",".join(name for name in {lazy!r} if name in sys.modules))
+"""
+
+
+def clean_env() -> dict:
+    env = {k: v for k, v in os.environ.items() if k not in ("DISCORD_TOKEN", "GEMINI_API_KEY", "GITHUB_TOKEN")}
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def time_import(module: str) -> tuple[float, list[str]]:
+    """Seconds to import `module` in a fresh interpreter, and which LAZY_MODULES it loaded."""
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", PROBE.format(module=module, lazy=LAZY_MODULES)],
+        capture_output=True, text=True, check=True, env=clean_env(),
+    ).stdout.splitlines()
+    return float(output[0]), [name for name in output[1].split(",") if name]
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[int, str]]:
+    """(cumulative microseconds, module) for the `top` slowest imports, from -X importtime."""
+    stderr = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, env=clean_env(),
+    ).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="bot.discord_bot")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="show the N slowest imports")
+    args = parser.parse_args()
+
+    timings = []
+    for _ in range(args.repeat):
+        elapsed, loaded = time_import(args.module)
+        timings.append(elapsed)
+
+    timings.sort()
+    print(f"module:  {args.module}")
+    print(f"best:    {timings[0] * 1000:.1f} ms")
+    print(f"median:  {timings[len(timings) // 2] * 1000:.1f} ms")
+    print(f"eager:   {', '.join(loaded) or 'none of ' + ', '.join(LAZY_MODULES)}")
+    print("slowest imports (cumulative):")
+    for micros, name in slowest_imports(args.module, args.top):
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+    if loaded:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
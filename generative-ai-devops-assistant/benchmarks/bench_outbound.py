@@ -0,0 +1,196 @@
+"""
+Outbound message benchmark: Discord API calls, rate-limit waits and reply latency when the handlers post
+straight to the channel (every status line a new message, every reply its own send) versus
+through bot.outbound's per-channel queues.
+
+Discord is simulated: each channel's sends and edits have a fixed-window bucket of `--burst`
+calls per `--window` seconds, and each call takes `--latency`. As in discord.py, a call on an
+empty bucket waits for its reset before it is made, so neither mode sees 429s; the table counts
+those waits. The simulated responses carry X-RateLimit headers, which the outbox reads as it
+would through the client's HTTP trace hook.
+
+The workload is one busy channel and several quiet ones. Each request posts a status line,
+waits for the model, then posts its replies: three files (a ChatOps deploy run, with a follow-up
+question) or two files after a second status line (a Dockerfile/manifest request).
+
+Run from the project root:
+    python -m benchmarks.bench_outbound [--busy 20] [--quiet 4] [--window 1.0] [--burst 5]
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import time
+
+import discord
+
+from benchmarks.harness import percentile
+from bot.outbound import Attachment, Outbox
+
+FILES = {"Dockerfile": "FROM python:3.12-slim\n" * 20, "kubernetes.yaml": "apiVersion: apps/v1\n" * 60,
+         "ci.yml": "on: push\n" * 40}
+
+
+class SimulatedDiscord:
+    def __init__(self, burst: int, window: float, latency: float, outbox: Outbox = None):
+        self.burst = burst
+        self.window = window
+        self.latency = latency
+        self.outbox = outbox
+        self.buckets: dict[tuple, list] = {}
+        self.calls = 0
+        self.bucket_waits = 0
+        self.bytes_uploaded = 0
+
+    async def call(self, channel_id: int, kind: str, message_id: int = 0) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            bucket = self.buckets.get((channel_id, kind))
+            if bucket is None or now >= bucket[1]:
+                bucket = self.buckets[(channel_id, kind)] = [self.burst, now + self.window]
+            if bucket[0] > 0:
+                bucket[0] -= 1
+                break
+            self.bucket_waits += 1
+            await asyncio.sleep(bucket[1] - now)
+        await asyncio.sleep(self.latency)
+        self.calls += 1
+        if self.outbox is not None:
+            path = f"/api/v10/channels/{channel_id}/messages" + (f"/{message_id}" if kind == "edit" else "")
+            self.outbox.observe("POST" if kind == "send" else "PATCH", path, {
+                "X-RateLimit-Remaining": str(bucket[0]),
+                "X-RateLimit-Reset-After": f"{max(0.0, bucket[1] - loop.time()):.3f}"})
+
+
+class SimulatedMessage:
+    ids = iter(range(1, 10**9))
+
+    def __init__(self, channel: "SimulatedChannel", content):
+        self.id = next(self.ids)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content=None, **kwargs):
+        await self.channel.api.call(self.channel.id, "edit", self.id)
+        self.content = content
+        return self
+
+
+class SimulatedChannel:
+    def __init__(self, id: int, api: SimulatedDiscord):
+        self.id = id
+        self.api = api
+        self.messages = 0
+
+    async def send(self, content=None, file=None, files=None, **kwargs):
+        uploads = [file] if file is not None else list(files or ())
+        await self.api.call(self.id, "send")
+        for upload in uploads:
+            self.api.bytes_uploaded += len(upload.fp.getbuffer())
+        self.messages += 1
+        return SimulatedMessage(self, content)
+
+
+class Direct:
+    """How the handlers posted before the outbox: one call per message, files encoded per send."""
+
+    async def status(self, channel, text, key):
+        await channel.send(text)
+
+    async def send(self, channel, text, files, key):
+        uploads = [discord.File(io.BytesIO(FILES[name].encode("utf-8")), filename=name) for name in files]
+        await channel.send(text, files=uploads)
+
+
+class Queued:
+    def __init__(self, outbox: Outbox):
+        self.outbox = outbox
+        self.attachments = {name: Attachment(name, text) for name, text in FILES.items()}
+
+    async def status(self, channel, text, key):
+        self.outbox.status(channel, text, key=key)
+
+    async def send(self, channel, text, files, key):
+        await self.outbox.send(channel, text, attachments=[self.attachments[name] for name in files], key=key)
+
+
+async def request(sender, channel, user: int, rng: random.Random, model_latency: float, delays: dict) -> None:
+    mention = f"<@{user}> "
+    await sender.status(channel, mention + "Generating files based on your inputs...", user)
+    await asyncio.sleep(model_latency * rng.uniform(0.5, 1.5))
+    if rng.random() < 0.5:
+        # ChatOps: three files finishing close together, then the next question.
+        async def artifact(name: str) -> None:
+            await asyncio.sleep(rng.uniform(0, 0.02))
+            ready = time.perf_counter()
+            await sender.send(channel, f"{mention}Here is your {name}:", [name], user)
+            delays.setdefault(channel.id, []).append(time.perf_counter() - ready)
+
+        await asyncio.gather(*(artifact(name) for name in FILES))
+        await sender.send(channel, mention + "Would you like to trigger deployment now?", [], user)
+    else:
+        await sender.status(channel, mention + "Validating the generated files...", user)
+        await asyncio.sleep(model_latency * 0.2)
+        ready = time.perf_counter()
+        await sender.send(channel, mention + "Here are the generated files:", ["Dockerfile", "kubernetes.yaml"], user)
+        delays.setdefault(channel.id, []).append(time.perf_counter() - ready)
+
+
+async def run(mode: str, args) -> dict:
+    outbox = Outbox(burst=args.burst, window=args.window) if mode == "outbox" else None
+    api = SimulatedDiscord(args.burst, args.window, args.latency, outbox)
+    sender = Queued(outbox) if outbox is not None else Direct()
+    busy = SimulatedChannel(1, api)
+    quiet = [SimulatedChannel(100 + i, api) for i in range(args.quiet)]
+    rng = random.Random(args.seed)
+    delays: dict[int, list[float]] = {}
+    started = time.perf_counter()
+    jobs = [request(sender, busy, 1000 + i, rng, args.model_latency, delays) for i in range(args.busy)]
+    jobs += [request(sender, channel, 2000 + i, rng, args.model_latency, delays) for i, channel in enumerate(quiet)]
+    await asyncio.gather(*jobs)
+    if outbox is not None:
+        await outbox.flush()
+    elapsed = time.perf_counter() - started
+    quiet_delays = [d for channel in quiet for d in delays.get(channel.id, [])]
+    return {
+        "api_calls": api.calls,
+        "bucket_waits": api.bucket_waits,
+        "upload_kb": round(api.bytes_uploaded / 1024, 1),
+        "busy_reply_p50_ms": round(percentile(delays.get(1, []), 50) * 1000, 1),
+        "busy_reply_p95_ms": round(percentile(delays.get(1, []), 95) * 1000, 1),
+        "quiet_reply_p95_ms": round(percentile(quiet_delays, 95) * 1000, 1),
+        "elapsed_s": round(elapsed, 2),
+        "saved": dict(outbox.saved) if outbox is not None else {},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--busy", type=int, default=20, help="concurrent requests in the busy channel")
+    parser.add_argument("--quiet", type=int, default=4, help="quiet channels, one request each")
+    parser.add_argument("--burst", type=int, default=5, help="calls per bucket window")
+    parser.add_argument("--window", type=float, default=1.0, help="bucket window, seconds (Discord: 5)")
+    parser.add_argument("--latency", type=float, default=0.04, help="per-call API latency, seconds")
+    parser.add_argument("--model-latency", type=float, default=0.5, help="mean model latency, seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    args = parser.parse_args()
+
+    results = {mode: asyncio.run(run(mode, args)) for mode in ("direct", "outbox")}
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ("api_calls", "bucket_waits", "upload_kb", "busy_reply_p50_ms", "busy_reply_p95_ms",
+               "quiet_reply_p95_ms", "elapsed_s")
+    print(f"{'mode':<8}" + "".join(f"{column:>20}" for column in columns))
+    for mode, result in results.items():
+        print(f"{mode:<8}" + "".join(f"{result[column]:>20}" for column in columns))
+    direct, queued = results["direct"]["api_calls"], results["outbox"]["api_calls"]
+    print(f"\nAPI calls saved: {direct - queued} of {direct} ({100 * (direct - queued) / direct:.1f}%); "
+          f"outbox savings by reason: {results['outbox']['saved']}")
+
+
+if __name__ == "__main__":
+    main()
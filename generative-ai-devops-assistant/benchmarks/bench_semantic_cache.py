@@ -0,0 +1,207 @@
+"""
+Semantic cache benchmark: hit rate and lookup latency of bot.semantic_cache at 100k entries.
+
+The index is filled with synthetic #chatbot questions (task x tool x context). It is then queried
+with paraphrases of stored questions, which should hit the same question, and with questions
+about tasks that were never stored, which should miss. It reports:
+- hit rate on reworded questions (same key terms) and on rephrased ones (different vocabulary);
+- precision: hits that returned the paraphrased question's own answer;
+- false hit rate on new questions;
+- p50/p99 lookup and insert latency;
+- for hand-labelled question pairs (same answer or not), the hit rate on each at a range of
+  thresholds, which is how the default threshold was chosen.
+
+Run from the project root:
+    python -m benchmarks.bench_semantic_cache [--entries 100000] [--queries 2000] [--threshold 0.7]
+                                              [--dim 512] [--path /tmp/semantic-cache]
+"""
+import argparse
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.harness import percentile
+from bot.semantic_cache import SemanticCache
+
+# Each task as stored, reworded (same key terms, other inflections and filler) and rephrased
+# (different vocabulary, which word-level hashing is not expected to match).
+TASKS = [
+    ("set resource limits", "setting the resource limit", "cap cpu and memory"),
+    ("roll back a deployment", "rolling back the deployments", "undo a rollout"),
+    ("rotate secrets", "rotating a secret", "change credentials regularly"),
+    ("cache dependencies", "caching the dependency", "speed up installs"),
+    ("shrink the image size", "shrinking image sizes", "make the container smaller"),
+    ("run database migrations", "running a db migration", "apply schema changes"),
+    ("set up health checks", "configure health checking", "add readiness probes"),
+    ("store environment variables", "storing env variables", "keep settings outside the code"),
+    ("scale horizontally", "horizontal scaling", "add more replicas under load"),
+    ("debug a crash loop", "debugging crash loops", "fix a pod that keeps restarting"),
+    ("expose a service publicly", "exposing the service to the public", "make it reachable from the internet"),
+    ("pin dependency versions", "pinning dependencies to versions", "lock what gets installed"),
+    ("run tests in parallel", "running the tests in parallel", "split the suite across runners"),
+    ("deploy on every tag", "deploying for each tag", "release when a tag is pushed"),
+    ("mount a config file", "mounting config files", "provide a settings file to the app"),
+    ("collect logs", "collecting the logs", "ship output to a central place"),
+    ("set up tls certificates", "configure a tls certificate", "enable https"),
+    ("limit network access", "limiting the network access", "restrict traffic between pods"),
+    ("back up the database", "backing up databases", "take nightly dumps of postgres data"),
+    ("run a job on a schedule", "running scheduled jobs", "trigger something every night"),
+]
+# Never stored: queries about these should miss.
+NEW_TASKS = [
+    ("write a custom operator",), ("profile memory usage",), ("set up a service mesh",),
+    ("sign container images",), ("migrate from jenkins",), ("estimate cloud costs",),
+]
+TOOLS = [
+    ("kubernetes", "k8s"), ("docker", "docker"), ("github actions", "gha"), ("gitlab ci", "gitlab"),
+    ("terraform", "tf"), ("helm", "helm charts"), ("jenkins", "jenkins"), ("aws ecs", "ecs"),
+    ("google cloud run", "cloud run"), ("azure aks", "aks"), ("ansible", "ansible"), ("argo cd", "argocd"),
+    ("nginx", "nginx"), ("postgres", "postgresql"), ("redis", "redis"), ("prometheus", "prometheus"),
+    ("grafana", "grafana"), ("docker compose", "compose"), ("openshift", "openshift"), ("nomad", "nomad"),
+]
+# (stored question, new question, whether the stored answer is right for the new one).
+PAIRS = [
+    ("how do I set resource limits in k8s", "configure cpu/memory limits for kubernetes pods", True),
+    ("How do I set resource limits in k8s for a python app?", "setting resource limits on kubernetes for python apps", True),
+    ("how to cache pip dependencies in github actions", "caching pip dependency installs with gha", True),
+    ("roll back a deployment in kubernetes", "how can I roll back a k8s deployment?", True),
+    ("write a dockerfile for a flask app", "flask app dockerfile", True),
+    ("how do I store secrets in github actions", "storing secrets for github actions workflows", True),
+    ("run database migrations in a kubernetes job", "how to run db migrations as a k8s job", True),
+    ("terraform remote state on s3", "how do I keep tf state remotely in s3", True),
+    ("how to set environment variables in a dockerfile", "setting env vars in a dockerfile", True),
+    ("expose a kubernetes service with an ingress", "how do I expose my k8s service through ingress", True),
+    ("scale a deployment horizontally in k8s", "horizontal scaling for kubernetes deployments", True),
+    ("how do I pin python dependency versions", "pinning versions of python dependencies", True),
+    ("add a health check to my docker compose service", "docker compose health checks for a service", True),
+    ("rotate database credentials in vault", "how should I rotate db credentials stored in vault", True),
+    ("speed up docker builds with layer caching", "use layer caching to make docker builds faster", True),
+    ("deploy on every git tag with gitlab ci", "gitlab ci: deploy each time a tag is pushed", True),
+    ("set memory limits for a pod in k8s", "set cpu limits for a pod in k8s", False),
+    ("how do I enable caching in github actions", "how do I disable caching in github actions", False),
+    ("write a dockerfile for a flask app", "write a dockerfile for a django app", False),
+    ("roll back a deployment in kubernetes", "roll back a helm release", False),
+    ("how to cache npm dependencies in github actions", "how to cache pip dependencies in github actions", False),
+    ("run migrations in a kubernetes job", "run migrations in a kubernetes init container", False),
+    ("store secrets in github actions", "store secrets in gitlab ci", False),
+    ("set environment variables in a dockerfile", "set environment variables in docker compose", False),
+    ("deploy to kubernetes", "deploy to kubernetes with helm", False),
+    ("expose a service with an ingress", "expose a service with a load balancer", False),
+    ("terraform remote state on s3", "terraform remote state on gcs", False),
+    ("scale up a deployment", "scale down a deployment", False),
+    ("how do I upgrade postgres in kubernetes", "how do I back up postgres in kubernetes", False),
+    ("python 3.12 dockerfile", "python 3.11 dockerfile", False),
+    ("build a docker image for arm64", "build a docker image for amd64", False),
+    ("run tests in github actions", "run tests in github actions on windows", False),
+]
+THRESHOLDS = [0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9]
+LANGUAGES = ["python", "node", "go", "java", "rust", "ruby", "php", "dotnet", "elixir", "scala"]
+STAGES = ["staging", "production", "development", "testing", "preview", "qa", "sandbox", "demo",
+          "canary", "disaster recovery", "edge", "on-prem", "multi-region", "batch", "ml", "data",
+          "internal", "customer", "partner", "legacy", "greenfield", "regulated", "high-traffic",
+          "low-latency", "cost-sensitive"]
+FRAMES = ["how do I {task} in {tool} for a {lang} {stage} app",
+          "How can I {task} with {tool}? It's a {lang} app in {stage}",
+          "{tool}: what's the right way to {task} ({lang}, {stage})",
+          "best way to {task} on {tool} for our {stage} {lang} service?"]
+
+
+def question(task: str, tool: str, lang: str, stage: str, frame: int) -> str:
+    return FRAMES[frame].format(task=task, tool=tool, lang=lang, stage=stage)
+
+
+def stored_questions(count: int):
+    """(question, key) for up to len(TASKS) * len(TOOLS) * len(LANGUAGES) * len(STAGES) entries."""
+    keys = [(t, o, l, s) for t in range(len(TASKS)) for o in range(len(TOOLS))
+            for l in range(len(LANGUAGES)) for s in range(len(STAGES))]
+    random.Random(0).shuffle(keys)
+    for key in keys[:count]:
+        t, o, l, s = key
+        yield question(TASKS[t][0], TOOLS[o][0], LANGUAGES[l], STAGES[s], 0), key
+
+
+def labelled_pairs(dim: int) -> None:
+    """Hit rate on same-answer and different-answer pairs at each threshold."""
+    print("threshold  same-answer hits  wrong-answer hits")
+    for threshold in THRESHOLDS:
+        hits = {True: 0, False: 0}
+        for stored, asked, same in PAIRS:
+            cache = SemanticCache(capacity=1, dim=dim, threshold=threshold)
+            cache.add(stored, "answer", "model")
+            hits[same] += cache.lookup(asked, "model") is not None
+        positives = sum(same for _, _, same in PAIRS)
+        print(f"{threshold:<11}{hits[True]:>3}/{positives:<14}{hits[False]:>3}/{len(PAIRS) - positives}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--threshold", type=float, default=None, help="default: the cache's own")
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--path", help="memory-map the index in this directory (default: a temporary one)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--pairs", action="store_true", help="only report the labelled pairs")
+    args = parser.parse_args()
+
+    labelled_pairs(args.dim)
+    if args.pairs:
+        return
+    print()
+
+    path = args.path or tempfile.mkdtemp(prefix="semantic-cache-")
+    cache = SemanticCache(path, capacity=args.entries, dim=args.dim)
+    if args.threshold is not None:
+        cache.threshold = args.threshold
+    cache.clear()
+    rng = random.Random(args.seed)
+    try:
+        inserts = []
+        stored = []
+        started = time.perf_counter()
+        for text, key in stored_questions(args.entries):
+            t0 = time.perf_counter()
+            cache.add(text, repr(key), "model")
+            inserts.append(time.perf_counter() - t0)
+            stored.append(key)
+        fill_seconds = time.perf_counter() - started
+
+        lookups = []
+        results = {}
+        for label, variant in (("reworded", 1), ("rephrased", 2)):
+            hits = correct = 0
+            for _ in range(args.queries):
+                t, o, l, s = key = rng.choice(stored)
+                text = question(TASKS[t][variant], rng.choice(TOOLS[o]), LANGUAGES[l], STAGES[s],
+                                rng.randrange(1, len(FRAMES)))
+                t0 = time.perf_counter()
+                answer = cache.lookup(text, "model")
+                lookups.append(time.perf_counter() - t0)
+                if answer is not None:
+                    hits += 1
+                    correct += answer == repr(key)
+            results[label] = (hits, correct)
+
+        false_hits = 0
+        for _ in range(args.queries):
+            text = question(rng.choice(NEW_TASKS)[0], rng.choice(TOOLS)[0], rng.choice(LANGUAGES), rng.choice(STAGES),
+                            rng.randrange(len(FRAMES)))
+            t0 = time.perf_counter()
+            false_hits += cache.lookup(text, "model") is not None
+            lookups.append(time.perf_counter() - t0)
+
+        print(f"entries:          {len(cache)} (dim {args.dim}, threshold {cache.threshold}), filled in {fill_seconds:.1f}s")
+        for label, (hits, correct) in results.items():
+            print(f"{label + ' hits:':<18}{hits / args.queries:.1%}  precision {correct / hits if hits else 0:.1%}")
+        print(f"false hits:       {false_hits / args.queries:.1%}")
+        print(f"lookup p50/p99:   {percentile(lookups, 50) * 1000:.2f} / {percentile(lookups, 99) * 1000:.2f} ms")
+        print(f"insert p50/p99:   {percentile(inserts, 50) * 1000:.3f} / {percentile(inserts, 99) * 1000:.3f} ms")
+    finally:
+        cache.close()
+        if not args.path:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Template-first generation benchmark: one request log replayed through `on_message` with the
+templates off (every request goes to the model) and on, against the offline harness.
+
+The default log is synthetic and mixes routine pipeline requests, requests that need the
+template customized, stacks no template covers, and Dockerfile/manifest requests for
+repositories and zip uploads. A recorded log can be replayed instead: one JSON object per line,
+{"channel": "cicd" | "generator", "content": "...", "attachment": "name.zip" (optional)}.
+
+Run from the project root:
+    python -m benchmarks.bench_templates [--requests 200] [--latency 0.5] [--log requests.jsonl]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+from benchmarks.harness import (
+    CHANNEL_IDS, FakeAttachment, FakeAuthor, FakeChannel, FakeMessage, ProfiledBackend, _outcome, offline_bot,
+    percentile,
+)
+from bot import discord_bot
+
+PLATFORMS = ("GitHub Actions", "GitLab CI", "a Jenkinsfile")
+ROUTINE_STACKS = ("Python", "Python 3.11 with poetry", "Node 20", "a Node app using pnpm", "a Go service",
+                  "Java with Maven", "Gradle Java 17")
+EXTRAS = ("deploy to EKS with helm on tags", "add a SonarQube scan", "run nightly at 2am",
+          "matrix over three OS versions", "cache Terraform plugins and run plan")
+UNKNOWN = ("a Rust crate", "an ASP.NET Core app", "a Terraform module", "our monorepo")
+
+# category -> share of the synthetic log
+MIX = {"routine": 0.5, "customized": 0.15, "unknown": 0.1, "repo": 0.1, "repo-unknown": 0.05, "zip": 0.1}
+
+
+def synthetic_log(count: int, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    categories = rng.choices(list(MIX), weights=list(MIX.values()), k=count)
+    log = []
+    for index, category in enumerate(categories):
+        platform = rng.choice(PLATFORMS)
+        if category == "routine":
+            entry = {"channel": "cicd", "content": f"{platform} to build and test {rng.choice(ROUTINE_STACKS)} (#{index})"}
+        elif category == "customized":
+            entry = {"channel": "cicd",
+                     "content": f"{platform} for {rng.choice(ROUTINE_STACKS)}, and {rng.choice(EXTRAS)} (#{index})"}
+        elif category == "unknown":
+            entry = {"channel": "cicd", "content": f"{platform} pipeline for {rng.choice(UNKNOWN)} (#{index})"}
+        elif category == "repo":
+            entry = {"channel": "generator", "content": f"Please containerize https://github.com/bench/repo-{index}"}
+        elif category == "repo-unknown":
+            entry = {"channel": "generator", "content": f"Please containerize https://github.com/bench/rust-{index}"}
+        else:
+            entry = {"channel": "generator", "content": "Here is my app", "attachment": f"app-{index}.zip"}
+        entry["category"] = category
+        log.append(entry)
+    return log
+
+
+def load_log(path: str) -> list[dict]:
+    with open(path) as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+CHANNELS = {"cicd": discord_bot.CI_CD_CHANNEL_NAME, "generator": discord_bot.DOCKER_K8S_CHANNEL_NAME}
+
+
+async def replay(log: list[dict], templates: bool, latency: float, concurrency: int, seed: int) -> dict:
+    backend = ProfiledBackend(latency=latency, seed=seed)
+    latencies: dict[str, list[float]] = {}
+    outcomes: dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with offline_bot(backend, templates=templates) as base_url:
+        async def one(index: int, entry: dict) -> None:
+            channel_name = CHANNELS[entry["channel"]]
+            channel = FakeChannel(channel_name, CHANNEL_IDS[channel_name])
+            author = FakeAuthor(1000 + index % 20)
+            attachments = ()
+            if entry.get("attachment"):
+                attachments = (FakeAttachment(entry["attachment"], f"{base_url}/attachments/{entry['attachment']}", 1024),)
+            message = FakeMessage(entry["content"], channel, author, attachments)
+            async with semaphore:
+                started = time.perf_counter()
+                await discord_bot.on_message(message)
+                elapsed = time.perf_counter() - started
+            latencies.setdefault(entry.get("category", entry["channel"]), []).append(elapsed)
+            outcome = _outcome(channel, author.id)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        await asyncio.gather(*(one(index, entry) for index, entry in enumerate(log)))
+
+    everything = [value for values in latencies.values() for value in values]
+    return {
+        "requests": len(everything),
+        "ok": outcomes.get("ok", 0),
+        "llm_calls": len(backend.calls),
+        "p50_ms": round(percentile(everything, 50) * 1000, 2),
+        "p95_ms": round(percentile(everything, 95) * 1000, 2),
+        "by_category": {category: round(percentile(values, 50) * 1000, 2) for category, values in sorted(latencies.items())},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="size of the synthetic log")
+    parser.add_argument("--log", metavar="PATH", help="replay this JSONL request log instead")
+    parser.add_argument("--latency", type=float, default=0.5, help="mean fake model latency, seconds")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON instead of a table")
+    parser.add_argument("--verbose", action="store_true", help="show the handlers' log output")
+    args = parser.parse_args()
+
+    log = load_log(args.log) if args.log else synthetic_log(args.requests, args.seed)
+    results = {}
+    for mode, templates in (("model", False), ("templates", True)):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            results[mode] = asyncio.run(replay(log, templates, args.latency, args.concurrency, args.seed))
+    model, fast = results["model"], results["templates"]
+    saved = model["llm_calls"] - fast["llm_calls"]
+    results["llm_calls_saved"] = saved
+    results["llm_calls_saved_pct"] = round(100 * saved / model["llm_calls"], 1) if model["llm_calls"] else 0.0
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<12}{'requests':>10}{'ok':>8}{'llm_calls':>12}{'p50_ms':>12}{'p95_ms':>12}")
+    for mode in ("model", "templates"):
+        r = results[mode]
+        print(f"{mode:<12}{r['requests']:>10}{r['ok']:>8}{r['llm_calls']:>12}{r['p50_ms']:>12}{r['p95_ms']:>12}")
+    print(f"\nLLM calls saved: {saved} of {model['llm_calls']} ({results['llm_calls_saved_pct']}%)")
+    print(f"\n{'p50 ms by category':<20}{'model':>12}{'templates':>12}")
+    for category in model["by_category"]:
+        print(f"{category:<20}{model['by_category'][category]:>12}{fast['by_category'].get(category, 0.0):>12}")
+
+
+if __name__ == "__main__":
+    main()
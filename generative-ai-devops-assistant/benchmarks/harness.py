@@ -0,0 +1,465 @@
+"""
+Offline load harness for the Discord handlers.
+
+Synthetic messages go through the real `on_message` (and from there `handle_generator_request`
+and `handle_cicd_request`) while Gemini is replaced by a local fake with tunable latency,
+error and streaming profiles, and GitHub plus attachment downloads are served by a local
+aiohttp stub. Nothing leaves the machine. Used by `benchmarks/bench_bot.py` and the tests.
+"""
+import asyncio
+import hashlib
+import io
+import random
+import resource
+import sys
+import time
+import zipfile
+from collections import OrderedDict
+from contextlib import ExitStack, asynccontextmanager
+from typing import Optional
+from unittest import mock
+
+import discord
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot import discord_bot, llm_client as llm_module
+from bot.config import override_settings
+from bot.conversations import ConversationStore
+from bot.github_client import github_client
+from bot.http_client import shared_http
+from bot.llm_client import FakeBackend, llm_client
+from bot.outbound import outbox
+from bot.providers import Route
+from bot.repo_inspector import repo_inspector
+from bot.scheduler import FairScheduler, RateLimiter
+from bot.workers import cpu_pool
+
+CHAT_REPLY = (
+    "Use a multi-stage build: compile in a full image, then copy the artifacts into a slim "
+    "runtime image. Pin base image digests, run as a non-root user and keep secrets out of "
+    "layers by passing them at build time with --secret. "
+) * 4
+
+DOCKER_K8S_REPLY = """### Dockerfile
+```dockerfile
+FROM python:3.12-slim
+WORKDIR /app
+COPY requirements.txt .
+RUN pip install --no-cache-dir -r requirements.txt
+COPY . .
+CMD ["gunicorn", "-b", "0.0.0.0:8000", "app:app"]
+```
+
+### Kubernetes manifest
+```yaml
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: web
+spec:
+  replicas: 2
+---
+apiVersion: v1
+kind: Service
+metadata:
+  name: web
+spec:
+  ports:
+    - port: 80
+```
+"""
+
+GITHUB_WORKFLOW_REPLY = """```yaml
+name: CI
+on: push
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+      - uses: actions/checkout@v4
+      - run: make test
+```"""
+
+GITLAB_PIPELINE_REPLY = """```yaml
+stages: [test]
+test:
+  stage: test
+  script:
+    - make test
+```"""
+
+JENKINSFILE_REPLY = """```groovy
+pipeline {
+  agent any
+  stages {
+    stage('Test') { steps { sh 'make test' } }
+  }
+}
+```"""
+
+
+def fake_reply(prompt: str) -> str:
+    """A valid answer for whichever handler built `prompt`."""
+    if "Dockerfile and Kubernetes manifest" in prompt:
+        return DOCKER_K8S_REPLY
+    if "Jenkins pipeline" in prompt:
+        return JENKINSFILE_REPLY
+    if "GitLab CI" in prompt:
+        return GITLAB_PIPELINE_REPLY
+    if "GitHub Actions" in prompt:
+        return GITHUB_WORKFLOW_REPLY
+    return CHAT_REPLY
+
+
+class FakeServiceError(Exception):
+    """Looks like a Gemini 503 to the client's retry logic."""
+
+    code = 503
+
+
+class ProfiledBackend(FakeBackend):
+    """
+    FakeBackend with a latency distribution and a failure rate: each call takes `latency`
+    seconds give or take `jitter` (a fraction), and fails with a retryable 503 with
+    probability `error_rate`. Seeded so runs are comparable.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.2, error_rate: float = 0.0,
+                 chunk_size: int = 64, chunk_latency: float = 0.005, seed: int = 0):
+        super().__init__(reply=fake_reply, chunk_size=chunk_size, chunk_latency=chunk_latency)
+        self.mean_latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.failures = 0
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        self.calls.append((prompt, model_name))
+        delay = self.mean_latency * (1 + self.rng.uniform(-self.jitter, self.jitter))
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.failures += 1
+            raise FakeServiceError("fake Gemini is unavailable")
+        return self.reply(prompt)
+
+
+# --- Fake Discord objects: just the attributes the handlers touch ---
+
+class FakeAuthor:
+    def __init__(self, id: int, bot: bool = False):
+        self.id = id
+        self.bot = bot
+
+    def __str__(self) -> str:
+        return f"user{self.id}"
+
+
+class FakeSentMessage:
+    def __init__(self, content: Optional[str]):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content: Optional[str] = None, **kwargs) -> "FakeSentMessage":
+        self.content = content
+        self.edits += 1
+        return self
+
+
+class FakeChannel:
+    """Records what the bot sends so each request's outcome can be read back."""
+
+    def __init__(self, name: str, id: int):
+        self.name = name
+        self.id = id
+        self.sent: list[FakeSentMessage] = []
+        self.files = 0
+
+    async def send(self, content: Optional[str] = None, file=None, files=None, **kwargs) -> FakeSentMessage:
+        self.files += (1 if file is not None else 0) + len(files or ())
+        sent = FakeSentMessage(content)
+        self.sent.append(sent)
+        return sent
+
+
+class FakeAttachment:
+    def __init__(self, filename: str, url: str, size: int):
+        self.filename = filename
+        self.url = url
+        self.size = size
+
+
+class FakeMessage:
+    def __init__(self, content: str, channel: FakeChannel, author: FakeAuthor, attachments=()):
+        self.content = content
+        self.channel = channel
+        self.author = author
+        self.attachments = list(attachments)
+        self.created_at = discord.utils.utcnow()
+
+
+# --- Local stand-in for the GitHub API and the Discord CDN ---
+
+def _fake_sha(name: str) -> str:
+    return hashlib.sha1(name.encode()).hexdigest()
+
+
+def make_stub_app() -> web.Application:
+    """
+    GitHub repo/commit/tree/contents endpoints for any repo (a Flask app, or a Rust one for repos
+    named rust-*), plus `/attachments/<name>.zip`.
+    """
+
+    async def repo(request):
+        return web.json_response({"default_branch": "main"}, headers={"ETag": '"repo-v1"'})
+
+    async def commit(request):
+        return web.json_response({"sha": _fake_sha(request.match_info["repo"])})
+
+    async def tree(request):
+        if request.match_info["repo"].startswith("rust-"):
+            # A stack the deployment templates don't cover.
+            return web.json_response({"truncated": False, "tree": [
+                {"path": "Cargo.toml", "type": "blob", "size": 200},
+                {"path": "src/main.rs", "type": "blob", "size": 900},
+            ]})
+        return web.json_response({
+            "truncated": False,
+            "tree": [
+                {"path": "app.py", "type": "blob", "size": 400},
+                {"path": "requirements.txt", "type": "blob", "size": 20},
+                {"path": "templates", "type": "tree"},
+                {"path": "templates/index.html", "type": "blob", "size": 900},
+            ],
+        })
+
+    async def contents(request):
+        if request.match_info["path"] == "requirements.txt":
+            return web.Response(text="flask==3.0\ngunicorn\n")
+        return web.Response(status=404)
+
+    async def attachment(request):
+        # A different top-level folder per upload, so prompts (and cache keys) differ.
+        name = request.match_info["name"]
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr(f"{name}/requirements.txt", "fastapi==0.110\nuvicorn\n")
+            archive.writestr(f"{name}/main.py", "from fastapi import FastAPI\napp = FastAPI()\n")
+            archive.writestr(f"{name}/tests/test_main.py", "def test_ok():\n    assert True\n")
+        return web.Response(body=buffer.getvalue(), content_type="application/zip")
+
+    app = web.Application()
+    app.router.add_get("/repos/{owner}/{repo}", repo)
+    app.router.add_get("/repos/{owner}/{repo}/commits/{ref}", commit)
+    app.router.add_get("/repos/{owner}/{repo}/git/trees/{sha}", tree)
+    app.router.add_get("/repos/{owner}/{repo}/contents/{path:.+}", contents)
+    app.router.add_get("/attachments/{name}.zip", attachment)
+    return app
+
+
+# --- Scenarios ---
+
+CHANNEL_IDS = {discord_bot.TARGET_CHANNEL_NAME: 1, discord_bot.DOCKER_K8S_CHANNEL_NAME: 2,
+               discord_bot.CI_CD_CHANNEL_NAME: 3}
+
+
+def _chat(index: int, base_url: str):
+    return discord_bot.TARGET_CHANNEL_NAME, f"How do I shrink docker image #{index}?", ()
+
+
+def _generator_github(index: int, base_url: str):
+    return discord_bot.DOCKER_K8S_CHANNEL_NAME, f"Please containerize https://github.com/bench/repo-{index}", ()
+
+
+def _generator_zip(index: int, base_url: str):
+    attachment = FakeAttachment("app.zip", f"{base_url}/attachments/app-{index}.zip", 1024)
+    return discord_bot.DOCKER_K8S_CHANNEL_NAME, "Here is my app", (attachment,)
+
+
+def _cicd(index: int, base_url: str):
+    flavour = ("github actions", "gitlab", "jenkins")[index % 3]
+    return discord_bot.CI_CD_CHANNEL_NAME, f"Build and test a python service with {flavour} (#{index})", ()
+
+
+# name -> (message factory, stream chat replies)
+SCENARIOS = {
+    "chat": (_chat, False),
+    "chat-stream": (_chat, True),
+    "generator-github": (_generator_github, False),
+    "generator-zip": (_generator_zip, False),
+    "cicd": (_cicd, False),
+}
+
+# Text the handlers send when a request did not produce what was asked for.
+_FAILURE_MARKERS = ("Sorry", "Failed", "Could not", "Error processing", "(The response was interrupted")
+
+
+def _outcome(channel: FakeChannel, user_id: int) -> str:
+    texts = [sent.content or "" for sent in channel.sent]
+    mention = f"<@{user_id}> "
+    if any(text.startswith(mention) and "in queue" not in text for text in texts):
+        return "rejected"
+    if not texts or any(marker in text for text in texts for marker in _FAILURE_MARKERS):
+        return "error"
+    return "ok"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile; 0 for no samples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class LoadResult:
+    def __init__(self, scenario: str, latencies: list[float], outcomes: dict, elapsed: float, llm_calls: int):
+        self.scenario = scenario
+        self.latencies = latencies
+        self.outcomes = outcomes
+        self.elapsed = elapsed
+        self.llm_calls = llm_calls
+
+    def summary(self) -> dict:
+        return {
+            "requests": len(self.latencies),
+            "ok": self.outcomes.get("ok", 0),
+            "errors": self.outcomes.get("error", 0),
+            "rejected": self.outcomes.get("rejected", 0),
+            "llm_calls": self.llm_calls,
+            "p50_ms": round(percentile(self.latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(self.latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(self.latencies, 99) * 1000, 2),
+            "throughput_rps": round(len(self.latencies) / self.elapsed, 2) if self.elapsed else 0.0,
+            "peak_rss_mb": round(peak_rss_mb(), 1),
+        }
+
+
+@asynccontextmanager
+async def offline_bot(backend: FakeBackend, cache: bool = False, rate_limits: bool = False,
+                      templates: bool = False):
+    """
+    Point the bot's shared clients at `backend` and a local stub server; yields the stub's
+    base URL. Everything is restored on exit. Template answers are off unless `templates`, so
+    the handler scenarios measure the model path.
+    """
+    server = TestServer(make_stub_app())
+    await server.start_server()
+    base_url = str(server.make_url("")).rstrip("/")
+    with ExitStack() as patches:
+        patches.enter_context(mock.patch.object(llm_client, "backend", backend))
+        # Every route goes to the patched Gemini client whatever LLM_*_ROUTE says, with the
+        # route's preferred model so cache keys and accounting match production.
+        offline_routes = {purpose: [Route("gemini", targets[0].model)]
+                          for purpose, targets in llm_module.router.routes.items()}
+        patches.enter_context(mock.patch.object(llm_module.router, "routes", offline_routes))
+        llm_module.router.reset()
+        patches.enter_context(mock.patch.object(github_client, "api_url", base_url))
+        patches.enter_context(override_settings(llm_cache_enabled=cache, templates_enabled=templates))
+        # Fresh scheduler state per run; the real limits unless the run asks to lift them.
+        patches.enter_context(mock.patch.object(llm_module, "scheduler", FairScheduler()))
+        if not rate_limits:
+            unlimited = RateLimiter(user_per_minute=1e9, user_burst=10**9,
+                                    channel_per_minute=1e9, channel_burst=10**9)
+            patches.enter_context(mock.patch.object(discord_bot, "rate_limiter", unlimited))
+        # The fake channels have no Discord rate limits to pace for.
+        patches.enter_context(mock.patch.object(outbox, "burst", 0))
+        patches.enter_context(mock.patch.object(outbox, "_pacers", {}))
+        patches.enter_context(mock.patch.object(outbox, "_status", OrderedDict()))
+        # Conversations start empty each run.
+        patches.enter_context(mock.patch.object(discord_bot, "conversation_store", ConversationStore()))
+        repo_inspector._snapshots.clear()
+        # Measure steady state: worker processes are started up front, as with WARM_UP.
+        await cpu_pool.warm_up()
+        try:
+            yield base_url
+        finally:
+            await outbox.flush()
+            await server.close()
+            await shared_http.close()
+
+
+async def run_load(
+    scenario: str,
+    requests: int = 100,
+    concurrency: int = 10,
+    users: int = 20,
+    backend: Optional[FakeBackend] = None,
+    cache: bool = False,
+    rate_limits: bool = False,
+    templates: bool = False,
+) -> LoadResult:
+    """Send `requests` messages for `scenario` through on_message, at most `concurrency` at a time."""
+    factory, stream = SCENARIOS[scenario]
+    backend = backend or ProfiledBackend()
+    latencies: list[float] = []
+    outcomes: dict[str, int] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with offline_bot(backend, cache=cache, rate_limits=rate_limits, templates=templates) as base_url:
+        async def one(index: int) -> None:
+            channel_name, content, attachments = factory(index, base_url)
+            channel = FakeChannel(channel_name, CHANNEL_IDS[channel_name])
+            author = FakeAuthor(1000 + index % users)
+            message = FakeMessage(content, channel, author, attachments)
+            async with semaphore:
+                started = time.perf_counter()
+                await discord_bot.on_message(message)
+                latencies.append(time.perf_counter() - started)
+            outcome = _outcome(channel, author.id)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        with override_settings(stream_chat_responses=stream):
+            started = time.perf_counter()
+            await asyncio.gather(*(one(i) for i in range(requests)))
+            elapsed = time.perf_counter() - started
+
+    return LoadResult(scenario, latencies, outcomes, elapsed, len(backend.calls))
+
+
+def compare_counts(results: dict, baseline: dict) -> list[str]:
+    """
+    Regressions of `results` against `baseline` (both scenario -> summary) in what doesn't depend
+    on the machine: more failed requests or fewer answered ones. Scenarios missing from the
+    baseline are not checked.
+    """
+    regressions = []
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        failed = current["errors"] + current["rejected"]
+        if failed > base["errors"] + base["rejected"]:
+            regressions.append(f"{scenario}: {failed} failed requests, baseline had {base['errors'] + base['rejected']}")
+        if current["ok"] < base["ok"]:
+            regressions.append(f"{scenario}: {current['ok']} ok, baseline had {base['ok']}")
+    return regressions
+
+
+def compare_timings(results: dict, baseline: dict, tolerance: float = 0.5) -> list[str]:
+    """
+    Slowdowns of `results` against `baseline`: p95/p99 latency or peak RSS more than `tolerance`
+    above, or throughput more than `tolerance` below. These vary with the machine, so they are
+    meant to be read, not gated on.
+    """
+    slowdowns = []
+    for scenario, current in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        for key in ("p95_ms", "p99_ms", "peak_rss_mb"):
+            if current[key] > base[key] * (1 + tolerance):
+                slowdowns.append(f"{scenario}: {key} {current[key]} > baseline {base[key]} (+{tolerance:.0%})")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - tolerance):
+            slowdowns.append(f"{scenario}: throughput_rps {current['throughput_rps']} < baseline "
+                             f"{base['throughput_rps']} (-{tolerance:.0%})")
+    return slowdowns
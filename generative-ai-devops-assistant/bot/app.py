@@ -0,0 +1,58 @@
+# bot/app.py
+"""
+Application bootstrap: load the .env file, read and validate Settings once, then start the bot.
+
+Nothing from the bot package is imported at module level: the .env file has to be loaded and the
+settings installed before the bot's modules build their shared clients from them.
+"""
+from typing import Optional
+
+
+def load_environment(env_file: Optional[str] = None) -> None:
+    """Load `env_file` (default: .env in the working directory) into os.environ without overriding it."""
+    from dotenv import load_dotenv
+    load_dotenv(env_file)
+
+
+def main(env_file: Optional[str] = None) -> None:
+    load_environment(env_file)
+
+    from bot.config import Settings, use_settings
+    settings = Settings.from_env()
+    settings.validate()
+    use_settings(settings)
+
+    from bot.sharding import parse_shard_count, run_sharded
+    shard_count = parse_shard_count(settings.shard_count)
+    if settings.shard_processes > 1:
+        run_sharded(settings, shard_count, settings.shard_processes)
+        return
+
+    from bot.discord_bot import run
+    run(settings, sharded=settings.shard_count is not None, shard_count=shard_count)
+
+
+def batch_main(argv: Optional[list[str]] = None) -> None:
+    """Command-line batch generation: repositories or a zip of services in, one zip bundle out."""
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Generate Dockerfiles and Kubernetes manifests for many services.")
+    parser.add_argument("sources", nargs="+",
+                        help="GitHub repository URLs, text files listing one URL per line, or zip files of services")
+    parser.add_argument("-o", "--output", default="deployment-bundle.zip", help="where to write the bundle")
+    parser.add_argument("--pipeline", choices=("github-actions", "gitlab", "jenkins"),
+                        help="also generate a CI/CD pipeline per service")
+    parser.add_argument("--concurrency", type=int, default=None, help="generations in flight at a time")
+    parser.add_argument("--env-file", default=None)
+    args = parser.parse_args(argv)
+    load_environment(args.env_file)
+
+    from bot.config import Settings, use_settings
+    use_settings(Settings.from_env())
+
+    from bot.batch import run_cli
+    pipeline = args.pipeline.replace("-", " ") if args.pipeline else None
+    report = asyncio.run(run_cli(args.sources, args.output, pipeline, args.concurrency))
+    if report.failed:
+        raise SystemExit(1)
@@ -0,0 +1,209 @@
+# bot/archive.py
+import io
+import os
+import posixpath
+import tempfile
+import zipfile
+from contextlib import asynccontextmanager
+from typing import IO, Optional
+import aiohttp
+from bot.config import get_settings
+from bot.fingerprint import FileIndex, fingerprint_repository
+from bot.templates import Stack, detect_stack
+from bot.workers import cpu_pool
+
+# Manifests worth reading for stack detection; everything else is only listed.
+MANIFEST_NAMES = ("requirements.txt", "package.json", "go.mod", "pom.xml")
+
+# Archives are buffered in memory up to this size before spilling to a temporary file.
+SPOOL_MEMORY_BYTES = 4 * 1024 * 1024
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+class ArchiveError(ValueError):
+    """Raised when an upload cannot be downloaded or breaks one of the archive limits."""
+
+
+class RepoArchive:
+    """
+    Read-only view of an uploaded zip.
+
+    Only the central directory is parsed up front to produce the file list; nothing is
+    extracted. Manifests are decompressed on demand, one at a time, with a size cap.
+    Limits left as None come from the ZIP_* settings.
+    """
+
+    def __init__(
+        self,
+        fileobj,
+        max_entries: Optional[int] = None,
+        max_uncompressed_bytes: Optional[int] = None,
+        max_compression_ratio: Optional[float] = None,
+        manifest_max_bytes: Optional[int] = None,
+    ):
+        settings = get_settings()
+        max_entries = settings.zip_max_entries if max_entries is None else max_entries
+        if max_uncompressed_bytes is None:
+            max_uncompressed_bytes = settings.zip_max_uncompressed_bytes
+        if max_compression_ratio is None:
+            max_compression_ratio = settings.zip_max_compression_ratio
+        if manifest_max_bytes is None:
+            manifest_max_bytes = settings.zip_manifest_max_bytes
+        try:
+            self._zip = zipfile.ZipFile(fileobj)
+        except zipfile.BadZipFile as e:
+            raise ArchiveError(f"not a valid zip file ({e})") from e
+        self.manifest_max_bytes = manifest_max_bytes
+        try:
+            infos = self._zip.infolist()
+            if len(infos) > max_entries:
+                raise ArchiveError(f"archive has {len(infos)} entries (limit {max_entries})")
+
+            total_size = 0
+            self._files: dict[str, zipfile.ZipInfo] = {}
+            for info in infos:
+                if info.is_dir():
+                    continue
+                total_size += info.file_size
+                if info.compress_size and info.file_size > 1024 * 1024 and (
+                    info.file_size / info.compress_size > max_compression_ratio
+                ):
+                    raise ArchiveError(f"suspicious compression ratio for {info.filename}")
+                self._files[info.filename] = info
+            if total_size > max_uncompressed_bytes:
+                raise ArchiveError(
+                    f"archive expands to {total_size} bytes (limit {max_uncompressed_bytes})"
+                )
+        except Exception:
+            self._zip.close()
+            raise
+        self.file_list = list(self._files)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def find(self, basename: str) -> Optional[str]:
+        """Path of the shallowest file with this basename, if any."""
+        candidates = [path for path in self._files if posixpath.basename(path).lower() == basename.lower()]
+        return min(candidates, key=lambda path: (path.count("/"), len(path))) if candidates else None
+
+    def read_text(self, path: str) -> Optional[str]:
+        """Decompress a single small file; returns None if it is missing or over the size cap."""
+        info = self._files.get(path)
+        if info is None or info.file_size > self.manifest_max_bytes:
+            return None
+        with self._zip.open(info) as fh:
+            # Read one byte past the cap so a lying header cannot stream unbounded data.
+            data = fh.read(self.manifest_max_bytes + 1)
+        if len(data) > self.manifest_max_bytes:
+            return None
+        return data.decode("utf-8", errors="replace")
+
+    def read_manifest(self, basename: str) -> Optional[str]:
+        path = self.find(basename)
+        return self.read_text(path) if path else None
+
+    def manifests(self) -> dict[str, str]:
+        """Contents of whichever known manifests are present."""
+        found = {}
+        for name in MANIFEST_NAMES:
+            text = self.read_manifest(name)
+            if text is not None:
+                found[name] = text
+        return found
+
+
+async def spool_download(
+    session: aiohttp.ClientSession,
+    url: str,
+    max_bytes: Optional[int] = None,
+    spool: Optional[IO[bytes]] = None,
+) -> IO[bytes]:
+    """
+    Stream a download into `spool` (by default a spooled buffer), aborting as soon as it passes
+    max_bytes (default: ZIP_MAX_DOWNLOAD_BYTES). The spool is returned rewound, or closed on failure.
+    """
+    if max_bytes is None:
+        max_bytes = get_settings().zip_max_download_bytes
+    if spool is None:
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    try:
+        async with session.get(url) as resp:
+            if resp.status != 200:
+                raise ArchiveError(f"download failed with HTTP {resp.status}")
+            if resp.content_length is not None and resp.content_length > max_bytes:
+                raise ArchiveError(f"upload is {resp.content_length} bytes (limit {max_bytes})")
+            received = 0
+            async for chunk in resp.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                received += len(chunk)
+                if received > max_bytes:
+                    raise ArchiveError(f"upload exceeds {max_bytes} bytes")
+                spool.write(chunk)
+        spool.seek(0)
+        return spool
+    except Exception:
+        spool.close()
+        raise
+
+
+@asynccontextmanager
+async def downloaded_zip(
+    session: aiohttp.ClientSession,
+    url: str,
+    max_bytes: Optional[int] = None,
+    size: Optional[int] = None,
+):
+    """
+    Download a zip for the CPU pool and yield it in a form the pool can take. With the pool off,
+    that is the spooled buffer itself. Worker processes get the bytes of an upload of `size` up to
+    SPOOL_MEMORY_BYTES, which the spool would have kept in memory anyway; a larger or unknown
+    size is streamed into a named temporary file, where the spool would have spilled it, and the
+    worker gets its path. Whatever was downloaded is gone on exit.
+    """
+    if not cpu_pool.enabled or (size is not None and size <= SPOOL_MEMORY_BYTES):
+        spool = await spool_download(session, url, max_bytes)
+        try:
+            yield spool if not cpu_pool.enabled else spool.read()
+        finally:
+            spool.close()
+        return
+    spill = tempfile.NamedTemporaryFile(suffix=".zip", delete=False)
+    try:
+        await spool_download(session, url, max_bytes, spill)
+        spill.close()
+        yield spill.name
+    finally:
+        spill.close()
+        os.remove(spill.name)
+
+
+def inspect_archive(source, name: str = "app") -> tuple[list[str], str, Optional[Stack]]:
+    """
+    File list, stack description and template Stack (None when no template fits) of a zip given
+    as bytes, a file object or a path. Pure CPU work (central directory, manifests, fingerprinting),
+    so it can run in a worker process.
+    """
+    fileobj = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    with RepoArchive(fileobj) as archive:
+        index = FileIndex(archive.file_list)
+        fingerprint = fingerprint_repository(index, archive.read_text)
+        stack = detect_stack(index, archive.read_text, name=name, fingerprint=fingerprint)
+        return archive.file_list, fingerprint.describe(), stack
+
+
+async def inspect_zip_attachment(
+    session: aiohttp.ClientSession,
+    url: str,
+    max_bytes: Optional[int] = None,
+    name: str = "app",
+    size: Optional[int] = None,
+) -> tuple[list[str], str, Optional[Stack]]:
+    """Download a zip of `size` bytes (if known) on the event loop, then list and fingerprint it in the CPU pool."""
+    async with downloaded_zip(session, url, max_bytes, size) as source:
+        return await cpu_pool.run(inspect_archive, source, name)
@@ -0,0 +1,181 @@
+# bot/artifacts.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+from bot.config import get_settings
+from bot.extraction import (
+    DOCKERFILE,
+    GITHUB_WORKFLOW,
+    GITLAB_PIPELINE,
+    JENKINSFILE,
+    K8S_MANIFEST,
+    ArtifactKind,
+    ExtractedArtifact,
+    ExtractionResult,
+    build_repair_prompt,
+    extract_artifacts,
+)
+from bot.llm_client import get_gemini_file_response, is_error_reply
+from bot.prompts import prompt_registry
+from bot.tracing import stage
+from bot.workers import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+class ArtifactSpec:
+    """
+    One file to generate: its own prompt, and therefore its own cache entry. With a `kind`,
+    the reply is extracted and validated, and invalid output is re-asked on its own.
+    Timeout and retries default to the ARTIFACT_* settings.
+    """
+
+    __slots__ = ("name", "filename", "prompt", "kind", "timeout", "retries")
+
+    def __init__(self, name: str, filename: str, prompt: str, kind: Optional[ArtifactKind] = None,
+                 timeout: Optional[float] = None, retries: Optional[int] = None):
+        settings = get_settings()
+        self.name = name
+        self.filename = filename
+        self.prompt = prompt
+        self.kind = kind
+        self.timeout = settings.artifact_timeout_seconds if timeout is None else timeout
+        self.retries = settings.artifact_max_retries if retries is None else retries
+
+    @classmethod
+    def for_kind(cls, kind: ArtifactKind, prompt: str, **kwargs) -> "ArtifactSpec":
+        return cls(kind.name, kind.filename, prompt, kind=kind, **kwargs)
+
+
+class ArtifactResult:
+    """Outcome of one artifact. `problems` lists validation findings that survived every re-ask."""
+
+    __slots__ = ("spec", "content", "error", "problems", "attempts", "elapsed")
+
+    def __init__(self, spec: ArtifactSpec, content: Optional[str] = None, error: Optional[str] = None,
+                 problems: Optional[list[str]] = None, attempts: int = 0, elapsed: float = 0.0):
+        self.spec = spec
+        self.content = content
+        self.error = error
+        self.problems = problems or []
+        self.attempts = attempts
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.content is not None
+
+    def __repr__(self) -> str:
+        state = "ok" if self.ok else f"error={self.error!r}"
+        return f"ArtifactResult({self.spec.name}, {state}, attempts={self.attempts}, {self.elapsed:.2f}s)"
+
+
+def _extract(kind: Optional[ArtifactKind], text: str):
+    """Returns (content, problems) for one reply; content is None when nothing usable came back."""
+    if is_error_reply(text) or not text.strip():
+        return None, [text.strip() or "no content was generated"]
+    text = text.strip()
+    if kind is None:
+        return text, []
+    artifact = extract_artifacts(text, [kind]).get(kind.name)
+    if artifact is None:
+        return None, [f"no {kind.name} found in the reply"]
+    return artifact.content, artifact.errors
+
+
+async def generate_artifact(spec: ArtifactSpec, generate=None) -> ArtifactResult:
+    """
+    Generate one artifact with up to `spec.retries` extra attempts. Timeouts and error
+    replies retry the same prompt (error replies are never cached); output that fails
+    validation is sent back with its problems so only that file is corrected.
+    """
+    generate = generate or get_gemini_file_response
+    started = time.monotonic()
+    prompt = spec.prompt
+    best_content, best_problems = None, []
+    error = None
+    for attempt in range(1, spec.retries + 2):
+        try:
+            text = await asyncio.wait_for(generate(prompt), spec.timeout)
+        except asyncio.TimeoutError:
+            error = f"timed out after {spec.timeout:.0f}s"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+        else:
+            with stage("parse", artifact=spec.filename):
+                if spec.kind is None:
+                    content, problems = _extract(None, text)
+                else:
+                    # Tokenizing and YAML validation are CPU work; keep them off the event loop.
+                    content, problems = await cpu_pool.run(_extract, spec.kind, text)
+            if content is not None and not problems:
+                return ArtifactResult(spec, content=content, attempts=attempt, elapsed=time.monotonic() - started)
+            if content is not None:
+                best_content, best_problems = content, problems
+                error = "; ".join(problems)
+                if spec.kind is not None:
+                    prompt = build_repair_prompt(spec.kind, ExtractedArtifact(spec.kind, content, problems), spec.prompt)
+            else:
+                error = problems[0]
+        logger.warning("%s attempt %d failed: %s", spec.name, attempt, error)
+    elapsed = time.monotonic() - started
+    if best_content is not None:
+        # Still worth delivering; the caller shows the remaining problems next to the file.
+        return ArtifactResult(spec, content=best_content, problems=best_problems,
+                              attempts=spec.retries + 1, elapsed=elapsed)
+    return ArtifactResult(spec, error=error, attempts=spec.retries + 1, elapsed=elapsed)
+
+
+async def generate_artifacts(
+    specs: list[ArtifactSpec],
+    on_ready: Optional[Callable[[ArtifactResult], Awaitable[None]]] = None,
+    generate=None,
+) -> list[ArtifactResult]:
+    """
+    Generate every artifact concurrently. `on_ready` is awaited for each result as soon as
+    that artifact finishes, so fast files are delivered without waiting on slow ones.
+    Results are returned in spec order.
+    """
+
+    async def run(spec: ArtifactSpec) -> ArtifactResult:
+        result = await generate_artifact(spec, generate)
+        if on_ready is not None:
+            await on_ready(result)
+        return result
+
+    return list(await asyncio.gather(*(run(spec) for spec in specs)))
+
+
+async def repair_artifacts(extraction: ExtractionResult, context: str, generate=None) -> ExtractionResult:
+    """
+    Re-ask, concurrently, for just the artifacts of a combined reply that were missing or
+    failed validation; artifacts that came back fine are kept as they are.
+    """
+    broken = extraction.needs_repair
+    if not broken:
+        return extraction
+    specs = [ArtifactSpec.for_kind(kind, build_repair_prompt(kind, extraction.get(kind.name), context), retries=0)
+             for kind in broken]
+    for result in await generate_artifacts(specs, generate=generate):
+        previous = extraction.get(result.spec.kind.name)
+        if result.content is not None and (previous is None or len(result.problems) <= len(previous.errors)):
+            extraction.artifacts[result.spec.kind.name] = ExtractedArtifact(
+                result.spec.kind, result.content, result.problems)
+    return extraction
+
+
+PIPELINE_KINDS = {"github actions": GITHUB_WORKFLOW, "gitlab": GITLAB_PIPELINE, "jenkins": JENKINSFILE}
+
+
+def deploy_artifact_specs(framework: str, https: bool, cicd: str) -> list[ArtifactSpec]:
+    """Prompts for the ChatOps deploy flow: Dockerfile, Kubernetes manifest and, unless declined, a pipeline."""
+    specs = [
+        ArtifactSpec.for_kind(DOCKERFILE, prompt_registry.render("deploy.dockerfile", framework=framework)),
+        ArtifactSpec.for_kind(K8S_MANIFEST, prompt_registry.render(
+            "deploy.k8s", framework=framework, exposure="HTTPS Ingress" if https else "internal service only")),
+    ]
+    pipeline_kind = PIPELINE_KINDS.get(cicd)
+    if pipeline_kind is not None:
+        specs.append(ArtifactSpec.for_kind(
+            pipeline_kind, prompt_registry.render("deploy.pipeline", framework=framework, cicd=cicd)))
+    return specs
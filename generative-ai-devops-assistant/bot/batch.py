@@ -0,0 +1,389 @@
+# bot/batch.py
+import asyncio
+import hashlib
+import io
+import logging
+import posixpath
+import re
+import tempfile
+import zipfile
+from typing import Awaitable, Callable, Optional
+import discord
+from bot.archive import SPOOL_MEMORY_BYTES, ArchiveError, RepoArchive, downloaded_zip
+from bot.artifacts import PIPELINE_KINDS, ArtifactSpec, generate_artifact
+from bot.config import get_settings
+from bot.fingerprint import MANIFEST_FILES, common_root, fingerprint_repository
+from bot.generator import build_structure_prompt, build_url_prompt, fit_file_list, generate_deployment_files
+from bot.http_client import shared_http
+from bot.metrics import registry
+from bot.outbound import outbox
+from bot.prompts import NOISE_DIRS, prompt_registry
+from bot.repo_inspector import RepoInspectionError, repo_inspector
+from bot.tracing import stage
+from bot.workers import cpu_pool
+
+logger = logging.getLogger(__name__)
+
+GITHUB_URL_RE = re.compile(r"https?://github\.com/[^\s>]+")
+
+# Files that make a folder of a multi-service zip a service of its own.
+SERVICE_MARKERS = frozenset(MANIFEST_FILES) | {"dockerfile", "setup.py", "pom.xml", "gemfile", "composer.json"}
+
+PIPELINE_DESCRIPTIONS = {
+    "github actions": "a GitHub Actions workflow YAML file",
+    "gitlab": "a GitLab CI YAML pipeline configuration",
+    "jenkins": "a Jenkins pipeline script",
+}
+
+BUNDLE_FILENAME = "deployment-bundle.zip"
+# Credentials the command-line batch needs: the bot's, minus the Discord token.
+CLI_REQUIRED = ("gemini_api_key", "github_token")
+# The progress message is edited at most this often.
+PROGRESS_EDIT_INTERVAL_SECONDS = 2.0
+
+BATCH_SERVICES = registry.counter("bot_batch_services_total", "Services in batch generation requests.")
+BATCH_GENERATIONS = registry.counter(
+    "bot_batch_generations_total", "Generations run for batches; services with the same profile share one.")
+
+
+class BatchService:
+    """One service of a batch and the prompts it needs. Services with the same prompts share a generation."""
+
+    __slots__ = ("name", "repo_type", "prompt", "pipeline")
+
+    def __init__(self, name: str, repo_type: str, prompt: str, pipeline: Optional[str] = None):
+        self.name = name
+        self.repo_type = repo_type
+        self.prompt = prompt
+        # A CI/CD platform from PIPELINE_KINDS, or None for no pipeline.
+        self.pipeline = pipeline
+
+    @property
+    def pipeline_prompt(self) -> Optional[str]:
+        # The pipeline depends only on the stack, so services on the same stack share it.
+        if self.pipeline is None:
+            return None
+        return prompt_registry.render(
+            "cicd", description=PIPELINE_DESCRIPTIONS[self.pipeline],
+            request=f"Build, test and publish a container image for a {self.repo_type}, then deploy it to Kubernetes.")
+
+    @property
+    def profile(self) -> str:
+        digest = hashlib.sha256(self.prompt.encode("utf-8"))
+        digest.update(b"\0" + (self.pipeline_prompt or "").encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+
+def split_services(file_list: list[str]) -> dict[str, list[str]]:
+    """
+    Group the paths of a zip by service. Each outermost folder holding a manifest or a
+    Dockerfile is one service, with paths relative to it; a zip with fewer than two such
+    folders is a single service. Vendored and generated folders never count.
+    """
+    root = common_root(file_list)
+    service_dirs = set()
+    for path in file_list:
+        relative = path[len(root):]
+        directory, basename = posixpath.split(relative)
+        if directory and basename.lower() in SERVICE_MARKERS and not NOISE_DIRS.intersection(directory.split("/")):
+            service_dirs.add(directory)
+    # Keep the outermost folders only: services/api and not services/api/tools.
+    outermost = sorted(d for d in service_dirs if not any(d.startswith(other + "/") for other in service_dirs))
+    if len(outermost) < 2:
+        return {root.rstrip("/") or "service": [path[len(root):] for path in file_list]}
+    services: dict[str, list[str]] = {directory: [] for directory in outermost}
+    for path in file_list:
+        relative = path[len(root):]
+        top = relative
+        while top:
+            top = posixpath.dirname(top)
+            if top in services:
+                services[top].append(relative[len(top) + 1:])
+                break
+    return services
+
+
+def summarize_services(source) -> list[tuple[str, list[str], str]]:
+    """
+    (name, file list, detected stack) for each service in a zip given as bytes, a file object
+    or a path. Pure CPU work, so it can run in a worker process.
+    """
+    fileobj = io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+    with RepoArchive(fileobj) as archive:
+        root = common_root(archive.file_list)
+        found = []
+        for name, files in split_services(archive.file_list).items():
+            prefix = root if len(files) == len(archive.file_list) else f"{root}{name}/"
+            describe = fingerprint_repository(files, lambda path: archive.read_text(prefix + path)).describe()
+            found.append((name, files, describe))
+        return found
+
+
+async def services_from_urls(urls: list[str], pipeline: Optional[str] = None) -> list[BatchService]:
+    """Inspect every repository concurrently; one that cannot be inspected is generated from its URL alone."""
+
+    async def inspect(url: str) -> BatchService:
+        try:
+            snapshot = await repo_inspector.inspect(url)
+        except RepoInspectionError as e:
+            logger.warning("Inspecting %s failed, using a URL-only prompt: %s", url, e)
+            name = url.rstrip("/").split("github.com/", 1)[-1]
+            return BatchService(name, "unspecified application", build_url_prompt(url), pipeline)
+        repo_type = fingerprint_repository(snapshot.file_list, snapshot.read_file).describe()
+        # Commit and name stay out of the prompt so identical services share one generation.
+        prompt = build_structure_prompt("A repository has source code", await fit_file_list(snapshot.file_list),
+                                        repo_type)
+        return BatchService(snapshot.full_name, repo_type, prompt, pipeline)
+
+    with stage("prompt_build", source="github"):
+        return list(await asyncio.gather(*(inspect(url) for url in dict.fromkeys(urls))))
+
+
+async def services_from_zip(source, pipeline: Optional[str] = None) -> list[BatchService]:
+    """
+    Split a multi-service zip into services, fingerprinted in the CPU pool. `source` is a path,
+    or what archive.downloaded_zip() yields for an upload; a file object only works with the
+    pool off, since it can't be sent to a worker process.
+    """
+    with stage("prompt_build", source="zip"):
+        found = await cpu_pool.run(summarize_services, source)
+        return [BatchService(name, repo_type,
+                             build_structure_prompt("A service has source code", await fit_file_list(files), repo_type),
+                             pipeline)
+                for name, files, repo_type in found]
+
+
+class BundleWriter:
+    """
+    The batch's zip, written one file at a time as results come in. It goes to `fileobj`,
+    or to a buffer that spills to a temporary file, so the bundle is never held in memory
+    as a whole.
+    """
+
+    def __init__(self, fileobj=None):
+        self.fileobj = fileobj if fileobj is not None else tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+        self._zip = zipfile.ZipFile(self.fileobj, "w", compression=zipfile.ZIP_DEFLATED)
+        self._names: set[str] = set()
+        self.files = 0
+
+    def add(self, path: str, text: str) -> None:
+        self._zip.writestr(path, text)
+        self.files += 1
+
+    def directory(self, name: str) -> str:
+        """A unique folder for a service, so two services called `api` don't overwrite each other."""
+        candidate, n = name, 1
+        while candidate in self._names:
+            n += 1
+            candidate = f"{name}-{n}"
+        self._names.add(candidate)
+        return candidate
+
+    def close(self):
+        """Finish the zip and return its file object, rewound for reading."""
+        self._zip.close()
+        if self.fileobj.seekable():
+            self.fileobj.seek(0)
+        return self.fileobj
+
+
+class BatchReport:
+    """What happened to each service of a batch."""
+
+    def __init__(self):
+        self.lines: list[str] = []
+        self.services = 0
+        self.failed = 0
+        self.generations = 0
+
+    def render(self) -> str:
+        return "\n".join([f"{self.services} service(s), {self.generations} generation(s), {self.failed} failed", ""]
+                         + self.lines) + "\n"
+
+
+async def run_batch(services: list[BatchService], bundle: BundleWriter, concurrency: Optional[int] = None,
+                    on_progress: Optional[Callable[[int, int], Awaitable[None]]] = None) -> BatchReport:
+    """
+    Generate files for every service into `bundle`. Services with the same profile share one
+    generation, at most `concurrency` (default: BATCH_MAX_CONCURRENCY) generations run at a
+    time, and each service's files are written to the bundle as soon as its generation
+    finishes. `on_progress(done, total)` is awaited after each generation.
+    """
+    report = BatchReport()
+    report.services = len(services)
+    profiles: dict[str, list[BatchService]] = {}
+    for service in services:
+        profiles.setdefault(service.profile, []).append(service)
+    report.generations = len(profiles)
+    semaphore = asyncio.Semaphore(concurrency or get_settings().batch_max_concurrency)
+    done = 0
+
+    async def generate(members: list[BatchService]) -> None:
+        nonlocal done
+        first = members[0]
+        files: list[tuple[str, str]] = []
+        problems: list[str] = []
+        error = None
+        async with semaphore:
+            try:
+                with stage("batch_generate", services=len(members)):
+                    extraction = await generate_deployment_files(first.prompt)
+                    files += [(artifact.kind.filename, artifact.content) for artifact in extraction]
+                    problems += [f"{a.kind.name}: {'; '.join(a.errors)}" for a in extraction if a.errors]
+                    if first.pipeline is not None:
+                        kind = PIPELINE_KINDS[first.pipeline]
+                        result = await generate_artifact(ArtifactSpec.for_kind(kind, first.pipeline_prompt))
+                        if result.ok:
+                            files.append((kind.filename, result.content))
+                            problems += [f"{kind.name}: {problem}" for problem in result.problems]
+                        else:
+                            problems.append(f"{kind.name}: {result.error}")
+            except Exception as e:
+                error = str(e) or type(e).__name__
+                logger.warning("Generation for %s failed: %s", ", ".join(s.name for s in members), error)
+        if not files and error is None:
+            error = "no files could be parsed from the reply"
+        for service in members:
+            directory = bundle.directory(service.name)
+            for filename, content in files:
+                bundle.add(f"{directory}/{filename}", content)
+            shared = f" (same as {first.name})" if service is not first else ""
+            if error is not None:
+                report.failed += 1
+                report.lines.append(f"{directory}: failed: {error}")
+            else:
+                note = f"; still failing checks: {'; '.join(problems)}" if problems else ""
+                report.lines.append(f"{directory}: {service.repo_type}{shared}{note}")
+        done += 1
+        if on_progress is not None:
+            await on_progress(done, len(profiles))
+
+    await asyncio.gather(*(generate(members) for members in profiles.values()))
+    bundle.add("REPORT.txt", report.render())
+    BATCH_SERVICES.inc(report.services)
+    BATCH_GENERATIONS.inc(report.generations)
+    return report
+
+
+def parse_pipeline(text: str) -> Optional[str]:
+    """The CI/CD platform asked for next to the sources, if any; URLs are ignored so github.com doesn't count."""
+    lowered = GITHUB_URL_RE.sub(" ", text).lower()
+    if "gitlab" in lowered:
+        return "gitlab"
+    if "jenkins" in lowered:
+        return "jenkins"
+    if "actions" in lowered:
+        return "github actions"
+    return None
+
+
+async def handle_batch_request(message: discord.Message) -> None:
+    """
+    `!batch` in the generator channel: several GitHub URLs, or a zip with several services,
+    in; one zip with a Dockerfile and Kubernetes manifest per service (and a pipeline, when
+    GitHub Actions, GitLab or Jenkins is named) out.
+    """
+    channel = message.channel
+    content = message.content.strip()
+    urls = list(dict.fromkeys(GITHUB_URL_RE.findall(content)))
+    zip_attachment = next((a for a in message.attachments if a.filename.lower().endswith(".zip")), None)
+    pipeline = parse_pipeline(content)
+
+    if not urls and zip_attachment is None:
+        await outbox.send(channel, "Usage: `!batch [github actions|gitlab|jenkins] <GitHub URLs...>`, "
+                          "or `!batch` with a zip that has one folder per service.")
+        return
+    settings = get_settings()
+    if len(urls) > settings.batch_max_services:
+        await outbox.send(channel, f"That's {len(urls)} repositories; a batch can have at most "
+                          f"{settings.batch_max_services}.")
+        return
+    if zip_attachment is not None and zip_attachment.size > settings.zip_max_download_bytes:
+        await outbox.send(channel, f"`{zip_attachment.filename}` is too large ({zip_attachment.size} bytes). "
+                          f"The limit is {settings.zip_max_download_bytes} bytes.")
+        return
+
+    # One status message, edited as the batch goes on.
+    outbox.status(channel, f"Inspecting {len(urls) or 'the uploaded'} "
+                           f"{'repositories' if urls else 'zip file'} for batch generation...")
+    if urls:
+        services = await services_from_urls(urls, pipeline)
+    else:
+        try:
+            async with downloaded_zip(shared_http.session, zip_attachment.url, size=zip_attachment.size) as source:
+                services = await services_from_zip(source, pipeline)
+        except ArchiveError as e:
+            await outbox.send(channel, f"Could not use the uploaded zip file: {e}")
+            return
+    if len(services) > settings.batch_max_services:
+        await outbox.send(channel, f"The zip has {len(services)} services; a batch can have at most "
+                          f"{settings.batch_max_services}.")
+        return
+
+    last_edit = 0.0
+
+    async def progress(done: int, total: int) -> None:
+        nonlocal last_edit
+        now = asyncio.get_running_loop().time()
+        if done < total and now - last_edit < PROGRESS_EDIT_INTERVAL_SECONDS:
+            return
+        last_edit = now
+        outbox.status(channel, f"Generating files for {len(services)} service(s): {done}/{total} generation(s) done...")
+
+    outbox.status(channel, f"Generating files for {len(services)} service(s)...")
+    bundle = BundleWriter()
+    try:
+        report = await run_batch(services, bundle, on_progress=progress)
+        fileobj = bundle.close()
+        summary = (f"Generated files for {report.services - report.failed} of {report.services} service(s) "
+                   f"with {report.generations} generation(s). See REPORT.txt in the bundle for details.")
+        with stage("upload"):
+            await outbox.send(channel, summary, file=discord.File(fileobj, filename=BUNDLE_FILENAME))
+    finally:
+        bundle.fileobj.close()
+
+
+async def run_cli(sources: list[str], output: str, pipeline: Optional[str] = None,
+                  concurrency: Optional[int] = None) -> BatchReport:
+    """
+    Batch generation from the command line. `sources` are GitHub URLs, zip files of services,
+    or text files listing one URL per line; the bundle is written straight to `output`.
+    Raises ValueError before doing any work if the credentials it needs are missing.
+    """
+    from bot.github_client import github_client
+    from bot.llm_client import GeminiBackend, llm_client, openai_client
+
+    settings = get_settings()
+    settings.validate(CLI_REQUIRED)
+    llm_client.backend = GeminiBackend(settings.gemini_api_key)
+    openai_client.backend.api_key = settings.openai_api_key
+    github_client.token = settings.github_token
+
+    urls, zips = [], []
+    for source in sources:
+        if GITHUB_URL_RE.match(source):
+            urls.append(source)
+        elif source.lower().endswith(".zip"):
+            zips.append(source)
+        else:
+            with open(source, encoding="utf-8") as fh:
+                urls += [line.strip() for line in fh if line.strip() and not line.lstrip().startswith("#")]
+
+    async def progress(done: int, total: int) -> None:
+        print(f"[batch] {done}/{total} generation(s) done")
+
+    try:
+        services = await services_from_urls(urls, pipeline) if urls else []
+        for path in zips:
+            # Workers open the zip by path, so it is never read into memory here.
+            services += await services_from_zip(path, pipeline)
+        print(f"[batch] {len(services)} service(s) found")
+        with open(output, "wb") as fh:
+            bundle = BundleWriter(fh)
+            report = await run_batch(services, bundle, concurrency, on_progress=progress)
+            bundle.close()
+    finally:
+        await shared_http.close()
+        cpu_pool.shutdown()
+    print(report.render())
+    return report
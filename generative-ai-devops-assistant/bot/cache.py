@@ -0,0 +1,234 @@
+# bot/cache.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapse whitespace so trivially different prompts share a cache entry."""
+    return " ".join(prompt.split())
+
+
+def make_cache_key(prompt: str, model_name: str) -> str:
+    """Content-addressed key: sha256 of the model name and the normalized prompt."""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(normalize_prompt(prompt).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CacheStats:
+    """Hit/miss/eviction counters for a ResponseCache."""
+
+    __slots__ = ("hits", "misses", "evictions", "disk_hits")
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_hits": self.disk_hits,
+            "hit_rate": self.hit_rate,
+        }
+
+
+class SqliteCacheTier:
+    """
+    Optional on-disk tier so cached responses survive restarts.
+    Entries carry an absolute expiry timestamp; expired rows are ignored and purged lazily.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, now: float) -> Optional[tuple[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            return row[0], row[1]
+
+    def set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def purge_expired(self, now: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class ResponseCache:
+    """
+    Two-tier LLM response cache.
+
+    The memory tier is an LRU bounded by total size in bytes, with a TTL per entry.
+    When a disk path is given, entries are written through to sqlite and memory misses
+    fall back to disk, promoting the entry back into memory on a hit. Code on the event loop
+    uses `aget`/`aset`, which do the sqlite work in a thread.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = 3600,
+        max_bytes: int = 32 * 1024 * 1024,
+        disk_path: Optional[str] = None,
+        clock=time.monotonic,
+        wall_clock=time.time,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._clock = clock
+        self._wall_clock = wall_clock
+        # key -> (value, size_in_bytes, expires_at on the monotonic clock)
+        self._entries: OrderedDict[str, tuple[str, int, float]] = OrderedDict()
+        self._size_bytes = 0
+        self._disk = SqliteCacheTier(disk_path) if disk_path else None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size_bytes
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get_memory(key)
+        if value is None and self._disk is not None:
+            wall_now = self._wall_clock()
+            value = self._promote(key, self._disk.get(key, wall_now), wall_now)
+        if value is None:
+            self.stats.misses += 1
+        return value
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Like get, with the disk lookup run off the event loop."""
+        value = self._get_memory(key)
+        if value is None and self._disk is not None:
+            wall_now = self._wall_clock()
+            found = await asyncio.to_thread(self._disk.get, key, wall_now)
+            value = self._promote(key, found, wall_now)
+        if value is None:
+            self.stats.misses += 1
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        self._store(key, value, self._clock() + self.ttl_seconds)
+        if self._disk is not None:
+            self._disk.set(key, value, self._wall_clock() + self.ttl_seconds)
+
+    async def aset(self, key: str, value: str) -> None:
+        """Like set, with the disk write run off the event loop."""
+        self._store(key, value, self._clock() + self.ttl_seconds)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk.set, key, value, self._wall_clock() + self.ttl_seconds)
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, _, expires_at = entry
+            if expires_at > self._clock():
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return value
+            self._remove(key)
+        return None
+
+    def _promote(self, key: str, found: Optional[tuple[str, float]], wall_now: float) -> Optional[str]:
+        """Copy a disk hit into the memory tier; the memory tier is only touched on the event loop."""
+        if found is None:
+            return None
+        value, wall_expires_at = found
+        self._store(key, value, self._clock() + (wall_expires_at - wall_now))
+        self.stats.hits += 1
+        self.stats.disk_hits += 1
+        return value
+
+    def invalidate(self, key: str) -> None:
+        self._remove(key)
+        if self._disk is not None:
+            self._disk.delete(key)
+
+    def clear(self) -> None:
+        """Drop every entry from both tiers."""
+        self._entries.clear()
+        self._size_bytes = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _store(self, key: str, value: str, expires_at: float) -> None:
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            # Never let a single oversized response flush the whole memory tier.
+            return
+        self._remove(key)
+        self._entries[key] = (value, size, expires_at)
+        self._size_bytes += size
+        while self._size_bytes > self.max_bytes:
+            _, (_, oldest_size, _) = self._entries.popitem(last=False)
+            self._size_bytes -= oldest_size
+            self.stats.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._size_bytes -= entry[1]
@@ -0,0 +1,247 @@
+# bot/chatops.py
+from typing import Optional
+from bot.artifacts import ArtifactResult, deploy_artifact_specs, generate_artifacts
+from bot.deploy import GUILD, USER, DeployTarget, deploy_targets, parse_target
+from bot.deploy_jobs import deploy_tracker
+from bot.flows import END, ChoiceMatcher, Flow, FlowContext, FlowEngine, InvalidInput, State
+from bot.metrics import registry
+from bot.outbound import Attachment
+from bot.sessions import create_session_store
+from bot.tracing import stage
+
+# ChatOps sessions by user_id, with idle eviction and per-user locks
+session_store = create_session_store()
+
+# Every ChatOps flow is registered here; other modules add flows with flow_engine.register_flow.
+flow_engine = FlowEngine(session_store)
+
+CICD_PLATFORMS = ChoiceMatcher(["github actions", "jenkins", "gitlab", "none"])
+
+
+@registry.register_collector
+def _session_metrics():
+    # Redis expires keys on its own and has no cheap count, so only local backends report.
+    if session_store.is_open and hasattr(session_store.backend, "__len__"):
+        yield "bot_chatops_sessions", "ChatOps sessions currently stored.", {}, len(session_store.backend)
+
+
+async def send_artifact(ctx: FlowContext, result: ArtifactResult) -> None:
+    """Attach one generated file as soon as it is ready, or say which one failed."""
+    if result.ok:
+        note = f" (it still has problems: {'; '.join(result.problems)})" if result.problems else ""
+        with stage("upload", artifact=result.spec.filename):
+            await ctx.reply(
+                f"Here is your {result.spec.name}{note}:",
+                attachments=[Attachment(result.spec.filename, result.content)],
+            )
+    else:
+        await ctx.reply(f"Couldn't generate the {result.spec.name}: {result.error}")
+
+
+# --- Deploy flow: framework -> https -> cicd -> confirm -> deploy ---
+
+def _parse_https(ctx: FlowContext) -> bool:
+    text = ctx.content_lower
+    return bool("https" in text or "ingress" in text or "yes" in text)
+
+
+def _parse_cicd(ctx: FlowContext) -> str:
+    choice = CICD_PLATFORMS.match(ctx.content_lower)
+    if choice is None:
+        raise InvalidInput(
+            f"'{ctx.content}' is not a recognized CI/CD platform.\n"
+            "Please choose one of: GitHub Actions, Jenkins, GitLab, or None."
+        )
+    return choice
+
+
+def _confirm_summary(ctx: FlowContext) -> str:
+    summary = (
+        f"Framework: {ctx.data.get('framework')}\n"
+        f"HTTPS Ingress: {'Yes' if ctx.data.get('https') else 'No'}\n"
+        f"CI/CD platform: {ctx.data.get('cicd')}\n"
+        "Type 'yes' to generate the files or 'no' to cancel."
+    )
+    return f"Please confirm your choices:\n{summary}"
+
+
+async def _generate_files(ctx: FlowContext, confirmed: bool):
+    if not confirmed:
+        await ctx.reply("Session cancelled.")
+        return None
+
+    specs = deploy_artifact_specs(ctx.data["framework"], ctx.data["https"], ctx.data["cicd"])
+    ctx.status(f"Generating {len(specs)} files based on your inputs...")
+    return await _run_artifacts(ctx, specs)
+
+
+async def _run_artifacts(ctx: FlowContext, specs):
+    """Generate `specs`, remembering failures so only those are regenerated on `retry`."""
+    # One prompt per file, all in flight at once; each file is attached the moment it's done.
+    results = await generate_artifacts(specs, on_ready=lambda result: send_artifact(ctx, result))
+    ctx.data["failed_artifacts"] = [result.spec.name for result in results if not result.ok]
+    return "retry" if ctx.data["failed_artifacts"] else None
+
+
+def _retry_question(ctx: FlowContext) -> str:
+    failed = ", ".join(ctx.data["failed_artifacts"])
+    return f"Some files failed ({failed}). Reply `retry` to regenerate only those, or `continue` to move on."
+
+
+def _parse_retry_choice(ctx: FlowContext) -> str:
+    if ctx.content_lower not in ("retry", "continue"):
+        raise InvalidInput(f"<@{ctx.user_id}> Please reply with `retry` or `continue`.")
+    return ctx.content_lower
+
+
+async def _retry_failed(ctx: FlowContext, choice: str):
+    if choice != "retry":
+        return None
+    failed = set(ctx.data["failed_artifacts"])
+    specs = [spec for spec in deploy_artifact_specs(ctx.data["framework"], ctx.data["https"], ctx.data["cicd"])
+             if spec.name in failed]
+    ctx.status(f"Regenerating {len(specs)} file(s)...")
+    return await _run_artifacts(ctx, specs)
+
+
+def _parse_deploy_choice(ctx: FlowContext) -> Optional[DeployTarget]:
+    """None for `skip`; for `deploy`, the target given after it or the user's/server's configured one."""
+    words = ctx.content.split(maxsplit=1)
+    choice = words[0].lower() if words else ""
+    if choice not in ("deploy", "skip"):
+        raise InvalidInput(f"<@{ctx.user_id}> Please reply with `deploy` to trigger deployment or `skip` to finish.")
+    if choice == "skip":
+        return None
+    if len(words) > 1:
+        try:
+            return parse_target(words[1])
+        except ValueError as e:
+            raise InvalidInput(f"<@{ctx.user_id}> Please reply with `deploy` followed by {e}.")
+    guild = ctx.message.guild
+    target = deploy_targets.resolve(ctx.user_id, guild.id if guild else None)
+    if target is None:
+        raise InvalidInput(
+            f"<@{ctx.user_id}> No deploy target is set for you or this server. Reply with "
+            f"`deploy owner/repo [workflow file] [ref]`, or save one with `!deploy-target`."
+        )
+    return target
+
+
+async def _trigger_deploy(ctx: FlowContext, target: Optional[DeployTarget]):
+    if target is None:
+        await ctx.reply("Deployment skipped. Session finished.")
+        return None
+
+    if ctx.data.get("cicd") != "github actions":
+        await ctx.reply("Deployment trigger currently supports only GitHub Actions.")
+        return None
+
+    running = deploy_tracker.find_active(ctx.user_id, target)
+    if running is not None:
+        await ctx.reply(f"Deploy `{running.id}` of `{target.repo}` is still running; its status message is kept up to date.")
+        return None
+    # The tracker posts one status message and edits it until the run finishes.
+    await deploy_tracker.start(target, ctx.channel, ctx.user_id)
+    return None
+
+
+DEPLOY_FLOW = flow_engine.register_flow(Flow(
+    "deploy",
+    triggers=("!deploy", "/start"),
+    states=[
+        State(
+            "framework",
+            question=lambda ctx: "What framework are you using? (e.g., Flask, FastAPI, Node.js)",
+            field="framework",
+            next="https",
+        ),
+        State(
+            "https",
+            question=lambda ctx: "Do you want HTTPS Ingress or only internal service?",
+            parse=_parse_https,
+            field="https",
+            next="cicd",
+        ),
+        State(
+            "cicd",
+            question=lambda ctx: "Which CI/CD platform do you want: GitHub Actions, Jenkins, GitLab, or None?",
+            parse=_parse_cicd,
+            field="cicd",
+            next="confirm",
+        ),
+        State(
+            "confirm",
+            question=_confirm_summary,
+            parse=lambda ctx: ctx.content_lower in ("yes", "y"),
+            next=lambda confirmed: "deploy" if confirmed else END,
+            actions=(_generate_files,),
+        ),
+        State(
+            "retry",
+            question=_retry_question,
+            parse=_parse_retry_choice,
+            next="deploy",
+            actions=(_retry_failed,),
+        ),
+        State(
+            "deploy",
+            question=lambda ctx: (
+                "Would you like to trigger deployment on GitHub Actions now? "
+                "Reply with `deploy` to proceed or `skip` to finish."
+            ),
+            parse=_parse_deploy_choice,
+            next=END,
+            actions=(_trigger_deploy,),
+        ),
+    ],
+))
+
+
+# --- Deploy target: where `deploy` dispatches to, per user or per server ---
+
+def _parse_target_setting(ctx: FlowContext) -> tuple[str, int, Optional[DeployTarget]]:
+    words = ctx.content.split()
+    scope, scope_id = USER, ctx.user_id
+    if words and words[0].lower() == "server":
+        guild = ctx.message.guild
+        permissions = getattr(ctx.message.author, "guild_permissions", None)
+        if guild is None:
+            raise InvalidInput(f"<@{ctx.user_id}> A server deploy target can only be set in a server channel.")
+        if permissions is None or not permissions.manage_guild:
+            raise InvalidInput(f"<@{ctx.user_id}> Only members who can manage this server can set its deploy target.")
+        scope, scope_id, words = GUILD, guild.id, words[1:]
+    if words and words[0].lower() == "clear":
+        return scope, scope_id, None
+    try:
+        return scope, scope_id, parse_target(" ".join(words))
+    except ValueError as e:
+        raise InvalidInput(f"<@{ctx.user_id}> Please reply with {e}, optionally after `server`.")
+
+
+async def _save_target(ctx: FlowContext, setting: tuple[str, int, Optional[DeployTarget]]):
+    scope, scope_id, target = setting
+    whose = "this server" if scope == GUILD else "you"
+    if target is None:
+        deploy_targets.clear(scope, scope_id)
+        await ctx.reply(f"Cleared the deploy target for {whose}.")
+    else:
+        deploy_targets.set(scope, scope_id, target)
+        await ctx.reply(f"Deploys for {whose} now dispatch `{target.workflow}` on `{target.repo}` at `{target.ref}`.")
+    return None
+
+
+DEPLOY_TARGET_FLOW = flow_engine.register_flow(Flow(
+    "deploy-target",
+    triggers=("!deploy-target",),
+    states=[
+        State(
+            "target",
+            question=lambda ctx: (
+                "Which repository should your deploys use? Reply with `owner/repo [workflow file] [ref]`. "
+                "Start with `server` to set it for the whole server, or reply `clear` to remove it."
+            ),
+            parse=_parse_target_setting,
+            actions=(_save_target,),
+        ),
+    ],
+))
@@ -1,47 +1,96 @@
 import discord
-import io
-from bot.llm_client import get_gemini_file_response
+import logging
+import re
+from typing import Optional
+from bot.artifacts import ArtifactSpec, generate_artifact
+from bot.config import get_settings
+from bot.extraction import GITHUB_WORKFLOW, GITLAB_PIPELINE, JENKINSFILE
+from bot.outbound import Attachment, outbox
+from bot.prompts import prompt_registry
+from bot.repo_inspector import RepoInspectionError, repo_inspector
+from bot.templates import TEMPLATE_REQUESTS, Stack, detect_stack, extra_requirements, render_pipeline, stack_from_text, wants_image
+from bot.tracing import stage
+
+logger = logging.getLogger(__name__)
+
+async def find_stack(content: str) -> Optional[Stack]:
+    """
+    The stack a request is about: from the fingerprint of a linked GitHub repository when there
+    is one, otherwise from the languages and tools it names. None when the templates don't fit.
+    """
+    match = re.search(r'https?://github\.com/[^\s]+', content)
+    if match:
+        try:
+            snapshot = await repo_inspector.inspect(match.group())
+            stack = detect_stack(snapshot.file_list, snapshot.read_file, name=snapshot.repo)
+            if stack is not None:
+                return stack
+        except RepoInspectionError as e:
+            logger.warning("Repository inspection failed, using the request text: %s", e)
+    return stack_from_text(content)
 
 async def handle_cicd_request(message: discord.Message):
     """
     Handle CI/CD pipeline YAML generation requests in ci-cd-pipelines channel.
+    Routine requests are answered from a template; the model customizes the template when the
+    request asks for more, and writes the whole pipeline for stacks the templates don't cover.
     """
     content = message.content.strip()
     lowered = content.lower()
 
     if "jenkins" in lowered:
         pipeline_type = "Jenkins pipeline"
-        filename = "Jenkinsfile"
+        kind = JENKINSFILE
         description = "a Jenkins pipeline script"
     elif "gitlab" in lowered:
         pipeline_type = "GitLab CI pipeline"
-        filename = ".gitlab-ci.yml"
+        kind = GITLAB_PIPELINE
         description = "a GitLab CI YAML pipeline configuration"
     else:
         pipeline_type = "GitHub Actions workflow"
-        filename = "ci.yml"
+        kind = GITHUB_WORKFLOW
         description = "a GitHub Actions workflow YAML file"
 
-    prompt_lines = [
-        "You are a senior DevOps engineer.",
-        f"Generate {description} based on the user's request below.",
-        "Include best practices, caching, testing, building, and deployment steps.",
-        "Add comments to explain each stage and step.",
-        f"User's request: {content}",
-    ]
-    prompt = "\n".join(prompt_lines).strip()
-
-    await message.channel.send(f"Generating {pipeline_type} for you. Please wait...")
+    stack = await find_stack(content) if get_settings().templates_enabled else None
+    template = None
+    if stack is not None:
+        with stage("template", artifact=kind.filename):
+            template = render_pipeline(kind, stack, image=wants_image(content))
+        # Encoded once: sent as is, or as the fallback when customizing it fails.
+        template_file = Attachment(kind.filename, template)
+        extras = extra_requirements(content)
+        if not extras:
+            TEMPLATE_REQUESTS.labels("cicd", "template").inc()
+            with stage("upload"):
+                await outbox.send(message.channel, f"Here is your generated {pipeline_type} (from the {stack.label} template):",
+                                  attachments=[template_file])
+            return
+        logger.info("Customizing the %s template for: %s", stack.label, ", ".join(extras))
+        prompt = prompt_registry.render("cicd.customize", description=description, template=template, request=content)
+        outbox.status(message.channel, f"Adapting the {stack.label} {pipeline_type} template to your request. Please wait...")
+    else:
+        prompt = prompt_registry.render("cicd", description=description, request=content)
+        outbox.status(message.channel, f"Generating {pipeline_type} for you. Please wait...")
+    TEMPLATE_REQUESTS.labels("cicd", "model" if template is None else "customized").inc()
 
     try:
-        file_content = await get_gemini_file_response(prompt)
-        if not file_content or "Sorry" in file_content[:10]:
-            await message.channel.send("Sorry, I could not generate the pipeline file. Please provide more details or try rephrasing.")
+        # Extracted from the reply and validated; a broken pipeline is sent back once for correction.
+        result = await generate_artifact(ArtifactSpec.for_kind(kind, prompt))
+        if not result.ok and template is not None:
+            # The template still answers the routine part of the request.
+            with stage("upload"):
+                await outbox.send(message.channel, f"I could not apply your changes, so here is the {stack.label} "
+                                  f"{pipeline_type} template they would start from:", attachments=[template_file])
+            return
+        if not result.ok:
+            await outbox.send(message.channel, "Sorry, I could not generate the pipeline file. Please provide more details or try rephrasing.")
             return
 
-        discord_file = discord.File(io.BytesIO(file_content.encode('utf-8')), filename=filename)
-        await message.channel.send(f"Here is your generated {pipeline_type}:", file=discord_file)
+        note = f"\nSome checks still fail: {'; '.join(result.problems)}" if result.problems else ""
+        with stage("upload"):
+            await outbox.send(message.channel, f"Here is your generated {pipeline_type}:{note}",
+                              attachments=[Attachment(kind.filename, result.content)])
 
     except Exception as e:
-        await message.channel.send("Sorry, an error occurred while generating your pipeline file.")
-        print(f"[cicd_generator] Error in handle_cicd_request: {e}")
+        await outbox.send(message.channel, "Sorry, an error occurred while generating your pipeline file.")
+        logger.exception("Error in handle_cicd_request: %s", e)
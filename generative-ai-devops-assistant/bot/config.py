@@ -1,13 +1,10 @@
 import os
-from dotenv import load_dotenv
+from contextlib import contextmanager
+from typing import Mapping, Optional
 
-# Load environment variables from .env file
-load_dotenv()
-
-# Required tokens and credentials
-DISCORD_TOKEN = os.getenv("DISCORD_TOKEN")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+# Everything configurable is an attribute of Settings, read from the environment by Settings.from_env()
+# and nowhere else. The bootstrap (bot/app.py) loads the .env file, reads the settings once and installs
+# them with use_settings(); importing this module reads nothing.
 
 # Channel name constants—these are used both for display and channel lookup.
 CHATBOT_CHANNEL = "chatbot"
@@ -26,17 +23,260 @@ def get_all_target_channels():
     """Returns the list of all target channel names."""
     return TARGET_CHANNEL_NAMES
 
+
+def _flag(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+class Settings:
+    """
+    Credentials and tunables. Each attribute is set by the environment variable of the same name
+    in upper case (llm_cache_ttl_seconds by LLM_CACHE_TTL_SECONDS); unset or empty ones keep the
+    defaults below. Loaded once by the bootstrap and handed to the startup hook.
+    """
+
+    required = ("discord_token", "gemini_api_key", "github_token")
+
+    discord_token: Optional[str] = None
+    gemini_api_key: Optional[str] = None
+    github_token: Optional[str] = None
+    openai_api_key: Optional[str] = None
+
+    # LLM response cache: in-memory LRU bounded by TTL and total size, plus an optional
+    # sqlite file (LLM_CACHE_PATH) so cached responses survive restarts.
+    llm_cache_enabled: bool = True
+    llm_cache_ttl_seconds: int = 3600
+    llm_cache_max_bytes: int = 32 * 1024 * 1024
+    llm_cache_path: Optional[str] = None
+
+    # Semantic cache for first #chatbot questions: a reworded question whose cosine similarity to
+    # an answered one is at least SEMANTIC_CACHE_THRESHOLD, and whose key terms don't conflict with
+    # it ("cpu" vs "memory"), gets the stored answer; the default comes from the labelled pairs in
+    # benchmarks/bench_semantic_cache.py. Holds up to
+    # SEMANTIC_CACHE_MAX_ENTRIES questions (least recently used go first), memory-mapped under
+    # SEMANTIC_CACHE_PATH when set (one subdirectory per process when sharded). Also off when
+    # LLM_CACHE_ENABLED is.
+    semantic_cache_enabled: bool = True
+    semantic_cache_threshold: float = 0.7
+    semantic_cache_max_entries: int = 20000
+    semantic_cache_dim: int = 512
+    semantic_cache_ttl_seconds: int = 86400
+    semantic_cache_path: Optional[str] = None
+
+    # LLM client limits: concurrent in-flight requests, per-attempt timeout and retries on 429/5xx.
+    llm_max_concurrency: int = 8
+    llm_request_timeout_seconds: float = 60
+    llm_max_retries: int = 3
+
+    # Stream #chatbot answers into Discord, editing one message at most every STREAM_EDIT_INTERVAL_SECONDS
+    # and rolling over into up to STREAM_MAX_MESSAGES messages before switching to an attachment.
+    stream_chat_responses: bool = True
+    stream_edit_interval_seconds: float = 1.0
+    stream_max_messages: int = 3
+
+    # Outbound Discord messages go through one queue per channel. Sends and edits are each paced to
+    # OUTBOUND_CHANNEL_BURST per OUTBOUND_CHANNEL_WINDOW_SECONDS per channel (0 turns pacing off) until
+    # Discord's rate-limit headers say otherwise. Queued replies to one request are merged into one
+    # message of up to OUTBOUND_MAX_FILES attachments and OUTBOUND_MAX_UPLOAD_BYTES.
+    outbound_channel_burst: int = 5
+    outbound_channel_window_seconds: float = 5
+    outbound_max_files: int = 10
+    outbound_max_upload_bytes: int = 10 * 1024 * 1024
+    outbound_max_retries: int = 2
+
+    # Limits for uploaded zip archives. Archives are never extracted; only manifests up to
+    # ZIP_MANIFEST_MAX_BYTES are read from them.
+    zip_max_download_bytes: int = 50 * 1024 * 1024
+    zip_max_entries: int = 50000
+    zip_max_uncompressed_bytes: int = 1024 * 1024 * 1024
+    zip_max_compression_ratio: float = 100
+    zip_manifest_max_bytes: int = 256 * 1024
+
+    # Shared HTTP connection pool and GitHub API concurrency.
+    http_max_connections: int = 100
+    http_max_connections_per_host: int = 20
+    github_max_concurrency: int = 10
+
+    # ChatOps session store: "memory", "sqlite" (persists across restarts) or "redis".
+    # Sessions idle for SESSION_IDLE_TTL_SECONDS are evicted by a background sweeper.
+    session_backend: str = "memory"
+    session_sqlite_path: str = "data/sessions.sqlite3"
+    session_redis_url: str = "redis://localhost:6379/0"
+    session_idle_ttl_seconds: float = 900
+    session_sweep_interval_seconds: float = 60
+
+    # Generated artifacts (Dockerfile, manifests, pipelines) are requested one prompt each, in parallel.
+    # Each gets its own timeout and ARTIFACT_MAX_RETRIES extra attempts before it is reported as failed.
+    artifact_timeout_seconds: float = 90
+    artifact_max_retries: int = 1
+
+    # Per-user and per-channel token buckets for messages that reach the LLM (requests per minute, burst).
+    rate_limit_user_per_minute: float = 6
+    rate_limit_user_burst: int = 3
+    rate_limit_channel_per_minute: float = 30
+    rate_limit_channel_burst: int = 10
+
+    # Fair scheduler in front of the LLM: concurrent calls (by default LLM_MAX_CONCURRENCY), queued calls
+    # beyond that, and the smoothed upstream latency above which bulk work (and at twice the value, all
+    # work) is shed.
+    scheduler_max_concurrency: Optional[int] = None
+    scheduler_max_queue: int = 50
+    scheduler_shed_latency_seconds: float = 30
+
+    # Observability: Prometheus-format metrics on http://METRICS_HOST:METRICS_PORT/metrics, and
+    # LOG_FORMAT=json for one JSON object per log line with per-request trace IDs.
+    metrics_enabled: bool = True
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 9108
+    log_format: str = "text"
+
+    # WARM_UP=true imports the Gemini SDK, builds the model and opens the HTTP pool before the bot
+    # connects to Discord, so the first message doesn't pay for them.
+    warm_up: bool = False
+
+    # Sharding for large guild counts: SHARD_COUNT shards ("auto" asks Discord; unset runs one unsharded
+    # client) spread over SHARD_PROCESSES processes. With more than one process, ChatOps sessions need the
+    # sqlite or redis backend, and each process serves metrics on METRICS_PORT plus its index.
+    shard_count: Optional[str] = None
+    shard_processes: int = 1
+
+    # Worker processes for CPU-heavy steps (zip inspection, parsing and validating model output);
+    # 0 runs them inline on the event loop.
+    cpu_workers: int = 2
+
+    # Model routing: comma-separated provider:model targets per request type, in failover order.
+    # Providers are "gemini", "openai" (any OpenAI-compatible /chat/completions API at OPENAI_BASE_URL,
+    # key in OPENAI_API_KEY) and "fake" (local echo, for development). #chatbot Q&A uses the chat route;
+    # Dockerfile/Kubernetes and pipeline generation use the generation route.
+    llm_chat_route: str = "gemini:gemini-2.5-flash"
+    llm_generation_route: str = "gemini:gemini-2.5-pro"
+    openai_base_url: str = "https://api.openai.com/v1"
+    openai_max_concurrency: int = 8
+
+    # A provider whose smoothed error rate or latency crosses these is skipped for LLM_FAILOVER_COOLDOWN_SECONDS.
+    llm_failover_error_rate: float = 0.5
+    llm_failover_latency_seconds: float = 20
+    llm_failover_cooldown_seconds: float = 60
+
+    # Prompts come from the registry in bot/prompts.py. PROMPT_VERSIONS pins templates to an older
+    # version ("generator.structure=1,cicd=1"); repository file listings are cut down to about
+    # PROMPT_FILE_LIST_TOKENS tokens, most important paths first.
+    prompt_versions: str = ""
+    prompt_file_list_tokens: int = 1500
+
+    # #chatbot conversation memory: recent turns up to CHAT_MEMORY_TOKENS are resent with each question;
+    # older turns are folded into a summary of about CHAT_MEMORY_SUMMARY_TOKENS. Conversations idle for
+    # CHAT_MEMORY_IDLE_TTL_SECONDS are dropped, and the least recently used go first past CHAT_MEMORY_MAX_BYTES.
+    chat_memory_enabled: bool = True
+    chat_memory_tokens: int = 2000
+    chat_memory_summary_tokens: int = 300
+    chat_memory_idle_ttl_seconds: float = 3600
+    chat_memory_max_bytes: int = 16 * 1024 * 1024
+
+    # Deploy targets: the repository, workflow file and ref dispatched by `deploy`, unless a user or
+    # server has set their own with !deploy-target (stored in DEPLOY_TARGETS_PATH). DEPLOY_ID_INPUT names
+    # an optional workflow_dispatch input that receives the job id; a workflow that puts it in its
+    # run-name is matched to its job exactly instead of by branch and dispatch time.
+    deploy_repo: str = ""
+    deploy_workflow: str = "ci.yml"
+    deploy_ref: str = "main"
+    deploy_targets_path: str = "data/deploy_targets.sqlite3"
+    deploy_id_input: str = ""
+
+    # Deploy tracking: runs of one workflow are polled together, every DEPLOY_POLL_MIN_SECONDS while
+    # they change and backing off to DEPLOY_POLL_MAX_SECONDS while they don't. A dispatch with no run
+    # after DEPLOY_CORRELATION_TIMEOUT_SECONDS, or a run still going after DEPLOY_JOB_TIMEOUT_SECONDS,
+    # stops being tracked.
+    deploy_poll_min_seconds: float = 5
+    deploy_poll_max_seconds: float = 60
+    deploy_correlation_timeout_seconds: float = 180
+    deploy_job_timeout_seconds: float = 7200
+
+    # Batch generation (`!batch` in the generator channel, or batch_generate.py): at most BATCH_MAX_SERVICES
+    # services per request from Discord, with BATCH_MAX_CONCURRENCY generations in flight at a time.
+    batch_max_services: int = 50
+    batch_max_concurrency: int = 4
+
+    # Template-first generation: routine pipelines, Dockerfiles and manifests are rendered from the
+    # templates in bot/templates.py, and the model is only asked to customize them or to handle stacks
+    # the templates don't cover. TEMPLATES_ENABLED=false sends every request to the model.
+    templates_enabled: bool = True
+
+    def __init__(self, discord_token: Optional[str] = None, gemini_api_key: Optional[str] = None,
+                 github_token: Optional[str] = None, openai_api_key: Optional[str] = None, **tunables):
+        self.discord_token = discord_token
+        self.gemini_api_key = gemini_api_key
+        self.github_token = github_token
+        self.openai_api_key = openai_api_key
+        for name, value in tunables.items():
+            if name not in self.__annotations__:
+                raise TypeError(f"Unknown setting: {name}")
+            setattr(self, name, value)
+
+    @classmethod
+    def from_env(cls, environ: Optional[Mapping[str, str]] = None) -> "Settings":
+        """Settings from `environ` (default: os.environ). This is the only place the environment is read."""
+        environ = os.environ if environ is None else environ
+        values = {}
+        for name, kind in cls.__annotations__.items():
+            raw = environ.get(name.upper(), "").strip()
+            if not raw:
+                continue
+            if kind is bool:
+                values[name] = _flag(raw)
+            elif kind in (int, Optional[int]):
+                values[name] = int(raw)
+            elif kind is float:
+                values[name] = float(raw)
+            else:
+                values[name] = raw.lower() if name in _CASE_INSENSITIVE else raw
+        return cls(**values)
+
+    def replace(self, **changes) -> "Settings":
+        """A copy with `changes` applied."""
+        return type(self)(**{**vars(self), **changes})
+
+    def validate(self, required: Optional[tuple[str, ...]] = None) -> None:
+        """Ensures the `required` credentials (default: all the bot needs) are set, or raises ValueError."""
+        missing_vars = [name.upper() for name in required or self.required if not getattr(self, name)]
+        if missing_vars:
+            raise ValueError(f"The following environment variables are missing or empty: {', '.join(missing_vars)}")
+
+
+# Values compared in lower case, whatever case the environment uses.
+_CASE_INSENSITIVE = frozenset({"session_backend", "log_format", "shard_count"})
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """The process-wide Settings: the ones the bootstrap installed, or else read from the environment on first call."""
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_env()
+    return _settings
+
+
+def use_settings(settings: Settings) -> None:
+    """
+    Install `settings` for the process. The bootstrap does this before importing the rest of the
+    bot, whose shared clients are built from the settings when their modules are imported.
+    """
+    global _settings
+    _settings = settings
+
+
+@contextmanager
+def override_settings(**changes):
+    """Use a copy of the current settings with `changes` inside the block (for tests and benchmarks)."""
+    previous = get_settings()
+    use_settings(previous.replace(**changes))
+    try:
+        yield get_settings()
+    finally:
+        use_settings(previous)
+
+
 def validate_required_env_vars():
     """Ensures all required environment variables are set, or raises ValueError."""
-    missing_vars = []
-    if not DISCORD_TOKEN:
-        missing_vars.append("DISCORD_TOKEN")
-    if not GEMINI_API_KEY:
-        missing_vars.append("GEMINI_API_KEY")
-    if not GITHUB_TOKEN:
-        missing_vars.append("GITHUB_TOKEN")
-    if missing_vars:
-        raise ValueError(f"The following environment variables are missing or empty: {', '.join(missing_vars)}")
-
-# Validate required variables at import
-validate_required_env_vars()
+    get_settings().validate()
@@ -0,0 +1,249 @@
+# bot/conversations.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+import discord
+from bot.config import get_settings
+from bot.llm_client import summarize_conversation
+from bot.metrics import registry
+from bot.prompts import prompt_registry
+from bot.providers import estimate_tokens
+from bot.scheduler import BULK, current_request, request_context
+
+logger = logging.getLogger(__name__)
+
+# summarize(previous_summary, turns, max_tokens) -> new summary
+Summarizer = Callable[[str, list["Turn"], int], Awaitable[str]]
+
+
+class Turn:
+    """One question and its answer."""
+
+    __slots__ = ("question", "answer", "tokens", "size")
+
+    def __init__(self, question: str, answer: str):
+        self.question = question
+        self.answer = answer
+        self.tokens = estimate_tokens(question) + estimate_tokens(answer)
+        self.size = len(question) + len(answer)
+
+    def render(self) -> str:
+        return f"User: {self.question}\nAssistant: {self.answer}"
+
+
+class Conversation:
+    """
+    Recent turns of one conversation, oldest first, plus a rolling summary of everything
+    before them. `pending` holds turns that are being summarized; they stay in the history
+    until the summary that replaces them is ready.
+    """
+
+    __slots__ = ("key", "summary", "turns", "pending", "tokens", "size", "updated_at", "summarizing")
+
+    def __init__(self, key: str, now: float):
+        self.key = key
+        self.summary = ""
+        self.turns: deque[Turn] = deque()
+        self.pending: list[Turn] = []
+        self.tokens = 0
+        self.size = 0
+        self.updated_at = now
+        self.summarizing: Optional[asyncio.Task] = None
+
+    def history(self) -> str:
+        lines = [f"Summary of the earlier conversation: {self.summary}"] if self.summary else []
+        lines.extend(turn.render() for turn in self.pending)
+        lines.extend(turn.render() for turn in self.turns)
+        return "\n".join(lines)
+
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Keep the start of `text` within about `max_tokens`."""
+    limit = max_tokens * 4
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}\n[... {len(text) - limit} more characters not kept]"
+
+
+def _fallback_summary(summary: str, turns: list[Turn], max_tokens: int) -> str:
+    """Without a model summary, keep what the user asked about."""
+    asked = "; ".join(" ".join(turn.question.split())[:200] for turn in turns)
+    text = f"{summary} Earlier the user asked: {asked}".strip()
+    return text[-max_tokens * 4:]
+
+
+class ConversationStore:
+    """
+    Conversation memory for #chatbot, bounded three ways.
+
+    Each conversation resends at most `max_tokens` of recent turns. Past that, the oldest
+    turns are cut down to half the budget in one go and summarized in the background,
+    so the history sent with each question only grows at its end between summaries and
+    providers can keep reusing its prefix. Conversations idle for `idle_ttl` are dropped
+    on read and by the sweeper, and the least recently used ones go first once all of them
+    together pass `max_bytes`. Limits left as None come from the CHAT_MEMORY_* settings.
+    """
+
+    def __init__(self, summarize: Optional[Summarizer] = None, max_tokens: Optional[int] = None,
+                 summary_tokens: Optional[int] = None, idle_ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sweep_interval: Optional[float] = None,
+                 clock=time.monotonic):
+        settings = get_settings()
+        self.summarize = summarize or summarize_with_llm
+        self.max_tokens = settings.chat_memory_tokens if max_tokens is None else max_tokens
+        self.summary_tokens = settings.chat_memory_summary_tokens if summary_tokens is None else summary_tokens
+        self.idle_ttl = settings.chat_memory_idle_ttl_seconds if idle_ttl is None else idle_ttl
+        self.max_bytes = settings.chat_memory_max_bytes if max_bytes is None else max_bytes
+        self.sweep_interval = settings.session_sweep_interval_seconds if sweep_interval is None else sweep_interval
+        self._clock = clock
+        self._conversations: OrderedDict[str, Conversation] = OrderedDict()
+        self._size = 0
+        self._sweeper: Optional[asyncio.Task] = None
+        self.summaries = 0
+        self.summary_failures = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._conversations)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._size
+
+    def get(self, key: str) -> Optional[Conversation]:
+        conversation = self._conversations.get(key)
+        if conversation is not None and conversation.updated_at < self._clock() - self.idle_ttl:
+            self._drop(key)
+            return None
+        return conversation
+
+    def history(self, key: str) -> str:
+        """What to send ahead of the next question in this conversation; empty for a new one."""
+        conversation = self.get(key)
+        return conversation.history() if conversation is not None else ""
+
+    def record(self, key: str, question: str, answer: str) -> None:
+        """Remember a completed turn; call only for real answers, not error replies."""
+        conversation = self.get(key)
+        if conversation is None:
+            conversation = self._conversations[key] = Conversation(key, self._clock())
+        self._conversations.move_to_end(key)
+        # A single turn never takes more than half the budget, however much was pasted.
+        half = max(1, self.max_tokens // 4)
+        turn = Turn(_clip(question, half), _clip(answer, half))
+        conversation.turns.append(turn)
+        conversation.tokens += turn.tokens
+        self._resize(conversation, turn.size)
+        conversation.updated_at = self._clock()
+        if conversation.tokens > self.max_tokens and conversation.summarizing is None:
+            self._compact(conversation)
+        self._enforce_size()
+
+    def _compact(self, conversation: Conversation) -> None:
+        while conversation.turns and conversation.tokens > self.max_tokens // 2:
+            turn = conversation.turns.popleft()
+            conversation.tokens -= turn.tokens
+            conversation.pending.append(turn)
+        conversation.summarizing = asyncio.get_running_loop().create_task(self._summarize(conversation))
+
+    async def _summarize(self, conversation: Conversation) -> None:
+        turns = list(conversation.pending)
+        ctx = current_request.get()
+        try:
+            # Summaries are background work and yield to questions waiting for an answer.
+            with request_context(ctx.user_id if ctx else None, ctx.channel_id if ctx else None, BULK):
+                summary = (await self.summarize(conversation.summary, turns, self.summary_tokens)).strip()
+            if not summary:
+                raise ValueError("empty summary")
+            self.summaries += 1
+        except Exception as e:
+            logger.warning("Summarizing %s failed, keeping the questions only: %s", conversation.key, e)
+            self.summary_failures += 1
+            summary = _fallback_summary(conversation.summary, turns, self.summary_tokens)
+        summary = _clip(summary, self.summary_tokens)
+        # A conversation dropped meanwhile had this task cancelled, so it is still in the store.
+        self._resize(conversation, len(summary) - len(conversation.summary) - sum(turn.size for turn in turns))
+        conversation.summary = summary
+        del conversation.pending[:len(turns)]
+        conversation.summarizing = None
+        if conversation.tokens > self.max_tokens:
+            self._compact(conversation)
+
+    def _resize(self, conversation: Conversation, delta: int) -> None:
+        conversation.size += delta
+        self._size += delta
+
+    def _enforce_size(self) -> None:
+        while self._size > self.max_bytes and len(self._conversations) > 1:
+            self._drop(next(iter(self._conversations)))
+            self.evictions += 1
+
+    def _drop(self, key: str) -> None:
+        conversation = self._conversations.pop(key, None)
+        if conversation is None:
+            return
+        self._size -= conversation.size
+        if conversation.summarizing is not None:
+            conversation.summarizing.cancel()
+
+    def forget(self, key: str) -> None:
+        self._drop(key)
+
+    def sweep(self) -> int:
+        """Drop idle conversations; returns how many."""
+        cutoff = self._clock() - self.idle_ttl
+        stale = [key for key, c in self._conversations.items() if c.updated_at < cutoff]
+        for key in stale:
+            self._drop(key)
+        return len(stale)
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                logger.info("Evicted %d idle conversation(s)", removed)
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+async def summarize_with_llm(summary: str, turns: list[Turn], max_tokens: int) -> str:
+    """Fold `turns` into `summary` with the chat route's (cheap) model."""
+    prompt = prompt_registry.render(
+        "chat.summary", words=max(20, max_tokens * 3 // 4), summary=summary or "(none)",
+        exchanges="\n".join(turn.render() for turn in turns))
+    return await summarize_conversation(prompt)
+
+
+def conversation_key(message: discord.Message) -> str:
+    """A thread is one conversation; in the channel itself, each user has their own."""
+    channel = message.channel
+    if isinstance(channel, discord.Thread):
+        return f"thread:{channel.id}"
+    return f"channel:{getattr(channel, 'id', None)}:{message.author.id}"
+
+
+conversation_store = ConversationStore()
+
+
+@registry.register_collector
+def _conversation_metrics():
+    store = conversation_store
+    yield "bot_chat_conversations", "Conversations held in memory.", {}, len(store)
+    yield "bot_chat_memory_bytes", "Characters held by conversation memory.", {}, store.size_bytes
+    yield "bot_chat_summaries", "Older turns folded into a summary by the model.", {}, store.summaries
+    yield "bot_chat_summary_failures", "Summaries that fell back to keeping the questions only.", {}, store.summary_failures
+    yield "bot_chat_evictions", "Conversations dropped to stay under the memory cap.", {}, store.evictions
@@ -1,18 +1,118 @@
 # bot/deploy.py
 import os
-import aiohttp
-
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-
-async def trigger_github_workflow(repo: str, workflow_id: str, ref: str = "main"):
-    url = f"https://api.github.com/repos/{repo}/actions/workflows/{workflow_id}/dispatches"
-    headers = {
-        "Authorization": f"token {GITHUB_TOKEN}",
-        "Accept": "application/vnd.github.v3+json"
-    }
-    payload = {"ref": ref}
-
-    async with aiohttp.ClientSession() as session:
-        async with session.post(url, json=payload, headers=headers) as resp:
-            resp_text = await resp.text()
-            return resp.status, resp_text
+import re
+import sqlite3
+import threading
+from typing import Optional
+from bot.config import get_settings
+from bot.github_client import github_client
+
+USER = "user"
+GUILD = "guild"
+
+_REPO_RE = re.compile(r"^[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+$")
+
+
+class DeployTarget:
+    """The repository, workflow file and ref a deploy dispatches; DEPLOY_WORKFLOW and DEPLOY_REF by default."""
+
+    __slots__ = ("repo", "workflow", "ref")
+
+    def __init__(self, repo: str, workflow: Optional[str] = None, ref: Optional[str] = None):
+        self.repo = repo
+        self.workflow = workflow or get_settings().deploy_workflow
+        self.ref = ref or get_settings().deploy_ref
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DeployTarget) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return f"{self.repo}/{self.workflow}@{self.ref}"
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return self.repo, self.workflow, self.ref
+
+
+def parse_target(text: str) -> DeployTarget:
+    """Parse "owner/repo [workflow] [ref]"; raises ValueError for anything else."""
+    parts = text.split()
+    if not 1 <= len(parts) <= 3 or not _REPO_RE.match(parts[0]):
+        raise ValueError("expected `owner/repo [workflow file] [ref]`")
+    return DeployTarget(*parts)
+
+
+class DeployTargetStore:
+    """
+    Deploy targets set per user and per server, in a sqlite file opened on first use.
+    A user's own target wins over their server's, which wins over DEPLOY_REPO.
+    """
+
+    def __init__(self, path: Optional[str] = None, default_repo: Optional[str] = None):
+        settings = get_settings()
+        self.path = path or settings.deploy_targets_path
+        default_repo = settings.deploy_repo if default_repo is None else default_repo
+        self.default = DeployTarget(default_repo) if default_repo else None
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS deploy_targets ("
+                "scope TEXT NOT NULL, scope_id INTEGER NOT NULL, repo TEXT NOT NULL, "
+                "workflow TEXT NOT NULL, ref TEXT NOT NULL, PRIMARY KEY (scope, scope_id))"
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def get(self, scope: str, scope_id: int) -> Optional[DeployTarget]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT repo, workflow, ref FROM deploy_targets WHERE scope = ? AND scope_id = ?", (scope, scope_id)
+            ).fetchone()
+        return DeployTarget(*row) if row else None
+
+    def set(self, scope: str, scope_id: int, target: DeployTarget) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO deploy_targets (scope, scope_id, repo, workflow, ref) VALUES (?, ?, ?, ?, ?)",
+                (scope, scope_id, target.repo, target.workflow, target.ref),
+            )
+            conn.commit()
+
+    def clear(self, scope: str, scope_id: int) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM deploy_targets WHERE scope = ? AND scope_id = ?", (scope, scope_id))
+            conn.commit()
+
+    def resolve(self, user_id: int, guild_id: Optional[int]) -> Optional[DeployTarget]:
+        target = self.get(USER, user_id)
+        if target is None and guild_id is not None:
+            target = self.get(GUILD, guild_id)
+        return target or self.default
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+deploy_targets = DeployTargetStore()
+
+
+async def trigger_github_workflow(repo: str, workflow_id: str, ref: str = "main", inputs: Optional[dict] = None):
+    """Dispatch a workflow run through the shared GitHub client; returns (status, response text)."""
+    return await github_client.dispatch_workflow(repo, workflow_id, ref, inputs)
@@ -0,0 +1,342 @@
+# bot/deploy_jobs.py
+import asyncio
+import logging
+import secrets
+import time
+from datetime import datetime
+from typing import Optional
+import discord
+from bot.config import get_settings
+from bot.deploy import DeployTarget
+from bot.github_client import GitHubClient, github_client
+from bot.metrics import registry
+from bot.outbound import outbox
+
+logger = logging.getLogger(__name__)
+
+DISPATCHING = "dispatching"
+WAITING = "waiting"
+
+# GitHub's clock and ours disagree a little; a run may look created slightly before its dispatch.
+CLOCK_SKEW_SECONDS = 10.0
+RUNS_PER_PAGE = 100
+MAX_RUN_PAGES = 5
+
+
+def _timestamp(value: Optional[str]) -> float:
+    """Seconds since the epoch for a GitHub ISO 8601 timestamp."""
+    if not value:
+        return 0.0
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+
+
+class DeployJob:
+    """One dispatched workflow and the run it turned into, shown in a single Discord message."""
+
+    __slots__ = ("id", "user_id", "channel_id", "target", "dispatched_at", "state", "run_id", "run_number",
+                 "conclusion", "html_url", "error", "message", "shown")
+
+    def __init__(self, user_id: int, channel_id: Optional[int], target: DeployTarget):
+        self.id = secrets.token_hex(6)
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.target = target
+        self.dispatched_at = 0.0
+        # DISPATCHING, WAITING for the run to appear, then the run's own status.
+        self.state = DISPATCHING
+        self.run_id: Optional[int] = None
+        self.run_number: Optional[int] = None
+        self.conclusion: Optional[str] = None
+        self.html_url: Optional[str] = None
+        self.error: Optional[str] = None
+        self.message: Optional[discord.Message] = None
+        self.shown = ""
+
+    @property
+    def finished(self) -> bool:
+        return self.state == "completed" or self.error is not None
+
+    def update(self, run: dict) -> None:
+        self.run_id = run["id"]
+        self.run_number = run.get("run_number")
+        self.state = run.get("status") or self.state
+        self.conclusion = run.get("conclusion")
+        self.html_url = run.get("html_url") or self.html_url
+
+    def fail(self, error: str) -> None:
+        self.error = error
+
+    def render(self) -> str:
+        head = f"<@{self.user_id}> Deploy `{self.id}` of `{self.target.repo}` ({self.target.workflow} on {self.target.ref})"
+        link = f" {self.html_url}" if self.html_url else ""
+        if self.error is not None:
+            return f"{head}: ⚠️ {self.error}{link}"
+        if self.state == DISPATCHING:
+            return f"{head}: dispatching..."
+        if self.state == WAITING:
+            return f"{head}: dispatched, waiting for the workflow run to start..."
+        run = f"run #{self.run_number}" if self.run_number else "run"
+        if self.state != "completed":
+            return f"{head}: 🔄 {run} {self.state.replace('_', ' ')}{link}"
+        if self.conclusion == "success":
+            return f"{head}: ✅ {run} succeeded{link}"
+        return f"{head}: ❌ {run} finished with `{self.conclusion or 'no conclusion'}`{link}"
+
+
+class _PollGroup:
+    """Active jobs of one (repo, workflow), checked with one shared list call."""
+
+    __slots__ = ("repo", "workflow", "jobs", "claimed", "interval", "next_poll")
+
+    def __init__(self, repo: str, workflow: str, interval: float):
+        self.repo = repo
+        self.workflow = workflow
+        self.jobs: dict[str, DeployJob] = {}
+        # Runs already matched to a job, including jobs that finished, so none is matched twice.
+        self.claimed: set[int] = set()
+        self.interval = interval
+        self.next_poll = 0.0
+
+
+class DeployTracker:
+    """
+    Follows dispatched deploys until their workflow runs finish.
+
+    GitHub's dispatch endpoint does not say which run it created, so each dispatch is matched
+    to a run of the same workflow: by its job id in the run name when DEPLOY_ID_INPUT is set,
+    otherwise to the earliest unmatched run on the same ref created after it. One background
+    loop polls every (repo, workflow) with active jobs using a single conditional list call,
+    which answers for all of that workflow's runs at once and costs no quota while nothing
+    changes. A group is polled every `min_interval` while its runs change, backing off to
+    `max_interval` while they don't and further when the rate-limit window runs low. Each job
+    has one status message that is edited only when its text changes. Anything left as None
+    comes from the DEPLOY_* settings.
+    """
+
+    def __init__(self, client: GitHubClient = github_client, id_input: Optional[str] = None,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 correlation_timeout: Optional[float] = None, job_timeout: Optional[float] = None, clock=time.time):
+        settings = get_settings()
+        self.client = client
+        self.id_input = settings.deploy_id_input if id_input is None else id_input
+        self.min_interval = settings.deploy_poll_min_seconds if min_interval is None else min_interval
+        self.max_interval = settings.deploy_poll_max_seconds if max_interval is None else max_interval
+        if correlation_timeout is None:
+            correlation_timeout = settings.deploy_correlation_timeout_seconds
+        self.correlation_timeout = correlation_timeout
+        self.job_timeout = settings.deploy_job_timeout_seconds if job_timeout is None else job_timeout
+        self._clock = clock
+        self._groups: dict[tuple[str, str], _PollGroup] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.list_calls = 0
+        self.run_lookups = 0
+        self.finished: dict[str, int] = {}
+
+    @property
+    def active(self) -> int:
+        return sum(len(group.jobs) for group in self._groups.values())
+
+    def find_active(self, user_id: int, target: DeployTarget) -> Optional[DeployJob]:
+        group = self._groups.get((target.repo, target.workflow))
+        if group is None:
+            return None
+        return next((job for job in group.jobs.values() if job.user_id == user_id and job.target == target), None)
+
+    async def start(self, target: DeployTarget, channel: discord.abc.Messageable, user_id: int) -> DeployJob:
+        """Dispatch `target` and keep one status message in `channel` up to date until its run finishes."""
+        job = DeployJob(user_id, getattr(channel, "id", None), target)
+        job.shown = job.render()
+        job.message = await outbox.send(channel, job.shown, merge=False)
+        inputs = {self.id_input: job.id} if self.id_input else None
+        job.dispatched_at = self._clock()
+        try:
+            status, response = await self.client.dispatch_workflow(target.repo, target.workflow, target.ref, inputs)
+        except Exception as e:
+            status, response = None, str(e)
+        if status != 204:
+            job.fail(f"could not dispatch the workflow (HTTP {status}): {response[:300]}")
+            self._finish(job)
+        else:
+            job.state = WAITING
+            group = self._groups.get((target.repo, target.workflow))
+            if group is None:
+                group = self._groups[(target.repo, target.workflow)] = _PollGroup(
+                    target.repo, target.workflow, self.min_interval)
+            group.jobs[job.id] = job
+            # The run takes a few seconds to appear, so the first look is one short interval away.
+            group.interval = self.min_interval
+            group.next_poll = min(group.next_poll or float("inf"), job.dispatched_at + self.min_interval)
+            self._ensure_running()
+        await self._publish(job)
+        return job
+
+    async def poll(self, force: bool = False) -> int:
+        """Poll the groups that are due (all of them with `force`); returns how many were polled."""
+        now = self._clock()
+        due = [group for group in self._groups.values() if force or group.next_poll <= now]
+        await asyncio.gather(*(self._poll_group(group) for group in due))
+        return len(due)
+
+    async def _poll_group(self, group: _PollGroup) -> None:
+        jobs = list(group.jobs.values())
+        try:
+            runs = await self._list_runs(group, jobs)
+            await self._look_up_missing(group, jobs, runs)
+        except Exception as e:
+            logger.warning("Polling %s %s failed: %s", group.repo, group.workflow, e)
+            runs = None
+        before = [job.render() for job in jobs]
+        if runs is not None:
+            self._correlate(group, jobs, runs)
+        self._expire(jobs)
+        changed = [job for job, text in zip(jobs, before) if job.render() != text]
+        await asyncio.gather(*(self._publish(job) for job in jobs))
+        for job in jobs:
+            if job.finished:
+                del group.jobs[job.id]
+                self._finish(job)
+        if not group.jobs:
+            del self._groups[(group.repo, group.workflow)]
+            return
+        group.interval = self._next_interval(group, bool(changed))
+        group.next_poll = self._clock() + group.interval
+
+    async def _list_runs(self, group: _PollGroup, jobs: list[DeployJob]) -> dict[int, dict]:
+        # Whole minutes keep the query, and with it the ETag, the same from one poll to the next.
+        since = min(job.dispatched_at for job in jobs) - CLOCK_SKEW_SECONDS
+        since -= since % 60
+        created = time.strftime(">=%Y-%m-%dT%H:%M:%SZ", time.gmtime(since))
+        runs: dict[int, dict] = {}
+        for page in range(1, MAX_RUN_PAGES + 1):
+            batch = await self.client.list_workflow_runs(
+                group.repo, group.workflow, conditional=True,
+                event="workflow_dispatch", created=created, per_page=RUNS_PER_PAGE, page=page,
+            )
+            self.list_calls += 1
+            runs.update((run["id"], run) for run in batch)
+            # Newest runs come first; older pages are only needed while some job's run is not in view.
+            waiting = any(job.run_id is None or job.run_id not in runs for job in jobs)
+            if len(batch) < RUNS_PER_PAGE or not waiting:
+                break
+        return runs
+
+    async def _look_up_missing(self, group: _PollGroup, jobs: list[DeployJob], runs: dict[int, dict]) -> None:
+        """Fetch matched runs that fell outside the listed pages one by one."""
+        missing = [job.run_id for job in jobs if job.run_id is not None and job.run_id not in runs]
+        for run in await asyncio.gather(*(
+                self.client.get_workflow_run(group.repo, run_id, conditional=True) for run_id in missing)):
+            self.run_lookups += 1
+            runs[run["id"]] = run
+
+    def _correlate(self, group: _PollGroup, jobs: list[DeployJob], runs: dict[int, dict]) -> None:
+        for job in jobs:
+            if job.run_id is not None and job.run_id in runs:
+                job.update(runs[job.run_id])
+        waiting = sorted((job for job in jobs if job.run_id is None), key=lambda job: job.dispatched_at)
+        unclaimed = sorted((run for run in runs.values() if run["id"] not in group.claimed),
+                           key=lambda run: (_timestamp(run.get("created_at")), run["id"]))
+        if self.id_input:
+            for job in waiting:
+                run = next((run for run in unclaimed if job.id in (run.get("display_title") or "")), None)
+                if run is not None:
+                    self._claim(group, job, run, unclaimed)
+            waiting = [job for job in waiting if job.run_id is None]
+        for job in waiting:
+            earliest = job.dispatched_at - CLOCK_SKEW_SECONDS
+            run = next((run for run in unclaimed
+                        if run.get("head_branch") == job.target.ref and _timestamp(run.get("created_at")) >= earliest),
+                       None)
+            if run is not None:
+                self._claim(group, job, run, unclaimed)
+        # Remember claims only as long as those runs can still show up in the list.
+        group.claimed &= set(runs) | {job.run_id for job in jobs if job.run_id is not None}
+
+    @staticmethod
+    def _claim(group: _PollGroup, job: DeployJob, run: dict, unclaimed: list[dict]) -> None:
+        unclaimed.remove(run)
+        group.claimed.add(run["id"])
+        job.update(run)
+
+    def _expire(self, jobs: list[DeployJob]) -> None:
+        now = self._clock()
+        for job in jobs:
+            if job.finished:
+                continue
+            if job.run_id is None and now - job.dispatched_at > self.correlation_timeout:
+                job.fail(f"no workflow run showed up within {self.correlation_timeout:.0f}s; "
+                         f"check the repository's Actions tab")
+            elif now - job.dispatched_at > self.job_timeout:
+                job.fail(f"still {job.state.replace('_', ' ')} after {self.job_timeout:.0f}s; no longer tracking it")
+
+    def _next_interval(self, group: _PollGroup, changed: bool) -> float:
+        interval = self.min_interval if changed else min(self.max_interval, group.interval * 1.5)
+        rate_limit = self.client.rate_limit
+        if rate_limit.remaining is not None and rate_limit.limit:
+            # Spread what is left of the window over every group, keeping a tenth for everything else.
+            budget = rate_limit.remaining - rate_limit.limit * 0.1
+            window = rate_limit.seconds_until_reset()
+            if budget <= 0:
+                interval = max(interval, window)
+            else:
+                interval = max(interval, window * len(self._groups) / budget)
+        return interval
+
+    async def _publish(self, job: DeployJob) -> None:
+        text = job.render()
+        if text == job.shown or job.message is None:
+            return
+        job.shown = text
+        try:
+            await outbox.edit(job.message, text)
+        except discord.HTTPException as e:
+            # A deleted status message shouldn't stop the job being tracked.
+            logger.warning("Could not update the status of deploy %s: %s", job.id, e)
+
+    def _finish(self, job: DeployJob) -> None:
+        result = "error" if job.error is not None else (job.conclusion or "unknown")
+        self.finished[result] = self.finished.get(result, 0) + 1
+        logger.info("Deploy %s of %r finished: %s", job.id, job.target, job.error or job.conclusion)
+
+    def _ensure_running(self) -> None:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while self._groups:
+            await self.poll()
+            if not self._groups:
+                break
+            wait = min(group.next_poll for group in self._groups.values()) - self._clock()
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), max(0.0, wait))
+            except asyncio.TimeoutError:
+                pass
+
+    async def shutdown(self) -> None:
+        """Stop polling; jobs still running are left as their last status message shows."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+deploy_tracker = DeployTracker()
+
+
+@registry.register_collector
+def _deploy_metrics():
+    tracker = deploy_tracker
+    yield "bot_deploy_jobs_active", "Dispatched deploys whose workflow run is still being tracked.", {}, tracker.active
+    yield "bot_deploy_poll_groups", "Workflows polled for active deploys.", {}, len(tracker._groups)
+    yield "bot_deploy_run_list_calls", "Workflow run list requests made to poll deploys.", {}, tracker.list_calls
+    yield "bot_deploy_run_lookups", "Single workflow runs fetched because they fell off the list.", {}, tracker.run_lookups
+    for result, count in tracker.finished.items():
+        yield "bot_deploy_jobs_finished", "Deploys no longer tracked, by conclusion.", {"result": result}, count
@@ -1,251 +1,273 @@
-import re
-import io
+import asyncio
+import logging
 import discord
 from typing import Optional
 from bot.config import (
-    DISCORD_TOKEN,
+    Settings,
+    get_settings,
     TARGET_CHANNEL_NAMES,
     DOCKER_K8S_CHANNEL_NAME,
     TARGET_CHANNEL_NAME,
     CI_CD_CHANNEL_NAME,
 )
-from bot.llm_client import get_gemini_response, get_gemini_file_response
+from bot.github_client import github_client
+from bot.llm_client import (
+    GeminiBackend, get_gemini_response, llm_client, openai_client, router, semantic_cache, stream_gemini_response,
+)
+from bot.streaming import DiscordStreamWriter
 from bot.generator import handle_generator_request
+from bot.batch import handle_batch_request
 from bot.cicd_generator import handle_cicd_request
-
-from bot.deploy import trigger_github_workflow  # Import deploy function
+from bot.chatops import flow_engine, session_store
+from bot.conversations import conversation_key, conversation_store
+from bot.deploy import deploy_targets
+from bot.deploy_jobs import deploy_tracker
+from bot.http_client import shared_http
+from bot.metrics import RECEIVE_LAG_SECONDS, MetricsServer
+from bot.outbound import Attachment, outbox
+from bot.tracing import setup_logging, stage, trace_request
+from bot.workers import cpu_pool
+from bot.scheduler import BULK, INTERACTIVE, SchedulerRejected, rate_limiter, request_context
+
+logger = logging.getLogger(__name__)
 
 intents = discord.Intents.default()
 intents.message_content = True
 
-client = discord.Client(intents=intents)
+# The gateway client of this process, created by _main() with create_client().
+client: Optional[discord.Client] = None
 
 MAX_DISCORD_MSG_LEN = 2000
 
-# In-memory ChatOps sessions by user_id
-user_sessions: dict[int, dict] = {}
-
-
-async def send_separate_generated_files(channel: discord.abc.Messageable, user_id: int, full_output: str):
-    """Parse generated output and send as separate files or one file if parsing fails."""
-    dockerfile_match = re.search(r"###\s*Dockerfile\s*\n(.*?)(?=\n###|$)", full_output, re.DOTALL | re.IGNORECASE)
-    k8s_match = re.search(r"###\s*Kubernetes manifest\s*\n(.*?)(?=\n###|$)", full_output, re.DOTALL | re.IGNORECASE)
-    cicd_match = re.search(r"###\s*CI/CD pipeline\s*\n(.*?)(?=\n###|$)", full_output, re.DOTALL | re.IGNORECASE)
-
-    files_to_send = []
-
-    if dockerfile_match:
-        dockerfile_content = dockerfile_match.group(1).strip()
-        files_to_send.append(discord.File(io.BytesIO(dockerfile_content.encode("utf-8")), filename="Dockerfile"))
-    if k8s_match:
-        k8s_content = k8s_match.group(1).strip()
-        files_to_send.append(discord.File(io.BytesIO(k8s_content.encode("utf-8")), filename="kubernetes.yaml"))
-    if cicd_match:
-        cicd_content = cicd_match.group(1).strip()
-        files_to_send.append(discord.File(io.BytesIO(cicd_content.encode("utf-8")), filename="ci.yml"))
-
-    if files_to_send:
-        await channel.send(
-            content=f"<@{user_id}> Here are your generated files:",
-            files=files_to_send
-        )
+
+def create_client(sharded: bool = False, shard_count: Optional[int] = None,
+                  shard_ids: Optional[list[int]] = None) -> discord.Client:
+    """
+    A gateway client with the handlers below registered. Sharded clients run `shard_ids` out of
+    `shard_count` shards over one event loop; without a count, Discord's recommendation is used.
+    """
+    if sharded:
+        new_client = discord.AutoShardedClient(intents=intents, shard_count=shard_count, shard_ids=shard_ids,
+                                               http_trace=outbox.trace_config())
     else:
-        await channel.send(
-            f"<@{user_id}> I couldn't detect separate files, sending all content in one file.",
-            file=discord.File(io.BytesIO(full_output.encode("utf-8")), filename="generated_files.txt")
-        )
-
-
-async def ask_question(channel: discord.abc.Messageable, user_id: int):
-    """Send next question based on current ChatOps stage."""
-    session = user_sessions[user_id]
-    stage = session.get('stage', 1)
-
-    if stage == 1:
-        await channel.send(f"<@{user_id}> What framework are you using? (e.g., Flask, FastAPI, Node.js)")
-    elif stage == 2:
-        await channel.send(f"<@{user_id}> Do you want HTTPS Ingress or only internal service?")
-    elif stage == 3:
-        await channel.send(
-            f"<@{user_id}> Which CI/CD platform do you want: GitHub Actions, Jenkins, GitLab, or None?"
-        )
-    elif stage == 4:
-        summary = (
-            f"Framework: {session.get('framework')}\n"
-            f"HTTPS Ingress: {'Yes' if session.get('https') else 'No'}\n"
-            f"CI/CD platform: {session.get('cicd')}\n"
-            "Type 'yes' to generate the files or 'no' to cancel."
-        )
-        await channel.send(f"<@{user_id}> Please confirm your choices:\n{summary}")
-    elif stage == 5:
-        await channel.send(
-            f"<@{user_id}> Would you like to trigger deployment on GitHub Actions now? "
-            f"Reply with `deploy` to proceed or `skip` to finish."
-        )
-
-
-@client.event
-async def on_ready() -> None:
-    print(f"[DiscordBot] Connected as {client.user}. Ready to handle messages.")
+        # The outbox paces messages by the rate-limit headers of Discord's responses.
+        new_client = discord.Client(intents=intents, http_trace=outbox.trace_config())
+    new_client.event(on_ready)
+    new_client.event(on_message)
+    return new_client
 
 
-@client.event
-async def on_message(message: discord.Message) -> None:
-    if message.author.bot:
-        return  # Ignore bot messages
+async def on_ready() -> None:
+    session_store.start_sweeper()
+    conversation_store.start_sweeper()
+    shards = ""
+    if isinstance(client, discord.AutoShardedClient):
+        shards = f" on shards {sorted(client.shards)} of {client.shard_count}"
+    logger.info("Connected as %s%s. Ready to handle messages.", client.user, shards)
 
-    user_id = message.author.id
-    content = message.content.strip()
-    content_lower = content.lower()
+
+async def handle_channel_message(message: discord.Message, channel_name: str, content: str) -> None:
+    """Route a message in one of the bot's channels to its handler."""
     channel = message.channel
-    channel_name: Optional[str] = getattr(channel, "name", None)
 
-    # --- ChatOps multi-step session management ---
-    if content_lower.startswith("!deploy") or content_lower.startswith("/start") or user_id in user_sessions:
-        # Start new session
-        if content_lower.startswith("!deploy") or content_lower.startswith("/start"):
-            user_sessions[user_id] = {"stage": 1}
-            await ask_question(channel, user_id)
+    if channel_name == TARGET_CHANNEL_NAME:
+        logger.info("Chat message from %s: %s", message.author, content)
+        settings = get_settings()
+        # Follow-ups are answered with the conversation so far; each answer extends it.
+        history, remember = "", None
+        if settings.chat_memory_enabled:
+            key = conversation_key(message)
+            history = conversation_store.history(key)
+
+            def remember(answer: str) -> None:
+                conversation_store.record(key, content, answer)
+
+        if settings.stream_chat_responses:
+            writer = DiscordStreamWriter(
+                channel,
+                edit_interval=settings.stream_edit_interval_seconds,
+                max_messages=settings.stream_max_messages,
+                max_len=MAX_DISCORD_MSG_LEN,
+            )
+            async for chunk in stream_gemini_response(content, history=history, on_answer=remember):
+                await writer.feed(chunk)
+            await writer.finish()
             return
 
-        # Continue session
-        session = user_sessions[user_id]
-        stage = session.get("stage", 1)
-
-        if stage == 1:
-            session["framework"] = content
-            session["stage"] = 2
-            await ask_question(channel, user_id)
+        response_text = await get_gemini_response(content, history=history, on_answer=remember)
+        with stage("upload"):
+            if len(response_text) > MAX_DISCORD_MSG_LEN:
+                await outbox.send(
+                    channel,
+                    "Response was too long for chat. See attached file for the full answer.",
+                    attachments=[Attachment("response.txt", response_text)],
+                )
+            else:
+                await outbox.send(channel, response_text)
 
-        elif stage == 2:
-            session["https"] = bool(
-                "https" in content_lower or "ingress" in content_lower or "yes" in content_lower
-            )
-            session["stage"] = 3
-            await ask_question(channel, user_id)
+    elif channel_name == DOCKER_K8S_CHANNEL_NAME:
+        logger.info("Generator message from %s: %s", message.author, content)
+        if content.lower().startswith("!batch"):
+            await handle_batch_request(message)
+        else:
+            await handle_generator_request(message)
 
-        elif stage == 3:
-            cicd_options = ["github actions", "jenkins", "gitlab", "none"]
-            user_choice = content_lower.strip()
+    elif channel_name == CI_CD_CHANNEL_NAME:
+        logger.info("CI/CD message from %s: %s", message.author, content)
+        await handle_cicd_request(message)
 
-            if user_choice in cicd_options:
-                session["cicd"] = user_choice
-                session["stage"] = 4
-                await ask_question(channel, user_id)
 
-            else:
-                matches = [opt for opt in cicd_options if user_choice in opt or opt in user_choice]
-                if len(matches) == 1:
-                    session["cicd"] = matches[0]
-                    session["stage"] = 4
-                    await ask_question(channel, user_id)
-                else:
-                    await channel.send(
-                        f"'{content}' is not a recognized CI/CD platform.\n"
-                        "Please choose one of: GitHub Actions, Jenkins, GitLab, or None."
-                    )
-            return
+def observe_receive_lag(message: discord.Message) -> None:
+    """Record how long the message took to reach us (gateway delay plus event loop backlog)."""
+    created_at = getattr(message, "created_at", None)
+    if created_at is not None:
+        RECEIVE_LAG_SECONDS.observe(max(0.0, (discord.utils.utcnow() - created_at).total_seconds()))
 
-        elif stage == 4:
-            if content_lower in ["yes", "y"]:
-                await channel.send(f"<@{user_id}> Generating files based on your inputs...")
-
-                prompt = (
-                    f"You are a senior DevOps engineer. "
-                    f"Generate three distinct files for a {session['framework']} application:\n\n"
-                    f"### Dockerfile\n"
-                    f"Production-ready Dockerfile including multi-stage build, proper user, ports, and comments.\n\n"
-                    f"### Kubernetes manifest\n"
-                    f"Best-practice deployment, service, and "
-                    f"{'HTTPS Ingress' if session['https'] else 'internal service only'} configuration.\n\n"
-                    f"### CI/CD pipeline\n"
-                    f"{session['cicd']} CI/CD YAML for build, test, docker push, and deployment.\n\n"
-                    f"Label each section clearly as above."
-                )
 
-                try:
-                    file_contents = await get_gemini_file_response(prompt)
-                    await send_separate_generated_files(channel, user_id, file_contents)
-                except Exception as e:
-                    await channel.send(f"<@{user_id}> Error generating files: {e}")
+async def on_message(message: discord.Message) -> None:
+    if message.author.bot:
+        return  # Ignore bot messages
 
-                session["stage"] = 5
-                await ask_question(channel, user_id)
+    user_id = message.author.id
+    content = message.content.strip()
+    channel = message.channel
+    channel_name: Optional[str] = getattr(channel, "name", None)
+    if isinstance(channel, discord.Thread) and channel.parent is not None:
+        # Threads are handled like the channel they were started in.
+        channel_name = channel.parent.name
+    channel_id: Optional[int] = getattr(channel, "id", None)
 
-            else:
-                await channel.send(f"<@{user_id}> Session cancelled.")
-                user_sessions.pop(user_id, None)
-
-        elif stage == 5:
-            # Deployment trigger step
-            if content_lower == "deploy":
-                if session.get("cicd") != "github actions":
-                    await channel.send(f"<@{user_id}> Deployment trigger currently supports only GitHub Actions.")
-                else:
-                    repo = "owner/repo"  # TODO: Replace with your GitHub repo
-                    workflow_file = "ci.yml"  # TODO: Replace with your workflow filename
-                    ref = "main"
-                    await channel.send(f"<@{user_id}> Triggering GitHub Actions workflow...")
-
-                    status, response = await trigger_github_workflow(repo, workflow_file, ref)
-
-                    if status == 204:
-                        await channel.send(f"<@{user_id}> ✅ Deployment triggered successfully!")
-                    else:
-                        await channel.send(f"<@{user_id}> ❌ Failed to trigger deployment: {response}")
-
-                user_sessions.pop(user_id, None)
-
-            elif content_lower == "skip":
-                await channel.send(f"<@{user_id}> Deployment skipped. Session finished.")
-                user_sessions.pop(user_id, None)
-            else:
-                await channel.send(f"<@{user_id}> Please reply with `deploy` to trigger deployment or `skip` to finish.")
+    async def tell_queue_position(position: int) -> None:
+        # Later positions edit the same message; the answer makes an unsent one moot.
+        outbox.status(channel, f"<@{user_id}> You're #{position} in queue, I'll answer as soon as I can.", key=user_id)
 
+    # --- ChatOps multi-step session management ---
+    if flow_engine.wants(message):
+        observe_receive_lag(message)
+        try:
+            with trace_request("chatops", user_id=user_id, channel=channel_name):
+                # Limited before the lock, so a flood of messages can't queue up behind it.
+                rate_limiter.check(user_id, channel_id)
+                # Serialize per user so two quick messages cannot race through a stage transition.
+                async with session_store.lock(user_id):
+                    with request_context(user_id, channel_id, BULK, on_queued=tell_queue_position):
+                        await flow_engine.handle(message)
+        except SchedulerRejected as rejected:
+            await outbox.send(channel, f"<@{user_id}> {rejected}", key=user_id)
         return  # ChatOps controls the flow exclusively here
 
     # --- Channel-specific command handlers ---
 
     if channel_name not in TARGET_CHANNEL_NAMES:
         return
+    if channel_name == TARGET_CHANNEL_NAME and not content:
+        return
 
-    try:
-        if channel_name == TARGET_CHANNEL_NAME:
-            if not content:
-                return
-            print(f"[Chatbot] Processing message from {message.author}: {content}")
-            response_text = await get_gemini_response(content)
-            if len(response_text) > MAX_DISCORD_MSG_LEN:
-                await channel.send(
-                    "Response was too long for chat. See attached file for the full answer.",
-                    file=discord.File(io.BytesIO(response_text.encode("utf-8")), filename="response.txt"),
-                )
-            else:
-                await channel.send(response_text)
+    # Chat answers are interactive; file generation is bulk work and yields to them.
+    priority = INTERACTIVE if channel_name == TARGET_CHANNEL_NAME else BULK
 
-        elif channel_name == DOCKER_K8S_CHANNEL_NAME:
-            print(f"[Generator] Processing message from {message.author}: {content}")
-            await handle_generator_request(message)
+    observe_receive_lag(message)
+    # The trace has ended by the time an error reaches the handlers below; log it under its ID.
+    trace_id = None
+    try:
+        with trace_request(channel_name, user_id=user_id) as trace_id:
+            rate_limiter.check(user_id, channel_id)
+            with request_context(user_id, channel_id, priority, on_queued=tell_queue_position):
+                await handle_channel_message(message, channel_name, content)
 
-        elif channel_name == CI_CD_CHANNEL_NAME:
-            print(f"[CI/CD] Processing message from {message.author}: {content}")
-            await handle_cicd_request(message)
+    except SchedulerRejected as rejected:
+        # Rate limits, a full queue or load shedding: tell the user rather than fail silently.
+        await outbox.send(channel, f"<@{user_id}> {rejected}", key=user_id)
 
     except discord.HTTPException as http_err:
-        print(f"[Discord HTTP Exception] {http_err}")
+        logger.warning("Discord HTTP error: %s", http_err, extra={"trace_id": trace_id})
         try:
-            await channel.send("Sorry, there was an issue sending the response to the channel.")
+            await outbox.send(channel, "Sorry, there was an issue sending the response to the channel.", key=user_id)
         except Exception:
             pass
 
     except Exception as e:
-        print(f"[Error in on_message] {e}")
+        logger.exception("Error in on_message: %s", e, extra={"trace_id": trace_id})
         try:
-            await channel.send("Sorry, an unexpected error occurred while processing your request.")
+            await outbox.send(channel, "Sorry, an unexpected error occurred while processing your request.", key=user_id)
         except Exception:
             pass
 
 
-def run() -> None:
-    """Starts the Discord bot."""
-    client.run(DISCORD_TOKEN)
+async def startup(settings: Settings, warm_up: Optional[bool] = None,
+                  metrics_port: Optional[int] = None) -> Optional[MetricsServer]:
+    """
+    Create the shared resources from `settings` before connecting to Discord. With `warm_up`
+    (default: settings.warm_up), also import the Gemini SDK, build the routed models, open the
+    HTTP pool to GitHub and start the CPU worker processes, so the first message after on_ready
+    doesn't pay for them. Returns the metrics server, if started.
+    """
+    if warm_up is None:
+        warm_up = settings.warm_up
+    llm_client.backend = GeminiBackend(settings.gemini_api_key)
+    openai_client.backend.api_key = settings.openai_api_key
+    github_client.token = settings.github_token
+    session_store.open()
+
+    if warm_up:
+        with stage("warm_up"):
+            results = await asyncio.gather(router.warm_up(), github_client.warm_up(), cpu_pool.warm_up(),
+                                           return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                # Warm-up is an optimization; the same work happens again on first use.
+                logger.warning("Warm-up step failed: %s", result)
+
+    if not settings.metrics_enabled:
+        return None
+    metrics_port = settings.metrics_port if metrics_port is None else metrics_port
+    metrics_server = MetricsServer(host=settings.metrics_host, port=metrics_port)
+    try:
+        await metrics_server.start()
+    except OSError as e:
+        # A taken port shouldn't keep the bot offline.
+        logger.warning("Could not start metrics server: %s", e)
+        return None
+    return metrics_server
+
+
+async def shutdown(metrics_server: Optional[MetricsServer] = None) -> None:
+    """Release everything startup() and the handlers created."""
+    if metrics_server is not None:
+        await metrics_server.stop()
+    await session_store.stop_sweeper()
+    await conversation_store.stop_sweeper()
+    await deploy_tracker.shutdown()
+    session_store.close()
+    deploy_targets.close()
+    semantic_cache.close()
+    cpu_pool.shutdown()
+    # The pooled HTTP session is owned by the bot and lives exactly as long as it does.
+    await shared_http.close()
+
+
+async def _main(settings: Settings, sharded: bool, shard_count: Optional[int], shard_ids: Optional[list[int]],
+                process_index: int) -> None:
+    global client
+    metrics_server = None
+    try:
+        # Each process of a sharded deployment serves its own metrics port.
+        metrics_server = await startup(settings, metrics_port=settings.metrics_port + process_index)
+        client = create_client(sharded, shard_count, shard_ids)
+        async with client:
+            await client.start(settings.discord_token)
+    finally:
+        await shutdown(metrics_server)
+
+
+def run(settings: Settings, sharded: bool = False, shard_count: Optional[int] = None,
+        shard_ids: Optional[list[int]] = None, process_index: int = 0) -> None:
+    """
+    Starts the Discord bot with already loaded and validated settings (see bot/app.py).
+    bot/sharding.py calls this once per process with that process's shard IDs.
+    """
+    setup_logging(settings.log_format)
+    try:
+        asyncio.run(_main(settings, sharded, shard_count, shard_ids, process_index))
+    except KeyboardInterrupt:
+        pass
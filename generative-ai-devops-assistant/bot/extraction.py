@@ -0,0 +1,387 @@
+# bot/extraction.py
+import re
+from typing import Callable, Iterable, Optional
+from bot.prompts import prompt_registry
+
+try:
+    import yaml  # Optional: without PyYAML, manifests and workflows get a lighter structural check.
+except ImportError:  # pragma: no cover - depends on the environment
+    yaml = None
+
+HEADER, CODE, TEXT = "header", "code", "text"
+
+_FENCE_RE = re.compile(r"^\s*(`{3,}|~{3,})\s*([\w+.#-]*)")
+_HEADER_RE = re.compile(r"^\s*(?:#{1,6}[ \t]+(.+?)[ \t]*#*|\*\*(.+?)\*\*:?)\s*$")
+# Headers longer than this are prose (or a comment in an unfenced file), not section titles.
+_MAX_HEADER_LEN = 80
+_MAX_ERRORS = 5
+
+
+class Token:
+    """One piece of model output: a header line, a fenced code block, or a run of prose lines."""
+
+    __slots__ = ("kind", "text", "lang", "raw")
+
+    def __init__(self, kind: str, text: str, lang: str = "", raw: str = ""):
+        self.kind = kind
+        self.text = text
+        self.lang = lang
+        self.raw = raw or text
+
+    def __repr__(self) -> str:
+        return f"Token({self.kind}, {self.text[:30]!r}, lang={self.lang!r})"
+
+
+def tokenize(text: str) -> list[Token]:
+    """
+    Split model output into header, code and text tokens in a single pass over its lines.
+    An unterminated fence (a truncated reply) still yields its code block.
+    """
+    tokens: list[Token] = []
+    prose: list[str] = []
+    code: list[str] = []
+    fence = None
+    lang = ""
+
+    def flush_prose():
+        if prose:
+            tokens.append(Token(TEXT, "\n".join(prose)))
+            prose.clear()
+
+    for line in text.splitlines():
+        if fence is not None:
+            stripped = line.strip()
+            if stripped.startswith(fence) and not stripped.strip(fence[0]):
+                tokens.append(Token(CODE, "\n".join(code), lang))
+                code.clear()
+                fence = None
+            else:
+                code.append(line)
+            continue
+
+        fence_match = _FENCE_RE.match(line)
+        if fence_match:
+            flush_prose()
+            fence, lang = fence_match.group(1), fence_match.group(2).lower()
+            continue
+
+        header_match = _HEADER_RE.match(line)
+        if header_match and len(line) <= _MAX_HEADER_LEN:
+            flush_prose()
+            title = (header_match.group(1) or header_match.group(2)).strip().rstrip(":").strip("*` ")
+            tokens.append(Token(HEADER, title, raw=line))
+        else:
+            prose.append(line)
+
+    if fence is not None:
+        tokens.append(Token(CODE, "\n".join(code), lang))
+    flush_prose()
+    return tokens
+
+
+# --- Validators: each returns a list of problems, empty when the artifact looks usable ---
+
+DOCKERFILE_INSTRUCTIONS = frozenset({
+    "FROM", "RUN", "CMD", "LABEL", "MAINTAINER", "EXPOSE", "ENV", "ADD", "COPY", "ENTRYPOINT",
+    "VOLUME", "USER", "WORKDIR", "ARG", "ONBUILD", "STOPSIGNAL", "HEALTHCHECK", "SHELL",
+})
+_HEREDOC_RE = re.compile(r"<<-?\s*['\"]?(\w+)['\"]?")
+
+
+def validate_dockerfile(text: str) -> list[str]:
+    """Instruction-level lint: known instructions only, FROM first (after ARGs), FROM has an image."""
+    errors = []
+    seen_from = False
+    continuation = False
+    heredoc = None
+    for lineno, line in enumerate(text.splitlines(), 1):
+        stripped = line.strip()
+        if heredoc is not None:
+            if stripped == heredoc:
+                heredoc = None
+            continue
+        if continuation:
+            continuation = stripped.endswith("\\")
+            continue
+        if not stripped or stripped.startswith("#"):
+            continue
+
+        parts = stripped.split(None, 1)
+        instruction = parts[0].upper()
+        if instruction not in DOCKERFILE_INSTRUCTIONS:
+            errors.append(f"line {lineno}: unknown instruction '{parts[0]}'")
+        elif instruction == "FROM":
+            seen_from = True
+            if len(parts) < 2:
+                errors.append(f"line {lineno}: FROM without an image")
+        elif not seen_from and instruction != "ARG":
+            errors.append(f"line {lineno}: {instruction} before the first FROM")
+
+        if instruction in ("RUN", "COPY", "ADD"):
+            heredoc_match = _HEREDOC_RE.search(stripped)
+            if heredoc_match:
+                heredoc = heredoc_match.group(1)
+        continuation = stripped.endswith("\\")
+        if len(errors) >= _MAX_ERRORS:
+            break
+
+    if not seen_from and len(errors) < _MAX_ERRORS:
+        errors.append("no FROM instruction")
+    return errors
+
+
+def _load_yaml_documents(text: str):
+    """Returns (documents, errors); documents is None when the YAML could not be checked."""
+    if yaml is None:
+        return None, []
+    try:
+        return [doc for doc in yaml.safe_load_all(text) if doc is not None], []
+    except yaml.YAMLError as e:
+        mark = getattr(e, "problem_mark", None)
+        where = f" at line {mark.line + 1}" if mark is not None else ""
+        problem = getattr(e, "problem", None) or str(e).splitlines()[0]
+        return None, [f"invalid YAML{where}: {problem}"]
+
+
+def validate_k8s_manifest(text: str) -> list[str]:
+    """Every YAML document must be a Kubernetes object with apiVersion, kind and metadata."""
+    documents, errors = _load_yaml_documents(text)
+    if documents is None:
+        if errors:
+            return errors
+        return [] if re.search(r"^apiVersion:", text, re.M) and re.search(r"^kind:", text, re.M) \
+            else ["no Kubernetes objects found"]
+    if not documents:
+        return ["no Kubernetes objects found"]
+    for index, doc in enumerate(documents, 1):
+        if not isinstance(doc, dict):
+            errors.append(f"document {index} is not a mapping")
+            continue
+        missing = [key for key in ("apiVersion", "kind", "metadata") if key not in doc]
+        if missing:
+            errors.append(f"document {index} ({doc.get('kind', 'unknown kind')}) is missing {', '.join(missing)}")
+    return errors[:_MAX_ERRORS]
+
+
+def validate_github_workflow(text: str) -> list[str]:
+    documents, errors = _load_yaml_documents(text)
+    if documents is None:
+        return errors if errors else ([] if re.search(r"^jobs:", text, re.M) else ["no jobs defined"])
+    if len(documents) != 1 or not isinstance(documents[0], dict):
+        return ["a workflow must be a single YAML mapping"]
+    workflow = documents[0]
+    # YAML 1.1 reads a bare `on:` key as boolean True.
+    if "on" not in workflow and True not in workflow:
+        errors.append("missing 'on' trigger")
+    jobs = workflow.get("jobs")
+    if not isinstance(jobs, dict) or not jobs:
+        errors.append("no jobs defined")
+        return errors
+    for name, job in jobs.items():
+        if not isinstance(job, dict):
+            errors.append(f"job '{name}' is not a mapping")
+        elif "uses" not in job and ("runs-on" not in job or "steps" not in job):
+            errors.append(f"job '{name}' needs runs-on and steps")
+    return errors[:_MAX_ERRORS]
+
+
+def validate_gitlab_pipeline(text: str) -> list[str]:
+    documents, errors = _load_yaml_documents(text)
+    if documents is None:
+        return errors if errors else ([] if re.search(r"^\s+script:", text, re.M) else ["no jobs with a script"])
+    if len(documents) != 1 or not isinstance(documents[0], dict):
+        return ["a pipeline must be a single YAML mapping"]
+    jobs = [value for key, value in documents[0].items()
+            if isinstance(value, dict) and not str(key).startswith(".")
+            and ("script" in value or "trigger" in value or "extends" in value)]
+    return [] if jobs else ["no jobs with a script"]
+
+
+def validate_jenkinsfile(text: str) -> list[str]:
+    errors = []
+    if not re.search(r"^\s*(pipeline|node)\s*(\(.*\))?\s*\{", text, re.M):
+        errors.append("no pipeline { } or node { } block")
+    depth = 0
+    for char in text:
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth < 0:
+                break
+    if depth != 0:
+        errors.append("unbalanced braces")
+    return errors
+
+
+class ArtifactKind:
+    """
+    A kind of file we ask the model for: how its section headers are named, which fence
+    languages and content signatures identify it, and how it is validated.
+    """
+
+    __slots__ = ("name", "filename", "aliases", "languages", "signature", "validate", "multi_document")
+
+    def __init__(self, name: str, filename: str, aliases: tuple, languages: tuple, signature: str,
+                 validate: Callable[[str], list[str]], multi_document: bool = False):
+        self.name = name
+        self.filename = filename
+        self.aliases = aliases
+        self.languages = languages
+        self.signature = re.compile(signature, re.M)
+        self.validate = validate
+        self.multi_document = multi_document
+
+    def matches_header(self, title: str) -> bool:
+        title = title.lower()
+        return any(alias in title for alias in self.aliases)
+
+    def matches_code(self, token: Token) -> bool:
+        if token.lang and token.lang not in self.languages:
+            return False
+        return bool(self.signature.search(token.text))
+
+    def __reduce__(self):
+        # Kinds are module singletons: pickle by name so worker processes hand back the same objects.
+        return kind_by_name, (self.name,)
+
+    def __repr__(self) -> str:
+        return f"ArtifactKind({self.name})"
+
+
+DOCKERFILE = ArtifactKind(
+    "Dockerfile", "Dockerfile", ("dockerfile",), ("dockerfile", "docker"),
+    r"^\s*FROM\s+\S", validate_dockerfile,
+)
+K8S_MANIFEST = ArtifactKind(
+    "Kubernetes manifest", "kubernetes.yaml", ("kubernetes", "k8s", "manifest"), ("yaml", "yml"),
+    r"^apiVersion:", validate_k8s_manifest, multi_document=True,
+)
+GITHUB_WORKFLOW = ArtifactKind(
+    "GitHub Actions workflow", "ci.yml", ("github actions", "workflow", "ci/cd", "pipeline"), ("yaml", "yml"),
+    r"^jobs:", validate_github_workflow,
+)
+GITLAB_PIPELINE = ArtifactKind(
+    "GitLab CI pipeline", ".gitlab-ci.yml", ("gitlab", "ci/cd", "pipeline"), ("yaml", "yml"),
+    r"^\s+script:", validate_gitlab_pipeline,
+)
+JENKINSFILE = ArtifactKind(
+    "Jenkins pipeline", "Jenkinsfile", ("jenkins", "ci/cd", "pipeline"), ("groovy", "jenkinsfile", "jenkins"),
+    r"^\s*(pipeline|node)\b", validate_jenkinsfile,
+)
+
+KINDS = {kind.name: kind for kind in (DOCKERFILE, K8S_MANIFEST, GITHUB_WORKFLOW, GITLAB_PIPELINE, JENKINSFILE)}
+
+
+def kind_by_name(name: str) -> ArtifactKind:
+    return KINDS[name]
+
+
+class ExtractedArtifact:
+    __slots__ = ("kind", "content", "errors")
+
+    def __init__(self, kind: ArtifactKind, content: str, errors: list[str]):
+        self.kind = kind
+        self.content = content
+        self.errors = errors
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.content) and not self.errors
+
+    def __repr__(self) -> str:
+        return f"ExtractedArtifact({self.kind.name}, {len(self.content)} chars, errors={self.errors})"
+
+
+class ExtractionResult:
+    """Artifacts found in one model reply, by kind name, plus the kinds that were asked for but absent."""
+
+    def __init__(self, kinds: Iterable[ArtifactKind], artifacts: dict[str, ExtractedArtifact]):
+        self.kinds = list(kinds)
+        self.artifacts = artifacts
+
+    def get(self, name: str) -> Optional[ExtractedArtifact]:
+        return self.artifacts.get(name)
+
+    @property
+    def missing(self) -> list[ArtifactKind]:
+        return [kind for kind in self.kinds if kind.name not in self.artifacts]
+
+    @property
+    def needs_repair(self) -> list[ArtifactKind]:
+        """Kinds that are missing or failed validation."""
+        return [kind for kind in self.kinds
+                if kind.name not in self.artifacts or not self.artifacts[kind.name].ok]
+
+    def __iter__(self):
+        return (self.artifacts[kind.name] for kind in self.kinds if kind.name in self.artifacts)
+
+
+def extract_artifacts(text: str, kinds: Iterable[ArtifactKind]) -> ExtractionResult:
+    """
+    Pull the requested artifacts out of a model reply.
+
+    A code block belongs to the artifact named by the header above it; blocks without a
+    usable header are assigned by fence language and content signature. Kinds marked
+    multi_document collect every block under their header (e.g. a Deployment and a Service
+    given separately). A header with no code block beneath it falls back to its prose. When
+    a single kind is asked for, an unrecognised code block, or failing that the whole
+    unstructured reply, is taken as the artifact.
+    """
+    kinds = list(kinds)
+    blocks: dict[str, list[str]] = {}
+    prose: dict[str, list[str]] = {}
+    current: Optional[ArtifactKind] = None
+    unassigned: list[str] = []
+    saw_structure = False
+
+    for token in tokenize(text):
+        if token.kind == HEADER:
+            matched = next((kind for kind in kinds if kind.matches_header(token.text)), None)
+            if matched is not None:
+                current = matched
+                saw_structure = True
+            elif current is not None:
+                prose.setdefault(current.name, []).append(token.raw)
+        elif token.kind == CODE:
+            saw_structure = True
+            target = current
+            if target is not None and target.name in blocks and not target.multi_document:
+                target = None
+            # A labelled fence that plainly belongs elsewhere (```dockerfile under the manifest header).
+            if target is not None and token.lang and token.lang not in target.languages:
+                target = None
+            if target is None:
+                target = next((kind for kind in kinds
+                               if (kind.name not in blocks or kind.multi_document) and kind.matches_code(token)),
+                              None)
+            if target is not None:
+                blocks.setdefault(target.name, []).append(token.text)
+            else:
+                unassigned.append(token.text)
+        elif current is not None:
+            prose.setdefault(current.name, []).append(token.text)
+
+    artifacts: dict[str, ExtractedArtifact] = {}
+    for kind in kinds:
+        if kind.name in blocks:
+            content = "\n---\n".join(block.strip() for block in blocks[kind.name]).strip()
+        elif kind.name in prose:
+            content = "\n".join(prose[kind.name]).strip()
+        elif len(kinds) == 1 and unassigned:
+            content = unassigned[0].strip()
+        elif len(kinds) == 1 and not saw_structure:
+            content = text.strip()
+        else:
+            continue
+        if content:
+            artifacts[kind.name] = ExtractedArtifact(kind, content, kind.validate(content))
+    return ExtractionResult(kinds, artifacts)
+
+
+def build_repair_prompt(kind: ArtifactKind, artifact: Optional[ExtractedArtifact], context: str) -> str:
+    """Re-ask for one broken or missing artifact only, quoting its problems."""
+    if artifact is None or not artifact.content:
+        return prompt_registry.render("repair.missing", context=context.strip(), kind=kind.name)
+    problems = "\n".join(f"- {error}" for error in artifact.errors)
+    return prompt_registry.render("repair.problems", kind=kind.name, problems=problems, content=artifact.content)
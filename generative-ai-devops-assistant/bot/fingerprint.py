@@ -0,0 +1,317 @@
+# bot/fingerprint.py
+import json
+import re
+from collections import Counter
+from typing import Callable, Optional
+
+
+class FileIndex:
+    """
+    One-pass index over a repository file list.
+
+    Paths are normalized to lowercase with any single wrapping folder removed (zip uploads
+    usually contain `repo-main/...`). Detectors then answer "is there a package.json" or
+    "how many .py files" with dict lookups instead of scanning the list again.
+    """
+
+    def __init__(self, file_list):
+        self.paths: list[str] = [p for p in file_list if p and not p.endswith("/")]
+        strip = len(common_root(self.paths))
+
+        self.basenames: dict[str, list[str]] = {}
+        self.extensions: Counter = Counter()
+        self.top_dirs: Counter = Counter()
+        for original in self.paths:
+            lowered = original[strip:].lower()
+            slash = lowered.rfind("/")
+            basename = lowered[slash + 1:]
+            self.basenames.setdefault(basename, []).append(original)
+            dot = basename.rfind(".")
+            if dot > 0:
+                self.extensions[basename[dot:]] += 1
+            if slash != -1:
+                self.top_dirs[lowered[:lowered.find("/")]] += 1
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def has(self, basename: str) -> bool:
+        return basename in self.basenames
+
+    def path(self, basename: str) -> Optional[str]:
+        """Shallowest original path with this (lowercase) basename."""
+        candidates = self.basenames.get(basename)
+        if not candidates:
+            return None
+        return min(candidates, key=lambda p: (p.count("/"), len(p)))
+
+    def count(self, extension: str) -> int:
+        return self.extensions.get(extension, 0)
+
+    def has_dir(self, name: str) -> bool:
+        return name in self.top_dirs
+
+
+def common_root(paths: list[str]) -> str:
+    """The single top-level folder shared by every path (with trailing slash), or ''."""
+    root = None
+    for path in paths:
+        slash = path.find("/")
+        if slash == -1:
+            return ""
+        head = path[:slash + 1]
+        if root is None:
+            root = head
+        elif head != root:
+            return ""
+    return root or ""
+
+
+class Detection:
+    """One finding: a stack component with a confidence in [0, 1] and the evidence for it."""
+
+    __slots__ = ("name", "kind", "confidence", "evidence")
+
+    def __init__(self, name: str, kind: str, confidence: float, evidence: str):
+        self.name = name
+        self.kind = kind
+        self.confidence = confidence
+        self.evidence = evidence
+
+    def as_dict(self) -> dict:
+        return {"name": self.name, "kind": self.kind, "confidence": round(self.confidence, 2), "evidence": self.evidence}
+
+    def __repr__(self) -> str:
+        return f"Detection({self.name!r}, {self.kind!r}, {self.confidence:.2f})"
+
+
+class RepoFingerprint:
+    """Structured result of running every detector over a repository."""
+
+    def __init__(self, detections: list[Detection], file_count: int):
+        self.detections = sorted(detections, key=lambda d: d.confidence, reverse=True)
+        self.file_count = file_count
+
+    def of_kind(self, kind: str) -> list[Detection]:
+        return [d for d in self.detections if d.kind == kind]
+
+    @property
+    def language(self) -> Optional[Detection]:
+        languages = self.of_kind("language")
+        return languages[0] if languages else None
+
+    @property
+    def frameworks(self) -> list[Detection]:
+        return self.of_kind("framework")
+
+    @property
+    def build_tools(self) -> list[Detection]:
+        return self.of_kind("build")
+
+    @property
+    def site(self) -> Optional[Detection]:
+        sites = self.of_kind("site")
+        return sites[0] if sites else None
+
+    @property
+    def is_documentation(self) -> bool:
+        """Docs/static-site signals only win over a language backed by more confident evidence."""
+        site = self.site
+        language = self.language
+        return site is not None and (language is None or language.confidence < site.confidence)
+
+    def describe(self) -> str:
+        """Short human-readable summary used in prompts."""
+        if self.is_documentation:
+            return f"documentation/static site project ({self.site.name})"
+        language = self.language
+        if language is None:
+            return "unspecified application"
+        extras = [d.name for d in self.frameworks + self.build_tools if d.confidence >= 0.5]
+        label = f"{language.name} application"
+        if self.frameworks and self.frameworks[0].confidence >= 0.5:
+            label = f"{language.name} web application"
+        return f"{label} ({', '.join(extras)})" if extras else label
+
+    def as_dict(self) -> dict:
+        return {
+            "summary": self.describe(),
+            "file_count": self.file_count,
+            "detections": [d.as_dict() for d in self.detections],
+        }
+
+
+# Lowercase basenames whose contents detectors may ask for; sources that cannot read
+# every file (remote repositories) fetch just these.
+MANIFEST_FILES = (
+    "requirements.txt", "pyproject.toml", "pipfile", "package.json", "go.mod",
+    "pom.xml", "build.gradle", "build.gradle.kts", "cargo.toml",
+)
+
+# A detector inspects the index (and optionally file contents) and returns its findings.
+Detector = Callable[[FileIndex, Callable[[str], Optional[str]]], list[Detection]]
+
+DETECTORS: list[Detector] = []
+
+
+def register_detector(detector: Detector) -> Detector:
+    """Add a detector to the engine; usable as a decorator."""
+    DETECTORS.append(detector)
+    return detector
+
+
+def _read(index: FileIndex, read_file, basename: str) -> str:
+    path = index.path(basename)
+    if path is None or read_file is None:
+        return ""
+    return (read_file(path) or "").lower()
+
+
+def _language_confidence(manifest: bool, source_files: int, total: int) -> float:
+    """A manifest is strong evidence; the share of source files decides how strong."""
+    share = source_files / total if total else 0.0
+    if manifest:
+        return 0.75 + min(0.2, share)
+    if not source_files:
+        return 0.0
+    return min(0.7, 0.3 + share)
+
+
+def _frameworks_in(text: str, candidates: dict[str, str], confidence: float, evidence: str) -> list[Detection]:
+    return [
+        Detection(name, "framework", confidence, evidence)
+        for token, name in candidates.items()
+        if re.search(rf"(?<![\w-]){re.escape(token)}(?![\w-])", text)
+    ]
+
+
+PYTHON_FRAMEWORKS = {"fastapi": "FastAPI", "flask": "Flask", "django": "Django", "streamlit": "Streamlit"}
+NODE_FRAMEWORKS = {"next": "Next.js", "express": "Express", "@nestjs/core": "NestJS", "react": "React", "vue": "Vue"}
+GO_FRAMEWORKS = {"github.com/gin-gonic/gin": "Gin", "github.com/labstack/echo": "Echo", "github.com/gofiber/fiber": "Fiber"}
+
+
+@register_detector
+def detect_python(index: FileIndex, read_file) -> list[Detection]:
+    manifests = [name for name in ("requirements.txt", "pyproject.toml", "setup.py", "pipfile") if index.has(name)]
+    confidence = _language_confidence(bool(manifests), index.count(".py"), len(index))
+    if not confidence:
+        return []
+    found = [Detection("Python", "language", confidence, ", ".join(manifests) or ".py files")]
+    text = " ".join(_read(index, read_file, name) for name in ("requirements.txt", "pyproject.toml", "pipfile"))
+    found += _frameworks_in(text, PYTHON_FRAMEWORKS, 0.85, "dependency manifest")
+    if index.has("manage.py") and not any(d.name == "Django" for d in found):
+        found.append(Detection("Django", "framework", 0.7, "manage.py"))
+    if index.has("poetry.lock") or "[tool.poetry]" in text:
+        found.append(Detection("Poetry", "build", 0.8, "poetry"))
+    return found
+
+
+@register_detector
+def detect_node(index: FileIndex, read_file) -> list[Detection]:
+    source_files = index.count(".js") + index.count(".ts") + index.count(".jsx") + index.count(".tsx")
+    has_manifest = index.has("package.json")
+    if not has_manifest:
+        # Plain .js alongside another language's manifest is usually front-end assets.
+        source_files = min(source_files, index.count(".ts"))
+    confidence = _language_confidence(has_manifest, source_files, len(index))
+    if not confidence:
+        return []
+    language = "TypeScript" if index.count(".ts") + index.count(".tsx") > index.count(".js") else "Node.js"
+    found = [Detection(language, "language", confidence, "package.json" if has_manifest else "source files")]
+    text = _read(index, read_file, "package.json")
+    if text:
+        try:
+            manifest = json.loads(text)
+            deps = {**manifest.get("dependencies", {}), **manifest.get("devDependencies", {})}
+            found += [Detection(name, "framework", 0.85, "package.json") for key, name in NODE_FRAMEWORKS.items() if key in deps]
+        except (ValueError, AttributeError):
+            pass
+    for lockfile, tool in (("yarn.lock", "Yarn"), ("pnpm-lock.yaml", "pnpm"), ("package-lock.json", "npm")):
+        if index.has(lockfile):
+            found.append(Detection(tool, "build", 0.8, lockfile))
+            break
+    return found
+
+
+@register_detector
+def detect_go(index: FileIndex, read_file) -> list[Detection]:
+    confidence = _language_confidence(index.has("go.mod"), index.count(".go"), len(index))
+    if not confidence:
+        return []
+    found = [Detection("Go", "language", confidence, "go.mod" if index.has("go.mod") else ".go files")]
+    found += _frameworks_in(_read(index, read_file, "go.mod"), GO_FRAMEWORKS, 0.85, "go.mod")
+    return found
+
+
+@register_detector
+def detect_java(index: FileIndex, read_file) -> list[Detection]:
+    maven = index.has("pom.xml")
+    gradle = index.has("build.gradle") or index.has("build.gradle.kts")
+    source_files = index.count(".java") + index.count(".kt")
+    confidence = _language_confidence(maven or gradle, source_files, len(index))
+    if not confidence:
+        return []
+    language = "Kotlin" if index.count(".kt") > index.count(".java") else "Java"
+    found = [Detection(language, "language", confidence, "pom.xml" if maven else "build.gradle" if gradle else "source files")]
+    if maven:
+        found.append(Detection("Maven", "build", 0.9, "pom.xml"))
+    if gradle:
+        found.append(Detection("Gradle", "build", 0.9, "build.gradle"))
+    text = _read(index, read_file, "pom.xml") or _read(index, read_file, "build.gradle") or _read(index, read_file, "build.gradle.kts")
+    if "spring-boot" in text:
+        found.append(Detection("Spring Boot", "framework", 0.85, "build manifest"))
+    return found
+
+
+@register_detector
+def detect_rust(index: FileIndex, read_file) -> list[Detection]:
+    confidence = _language_confidence(index.has("cargo.toml"), index.count(".rs"), len(index))
+    if not confidence:
+        return []
+    found = [Detection("Rust", "language", confidence, "Cargo.toml" if index.has("cargo.toml") else ".rs files")]
+    text = _read(index, read_file, "cargo.toml")
+    found += _frameworks_in(text, {"actix-web": "Actix Web", "axum": "Axum", "rocket": "Rocket"}, 0.85, "Cargo.toml")
+    return found
+
+
+@register_detector
+def detect_dotnet(index: FileIndex, read_file) -> list[Detection]:
+    projects = index.count(".csproj") + index.count(".fsproj") + index.count(".sln")
+    confidence = _language_confidence(bool(projects), index.count(".cs") + index.count(".fs"), len(index))
+    if not confidence:
+        return []
+    found = [Detection(".NET", "language", confidence, "project files" if projects else "source files")]
+    if index.has("program.cs") and index.count(".cshtml") + index.count(".razor"):
+        found.append(Detection("ASP.NET Core", "framework", 0.7, "Razor views"))
+    return found
+
+
+@register_detector
+def detect_static_site(index: FileIndex, read_file) -> list[Detection]:
+    if index.has("mkdocs.yml") or index.has("mkdocs.yaml"):
+        return [Detection("MkDocs", "site", 0.85, "mkdocs.yml")]
+    if index.has("_config.yml") and index.has_dir("_posts"):
+        return [Detection("Jekyll", "site", 0.9, "_config.yml + _posts/")]
+    if (index.has("hugo.toml") or index.has("config.toml")) and index.has_dir("content"):
+        return [Detection("Hugo", "site", 0.85, "hugo config + content/")]
+    conf = index.path("conf.py")
+    if conf and "/" in conf and index.count(".rst"):
+        return [Detection("Sphinx", "site", 0.85, conf)]
+    if index.has("index.html") and index.count(".html") + index.count(".css") >= len(index) * 0.5:
+        return [Detection("static HTML", "site", 0.7, "index.html")]
+    # A docs/ folder alone is weak evidence: real apps ship docs too.
+    if index.has_dir("docs") and index.count(".md") + index.count(".rst") >= len(index) * 0.5:
+        return [Detection("Markdown docs", "site", 0.6, "docs/")]
+    return []
+
+
+def fingerprint_repository(file_list, read_file: Optional[Callable[[str], Optional[str]]] = None) -> RepoFingerprint:
+    """
+    Run every registered detector over the file list. `read_file(path)` is used to peek
+    into manifests for framework detection and may be omitted when contents are unavailable.
+    """
+    index = file_list if isinstance(file_list, FileIndex) else FileIndex(file_list)
+    detections: list[Detection] = []
+    for detector in DETECTORS:
+        detections.extend(detector(index, read_file))
+    return RepoFingerprint(detections, len(index))
@@ -0,0 +1,193 @@
+# bot/flows.py
+import asyncio
+import re
+from typing import Awaitable, Callable, Optional, Union
+import discord
+from bot.outbound import outbox
+from bot.sessions import ChatOpsSession, SessionStore
+
+# Returned as a next state to finish the flow and drop the session.
+END = None
+
+
+class InvalidInput(Exception):
+    """Raised by a state's parser; the message is sent back and the flow stays in that state."""
+
+
+class ChoiceMatcher:
+    """
+    Precompiled option matcher: exact answers are a dict lookup, otherwise an answer is
+    accepted when it contains, or is contained in, exactly one option.
+    """
+
+    def __init__(self, options: list[str]):
+        self.options = [option.lower() for option in options]
+        self._exact = {option: option for option in self.options}
+
+    def match(self, text: str) -> Optional[str]:
+        choice = text.strip().lower()
+        exact = self._exact.get(choice)
+        if exact is not None:
+            return exact
+        matches = [option for option in self.options if choice in option or option in choice]
+        return matches[0] if len(matches) == 1 else None
+
+
+class FlowContext:
+    """What a state's callbacks get to see about the current message."""
+
+    __slots__ = ("message", "session", "content", "content_lower")
+
+    def __init__(self, message: discord.Message, session: ChatOpsSession):
+        self.message = message
+        self.session = session
+        self.content = message.content.strip()
+        self.content_lower = self.content.lower()
+
+    @property
+    def channel(self) -> discord.abc.Messageable:
+        return self.message.channel
+
+    @property
+    def user_id(self) -> int:
+        return self.session.user_id
+
+    @property
+    def data(self) -> dict:
+        return self.session.data
+
+    async def reply(self, text: str, **kwargs):
+        return await outbox.send(self.channel, f"<@{self.user_id}> {text}", **kwargs)
+
+    def status(self, text: str) -> None:
+        """A progress line; later ones edit it until the next reply."""
+        outbox.status(self.channel, f"<@{self.user_id}> {text}")
+
+
+Action = Callable[[FlowContext, object], Awaitable[Optional[str]]]
+
+
+class State:
+    """
+    One step of a flow.
+
+    On entry `question(ctx)` is sent. Each message is run through `parse(ctx)` (raise
+    InvalidInput to stay put), stored under `field`, then every action runs concurrently;
+    the next state is `next` (a name, END, or a callable of the parsed value), unless an
+    action returns a state name to jump to instead.
+    """
+
+    __slots__ = ("name", "question", "parse", "field", "next", "actions")
+
+    def __init__(
+        self,
+        name: str,
+        question: Optional[Callable[[FlowContext], str]] = None,
+        parse: Optional[Callable[[FlowContext], object]] = None,
+        field: Optional[str] = None,
+        next: Union[str, None, Callable[[object], Optional[str]]] = END,
+        actions: tuple = (),
+    ):
+        self.name = name
+        self.question = question
+        self.parse = parse
+        self.field = field
+        self.next = next
+        self.actions = tuple(actions)
+
+
+class Flow:
+    """A named set of states entered through one or more trigger prefixes."""
+
+    def __init__(self, name: str, triggers: tuple, states: list[State]):
+        self.name = name
+        self.triggers = tuple(t.lower() for t in triggers)
+        self.states = {state.name: state for state in states}
+        self.initial = states[0].name
+
+
+class FlowEngine:
+    """
+    Table-driven ChatOps engine. Flows are registered at startup; each message costs one
+    precompiled trigger match plus dict lookups for the flow and state, whatever the
+    number of flows.
+    """
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+        self.flows: dict[str, Flow] = {}
+        self._triggers: dict[str, Flow] = {}
+        self._trigger_re: Optional[re.Pattern] = None
+
+    def register_flow(self, flow: Flow) -> Flow:
+        self.flows[flow.name] = flow
+        for trigger in flow.triggers:
+            self._triggers[trigger] = flow
+        # Longest triggers first so "/start-helm" wins over "/start".
+        alternatives = sorted(self._triggers, key=len, reverse=True)
+        self._trigger_re = re.compile("|".join(re.escape(t) for t in alternatives))
+        return flow
+
+    def match_trigger(self, content: str) -> Optional[Flow]:
+        if self._trigger_re is None:
+            return None
+        match = self._trigger_re.match(content.strip().lower())
+        return self._triggers[match.group()] if match else None
+
+    def wants(self, message: discord.Message) -> bool:
+        """True when the message starts a flow or continues the author's live session."""
+        return self.match_trigger(message.content) is not None or self.store.get(message.author.id) is not None
+
+    async def start(self, flow: Flow, message: discord.Message) -> None:
+        session = self.store.start(message.author.id, flow.name, flow.initial)
+        await self._ask(flow, session, message)
+
+    async def handle(self, message: discord.Message) -> bool:
+        """Route a message into its flow; returns False when the user has no session to continue."""
+        flow = self.match_trigger(message.content)
+        if flow is not None:
+            await self.start(flow, message)
+            return True
+
+        session = self.store.get(message.author.id)
+        if session is None:
+            return False
+        flow = self.flows.get(session.flow)
+        state = flow.states.get(session.stage) if flow else None
+        if state is None:
+            # The flow was unregistered or changed shape since this session was saved.
+            self.store.end(session.user_id)
+            return False
+
+        ctx = FlowContext(message, session)
+        try:
+            value = state.parse(ctx) if state.parse else ctx.content
+        except InvalidInput as e:
+            self.store.save(session)
+            await outbox.send(ctx.channel, str(e))
+            return True
+
+        if state.field:
+            session.data[state.field] = value
+        next_state = state.next(value) if callable(state.next) else state.next
+
+        if state.actions:
+            results = await asyncio.gather(*(action(ctx, value) for action in state.actions))
+            for result in results:
+                if result is not None:
+                    next_state = result
+                    break
+
+        if next_state is END or next_state not in flow.states:
+            self.store.end(session.user_id)
+            return True
+        session.stage = next_state
+        self.store.save(session)
+        await self._ask(flow, session, message)
+        return True
+
+    async def _ask(self, flow: Flow, session: ChatOpsSession, message: discord.Message) -> None:
+        state = flow.states[session.stage]
+        if state.question is not None:
+            ctx = FlowContext(message, session)
+            await ctx.reply(state.question(ctx))
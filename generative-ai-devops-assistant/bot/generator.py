@@ -1,40 +1,87 @@
+import logging
 import re
-import io
-import os
-import zipfile
+from typing import Optional
 import discord
-import aiohttp
+from bot.archive import ArchiveError, inspect_zip_attachment
+from bot.artifacts import repair_artifacts
+from bot.config import get_settings
+from bot.extraction import DOCKERFILE, K8S_MANIFEST, ExtractionResult, extract_artifacts
+from bot.fingerprint import FileIndex, fingerprint_repository
+from bot.http_client import shared_http
 from bot.llm_client import get_gemini_file_response
+from bot.outbound import Attachment, outbox
+from bot.prompts import budget_file_list, prompt_registry
+from bot.repo_inspector import RepoInspectionError, repo_inspector
+from bot.scheduler import SchedulerRejected
+from bot.templates import TEMPLATE_REQUESTS, detect_stack, render_deployment
+from bot.tracing import stage
+from bot.workers import cpu_pool
 
-def detect_repo_type_from_files(file_list):
+logger = logging.getLogger(__name__)
+
+GENERATED_KINDS = (DOCKERFILE, K8S_MANIFEST)
+# Listings up to this many paths are budgeted inline (a few milliseconds).
+OFFLOAD_FILE_LIST_PATHS = 2000
+
+def detect_repo_type_from_files(file_list, read_file=None):
     """
-    Basic heuristic detection for repo type based on presence of key files.
-    Returns a string describing the repo type for prompt customization.
+    Describe the repo type for prompt customization, based on the fingerprinting engine.
+    `read_file(path)`, when given, lets detectors look inside manifests for frameworks.
     """
-    files_lower = [f.lower() for f in file_list]
-    if any('mkdocs.yml' in f or f.startswith('docs/') for f in files_lower):
-        return 'documentation project (e.g., MkDocs)'
-    if 'requirements.txt' in files_lower:
-        # Could enhance by reading requirements.txt contents for fastapi/flask, etc.
-        # For now, just generic Python app
-        return 'Python web application'
-    if 'package.json' in files_lower:
-        return 'Node.js application'
-    return 'unspecified application'
+    return fingerprint_repository(file_list, read_file).describe()
+
+def build_url_prompt(repo_url: str) -> str:
+    """Fallback prompt when only the repository URL is known."""
+    return prompt_registry.render("generator.url", repo_url=repo_url)
+
+async def fit_file_list(file_list: list[str]) -> str:
+    """
+    The listing cut down to the prompt's token budget, keeping the paths that matter for
+    deployment. Ranking tens of thousands of paths takes a while, so big listings are done
+    in a worker process.
+    """
+    max_tokens = get_settings().prompt_file_list_tokens
+    if len(file_list) <= OFFLOAD_FILE_LIST_PATHS:
+        return budget_file_list(file_list, max_tokens)
+    return await cpu_pool.run(budget_file_list, file_list, max_tokens)
+
+def build_structure_prompt(source_desc: str, file_listing: str, repo_type_desc: str) -> str:
+    """Prompt for a repository whose file structure is known (uploaded zip or fetched from GitHub)."""
+    return prompt_registry.render("generator.structure", source_desc=source_desc,
+                                  file_list=file_listing, repo_type=repo_type_desc)
+
+def template_files(stack) -> Optional[dict]:
+    """Dockerfile and manifest rendered from the templates, when they cover the stack."""
+    if not get_settings().templates_enabled or stack is None or not stack.deployable:
+        return None
+    with stage("template", stack=stack.label):
+        return render_deployment(stack)
+
+async def generate_deployment_files(prompt: str) -> ExtractionResult:
+    """
+    Ask for the Dockerfile and Kubernetes manifest in one reply. One pass over the reply finds
+    both files; whichever is missing or fails validation is re-asked on its own, with the
+    original prompt as context.
+    """
+    full_output = await get_gemini_file_response(prompt)
+    with stage("parse"):
+        extraction = await cpu_pool.run(extract_artifacts, full_output, GENERATED_KINDS)
+    if extraction.needs_repair:
+        logger.info("Re-asking for: %s", ", ".join(kind.name for kind in extraction.needs_repair))
+        with stage("repair"):
+            extraction = await repair_artifacts(extraction, prompt)
+    return extraction
 
 async def handle_generator_request(message: discord.Message):
     """
     Handle Dockerfile and Kubernetes manifest generation from GitHub repo URL or zip file upload.
-    Sends two files: Dockerfile and kubernetes.yaml.
+    Sends two files: Dockerfile and kubernetes.yaml, rendered from a template when one fits the
+    detected stack and generated by the model otherwise.
     """
 
     content = message.content.strip()
     files_to_send = []
-
-    def cleanup_extracted_folder(path: str):
-        import shutil
-        if os.path.exists(path):
-            shutil.rmtree(path)
+    stack = templated = None
 
     # Detect GitHub repo URL in message text
     match = re.search(r'https?://github\.com/[^\s]+', content)
@@ -48,131 +95,86 @@ async def handle_generator_request(message: discord.Message):
             break
 
     if repo_url:
-        prompt = f"""
-You are a senior DevOps engineer.
-
-First, analyze the given repository URL quickly to determine if it is:
-- A documentation project (e.g., MkDocs, Sphinx),
-- A web/API app (e.g., FastAPI, Flask, Django, Node.js),
-- Or something else.
-
-If it is documentation, generate a multi-stage Dockerfile for building static HTML with Python tools and a Kubernetes manifest to serve with NGINX.
-
-If it is an application, generate a Dockerfile to run the app properly (e.g., using Uvicorn or Gunicorn for Python), including dependencies and environment variables, and a Kubernetes manifest with deployment, service, health probes, and resource limits.
-
-Clearly label each generated file and include a brief comment explaining your choices at the top.
-
-Repository URL: {repo_url}
-
-Output the Dockerfile first, then the Kubernetes manifest, separated and labeled clearly.
-""".strip()
+        try:
+            with stage("prompt_build", source="github"):
+                snapshot = await repo_inspector.inspect(repo_url)
+                index = FileIndex(snapshot.file_list)
+                fingerprint = fingerprint_repository(index, snapshot.read_file)
+                stack = detect_stack(index, snapshot.read_file, name=snapshot.repo, fingerprint=fingerprint)
+                templated = template_files(stack)
+                if templated is None:
+                    prompt = build_structure_prompt(
+                        f"The GitHub repository {snapshot.full_name} (commit {snapshot.sha[:12]}) has source code",
+                        await fit_file_list(snapshot.file_list),
+                        fingerprint.describe(),
+                    )
+        except RepoInspectionError as e:
+            # Private repos, rate limits or API outages: let the model work from the URL alone.
+            logger.warning("Repository inspection failed, falling back to URL-only prompt: %s", e)
+            prompt = build_url_prompt(repo_url)
 
     elif zip_attachment:
-        await message.channel.send(f"Downloading and extracting uploaded zip file `{zip_attachment.filename}`. Please wait...")
+        max_bytes = get_settings().zip_max_download_bytes
+        if zip_attachment.size > max_bytes:
+            await outbox.send(
+                message.channel,
+                f"`{zip_attachment.filename}` is too large ({zip_attachment.size} bytes). "
+                f"The limit is {max_bytes} bytes."
+            )
+            return
 
-        zip_file_name = f"temp_{message.id}.zip"
-        extracted_folder = f"extracted_{message.id}"
+        outbox.status(message.channel, f"Downloading and inspecting uploaded zip file `{zip_attachment.filename}`. Please wait...")
 
         try:
-            # Download the zip file
-            async with aiohttp.ClientSession() as session:
-                async with session.get(zip_attachment.url) as resp:
-                    if resp.status != 200:
-                        await message.channel.send("Failed to download the zip file. Please try again.")
-                        return
-                    data = await resp.read()
-                    with open(zip_file_name, 'wb') as f:
-                        f.write(data)
-
-            # Extract zip and read file list for detection
-            with zipfile.ZipFile(zip_file_name, 'r') as zip_ref:
-                zip_ref.extractall(extracted_folder)
-                file_list = zip_ref.namelist()
-
-            repo_type_desc = detect_repo_type_from_files(file_list)
-
-            # Summarize files (limit 100 for prompt size)
-            summary = "\n".join(file_list[:100])
-            if len(file_list) > 100:
-                summary += f"\n...and {len(file_list) - 100} more files."
-
-            prompt = f"""
-You are a senior DevOps engineer.
-
-A user uploaded source code with the following file/folder structure:
-
-{summary}
-
-Based on this, the repository appears to be a {repo_type_desc}.
-
-Generate a production-ready Dockerfile and Kubernetes manifest:
-
-- For documentation, use a multi-stage Dockerfile with static HTML serving in NGINX.
-- For applications, use Dockerfile with app server, dependencies, and environment configs.
-- In all cases, provide Kubernetes manifests with deployment, service, health probes, and resource requests/limits.
-
-Clearly label and briefly comment each file.
-
-Output the Dockerfile first, then the Kubernetes manifest.
-""".strip()
-
+            # Stream the upload into a spooled buffer and read only the zip's central
+            # directory plus a few small manifests, in a worker process; nothing is extracted.
+            with stage("prompt_build", source="zip"):
+                file_list, repo_type_desc, stack = await inspect_zip_attachment(
+                    shared_http.session, zip_attachment.url, name=zip_attachment.filename.rsplit(".", 1)[0],
+                    size=zip_attachment.size)
+                templated = template_files(stack)
+                if templated is None:
+                    prompt = build_structure_prompt("A user uploaded source code", await fit_file_list(file_list),
+                                                    repo_type_desc)
+
+        except ArchiveError as e:
+            await outbox.send(message.channel, f"Could not use the uploaded zip file: {e}")
+            return
         except Exception as e:
-            await message.channel.send(f"Error processing the uploaded zip file: {e}")
+            await outbox.send(message.channel, f"Error processing the uploaded zip file: {e}")
             return
 
     else:
-        await message.channel.send("Please provide a GitHub repository URL or upload a zip file of your source code containing your app.")
+        await outbox.send(message.channel, "Please provide a GitHub repository URL or upload a zip file of your source code containing your app.")
+        return
+
+    if templated is not None:
+        TEMPLATE_REQUESTS.labels("generator", "template").inc()
+        files_to_send = [Attachment(kind.filename, text) for kind, text in templated.items()]
+        with stage("upload"):
+            await outbox.send(message.channel, f"Here are the generated files (from the {stack.label} template):",
+                              attachments=files_to_send)
         return
 
-    await message.channel.send("Generating Dockerfile and Kubernetes manifest for you. Please wait...")
+    TEMPLATE_REQUESTS.labels("generator", "model").inc()
+    outbox.status(message.channel, "Generating Dockerfile and Kubernetes manifest for you. Please wait...")
 
     try:
-        full_output = await get_gemini_file_response(prompt)
+        extraction = await generate_deployment_files(prompt)
+    except SchedulerRejected:
+        raise  # on_message tells the user why.
     except Exception as e:
-        await message.channel.send("Sorry, an error occurred while generating your files.")
-        print(f"[generator] Error calling Gemini: {e}")
-        if zip_attachment:
-            os.remove(zip_file_name)
-            cleanup_extracted_folder(extracted_folder)
+        await outbox.send(message.channel, "Sorry, an error occurred while generating your files.")
+        logger.exception("Error generating deployment files: %s", e)
         return
 
-    dockerfile_content = ""
-    k8s_content = ""
-
-    dockerfile_marker = re.search(r"(?:^|\n)###?\s*Dockerfile\s*(?:\n|$)", full_output, re.IGNORECASE)
-    k8s_marker = re.search(r"(?:^|\n)###?\s*Kubernetes manifest\s*(?:\n|$)", full_output, re.IGNORECASE)
-
-    if dockerfile_marker and k8s_marker:
-        dockerfile_start = dockerfile_marker.end()
-        k8s_start = k8s_marker.end()
-
-        if dockerfile_start < k8s_marker.start():
-            dockerfile_content = full_output[dockerfile_start:k8s_marker.start()].strip()
-            k8s_content = full_output[k8s_start:].strip()
-        else:
-            dockerfile_content = full_output.strip()
-    else:
-        parts = full_output.split('---')
-        if len(parts) > 1:
-            dockerfile_content = parts[0].strip()
-            k8s_content = '---'.join(parts[1:]).strip()
-        else:
-            dockerfile_content = full_output.strip()
-
-    if dockerfile_content:
-        files_to_send.append(discord.File(io.BytesIO(dockerfile_content.encode('utf-8')), filename="Dockerfile"))
-
-    if k8s_content:
-        files_to_send.append(discord.File(io.BytesIO(k8s_content.encode('utf-8')), filename="kubernetes.yaml"))
+    for artifact in extraction:
+        files_to_send.append(Attachment(artifact.kind.filename, artifact.content))
 
     if files_to_send:
-        await message.channel.send(content="Here are the generated files:", files=files_to_send)
+        problems = [f"{artifact.kind.name}: {'; '.join(artifact.errors)}" for artifact in extraction if artifact.errors]
+        note = "\nSome checks still fail:\n" + "\n".join(problems) if problems else ""
+        with stage("upload"):
+            await outbox.send(message.channel, f"Here are the generated files:{note}", attachments=files_to_send)
     else:
-        await message.channel.send("Failed to parse the generated content. Please try again.")
-
-    if zip_attachment:
-        try:
-            os.remove(zip_file_name)
-            cleanup_extracted_folder(extracted_folder)
-        except Exception as e:
-            print(f"[generator] Error cleaning up temp files: {e}")
+        await outbox.send(message.channel, "Failed to parse the generated content. Please try again.")
@@ -0,0 +1,208 @@
+# bot/github_client.py
+import asyncio
+import json
+import logging
+import time
+from typing import Optional
+from bot.config import get_settings
+from bot.http_client import HttpClient, shared_http
+from bot.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+GITHUB_API_URL = "https://api.github.com"
+
+
+class GitHubAPIError(Exception):
+    """Non-success response from the GitHub API."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"GitHub API returned HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+
+class RateLimit:
+    """Latest primary rate-limit state reported in X-RateLimit-* headers."""
+
+    __slots__ = ("limit", "remaining", "reset", "resource")
+
+    def __init__(self):
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.reset: Optional[float] = None
+        self.resource: Optional[str] = None
+
+    def update(self, headers) -> None:
+        if "X-RateLimit-Remaining" not in headers:
+            return
+        self.limit = int(headers.get("X-RateLimit-Limit", 0))
+        self.remaining = int(headers["X-RateLimit-Remaining"])
+        self.reset = float(headers.get("X-RateLimit-Reset", 0))
+        self.resource = headers.get("X-RateLimit-Resource")
+
+    def seconds_until_reset(self, now: Optional[float] = None) -> float:
+        if self.reset is None:
+            return 0.0
+        return max(0.0, self.reset - (now if now is not None else time.time()))
+
+    def as_dict(self) -> dict:
+        return {"limit": self.limit, "remaining": self.remaining, "reset": self.reset, "resource": self.resource}
+
+
+class GitHubClient:
+    """
+    GitHub REST client on top of the shared HttpClient.
+
+    Tracks primary rate-limit headroom from response headers and waits out short resets,
+    retries secondary rate limits (403/429 with Retry-After or an exhausted quota) with
+    bounded waits, and caps concurrent API calls so many workflow dispatches and status
+    polls can run together (GITHUB_MAX_CONCURRENCY unless given). GET requests can be made
+    conditional with ETags.
+    """
+
+    def __init__(
+        self,
+        http: HttpClient = shared_http,
+        token: Optional[str] = None,
+        api_url: str = GITHUB_API_URL,
+        max_concurrency: Optional[int] = None,
+        max_retries: int = 3,
+        max_retry_wait: float = 60.0,
+        max_etags: int = 1024,
+    ):
+        self.http = http
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.max_retries = max_retries
+        self.max_retry_wait = max_retry_wait
+        self.rate_limit = RateLimit()
+        self._semaphore = asyncio.Semaphore(max_concurrency or get_settings().github_max_concurrency)
+        self.max_etags = max_etags
+        self._etags: dict[str, tuple[str, object]] = {}
+
+    def _headers(self, accept: str = "application/vnd.github+json", extra: Optional[dict] = None) -> dict:
+        headers = {"Accept": accept, "X-GitHub-Api-Version": "2022-11-28"}
+        if self.token:
+            headers["Authorization"] = f"token {self.token}"
+        if extra:
+            headers.update(extra)
+        return headers
+
+    def _retry_delay(self, status: int, headers, body: str, attempt: int) -> Optional[float]:
+        """Seconds to wait before retrying a rate-limited response, or None if it is not one."""
+        if status not in (403, 429):
+            return None
+        retry_after = headers.get("Retry-After")
+        if retry_after is not None:
+            return float(retry_after)
+        if headers.get("X-RateLimit-Remaining") == "0":
+            return self.rate_limit.seconds_until_reset()
+        if "secondary rate limit" in body.lower():
+            # GitHub asks for at least a minute when no Retry-After is given.
+            return 60.0 * (2 ** attempt)
+        return None
+
+    async def request(self, method: str, path: str, *, accept: str = "application/vnd.github+json", headers=None, max_body: Optional[int] = None, **kwargs):
+        """
+        Send a request and return (status, headers, body). Non-2xx/304 responses are returned,
+        not raised, so callers decide what a failure means; rate limits are retried here.
+        """
+        url = path if path.startswith("http") else f"{self.api_url}{path}"
+        attempt = 0
+        while True:
+            if self.rate_limit.remaining == 0:
+                wait = self.rate_limit.seconds_until_reset()
+                if wait > self.max_retry_wait:
+                    raise GitHubAPIError(403, f"rate limit exhausted, resets in {wait:.0f}s")
+                await asyncio.sleep(wait)
+
+            async with self._semaphore:
+                async with self.http.session.request(method, url, headers=self._headers(accept, headers), **kwargs) as resp:
+                    self.rate_limit.update(resp.headers)
+                    if max_body is not None:
+                        body = await resp.content.read(max_body + 1)
+                    else:
+                        body = await resp.read()
+                    status, resp_headers = resp.status, resp.headers
+
+            delay = self._retry_delay(status, resp_headers, body[:2048].decode("utf-8", "replace"), attempt)
+            if delay is None or attempt >= self.max_retries or delay > self.max_retry_wait:
+                return status, resp_headers, body
+            logger.warning("Rate limited on %s %s; retrying in %.0fs", method, path, delay)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def get_json(self, path: str, conditional: bool = False, **kwargs):
+        """GET and decode JSON. With conditional=True, unchanged resources are served from the ETag cache."""
+        cache_key = f"{path}?{sorted(kwargs.get('params', {}).items())}"
+        extra = {}
+        cached = self._etags.get(cache_key) if conditional else None
+        if cached:
+            extra["If-None-Match"] = cached[0]
+        status, headers, body = await self.request("GET", path, headers=extra, **kwargs)
+        if status == 304 and cached:
+            return cached[1]
+        if status != 200:
+            raise GitHubAPIError(status, body[:200].decode("utf-8", "replace"))
+        payload = json.loads(body)
+        etag = headers.get("ETag")
+        if conditional and etag:
+            self._etags.pop(cache_key, None)
+            self._etags[cache_key] = (etag, payload)
+            if len(self._etags) > self.max_etags:
+                self._etags.pop(next(iter(self._etags)))
+        return payload
+
+    async def get_raw(self, path: str, max_bytes: int, **kwargs) -> Optional[str]:
+        """Raw file contents via the contents API, or None if missing or larger than max_bytes."""
+        status, _, body = await self.request("GET", path, accept="application/vnd.github.raw", max_body=max_bytes, **kwargs)
+        if status != 200 or len(body) > max_bytes:
+            return None
+        return body.decode("utf-8", errors="replace")
+
+    async def warm_up(self) -> None:
+        """Open a pooled connection to the API and read the current rate limit (free of quota)."""
+        status, _, _ = await self.request("GET", "/rate_limit")
+        if status != 200:
+            logger.warning("Warm-up request returned HTTP %s", status)
+
+    async def dispatch_workflow(self, repo: str, workflow_id: str, ref: str = "main", inputs: Optional[dict] = None):
+        payload = {"ref": ref}
+        if inputs:
+            payload["inputs"] = inputs
+        status, _, body = await self.request(
+            "POST", f"/repos/{repo}/actions/workflows/{workflow_id}/dispatches", json=payload
+        )
+        return status, body.decode("utf-8", errors="replace")
+
+    async def list_workflow_runs(self, repo: str, workflow_id: Optional[str] = None, conditional: bool = False,
+                                 **params) -> list[dict]:
+        path = f"/repos/{repo}/actions/workflows/{workflow_id}/runs" if workflow_id else f"/repos/{repo}/actions/runs"
+        payload = await self.get_json(path, conditional=conditional, params=params)
+        return payload.get("workflow_runs", [])
+
+    async def get_workflow_run(self, repo: str, run_id: int, conditional: bool = False) -> dict:
+        return await self.get_json(f"/repos/{repo}/actions/runs/{run_id}", conditional=conditional)
+
+    async def dispatch_many(self, dispatches: list[tuple[str, str, str]]) -> list:
+        """Dispatch several (repo, workflow_id, ref) workflows concurrently; results keep input order."""
+        return await asyncio.gather(
+            *(self.dispatch_workflow(repo, workflow_id, ref) for repo, workflow_id, ref in dispatches),
+            return_exceptions=True,
+        )
+
+
+# Shared GitHub client for deploys and repository inspection; the startup hook sets its token.
+github_client = GitHubClient()
+
+
+@registry.register_collector
+def _github_metrics():
+    rate_limit = github_client.rate_limit
+    if rate_limit.remaining is not None:
+        labels = {"resource": rate_limit.resource or "core"}
+        yield "bot_github_rate_limit_remaining", "GitHub API requests left in the current window.", labels, rate_limit.remaining
+        yield "bot_github_rate_limit_limit", "GitHub API requests allowed per window.", labels, rate_limit.limit
+        yield ("bot_github_rate_limit_reset_seconds", "Seconds until the GitHub rate-limit window resets.",
+               labels, rate_limit.seconds_until_reset())
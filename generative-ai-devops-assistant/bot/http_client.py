@@ -0,0 +1,54 @@
+# bot/http_client.py
+from typing import Optional
+import aiohttp
+from bot.config import get_settings
+
+
+class HttpClient:
+    """
+    Bot-owned aiohttp session shared by every outbound HTTP call.
+
+    The connector keeps connections alive between requests, caches DNS lookups and caps
+    connections overall and per host (HTTP_MAX_CONNECTIONS and HTTP_MAX_CONNECTIONS_PER_HOST
+    unless given), so GitHub API calls and attachment downloads reuse warm TCP/TLS
+    connections instead of paying a fresh handshake each time. The session is created lazily
+    inside the running event loop and closed by the bot on shutdown.
+    """
+
+    def __init__(
+        self,
+        limit: Optional[int] = None,
+        limit_per_host: Optional[int] = None,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30,
+        connect_timeout: float = 10,
+        read_timeout: float = 60,
+    ):
+        settings = get_settings()
+        self.limit = settings.http_max_connections if limit is None else limit
+        self.limit_per_host = settings.http_max_connections_per_host if limit_per_host is None else limit_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.timeout = aiohttp.ClientTimeout(total=None, connect=connect_timeout, sock_read=read_timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_cache_ttl,
+                keepalive_timeout=self.keepalive_timeout,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+# Shared client for the whole bot.
+shared_http = HttpClient()
@@ -1,40 +1,465 @@
-import google.generativeai as genai
-from bot.config import GEMINI_API_KEY
-from bot.utils import run_blocking_io
-
-genai.configure(api_key=GEMINI_API_KEY)
-
-def _sync_get_gemini_response(user_question: str) -> str:
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    system_prompt = (
-        "You are a senior DevOps engineer assisting developers with DevOps, "
-        "cloud, and software engineering questions. Provide concise, accurate answers using best practices."
-    )
-    prompt = f"{system_prompt}\nUser: {user_question.strip()}"
+import asyncio
+import logging
+import random
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+from bot.config import get_settings
+from bot.cache import ResponseCache, make_cache_key
+from bot.metrics import registry
+from bot.prompts import prompt_registry
+from bot.providers import CHAT, GENERATION, LLMRouter, OpenAICompatibleBackend, Provider, parse_route
+from bot.scheduler import SchedulerRejected, scheduler
+from bot.semantic_cache import SemanticCache
+from bot.tracing import stage
+from bot.singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def _status_code(exc: BaseException) -> Optional[int]:
+    """Best-effort HTTP status for SDK (google.api_core) and HTTP client exceptions."""
+    for attr in ("code", "status_code", "status"):
+        value = getattr(exc, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    if isinstance(exc, asyncio.TimeoutError):
+        return True
+    return _status_code(exc) in RETRYABLE_STATUS_CODES
+
+
+class GeminiBackend:
+    """
+    Calls Gemini through the SDK's native async API. Models are built once per name and reused.
+    The SDK takes most of a second to import, so it is imported and configured on first use.
+    """
+
+    def __init__(self, api_key: Optional[str] = None):
+        self.api_key = api_key
+        self._genai = None
+        self._models: dict[str, object] = {}
+
+    def _sdk(self):
+        if self._genai is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._genai = genai
+        return self._genai
+
+    def get_model(self, model_name: str):
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._sdk().GenerativeModel(model_name)
+            self._models[model_name] = model
+        return model
+
+    async def warm_up(self, model_name: str) -> None:
+        """Import the SDK and build the model off the event loop."""
+        await asyncio.to_thread(self.get_model, model_name)
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        response = await self.get_model(model_name).generate_content_async(prompt)
+        return response.text
+
+    async def stream(self, prompt: str, model_name: str) -> AsyncIterator[str]:
+        response = await self.get_model(model_name).generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. finish/safety metadata) carry nothing to show.
+                continue
+            if text:
+                yield text
+
+
+class FakeBackend:
+    """
+    Local stand-in for tests and benchmarks. Replies with `reply(prompt)` after `latency` seconds;
+    queued exceptions in `errors` are raised first, one per call. Streaming splits the reply
+    into `chunk_size` pieces, waiting `chunk_latency` seconds before each.
+    """
+
+    def __init__(self, reply=None, latency: float = 0.0, errors=None, chunk_size: int = 16, chunk_latency: float = 0.0):
+        self.reply = reply or (lambda prompt: f"echo: {prompt}")
+        self.latency = latency
+        self.errors = list(errors or [])
+        self.chunk_size = chunk_size
+        self.chunk_latency = chunk_latency
+        self.calls: list[tuple[str, str]] = []
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        self.calls.append((prompt, model_name))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.reply(prompt)
+
+    async def stream(self, prompt: str, model_name: str) -> AsyncIterator[str]:
+        text = await self.generate(prompt, model_name)
+        for start in range(0, len(text), self.chunk_size):
+            if self.chunk_latency:
+                await asyncio.sleep(self.chunk_latency)
+            yield text[start:start + self.chunk_size]
+
+
+class LLMClient:
+    """
+    Async LLM client with bounded concurrency.
+
+    A semaphore caps how many requests are in flight at once, each attempt gets its own
+    timeout, and 429/5xx/timeout failures are retried with full-jitter exponential backoff.
+    The semaphore is released while backing off so retries never hold a slot idle.
+    """
+
+    def __init__(
+        self,
+        backend,
+        model_name: str = GEMINI_MODEL_NAME,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+    ):
+        settings = get_settings()
+        if max_concurrency is None:
+            max_concurrency = settings.llm_max_concurrency
+        self.backend = backend
+        self.model_name = model_name
+        self.max_concurrency = max_concurrency
+        self.timeout = settings.llm_request_timeout_seconds if timeout is None else timeout
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+
+    def _backoff_delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def generate(self, prompt: str, model_name: Optional[str] = None) -> str:
+        model_name = model_name or self.model_name
+        attempt = 0
+        while True:
+            try:
+                return await self._attempt(prompt, model_name)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning("Retrying after %s (attempt %d) in %.2fs", type(e).__name__, attempt + 1, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def stream(self, prompt: str, model_name: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Yield response text as the backend produces it. The timeout applies to the wait for
+        each chunk, and retries only happen before the first chunk has been yielded.
+        """
+        model_name = model_name or self.model_name
+        attempt = 0
+        while True:
+            yielded = False
+            try:
+                async with self._slot():
+                    chunks = self.backend.stream(prompt, model_name)
+                    try:
+                        while True:
+                            try:
+                                chunk = await asyncio.wait_for(chunks.__anext__(), self.timeout)
+                            except StopAsyncIteration:
+                                return
+                            yielded = True
+                            yield chunk
+                    finally:
+                        await chunks.aclose()
+            except Exception as e:
+                if yielded or attempt >= self.max_retries or not is_retryable_error(e):
+                    raise
+                delay = self._backoff_delay(attempt)
+                logger.warning("Retrying stream after %s (attempt %d) in %.2fs", type(e).__name__, attempt + 1, delay)
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def _slot(self):
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def warm_up(self) -> None:
+        """Let the backend load whatever it would otherwise load on the first request."""
+        warm_up = getattr(self.backend, "warm_up", None)
+        if warm_up is not None:
+            await warm_up(self.model_name)
+
+    async def _attempt(self, prompt: str, model_name: str) -> str:
+        async with self._slot():
+            return await asyncio.wait_for(self.backend.generate(prompt, model_name), self.timeout)
+
+
+# One client per provider, each with its own concurrency limit. The startup hook swaps in
+# credentials from the loaded Settings.
+_settings = get_settings()
+llm_client = LLMClient(GeminiBackend())
+openai_client = LLMClient(OpenAICompatibleBackend(_settings.openai_base_url), model_name="gpt-4o-mini",
+                          max_concurrency=_settings.openai_max_concurrency)
+fake_client = LLMClient(FakeBackend(), model_name="fake")
+
+
+def _provider(name: str, client: LLMClient) -> Provider:
+    return Provider(name, client, max_error_rate=_settings.llm_failover_error_rate,
+                    max_latency=_settings.llm_failover_latency_seconds,
+                    cooldown=_settings.llm_failover_cooldown_seconds)
+
+
+# Picks provider and model per request type and fails over between providers.
+router = LLMRouter(
+    [_provider("gemini", llm_client), _provider("openai", openai_client), _provider("fake", fake_client)],
+    {CHAT: parse_route(_settings.llm_chat_route), GENERATION: parse_route(_settings.llm_generation_route)},
+)
+
+# Shared response cache for all handlers; responses that are error fallbacks are never stored.
+response_cache = ResponseCache(
+    ttl_seconds=_settings.llm_cache_ttl_seconds,
+    max_bytes=_settings.llm_cache_max_bytes,
+    disk_path=_settings.llm_cache_path,
+)
+
+# First #chatbot questions, matched by meaning; follow-ups depend on their conversation and skip it.
+semantic_cache = SemanticCache(
+    path=_settings.semantic_cache_path,
+    capacity=_settings.semantic_cache_max_entries,
+    dim=_settings.semantic_cache_dim,
+    threshold=_settings.semantic_cache_threshold,
+    ttl_seconds=_settings.semantic_cache_ttl_seconds,
+)
+
+# Concurrent identical prompts share one in-flight LLM call.
+inflight_requests = SingleFlight()
+
+def _build_chat_prompt(user_question: str, history: str = "") -> str:
+    if history:
+        return prompt_registry.render("chat.followup", history=history, question=user_question.strip())
+    return prompt_registry.render("chat", question=user_question.strip())
+
+class ErrorReply(str):
+    """The text returned instead of an answer when the model call fails or comes back empty."""
+
+
+def is_error_reply(text: str) -> bool:
+    """True for ErrorReply fallbacks, which are never cached; an answer that starts with "Sorry" is fine."""
+    return not text or isinstance(text, ErrorReply)
+
+
+async def _generate_chat_response(prompt: str, purpose: str = CHAT) -> str:
     try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+        text = (await router.generate(prompt, purpose)).strip()
         if not text:
-            return "Sorry, I couldn't generate a response. Please try rephrasing your question."
+            return ErrorReply("Sorry, I couldn't generate a response. Please try rephrasing your question.")
         return text
     except Exception as e:
-        print(f"[llm_client] Error fetching Gemini response: {e}")
-        return "Sorry, I encountered an internal error while processing your request. Please try again later."
+        logger.error("Error fetching LLM response: %s", e)
+        return ErrorReply("Sorry, I encountered an internal error while processing your request. Please try again later.")
 
-def _sync_get_gemini_file_response(prompt: str) -> str:
-    model = genai.GenerativeModel('gemini-2.5-flash')
+async def _generate_file_response(prompt: str, purpose: str = GENERATION) -> str:
     try:
-        response = model.generate_content(prompt)
-        text = response.text.strip()
+        text = (await router.generate(prompt, purpose)).strip()
         if not text:
-            return "Sorry, no content was generated."
+            return ErrorReply("Sorry, no content was generated.")
         return text
     except Exception as e:
-        print(f"[llm_client] Error fetching Gemini file response: {e}")
-        return "Sorry, I encountered an error generating your file."
+        logger.error("Error fetching LLM file response: %s", e)
+        return ErrorReply("Sorry, I encountered an error generating your file.")
+
+def _caching(use_cache: bool) -> bool:
+    return use_cache and get_settings().llm_cache_enabled
+
+def _semantic_caching(use_cache: bool, history: str) -> bool:
+    return (_caching(use_cache) and get_settings().semantic_cache_enabled and not history
+            and semantic_cache.available)
+
+async def _semantic_lookup(user_question: str) -> Optional[str]:
+    # The search and the sqlite read run off the event loop; the first one also imports numpy.
+    # A broken cache must not fail the question, so any error is a miss and the model answers.
+    try:
+        with stage("semantic_cache"):
+            return await asyncio.to_thread(semantic_cache.lookup, user_question, router.primary(CHAT).model)
+    except Exception as e:
+        logger.warning("Semantic cache lookup failed, asking the model: %s", e)
+        semantic_cache.stats.misses += 1
+        return None
+
+async def _semantic_store(user_question: str, text: str) -> None:
+    try:
+        await asyncio.to_thread(semantic_cache.add, user_question, text, router.primary(CHAT).model)
+    except Exception as e:
+        logger.warning("Could not store the answer in the semantic cache: %s", e)
+
+async def _cached_call(prompt: str, use_cache: bool, generate, purpose: str) -> str:
+    """
+    Serve from the response cache when allowed, otherwise call the model and store the result.
+    Cache misses for the same prompt are coalesced so only one request reaches the provider.
+    Entries are keyed by the route's preferred model, whichever provider ends up answering.
+    """
+    key = make_cache_key(prompt, router.primary(purpose).model)
+    caching = _caching(use_cache)
+    if caching:
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            return cached
+
+    async def fetch() -> str:
+        # Only cache misses queue for the model; the scheduler attributes the call to the
+        # request context of whichever caller started the flight.
+        async with scheduler.slot():
+            with stage("llm_call"):
+                text = await generate(prompt, purpose)
+        if caching and not is_error_reply(text):
+            await response_cache.aset(key, text)
+        return text
+
+    # Cached and uncached callers must not share a flight, or an opted-out handler could
+    # still populate the cache.
+    flight_key = key if caching else f"nocache:{key}"
+    return await inflight_requests.do(flight_key, fetch)
+
+async def get_gemini_response(user_question: str, use_cache: bool = True, history: str = "",
+                              on_answer: Optional[Callable[[str], None]] = None) -> str:
+    """
+    Answer a #chatbot question, after `history` (the conversation so far) if given.
+    `on_answer` is called with the answer unless it is an error reply. A first question that
+    only rewords an answered one gets the stored answer from the semantic cache.
+    """
+    semantic = _semantic_caching(use_cache, history)
+    text = await _semantic_lookup(user_question) if semantic else None
+    if text is None:
+        text = await _cached_call(_build_chat_prompt(user_question, history), use_cache, _generate_chat_response, CHAT)
+        if semantic and not is_error_reply(text):
+            await _semantic_store(user_question, text)
+    if on_answer is not None and not is_error_reply(text):
+        on_answer(text)
+    return text
+
+async def get_gemini_file_response(prompt: str, use_cache: bool = True, purpose: str = GENERATION) -> str:
+    return await _cached_call(prompt, use_cache, _generate_file_response, purpose)
+
+async def stream_gemini_response(user_question: str, use_cache: bool = True, history: str = "",
+                                 on_answer: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+    """
+    Stream a chat answer chunk by chunk. Cache hits are yielded in one piece; a completed,
+    successful stream is stored in the cache and passed to `on_answer`. Errors are reported
+    as text, never raised.
+    """
+    prompt = _build_chat_prompt(user_question, history)
+    key = make_cache_key(prompt, router.primary(CHAT).model)
+    caching = _caching(use_cache)
+    if caching:
+        cached = await response_cache.aget(key)
+        if cached is None and _semantic_caching(use_cache, history):
+            cached = await _semantic_lookup(user_question)
+        if cached is not None:
+            yield cached
+            if on_answer is not None:
+                on_answer(cached)
+            return
+
+    # The provider is read into a queue by its own task, which alone holds the scheduler slot:
+    # the caller's Discord edits are paced by the outbox and must neither keep the slot busy
+    # nor count towards the latency that load shedding watches.
+    chunks: asyncio.Queue = asyncio.Queue()
+
+    async def produce() -> None:
+        try:
+            async with scheduler.slot():
+                with stage("llm_stream"):
+                    async for chunk in router.stream(prompt, CHAT):
+                        chunks.put_nowait(chunk)
+        except Exception as e:
+            chunks.put_nowait(e)
+        else:
+            chunks.put_nowait(None)
+
+    parts: list[str] = []
+    producer = asyncio.create_task(produce())
+    try:
+        while (chunk := await chunks.get()) is not None:
+            if isinstance(chunk, SchedulerRejected):
+                # Propagates so the handler can tell the user why.
+                raise chunk
+            if isinstance(chunk, Exception):
+                logger.error("Error streaming LLM response: %s", chunk)
+                if parts:
+                    yield "\n\n(The response was interrupted. Please try again.)"
+                else:
+                    yield "Sorry, I encountered an internal error while processing your request. Please try again later."
+                return
+            parts.append(chunk)
+            yield chunk
+    finally:
+        # A caller that stops reading early also stops the provider and frees the slot.
+        producer.cancel()
+
+    text = "".join(parts).strip()
+    if not text:
+        yield "Sorry, I couldn't generate a response. Please try rephrasing your question."
+        return
+    if caching:
+        await response_cache.aset(key, text)
+        if _semantic_caching(use_cache, history):
+            await _semantic_store(user_question, text)
+    if on_answer is not None:
+        on_answer(text)
 
-async def get_gemini_response(user_question: str) -> str:
-    return await run_blocking_io(_sync_get_gemini_response, user_question)
+async def summarize_conversation(prompt: str) -> str:
+    """One background summary for conversation memory; failures raise instead of returning text."""
+    async with scheduler.slot():
+        with stage("llm_summary"):
+            return (await router.generate(prompt, CHAT)).strip()
 
-async def get_gemini_file_response(prompt: str) -> str:
-    return await run_blocking_io(_sync_get_gemini_file_response, prompt)
+@registry.register_collector
+def _llm_metrics():
+    stats = response_cache.stats
+    yield "bot_llm_cache_hits", "Response cache hits (memory and disk).", {}, stats.hits
+    yield "bot_llm_cache_misses", "Response cache misses.", {}, stats.misses
+    yield "bot_llm_cache_disk_hits", "Response cache hits served from the sqlite tier.", {}, stats.disk_hits
+    yield "bot_llm_cache_evictions", "Response cache evictions.", {}, stats.evictions
+    yield "bot_llm_cache_hit_ratio", "Response cache hit ratio since start.", {}, stats.hit_rate
+    yield "bot_llm_cache_bytes", "Bytes held by the in-memory response cache.", {}, response_cache.size_bytes
+    semantic = semantic_cache.stats
+    yield "bot_llm_semantic_cache_hits", "Chat questions answered from the semantic cache.", {}, semantic.hits
+    yield "bot_llm_semantic_cache_misses", "Chat questions with no close enough cached question.", {}, semantic.misses
+    yield "bot_llm_semantic_cache_evictions", "Semantic cache entries replaced or expired.", {}, semantic.evictions
+    yield "bot_llm_semantic_cache_entries", "Questions held by the semantic cache.", {}, len(semantic_cache)
+    yield "bot_llm_coalesced_calls", "Calls that joined an identical in-flight request.", {}, inflight_requests.coalesced
+    yield "bot_llm_failovers", "Calls retried on the next provider in their route.", {}, router.failovers
+    for name, provider in router.providers.items():
+        labels = {"provider": name}
+        stats = provider.stats
+        yield "bot_llm_in_flight", "LLM requests currently running.", labels, provider.client.in_flight
+        yield "bot_llm_waiting", "LLM requests waiting for the provider's semaphore.", labels, provider.client.waiting
+        yield "bot_llm_provider_calls", "Calls made to the provider.", labels, stats.calls
+        yield "bot_llm_provider_failures", "Calls that failed after the provider's retries.", labels, stats.failures
+        yield "bot_llm_provider_tokens", "Estimated input and output tokens.", {**labels, "direction": "input"}, stats.input_tokens
+        yield "bot_llm_provider_tokens", "Estimated input and output tokens.", {**labels, "direction": "output"}, stats.output_tokens
+        yield "bot_llm_provider_cost_usd", "Estimated spend at list prices.", labels, stats.cost
+        yield "bot_llm_provider_latency_seconds", "Smoothed call latency.", labels, stats.latency
+        yield "bot_llm_provider_available", "1 while the provider is in rotation.", labels, int(provider.available)
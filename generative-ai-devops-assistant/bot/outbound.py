@@ -0,0 +1,438 @@
+# bot/outbound.py
+import asyncio
+import io
+import logging
+import re
+import time
+from collections import OrderedDict, deque
+from typing import Optional, Union
+import aiohttp
+import discord
+from bot.config import get_settings
+from bot.metrics import registry
+from bot.scheduler import TokenBucket, current_request
+
+logger = logging.getLogger(__name__)
+
+# Everything the bot posts in Discord goes through the outbox instead of channel.send. Each
+# channel has its own queue and worker, so a channel that is being paced or retried never holds
+# up another one. While one call is in flight, the messages queued behind it are combined:
+# - consecutive status lines of one request ("Please wait...") become edits of one message, and
+#   a status line still queued when the request's reply is queued is never sent;
+# - queued replies to one request are merged into one message within Discord's limits;
+# - queued edits of one message collapse into the last.
+
+MAX_CONTENT_LEN = 2000
+
+SEND, STATUS, EDIT = "send", "status", "edit"
+
+DISCORD_CALLS = registry.counter("bot_discord_calls_total", "Message sends and edits made by the outbox.", ("kind",))
+DISCORD_CALLS_SAVED = registry.counter(
+    "bot_discord_calls_saved_total",
+    "Sends and edits the outbox avoided: merged replies, coalesced statuses and edits, superseded statuses.",
+    ("reason",))
+DISCORD_RATE_LIMITED = registry.counter("bot_discord_rate_limited_total", "Discord 429 responses seen by the outbox.")
+
+_MESSAGES_PATH_RE = re.compile(r"/channels/(\d+)/messages(/\d+)?$")
+_MENTION_RE = re.compile(r"<@!?\d+> ")
+
+# Default for `key`: the user of the request being handled.
+_CURRENT = object()
+
+
+class Attachment:
+    """
+    A file to upload, encoded once. Every upload of it, retries included, reads the same bytes:
+    a BytesIO made from bytes shares their buffer instead of copying it.
+    """
+
+    __slots__ = ("filename", "data")
+
+    def __init__(self, filename: str, data: Union[str, bytes]):
+        self.filename = filename
+        self.data = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def to_file(self) -> discord.File:
+        return discord.File(io.BytesIO(self.data), filename=self.filename)
+
+
+class _Item:
+    __slots__ = ("kind", "channel", "key", "content", "attachments", "kwargs", "message", "merge", "waiters")
+
+    def __init__(self, kind: str, channel, key, content: Optional[str] = None, attachments: tuple = (),
+                 kwargs: Optional[dict] = None, message=None, merge: bool = False):
+        self.kind = kind
+        self.channel = channel
+        self.key = key
+        self.content = content
+        self.attachments = attachments
+        self.kwargs = kwargs or {}
+        self.message = message
+        self.merge = merge and kind == SEND and not self.kwargs
+        self.waiters: list[asyncio.Future] = []
+
+
+class _Pacer:
+    """One Discord rate-limit bucket: the sends, or the edits, of one channel."""
+
+    __slots__ = ("bucket", "hold_until")
+
+    def __init__(self, burst: int, window: float, now: float):
+        self.bucket = TokenBucket(burst / window, burst, now) if burst > 0 and window > 0 else None
+        self.hold_until = 0.0
+
+    def wait_time(self, now: float) -> float:
+        wait = self.hold_until - now
+        if self.bucket is not None:
+            wait = max(wait, self.bucket.wait_time(now))
+        return max(0.0, wait)
+
+    def take(self, now: float) -> None:
+        if self.bucket is not None:
+            self.bucket.try_acquire(now)
+
+    def observe(self, remaining: int, reset_after: float, now: float) -> None:
+        """Discord's own count can only slow the bucket down; an empty one is held until it resets."""
+        if self.bucket is not None:
+            self.bucket.wait_time(now)
+            self.bucket.tokens = min(self.bucket.tokens, remaining)
+        if remaining <= 0:
+            self.hold_until = max(self.hold_until, now + reset_after)
+
+    def is_idle(self, now: float) -> bool:
+        return self.hold_until <= now and (self.bucket is None or self.bucket.is_full(now))
+
+
+def _retry_after(error: Exception) -> tuple[float, bool]:
+    """Seconds to wait after a 429, and whether the limit was the global one."""
+    if isinstance(error, discord.RateLimited):
+        return error.retry_after, False
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        seconds = float(headers.get("Retry-After") or headers.get("X-RateLimit-Reset-After") or 1.0)
+    except ValueError:
+        seconds = 1.0
+    return seconds, bool(headers.get("X-RateLimit-Global"))
+
+
+def _join(parts: list[str]) -> Optional[str]:
+    """Merged message text; a mention repeated at the start of later parts is dropped."""
+    parts = [part for part in parts if part]
+    if not parts:
+        return None
+    mention = _MENTION_RE.match(parts[0])
+    if mention:
+        prefix = mention.group()
+        parts = parts[:1] + [part[len(prefix):] if part.startswith(prefix) else part for part in parts[1:]]
+    return "\n".join(parts)
+
+
+class Outbox:
+    """
+    Per-channel outbound queues for Discord messages.
+
+    Sends and edits in a channel are paced with a token bucket each (Discord's documented
+    per-channel limit by default). Discord's X-RateLimit headers tighten the buckets: when
+    `trace_config()` is passed to the client, every response reports what is left. A 429 that
+    reaches the outbox holds the bucket for its Retry-After and is retried. Limits left as None
+    come from the OUTBOUND_* settings.
+    """
+
+    def __init__(self, burst: Optional[int] = None, window: Optional[float] = None,
+                 max_files: Optional[int] = None, max_upload_bytes: Optional[int] = None,
+                 max_retries: Optional[int] = None, max_tracked: int = 10000, clock=time.monotonic):
+        settings = get_settings()
+        self.burst = settings.outbound_channel_burst if burst is None else burst
+        self.window = settings.outbound_channel_window_seconds if window is None else window
+        self.max_files = settings.outbound_max_files if max_files is None else max_files
+        self.max_upload_bytes = settings.outbound_max_upload_bytes if max_upload_bytes is None else max_upload_bytes
+        self.max_retries = settings.outbound_max_retries if max_retries is None else max_retries
+        self.max_tracked = max_tracked
+        self._clock = clock
+        self._queues: dict[int, deque] = {}
+        self._workers: dict[int, asyncio.Task] = {}
+        self._pacers: dict[tuple[int, str], _Pacer] = {}
+        # (channel id, key) -> the status message later status lines of that request edit.
+        self._status: OrderedDict[tuple, object] = OrderedDict()
+        self._global_hold = 0.0
+        self.calls = {SEND: 0, EDIT: 0}
+        self.saved = {"merged": 0, "coalesced": 0, "superseded": 0}
+        self.rate_limited = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    @staticmethod
+    def _channel_id(channel) -> int:
+        channel_id = getattr(channel, "id", None)
+        return channel_id if channel_id is not None else id(channel)
+
+    @staticmethod
+    def _key(key):
+        if key is not _CURRENT:
+            return key
+        request = current_request.get()
+        return request.user_id if request is not None else None
+
+    async def send(self, channel, content: Optional[str] = None, attachments=(), key=_CURRENT, merge: bool = True,
+                   **kwargs):
+        """
+        Post `content` with `attachments` in `channel` after what is already queued there, and
+        return the message. Replies queued together for the same `key` (by default the current
+        request's user) are sent as one message, which every merged caller gets back; pass
+        `merge=False` for a message that will be edited later. More than the per-message file
+        limit is split over several messages. Other keyword arguments go to channel.send, and
+        such sends are never merged.
+        """
+        item = _Item(SEND, channel, self._key(key), content, tuple(attachments), kwargs, merge=merge)
+        future = asyncio.get_running_loop().create_future()
+        item.waiters.append(future)
+        self._enqueue(item)
+        return await future
+
+    def status(self, channel, content: str, key=_CURRENT) -> None:
+        """
+        Show a progress line for the current request without waiting for it to be posted. The
+        first status line is sent and later ones edit it, until the request's next reply.
+        """
+        self._enqueue(_Item(STATUS, channel, self._key(key), content))
+
+    async def edit(self, message, content: str) -> None:
+        """Edit `message` in turn with the rest of its channel; queued edits of one message collapse into the last."""
+        item = _Item(EDIT, getattr(message, "channel", None) or message, None, content, message=message)
+        future = asyncio.get_running_loop().create_future()
+        item.waiters.append(future)
+        self._enqueue(item)
+        await future
+
+    async def flush(self) -> None:
+        """Wait until everything queued so far has been delivered or has failed."""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()), return_exceptions=True)
+
+    def _enqueue(self, item: _Item) -> None:
+        channel_id = self._channel_id(item.channel)
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = deque()
+        if not self._coalesce(queue, item):
+            queue.append(item)
+        if channel_id not in self._workers:
+            self._workers[channel_id] = asyncio.get_running_loop().create_task(self._drain(channel_id, queue))
+
+    def _coalesce(self, queue: deque, item: _Item) -> bool:
+        """Fold `item` into what is queued; True when nothing is left to queue."""
+        if item.kind == EDIT:
+            for queued in queue:
+                if queued.kind == EDIT and queued.message is item.message:
+                    queued.content = item.content
+                    queued.waiters.extend(item.waiters)
+                    self._saved("coalesced")
+                    return True
+            return False
+        for queued in list(queue):
+            if queued.kind == STATUS and queued.key == item.key and queued.channel is item.channel:
+                if item.kind == STATUS:
+                    queued.content = item.content
+                    self._saved("coalesced")
+                    return True
+                # The reply makes the status line out of date before anyone saw it.
+                queue.remove(queued)
+                self._saved("superseded")
+        return False
+
+    def _saved(self, reason: str, count: int = 1) -> None:
+        self.saved[reason] += count
+        DISCORD_CALLS_SAVED.labels(reason).inc(count)
+
+    async def _drain(self, channel_id: int, queue: deque) -> None:
+        batch: list[_Item] = []
+        try:
+            while queue:
+                batch = [queue.popleft()]
+                if batch[0].merge:
+                    self._take_mergeable(queue, batch)
+                try:
+                    result = await self._deliver(channel_id, batch)
+                except Exception as e:
+                    if not any(item.waiters for item in batch):
+                        logger.warning("Could not post a status in channel %s: %s", channel_id, e)
+                    for item in batch:
+                        for waiter in item.waiters:
+                            if not waiter.done():
+                                waiter.set_exception(e)
+                else:
+                    for item in batch:
+                        for waiter in item.waiters:
+                            if not waiter.done():
+                                waiter.set_result(result)
+                batch = []
+        finally:
+            # Normally the queue is empty here; after a cancellation nobody is left to send the rest.
+            for item in batch + list(queue):
+                for waiter in item.waiters:
+                    waiter.cancel()
+            queue.clear()
+            del self._workers[channel_id]
+            if self._queues.get(channel_id) is queue:
+                del self._queues[channel_id]
+
+    def _take_mergeable(self, queue: deque, batch: list[_Item]) -> None:
+        first = batch[0]
+        files = len(first.attachments)
+        size = sum(attachment.size for attachment in first.attachments)
+        length = len(first.content or "")
+        while queue:
+            item = queue[0]
+            if not item.merge or item.channel is not first.channel or item.key != first.key:
+                break
+            files += len(item.attachments)
+            size += sum(attachment.size for attachment in item.attachments)
+            length += 1 + len(item.content or "")
+            if files > self.max_files or size > self.max_upload_bytes or length > MAX_CONTENT_LEN:
+                break
+            batch.append(queue.popleft())
+        if len(batch) > 1:
+            self._saved("merged", len(batch) - 1)
+
+    async def _deliver(self, channel_id: int, batch: list[_Item]):
+        first = batch[0]
+        if first.kind == EDIT:
+            await self._call(channel_id, EDIT, lambda: first.message.edit(content=first.content))
+            return first.message
+
+        slot = (channel_id, first.key)
+        if first.kind == STATUS:
+            message = self._status.get(slot)
+            if message is not None:
+                try:
+                    await self._call(channel_id, EDIT, lambda: message.edit(content=first.content))
+                    self._status.move_to_end(slot)
+                    return message
+                except discord.NotFound:
+                    pass  # Deleted meanwhile: post a new one.
+            message = await self._call(channel_id, SEND, lambda: first.channel.send(first.content))
+            self._status[slot] = message
+            if len(self._status) > self.max_tracked:
+                self._status.popitem(last=False)
+            return message
+
+        # The request's next status line starts a new message below this reply.
+        self._status.pop(slot, None)
+        content = _join([item.content for item in batch])
+        chunks = self._chunks([attachment for item in batch for attachment in item.attachments])
+        message = None
+        for index, chunk in enumerate(chunks):
+            def post(text=content if index == 0 else None, chunk=chunk):
+                return first.channel.send(text, **self._files(chunk), **first.kwargs)
+            sent = await self._call(channel_id, SEND, post)
+            message = message if message is not None else sent
+        return message
+
+    def _chunks(self, attachments: list[Attachment]) -> list[list[Attachment]]:
+        """Attachments split into messages within the file count and upload size limits; one chunk at least."""
+        chunks: list[list[Attachment]] = [[]]
+        size = 0
+        for attachment in attachments:
+            current = chunks[-1]
+            if current and (len(current) >= self.max_files or size + attachment.size > self.max_upload_bytes):
+                chunks.append([])
+                size = 0
+            chunks[-1].append(attachment)
+            size += attachment.size
+        return chunks
+
+    @staticmethod
+    def _files(chunk: list[Attachment]) -> dict:
+        if not chunk:
+            return {}
+        if len(chunk) == 1:
+            return {"file": chunk[0].to_file()}
+        return {"files": [attachment.to_file() for attachment in chunk]}
+
+    def _pacer(self, channel_id: int, kind: str) -> _Pacer:
+        pacer = self._pacers.get((channel_id, kind))
+        if pacer is None:
+            now = self._clock()
+            if len(self._pacers) >= self.max_tracked:
+                # Idle buckets carry no state worth keeping.
+                for stale in [key for key, p in self._pacers.items() if p.is_idle(now)]:
+                    del self._pacers[stale]
+            pacer = self._pacers[(channel_id, kind)] = _Pacer(self.burst, self.window, now)
+        return pacer
+
+    async def _call(self, channel_id: int, kind: str, request):
+        """Make one Discord call when the channel's bucket allows it, retrying 429s."""
+        pacer = self._pacer(channel_id, kind)
+        attempt = 0
+        while True:
+            now = self._clock()
+            wait = max(pacer.wait_time(now), self._global_hold - now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+            pacer.take(now)
+            self.calls[kind] += 1
+            DISCORD_CALLS.labels(kind).inc()
+            try:
+                return await request()
+            except (discord.HTTPException, discord.RateLimited) as e:
+                if getattr(e, "status", 429) != 429 or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.rate_limited += 1
+                DISCORD_RATE_LIMITED.inc()
+                seconds, is_global = _retry_after(e)
+                if is_global:
+                    self._global_hold = max(self._global_hold, self._clock() + seconds)
+                else:
+                    pacer.hold_until = max(pacer.hold_until, self._clock() + seconds)
+
+    def observe(self, method: str, path: str, headers) -> None:
+        """Take in the rate-limit headers of a Discord response to a message send or edit."""
+        match = _MESSAGES_PATH_RE.search(path)
+        if match is None:
+            return
+        if method == "POST" and match.group(2) is None:
+            kind = SEND
+        elif method == "PATCH" and match.group(2) is not None:
+            kind = EDIT
+        else:
+            return
+        now = self._clock()
+        try:
+            if headers.get("X-RateLimit-Global") and headers.get("Retry-After"):
+                self._global_hold = max(self._global_hold, now + float(headers["Retry-After"]))
+                return
+            remaining = headers.get("X-RateLimit-Remaining")
+            if remaining is None:
+                return
+            reset_after = float(headers.get("X-RateLimit-Reset-After") or 0.0)
+            self._pacer(int(match.group(1)), kind).observe(int(remaining), reset_after, now)
+        except ValueError:
+            return
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """For discord.Client(http_trace=...): every Discord response's headers go to observe()."""
+        config = aiohttp.TraceConfig()
+
+        async def on_request_end(session, context, params) -> None:
+            self.observe(params.method, params.url.path, params.response.headers)
+
+        config.on_request_end.append(on_request_end)
+        return config
+
+
+# Shared by every handler.
+outbox = Outbox()
+
+
+@registry.register_collector
+def _outbound_metrics():
+    yield "bot_discord_outbound_queued", "Messages and edits waiting in the outbound queues.", {}, outbox.queued
+    yield "bot_discord_outbound_channels", "Channels with messages on their way out.", {}, len(outbox._workers)
@@ -0,0 +1,288 @@
+# bot/prompts.py
+from collections import Counter
+from string import Formatter
+from typing import Optional
+from bot.config import get_settings
+from bot.metrics import registry
+
+# Every prompt is a fixed prefix (role, rules, output format) followed by the request-specific
+# body. Keeping the variable parts last lets provider-side prefix caching (Gemini's implicit
+# context caching, OpenAI's prompt caching) reuse the prefix across requests.
+
+PROMPT_RENDERS = registry.counter(
+    "bot_prompt_renders_total", "Prompts rendered, by template and version.", ("template", "version"))
+
+
+class PromptTemplate:
+    """
+    A named, versioned prompt. The body's {placeholders} are parsed once, at registration;
+    rendering is a single join. The prefix is literal text and never changes between renders.
+    """
+
+    __slots__ = ("name", "version", "prefix", "fields", "_parts")
+
+    def __init__(self, name: str, version: int, prefix: str, body: str):
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(body):
+            if field is not None and (not field.isidentifier() or spec or conversion):
+                raise ValueError(f"Prompt {name!r}: unsupported placeholder {{{field}}}")
+            parts.append((literal, field))
+        self.name = name
+        self.version = version
+        self.prefix = prefix
+        self.fields = frozenset(field for _, field in parts if field)
+        self._parts = tuple(parts)
+
+    def render(self, **values) -> str:
+        missing = self.fields - values.keys()
+        if missing:
+            raise ValueError(f"Prompt {self.name!r} needs {', '.join(sorted(missing))}")
+        pieces = [self.prefix]
+        for literal, field in self._parts:
+            pieces.append(literal)
+            if field:
+                pieces.append(str(values[field]))
+        return "".join(pieces)
+
+    def __repr__(self) -> str:
+        return f"<PromptTemplate {self.name} v{self.version}>"
+
+
+class PromptRegistry:
+    """
+    All of the bot's prompts by name and version. Callers render the newest version unless
+    PROMPT_VERSIONS pins an older one, so a prompt change can be rolled back without a deploy.
+    """
+
+    def __init__(self, pins: Optional[dict[str, int]] = None):
+        self._templates: dict[str, dict[int, PromptTemplate]] = {}
+        self.pins = dict(pins or {})
+
+    def register(self, name: str, version: int, prefix: str, body: str) -> PromptTemplate:
+        versions = self._templates.setdefault(name, {})
+        if version in versions:
+            raise ValueError(f"Prompt {name!r} version {version} is already registered")
+        template = PromptTemplate(name, version, prefix, body)
+        versions[version] = template
+        return template
+
+    def get(self, name: str, version: Optional[int] = None) -> PromptTemplate:
+        versions = self._templates.get(name)
+        if not versions:
+            raise KeyError(f"No prompt named {name!r}")
+        version = version or self.pins.get(name) or max(versions)
+        try:
+            return versions[version]
+        except KeyError:
+            raise KeyError(f"Prompt {name!r} has no version {version}") from None
+
+    def render(self, name: str, /, **values) -> str:
+        template = self.get(name)
+        PROMPT_RENDERS.labels(template.name, str(template.version)).inc()
+        return template.render(**values)
+
+    def names(self) -> list[str]:
+        return sorted(self._templates)
+
+
+def parse_versions(spec: str) -> dict[str, int]:
+    """"generator.structure=1,cicd=2" -> {"generator.structure": 1, "cicd": 2}."""
+    pins = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, sep, version = item.partition("=")
+        if not sep or not version.strip().isdigit():
+            raise ValueError(f"PROMPT_VERSIONS entries look like name=version, got {item!r}")
+        pins[name.strip()] = int(version)
+    return pins
+
+
+prompt_registry = PromptRegistry(parse_versions(get_settings().prompt_versions))
+
+SYSTEM_PROMPT = (
+    "You are a senior DevOps engineer assisting developers with DevOps, "
+    "cloud, and software engineering questions. Provide concise, accurate answers using best practices."
+)
+
+prompt_registry.register("chat", 1, SYSTEM_PROMPT, "\nUser: {question}")
+# Same prefix as "chat"; the history only ever grows at its end until older turns are summarized.
+prompt_registry.register("chat.followup", 1, SYSTEM_PROMPT, """
+Answer the last question, using the conversation so far for context.
+{history}
+User: {question}""")
+
+prompt_registry.register("chat.summary", 1, """You keep a running summary of a conversation between a developer and a DevOps assistant.
+Merge the earlier summary with the new exchanges. Keep facts, decisions, versions, names, error messages
+and open questions; drop greetings and anything already resolved. Reply with the summary only.
+""", """Keep it under {words} words.
+
+Earlier summary:
+{summary}
+
+New exchanges:
+{exchanges}""")
+
+# Shared by both generator prompts, so a URL-only request and a structure request reuse one prefix.
+GENERATOR_PREFIX = """You are a senior DevOps engineer.
+
+Generate a production-ready Dockerfile and Kubernetes manifest for the repository described below.
+
+- For documentation (e.g., MkDocs, Sphinx), use a multi-stage Dockerfile that builds static HTML and serves it with NGINX.
+- For applications (e.g., FastAPI, Flask, Django, Node.js), use a Dockerfile that runs the app with a proper app server (e.g., Uvicorn or Gunicorn for Python), including dependencies and environment configs.
+- In all cases, provide Kubernetes manifests with deployment, service, health probes, and resource requests/limits.
+
+Clearly label each file and include a brief comment explaining your choices at the top.
+
+Output the Dockerfile first, then the Kubernetes manifest, each in its own fenced code block under a "### Dockerfile" or "### Kubernetes manifest" header.
+"""
+
+prompt_registry.register("generator.url", 1, GENERATOR_PREFIX, """
+Only the repository URL is known; first work out from it what kind of project this is.
+
+Repository URL: {repo_url}""")
+
+prompt_registry.register("generator.structure", 1, GENERATOR_PREFIX, """
+{source_desc} with the following file/folder structure:
+
+{file_list}
+
+Based on this, the repository appears to be a {repo_type}.""")
+
+prompt_registry.register("cicd", 1, """You are a senior DevOps engineer.
+Include best practices, caching, testing, building, and deployment steps.
+Add comments to explain each stage and step.
+Reply with the file in a single fenced code block.
+""", """Generate {description} based on the user's request below.
+User's request: {request}""")
+
+# Template-first pipelines: the model only adapts a known-good starting point.
+prompt_registry.register("cicd.customize", 1, """You are a senior DevOps engineer.
+Below is a working CI/CD pipeline file and a user's request. Adapt the file to the request: keep what
+already fits, change or add only what the request asks for, and comment the parts you add.
+Reply with the complete file in a single fenced code block.
+""", """Starting point, {description}:
+```
+{template}
+```
+User's request: {request}""")
+
+DEPLOY_PREFIX = "You are a senior DevOps engineer. Reply with only the file contents in a single code block.\n\n"
+
+prompt_registry.register("deploy.dockerfile", 1, DEPLOY_PREFIX,
+                         "Generate a production-ready Dockerfile for a {framework} application, including "
+                         "multi-stage build, proper user, ports, and comments.")
+prompt_registry.register("deploy.k8s", 1, DEPLOY_PREFIX,
+                         "Generate a Kubernetes manifest for a {framework} application with a best-practice "
+                         "deployment, service, and {exposure} configuration.")
+prompt_registry.register("deploy.pipeline", 1, DEPLOY_PREFIX,
+                         "Generate a {cicd} CI/CD pipeline for a {framework} application, covering build, test, "
+                         "docker push, and deployment.")
+
+prompt_registry.register("repair.problems", 1,
+                         "You are a senior DevOps engineer. Fix the problems listed below and reply with only "
+                         "the corrected file, in a single code block.\n\n",
+                         "This {kind} has problems:\n{problems}\n\n```\n{content}\n```")
+# Starts with the original prompt, so it shares that prompt's cached prefix.
+prompt_registry.register("repair.missing", 1, "",
+                         "{context}\n\nYour previous reply did not include the {kind}. "
+                         "Reply with only the {kind}, in a single code block.")
+
+
+# --- Token budgeting for repository listings ---
+
+# Files that say how a project is built, run or deployed.
+KEY_FILES = frozenset((
+    "requirements.txt", "pyproject.toml", "pipfile", "setup.py", "setup.cfg", "manage.py",
+    "package.json", "tsconfig.json", "go.mod", "pom.xml", "build.gradle", "build.gradle.kts",
+    "cargo.toml", "gemfile", "composer.json", "dockerfile", "docker-compose.yml", "docker-compose.yaml",
+    "compose.yml", "compose.yaml", "makefile", "procfile", "mkdocs.yml", "conf.py", "nginx.conf",
+    ".env.example", "readme.md", "readme.rst",
+))
+# Likely entry points.
+ENTRY_POINTS = frozenset((
+    "main.py", "app.py", "wsgi.py", "asgi.py", "server.py", "index.js", "server.js", "app.js",
+    "main.ts", "index.ts", "main.go", "program.cs", "main.rs",
+))
+LOCK_FILES = frozenset(("package-lock.json", "yarn.lock", "pnpm-lock.yaml", "poetry.lock", "pipfile.lock", "go.sum", "cargo.lock"))
+# Directories whose contents say nothing about how to containerize the project.
+NOISE_DIRS = frozenset((
+    "node_modules", "vendor", ".git", "dist", "build", "target", "__pycache__", ".venv", "venv",
+    "coverage", ".next", ".cache", ".idea", ".vscode", "site-packages",
+))
+# Directories that matter less than the application itself.
+SECONDARY_DIRS = frozenset(("test", "tests", "__tests__", "spec", "docs", "examples"))
+SOURCE_EXTENSIONS = frozenset((".py", ".js", ".ts", ".tsx", ".jsx", ".go", ".java", ".kt", ".rs", ".cs", ".rb", ".php"))
+CONFIG_EXTENSIONS = frozenset((".yml", ".yaml", ".toml", ".json", ".ini", ".cfg", ".conf", ".env", ".properties", ".xml"))
+ASSET_EXTENSIONS = frozenset((
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".ico", ".webp", ".woff", ".woff2", ".ttf", ".eot",
+    ".mp3", ".mp4", ".pdf", ".zip", ".gz", ".map", ".lock", ".pyc",
+))
+
+
+def path_importance(path: str) -> float:
+    """Higher for paths that tell the model how to build and run the project."""
+    path = path.strip("/").lower()
+    slash = path.rfind("/")
+    basename = path[slash + 1:]
+    directories = path[:slash].split("/") if slash >= 0 else ()
+    extension = basename[basename.rfind("."):] if "." in basename else ""
+
+    if basename in KEY_FILES:
+        score = 10.0
+    elif basename in ENTRY_POINTS:
+        score = 8.0
+    elif basename in LOCK_FILES:
+        score = 4.0
+    elif extension in CONFIG_EXTENSIONS:
+        score = 5.0
+    elif extension in SOURCE_EXTENSIONS:
+        score = 3.0
+    elif extension in ASSET_EXTENSIONS or basename.endswith(".min.js"):
+        score = 0.5
+    else:
+        score = 2.0
+    if directories:
+        if not NOISE_DIRS.isdisjoint(directories):
+            score -= 8.0
+        elif not SECONDARY_DIRS.isdisjoint(directories):
+            score -= 1.5
+    # Shallow files describe the project; deep ones describe one corner of it.
+    return score - 0.5 * len(directories)
+
+
+def _path_tokens(path: str) -> float:
+    # Path plus its newline, at about four characters per token (see bot.providers.estimate_tokens).
+    return (len(path) + 1) / 4
+
+
+def budget_file_list(file_list: list[str], max_tokens: Optional[int] = None) -> str:
+    """
+    Fit a repository listing into about `max_tokens` (default: PROMPT_FILE_LIST_TOKENS) tokens.
+    Paths are kept in order of importance rather than position, shown in their original order,
+    and whatever doesn't fit is summarized by top-level directory.
+    """
+    if max_tokens is None:
+        max_tokens = get_settings().prompt_file_list_tokens
+    if sum(_path_tokens(path) for path in file_list) <= max_tokens:
+        return "\n".join(file_list)
+
+    # Room for the omission line, which names up to three directories.
+    budget = max_tokens - 24
+    scores = [path_importance(path) for path in file_list]
+    ranked = sorted(range(len(file_list)), key=lambda i: (-scores[i], len(file_list[i]), file_list[i]))
+    kept = set()
+    used = 0.0
+    for index in ranked:
+        cost = _path_tokens(file_list[index])
+        if used + cost > budget:
+            continue
+        kept.add(index)
+        used += cost
+
+    omitted = Counter(
+        path.split("/", 1)[0] + "/" if "/" in path else "(top level)"
+        for index, path in enumerate(file_list) if index not in kept
+    )
+    lines = [path for index, path in enumerate(file_list) if index in kept]
+    where = ", ".join(f"{name} ({count})" for name, count in omitted.most_common(3))
+    lines.append(f"...and {len(file_list) - len(kept)} more files, mostly under {where}.")
+    return "\n".join(lines)
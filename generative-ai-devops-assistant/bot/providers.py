@@ -0,0 +1,298 @@
+# bot/providers.py
+import json
+import logging
+import time
+from typing import AsyncIterator, Optional
+from bot.http_client import HttpClient, shared_http
+
+logger = logging.getLogger(__name__)
+
+# Request types the router has a policy for.
+CHAT = "chat"
+GENERATION = "generation"
+
+# USD per million (input, output) tokens, for comparing routes rather than for billing.
+MODEL_PRICES = {
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for accounting."""
+    return (len(text) + 3) // 4
+
+
+class ProviderError(Exception):
+    """Non-success response from an HTTP model API; `status` drives retries and failover."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(f"provider returned HTTP {status}: {message}")
+        self.status = status
+
+
+class OpenAICompatibleBackend:
+    """
+    Any API speaking OpenAI's /chat/completions (OpenAI, Azure-style gateways, vLLM, Ollama,
+    LiteLLM), over the shared HTTP pool. Streaming reads the server-sent event stream.
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, http: HttpClient = shared_http):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.http = http
+
+    def _request(self, prompt: str, model_name: str, stream: bool) -> tuple[str, dict, dict]:
+        # Prompts already carry their instructions, so everything goes in one user message.
+        messages = [{"role": "user", "content": prompt}]
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {"model": model_name, "messages": messages, "stream": stream}
+        return f"{self.base_url}/chat/completions", headers, payload
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        url, headers, payload = self._request(prompt, model_name, stream=False)
+        async with self.http.session.post(url, headers=headers, json=payload) as resp:
+            body = await resp.text()
+            if resp.status != 200:
+                raise ProviderError(resp.status, body[:200])
+        return json.loads(body)["choices"][0]["message"]["content"] or ""
+
+    async def stream(self, prompt: str, model_name: str) -> AsyncIterator[str]:
+        url, headers, payload = self._request(prompt, model_name, stream=True)
+        async with self.http.session.post(url, headers=headers, json=payload) as resp:
+            if resp.status != 200:
+                raise ProviderError(resp.status, (await resp.text())[:200])
+            async for line in resp.content:
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    return
+                choices = json.loads(data).get("choices") or [{}]
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    yield text
+
+
+class ProviderStats:
+    """
+    Per-provider accounting: calls, failures, tokens and estimated cost, plus smoothed
+    latency and error rate. The smoothed values drive failover.
+    """
+
+    __slots__ = ("calls", "failures", "input_tokens", "output_tokens", "cost", "latency", "error_rate",
+                 "samples", "alpha")
+
+    def __init__(self, alpha: float = 0.2):
+        self.calls = 0
+        self.failures = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cost = 0.0
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.samples = 0
+        self.alpha = alpha
+
+    def record(self, model_name: str, prompt: str, reply: Optional[str], seconds: float) -> None:
+        self.calls += 1
+        self.samples += 1
+        failed = reply is None
+        self.failures += failed
+        # The first sample seeds the averages so one slow call doesn't take ages to wash out.
+        alpha = 1.0 if self.samples == 1 else self.alpha
+        self.error_rate += alpha * (float(failed) - self.error_rate)
+        self.latency += alpha * (seconds - self.latency)
+        input_tokens = estimate_tokens(prompt)
+        output_tokens = estimate_tokens(reply) if reply else 0
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        input_price, output_price = MODEL_PRICES.get(model_name, (0.0, 0.0))
+        self.cost += (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    def as_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cost_usd": round(self.cost, 6),
+            "latency": round(self.latency, 3),
+            "error_rate": round(self.error_rate, 3),
+        }
+
+
+class Provider:
+    """
+    One model API behind its own LLMClient: its own concurrency limit, timeout and retries,
+    and its own stats. When the smoothed error rate or latency crosses the thresholds (after
+    `min_samples` calls), the provider is taken out of rotation for `cooldown` seconds;
+    after that it gets traffic again and its averages start over.
+    """
+
+    def __init__(self, name: str, client, max_error_rate: float = 0.5, max_latency: float = 20.0,
+                 cooldown: float = 60.0, min_samples: int = 5, clock=time.monotonic):
+        self.name = name
+        self.client = client
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self.cooldown = cooldown
+        self.min_samples = min_samples
+        self._clock = clock
+        self.stats = ProviderStats()
+        self.tripped_until = 0.0
+        self.trips = 0
+
+    @property
+    def available(self) -> bool:
+        if not self.tripped_until:
+            return True
+        if self._clock() < self.tripped_until:
+            return False
+        # Cooldown over: try it again with fresh averages.
+        self.tripped_until = 0.0
+        self.stats.samples = 0
+        return True
+
+    def _check_health(self) -> None:
+        stats = self.stats
+        if stats.samples < self.min_samples:
+            return
+        if stats.error_rate > self.max_error_rate or (self.max_latency and stats.latency > self.max_latency):
+            self.tripped_until = self._clock() + self.cooldown
+            self.trips += 1
+            logger.warning("%s taken out of rotation for %.0fs (error rate %.0f%%, latency %.1fs)",
+                           self.name, self.cooldown, stats.error_rate * 100, stats.latency)
+
+    def _record(self, model_name: str, prompt: str, reply: Optional[str], started: float) -> None:
+        self.stats.record(model_name, prompt, reply, self._clock() - started)
+        self._check_health()
+
+    async def generate(self, prompt: str, model_name: str) -> str:
+        started = self._clock()
+        try:
+            text = await self.client.generate(prompt, model_name)
+        except Exception:
+            self._record(model_name, prompt, None, started)
+            raise
+        self._record(model_name, prompt, text, started)
+        return text
+
+    async def stream(self, prompt: str, model_name: str) -> AsyncIterator[str]:
+        started = self._clock()
+        parts: list[str] = []
+        try:
+            async for chunk in self.client.stream(prompt, model_name):
+                parts.append(chunk)
+                yield chunk
+        except Exception:
+            self._record(model_name, prompt, None, started)
+            raise
+        self._record(model_name, prompt, "".join(parts), started)
+
+    def reset(self) -> None:
+        self.stats = ProviderStats()
+        self.tripped_until = 0.0
+        self.trips = 0
+
+    def as_dict(self) -> dict:
+        stats = self.stats.as_dict()
+        stats.update(available=self.available, trips=self.trips,
+                     in_flight=self.client.in_flight, waiting=self.client.waiting)
+        return stats
+
+
+class Route:
+    __slots__ = ("provider", "model")
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+
+    def __repr__(self) -> str:
+        return f"{self.provider}:{self.model}"
+
+
+def parse_route(spec: str) -> list[Route]:
+    """"gemini:gemini-2.5-flash,openai:gpt-4o-mini" -> routes in failover order."""
+    routes = []
+    for item in spec.split(","):
+        provider, sep, model = item.strip().partition(":")
+        if not sep or not provider or not model:
+            raise ValueError(f"Route entries look like provider:model, got {item.strip()!r}")
+        routes.append(Route(provider, model))
+    return routes
+
+
+class LLMRouter:
+    """
+    Picks a provider and model per request type. Each request type has a route: targets in
+    order of preference. A request goes to the first target whose provider is in rotation
+    and falls through to the next one when a call fails after that provider's own retries.
+    If every provider is out of rotation, the route is tried in order anyway.
+    """
+
+    def __init__(self, providers: list[Provider], routes: dict[str, list[Route]]):
+        self.providers = {provider.name: provider for provider in providers}
+        for purpose, targets in routes.items():
+            unknown = [target.provider for target in targets if target.provider not in self.providers]
+            if unknown:
+                raise ValueError(f"Route {purpose!r} uses unknown provider(s): {', '.join(unknown)}")
+        self.routes = routes
+        self.failovers = 0
+
+    def primary(self, purpose: str) -> Route:
+        return self.routes[purpose][0]
+
+    def _targets(self, purpose: str) -> list[Route]:
+        targets = self.routes[purpose]
+        return [t for t in targets if self.providers[t.provider].available] or targets
+
+    async def generate(self, prompt: str, purpose: str) -> str:
+        targets = self._targets(purpose)
+        for index, target in enumerate(targets):
+            try:
+                return await self.providers[target.provider].generate(prompt, target.model)
+            except Exception as e:
+                if index == len(targets) - 1:
+                    raise
+                self.failovers += 1
+                logger.warning("%s failed (%s: %s); failing over to %s", target, type(e).__name__, e, targets[index + 1])
+
+    async def stream(self, prompt: str, purpose: str) -> AsyncIterator[str]:
+        """Like generate(), but a provider that fails after its first chunk is not failed over."""
+        targets = self._targets(purpose)
+        for index, target in enumerate(targets):
+            yielded = False
+            try:
+                async for chunk in self.providers[target.provider].stream(prompt, target.model):
+                    yielded = True
+                    yield chunk
+                return
+            except Exception as e:
+                if yielded or index == len(targets) - 1:
+                    raise
+                self.failovers += 1
+                logger.warning("%s failed (%s: %s); failing over to %s", target, type(e).__name__, e, targets[index + 1])
+
+    async def warm_up(self) -> None:
+        """Warm every provider for each model its routes use."""
+        for purpose, targets in self.routes.items():
+            for target in targets:
+                warm_up = getattr(self.providers[target.provider].client.backend, "warm_up", None)
+                if warm_up is not None:
+                    await warm_up(target.model)
+
+    def reset(self) -> None:
+        """Forget accounting and health state (tests and benchmarks)."""
+        for provider in self.providers.values():
+            provider.reset()
+        self.failovers = 0
+
+    def stats(self) -> dict:
+        return {name: provider.as_dict() for name, provider in self.providers.items()}
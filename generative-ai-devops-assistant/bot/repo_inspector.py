@@ -0,0 +1,123 @@
+# bot/repo_inspector.py
+import asyncio
+import re
+from collections import OrderedDict
+from typing import Optional
+import aiohttp
+from bot.config import get_settings
+from bot.fingerprint import FileIndex, MANIFEST_FILES
+from bot.github_client import GitHubAPIError, GitHubClient, github_client
+
+GITHUB_URL_RE = re.compile(
+    r"https?://github\.com/(?P<owner>[\w.-]+)/(?P<repo>[\w.-]+?)(?:\.git)?(?:/tree/(?P<ref>[^\s?#]+))?/?(?:[?#].*)?$"
+)
+
+
+class RepoInspectionError(Exception):
+    """Raised when repository metadata cannot be fetched (private repo, rate limit, bad URL...)."""
+
+
+def parse_github_url(url: str) -> tuple[str, str, Optional[str]]:
+    """Return (owner, repo, ref) for a GitHub repository URL; ref is None for the default branch."""
+    match = GITHUB_URL_RE.match(url.strip())
+    if not match:
+        raise RepoInspectionError(f"not a GitHub repository URL: {url}")
+    return match.group("owner"), match.group("repo"), match.group("ref")
+
+
+class RepoSnapshot:
+    """File listing and key manifest contents of a repository at one commit."""
+
+    def __init__(self, owner: str, repo: str, sha: str, file_list: list[str], files: dict[str, str], truncated: bool):
+        self.owner = owner
+        self.repo = repo
+        self.sha = sha
+        self.file_list = file_list
+        self.files = files
+        self.truncated = truncated
+
+    @property
+    def full_name(self) -> str:
+        return f"{self.owner}/{self.repo}"
+
+    def read_file(self, path: str) -> Optional[str]:
+        return self.files.get(path)
+
+
+class RepoInspector:
+    """
+    Fetches a repository's tree and manifests through the GitHub REST API.
+
+    Branch lookups use ETag conditional requests, so an unchanged branch costs a 304
+    (which GitHub does not count against the rate limit), and snapshots are cached by
+    commit SHA, so an unchanged repository is never listed or downloaded twice.
+    """
+
+    def __init__(
+        self,
+        github: GitHubClient = github_client,
+        max_manifest_bytes: Optional[int] = None,
+        max_snapshots: int = 256,
+    ):
+        self.github = github
+        self.max_manifest_bytes = max_manifest_bytes or get_settings().zip_manifest_max_bytes
+        self.max_snapshots = max_snapshots
+        self._snapshots: OrderedDict[str, RepoSnapshot] = OrderedDict()
+
+    async def _get_json(self, path: str, conditional: bool = False):
+        try:
+            return await self.github.get_json(path, conditional=conditional)
+        except GitHubAPIError as e:
+            raise RepoInspectionError(f"GitHub API returned HTTP {e.status} for {path}") from e
+
+    async def _get_raw(self, owner: str, repo: str, path: str, sha: str) -> Optional[str]:
+        return await self.github.get_raw(
+            f"/repos/{owner}/{repo}/contents/{path}", self.max_manifest_bytes, params={"ref": sha}
+        )
+
+    async def resolve_commit(self, owner: str, repo: str, ref: Optional[str] = None) -> str:
+        """Commit SHA for a ref (default branch when None), using conditional requests."""
+        if ref is None:
+            info = await self._get_json(f"/repos/{owner}/{repo}", conditional=True)
+            ref = info["default_branch"]
+        commit = await self._get_json(f"/repos/{owner}/{repo}/commits/{ref}", conditional=True)
+        return commit["sha"]
+
+    async def inspect(self, url: str) -> RepoSnapshot:
+        owner, repo, ref = parse_github_url(url)
+        try:
+            sha = await self.resolve_commit(owner, repo, ref)
+            snapshot = self._snapshots.get(sha)
+            if snapshot is not None:
+                self._snapshots.move_to_end(sha)
+                return snapshot
+
+            tree = await self._get_json(f"/repos/{owner}/{repo}/git/trees/{sha}?recursive=1")
+            sizes = {
+                entry["path"]: entry.get("size", 0)
+                for entry in tree.get("tree", [])
+                if entry.get("type") == "blob"
+            }
+            file_list = list(sizes)
+
+            index = FileIndex(file_list)
+            wanted = [
+                path for path in (index.path(name) for name in MANIFEST_FILES)
+                if path is not None and sizes[path] <= self.max_manifest_bytes
+            ]
+            contents = await asyncio.gather(*(self._get_raw(owner, repo, path, sha) for path in wanted))
+            files = {path: text for path, text in zip(wanted, contents) if text is not None}
+        except (aiohttp.ClientError, asyncio.TimeoutError, GitHubAPIError) as e:
+            raise RepoInspectionError(f"could not reach GitHub: {e}") from e
+        except (KeyError, TypeError) as e:
+            raise RepoInspectionError(f"unexpected GitHub API response: {e}") from e
+
+        snapshot = RepoSnapshot(owner, repo, sha, file_list, files, bool(tree.get("truncated")))
+        self._snapshots[sha] = snapshot
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        return snapshot
+
+
+# Shared inspector used by the generator handler.
+repo_inspector = RepoInspector()
@@ -0,0 +1,312 @@
+# bot/scheduler.py
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
+from bot.config import get_settings
+from bot.metrics import REQUESTS_REJECTED, SCHEDULER_WAIT_SECONDS, registry
+
+# Priority classes; lower runs first.
+INTERACTIVE = 0
+BULK = 1
+
+
+class SchedulerRejected(Exception):
+    """Base for requests the bot refuses to queue; the message is meant for the user."""
+
+
+class RateLimited(SchedulerRejected):
+    def __init__(self, retry_after: float):
+        super().__init__(f"You're sending requests too quickly. Please try again in {max(1, round(retry_after))}s.")
+        self.retry_after = retry_after
+
+
+class QueueFull(SchedulerRejected):
+    def __init__(self):
+        super().__init__("The bot is busy right now. Please try again in a minute.")
+
+
+class Overloaded(SchedulerRejected):
+    def __init__(self):
+        super().__init__("The AI service is responding slowly right now, so new requests are paused. "
+                         "Please try again shortly.")
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, now: float, cost: float = 1.0) -> float:
+        """Seconds until `cost` tokens are available; 0 if they are now."""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        return (cost - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def try_acquire(self, now: float, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 on success, otherwise the seconds until they'd be available."""
+        wait = self.wait_time(now, cost)
+        if not wait:
+            self.tokens -= cost
+        return wait
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class RateLimiter:
+    """
+    Token buckets per user and per channel. A message must pass both; the user's token is
+    only spent when the channel has room too, so a busy channel doesn't drain its users.
+    """
+
+    def __init__(
+        self,
+        user_per_minute: Optional[float] = None,
+        user_burst: Optional[int] = None,
+        channel_per_minute: Optional[float] = None,
+        channel_burst: Optional[int] = None,
+        max_buckets: int = 10000,
+        clock=time.monotonic,
+    ):
+        settings = get_settings()
+        if user_per_minute is None:
+            user_per_minute = settings.rate_limit_user_per_minute
+        if user_burst is None:
+            user_burst = settings.rate_limit_user_burst
+        if channel_per_minute is None:
+            channel_per_minute = settings.rate_limit_channel_per_minute
+        if channel_burst is None:
+            channel_burst = settings.rate_limit_channel_burst
+        self.user_rate = user_per_minute / 60.0
+        self.user_burst = user_burst
+        self.channel_rate = channel_per_minute / 60.0
+        self.channel_burst = channel_burst
+        self.max_buckets = max_buckets
+        self._clock = clock
+        self._users: dict[int, TokenBucket] = {}
+        self._channels: dict[int, TokenBucket] = {}
+
+    def _bucket(self, buckets: dict, key, rate: float, burst: int, now: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            if len(buckets) >= self.max_buckets:
+                # Full buckets carry no state worth keeping.
+                for stale in [k for k, b in buckets.items() if b.is_full(now)]:
+                    del buckets[stale]
+            bucket = buckets[key] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def check(self, user_id: int, channel_id: Optional[int] = None) -> None:
+        """Spend one request for the user (and channel), or raise RateLimited."""
+        now = self._clock()
+        user = self._bucket(self._users, user_id, self.user_rate, self.user_burst, now)
+        wait = user.wait_time(now)
+        if wait:
+            REQUESTS_REJECTED.labels(reason="user_rate_limit").inc()
+            raise RateLimited(wait)
+        if channel_id is not None:
+            channel = self._bucket(self._channels, channel_id, self.channel_rate, self.channel_burst, now)
+            wait = channel.try_acquire(now)
+            if wait:
+                REQUESTS_REJECTED.labels(reason="channel_rate_limit").inc()
+                raise RateLimited(wait)
+        user.try_acquire(now)
+
+
+class RequestContext:
+    """Who an LLM call is for, set by the Discord handler and read by the scheduler."""
+
+    __slots__ = ("user_id", "channel_id", "priority", "weight", "on_queued")
+
+    def __init__(self, user_id: Optional[int] = None, channel_id: Optional[int] = None, priority: int = INTERACTIVE,
+                 weight: float = 1.0, on_queued: Optional[Callable[[int], Awaitable[None]]] = None):
+        self.user_id = user_id
+        self.channel_id = channel_id
+        self.priority = priority
+        self.weight = weight
+        self.on_queued = on_queued
+
+
+current_request: ContextVar[Optional[RequestContext]] = ContextVar("current_request", default=None)
+
+
+@contextmanager
+def request_context(user_id: int, channel_id: Optional[int] = None, priority: int = INTERACTIVE,
+                    weight: float = 1.0, on_queued: Optional[Callable[[int], Awaitable[None]]] = None):
+    """Attribute every LLM call made inside the block (and tasks it spawns) to this user and class."""
+    token = current_request.set(RequestContext(user_id, channel_id, priority, weight, on_queued))
+    try:
+        yield
+    finally:
+        current_request.reset(token)
+
+
+class _Waiter:
+    __slots__ = ("key", "future", "cancelled")
+
+    def __init__(self, key: tuple, future: asyncio.Future):
+        self.key = key
+        self.future = future
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return self.key < other.key
+
+
+class FairScheduler:
+    """
+    Admission control for LLM calls.
+
+    At most `max_concurrency` calls run at once. Beyond that, calls wait in a weighted fair
+    queue: each user's calls get virtual finish times, so a user with twenty queued calls
+    takes turns with a user who has one, and the interactive class always goes ahead of
+    bulk. The queue holds at most `max_queue` calls. When the smoothed call latency passes
+    `shed_latency`, new bulk calls are refused; past twice that, new calls of any class are.
+    The latency estimate decays while idle so shedding can't latch on.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        shed_latency: Optional[float] = None,
+        latency_alpha: float = 0.2,
+        latency_half_life: float = 30.0,
+        clock=time.monotonic,
+    ):
+        settings = get_settings()
+        if max_concurrency is None:
+            max_concurrency = settings.scheduler_max_concurrency or settings.llm_max_concurrency
+        if max_queue is None:
+            max_queue = settings.scheduler_max_queue
+        if shed_latency is None:
+            shed_latency = settings.scheduler_shed_latency_seconds
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.shed_latency = shed_latency
+        self.latency_alpha = latency_alpha
+        self.latency_half_life = latency_half_life
+        self._clock = clock
+        self._heap: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._user_finish: dict = {}
+        self._latency = 0.0
+        self._latency_at = clock()
+        self.active = 0
+        self.queued = 0
+        self.shed = 0
+
+    @property
+    def latency(self) -> float:
+        """Smoothed call latency, decayed by the time since the last sample."""
+        idle = self._clock() - self._latency_at
+        return self._latency * 0.5 ** (idle / self.latency_half_life)
+
+    def _record_latency(self, seconds: float) -> None:
+        self._latency = self.latency + self.latency_alpha * (seconds - self.latency)
+        self._latency_at = self._clock()
+
+    def _check_load(self, priority: int) -> None:
+        if not self.shed_latency:
+            return
+        latency = self.latency
+        if latency > 2 * self.shed_latency or (priority >= BULK and latency > self.shed_latency):
+            self.shed += 1
+            REQUESTS_REJECTED.labels(reason="overloaded").inc()
+            raise Overloaded()
+
+    def _enqueue(self, ctx: RequestContext) -> _Waiter:
+        user = ctx.user_id
+        start = max(self._virtual_time, self._user_finish.get(user, 0.0))
+        finish = start + 1.0 / max(ctx.weight, 1e-6)
+        self._user_finish[user] = finish
+        waiter = _Waiter((ctx.priority, finish, next(self._seq)), asyncio.get_running_loop().create_future())
+        heapq.heappush(self._heap, waiter)
+        self.queued += 1
+        return waiter
+
+    def position(self, waiter: _Waiter) -> int:
+        """1-based place in line."""
+        return 1 + sum(1 for other in self._heap if not other.cancelled and other.key < waiter.key)
+
+    def _release(self) -> None:
+        while self._heap:
+            waiter = heapq.heappop(self._heap)
+            if waiter.cancelled:
+                continue
+            self.queued -= 1
+            self._virtual_time = waiter.key[1]
+            # The slot passes straight to the waiter; `active` doesn't change.
+            waiter.future.set_result(None)
+            break
+        else:
+            self.active -= 1
+        if len(self._user_finish) > 4 * self.max_queue + 64:
+            self._user_finish = {u: f for u, f in self._user_finish.items() if f > self._virtual_time}
+
+    @asynccontextmanager
+    async def slot(self, ctx: Optional[RequestContext] = None):
+        """Hold one LLM slot for the duration of the block. Raises SchedulerRejected subclasses."""
+        ctx = ctx or current_request.get() or RequestContext()
+        self._check_load(ctx.priority)
+
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+        else:
+            if self.queued >= self.max_queue:
+                self.shed += 1
+                REQUESTS_REJECTED.labels(reason="queue_full").inc()
+                raise QueueFull()
+            enqueued = self._clock()
+            waiter = self._enqueue(ctx)
+            try:
+                if ctx.on_queued is not None:
+                    await ctx.on_queued(self.position(waiter))
+                await waiter.future
+            except BaseException:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._release()  # We were handed the slot just as we gave up; pass it on.
+                else:
+                    waiter.cancelled = True
+                    self.queued -= 1
+                raise
+            SCHEDULER_WAIT_SECONDS.labels(priority=ctx.priority).observe(self._clock() - enqueued)
+
+        started = self._clock()
+        try:
+            yield
+        finally:
+            self._record_latency(self._clock() - started)
+            self._release()
+
+    def stats(self) -> dict:
+        return {"active": self.active, "queued": self.queued, "shed": self.shed, "latency": round(self.latency, 3)}
+
+
+# Shared instances used by the Discord handlers and bot/llm_client.py.
+rate_limiter = RateLimiter()
+scheduler = FairScheduler()
+
+
+@registry.register_collector
+def _scheduler_metrics():
+    yield "bot_scheduler_active", "LLM calls holding a scheduler slot.", {}, scheduler.active
+    yield "bot_scheduler_queued", "LLM calls waiting in the fair queue.", {}, scheduler.queued
+    yield "bot_scheduler_latency_seconds", "Smoothed LLM call latency used for load shedding.", {}, scheduler.latency
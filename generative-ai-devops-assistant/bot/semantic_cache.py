@@ -0,0 +1,341 @@
+# bot/semantic_cache.py
+import importlib.util
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Optional
+from bot.cache import CacheStats
+
+logger = logging.getLogger(__name__)
+
+# Answers by meaning rather than by exact prompt: "how do I set resource limits in k8s" and
+# "configure cpu/memory limits for kubernetes pods" should share one model call. Questions are
+# embedded locally (feature hashing, no model download, no network) and searched by cosine
+# similarity against a fixed-size matrix, so a lookup is one matrix-vector product.
+
+_np = None
+
+
+def _numpy():
+    """NumPy takes a tenth of a second to import, so it is loaded on first use."""
+    global _np
+    if _np is None:
+        import numpy
+        _np = numpy
+    return _np
+
+
+# Spellings that mean the same thing in DevOps questions.
+ALIASES = {
+    "k8s": "kubernetes", "kube": "kubernetes", "kubectl": "kubernetes", "gha": "github actions",
+    "tf": "terraform", "db": "database", "env": "environment", "envs": "environment", "vars": "variable",
+    "config": "configure", "configuration": "configure", "setup": "configure", "set": "configure",
+    "repo": "repository", "img": "image", "ci/cd": "cicd", "ci": "cicd", "cd": "cicd", "mem": "memory",
+    "pods": "pod", "containers": "container", "secrets": "secret", "dockerfile": "docker", "argocd": "argo cd",
+}
+STOPWORDS = frozenset("""
+a an the and or but of to in on at for from by with into onto about as is are was were be been being do does
+did doing i me my we our you your it its this that these those there here how what whats what's which who
+why when where can could should would will shall may might must please thanks thank hi hello hey just
+really best right way ways proper properly correct correctly good some any get use using via up out through
+every each all app apps application applications
+""".split())
+# Word sets that name one broader term: "cpu and memory limits" are "resource limits".
+COMPOUNDS = {frozenset({"cpu", "memory"}): "resource"}
+# Tools, platforms and directions: a question that adds one asks something else, even though
+# "deploy to kubernetes with helm" scores close to "deploy to kubernetes".
+KEY_TERMS = frozenset("""
+helm kustomize compose swarm terraform pulumi ansible argo flux windows macos linux alpine arm64 amd64 gpu
+down rootless
+""".split())
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#/_.-]*")
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping, enough to match "limits"/"limit", "caching"/"cache" and "setting"/"set"."""
+    if len(word) > 5 and word.endswith("ing"):
+        word = word[:-3]
+    elif len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    elif len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    elif len(word) > 5 and word.endswith("ed"):
+        word = word[:-2]
+    if len(word) > 3 and word[-1] == word[-2] and word[-1].isalpha() and word[-1] not in "aeiouls":
+        return word[:-1]
+    if len(word) > 4 and word.endswith("e"):
+        return word[:-1]
+    return word
+
+
+def _same_word(a: str, b: str) -> bool:
+    """Stems the stemmer left apart ("deploy"/"deployment", "remote"/"remotely")."""
+    shared = len(os.path.commonprefix([a, b]))
+    return shared >= 4 and shared >= 0.6 * max(len(a), len(b))
+
+
+def conflicting(a: set, b: set) -> bool:
+    """
+    True when each question has a word the other lacks ("memory" vs "cpu limits", "enable" vs
+    "disable caching", "flask" vs "django"), or one adds a KEY_TERMS word. Such pairs share most
+    of their words, so they score close to real rewordings, but the answer to one is wrong for
+    the other. A question that only adds context ("... for kubernetes pods") is left to the
+    similarity threshold.
+    """
+    only_a = {word for word in a - b if not any(_same_word(word, other) for other in b - a)}
+    only_b = {word for word in b - a if not any(_same_word(word, other) for other in a - b)}
+    return (bool(only_a) and bool(only_b)) or not (only_a | only_b).isdisjoint(_KEY_STEMS)
+
+
+def _canonical(word: str) -> str:
+    word = _stem(word)
+    return _stem(ALIASES[word]) if word in ALIASES and " " not in ALIASES[word] else word
+
+
+_KEY_STEMS = frozenset(_canonical(term) for term in KEY_TERMS)
+_COMPOUNDS = {frozenset(map(_canonical, members)): _canonical(term) for members, term in COMPOUNDS.items()}
+
+
+class HashedVectorizer:
+    """
+    Question -> unit-length float32 vector by signed feature hashing of content words and their
+    character trigrams. Word order is ignored, so "k8s resource limits" matches "resource limits
+    in kubernetes". Needs no vocabulary or training, so vectors are comparable across processes
+    and restarts.
+    """
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def words(self, text: str) -> list[str]:
+        words = []
+        for token in _TOKEN_RE.findall(text.lower()):
+            token = token.rstrip(".?!:,")
+            # "cpu/memory" is two words, "ci/cd" one.
+            for part in [token] if token in ALIASES else token.split("/"):
+                for word in ALIASES.get(part, part).split():
+                    if len(word) > 1 and word not in STOPWORDS:
+                        words.append(_canonical(word))
+        for members, term in _COMPOUNDS.items():
+            if members <= set(words):
+                words = [word for word in words if word not in members] + [term]
+        return words
+
+    def features(self, text: str) -> dict[str, float]:
+        words = self.words(text)
+        features: dict[str, float] = {}
+        for word in words:
+            features["w:" + word] = features.get("w:" + word, 0.0) + 1.0
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                gram = "c:" + padded[i:i + 3]
+                features[gram] = features.get(gram, 0.0) + 0.25
+        return features
+
+    def __call__(self, text: str):
+        np = _numpy()
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self.features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks the sign, so collisions cancel out on average instead of adding up.
+            vector[h % self.dim] += -weight if h & 0x80000000 else weight
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """
+    Nearest-neighbour answer cache.
+
+    Question vectors live in a preallocated (capacity x dim) matrix and are searched by cosine
+    similarity (rows are unit length, so a matrix-vector product); the best of the top `top_k`
+    at or above `threshold` in the same namespace (the model), whose key terms do not conflict
+    with the question's, is a hit. Empty rows are zero and
+    never match. When full, the least recently used entry is replaced; entries expire after
+    `ttl_seconds`.
+
+    With a `path` (a directory), vectors and access times are memory-mapped .npy files and
+    answers live in sqlite, so the index survives restarts and only the pages a search touches
+    are read. Without one everything is in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None, capacity: int = 20000, dim: int = 512,
+                 threshold: float = 0.7, ttl_seconds: float = 86400, top_k: int = 4, clock=time.time):
+        self.path = path
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.top_k = top_k
+        self.vectorizer = HashedVectorizer(dim)
+        self.stats = CacheStats()
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._times = None
+        self._db = None
+        self._high = 0
+        self._free: list[int] = []
+        self._count = 0
+        self._available = None
+
+    @property
+    def available(self) -> bool:
+        """False when numpy is not installed, with one warning rather than an error per lookup."""
+        if self._available is None:
+            self._available = _np is not None or importlib.util.find_spec("numpy") is not None
+            if not self._available:
+                logger.warning("numpy is not installed; the semantic cache is off")
+        return self._available
+
+    def __len__(self) -> int:
+        if self.path is not None and self.available:
+            # A persisted index has entries before the first lookup.
+            with self._lock:
+                self._open()
+        return self._count
+
+    def _open(self) -> None:
+        """Allocate or map the arrays on first use."""
+        if self._vectors is not None:
+            return
+        np = _numpy()
+        shape = (self.capacity, self.vectorizer.dim)
+        if self.path is None:
+            self._vectors = np.zeros(shape, dtype=np.float32)
+            # Per row: created and last used, on the wall clock; 0 marks an empty row.
+            self._times = np.zeros((self.capacity, 2), dtype=np.float64)
+            self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        else:
+            os.makedirs(self.path, exist_ok=True)
+            self._vectors = self._map("vectors.npy", shape, np.float32)
+            self._times = self._map("times.npy", (self.capacity, 2), np.float64)
+            self._db = sqlite3.connect(os.path.join(self.path, "answers.sqlite3"), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS answers ("
+                         "slot INTEGER PRIMARY KEY, namespace TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL)")
+        self._db.commit()
+        self._recover()
+
+    def _map(self, name: str, shape: tuple, dtype):
+        np = _numpy()
+        filename = os.path.join(self.path, name)
+        if os.path.exists(filename):
+            try:
+                array = np.lib.format.open_memmap(filename, mode="r+")
+                if array.shape == shape and array.dtype == dtype:
+                    return array
+                logger.warning("%s has shape %s, expected %s; starting over", filename, array.shape, shape)
+                del array
+            except ValueError as e:
+                logger.warning("Could not map %s (%s); starting over", filename, e)
+            # The answers belong to the old rows.
+            db = os.path.join(self.path, "answers.sqlite3")
+            if os.path.exists(db):
+                os.remove(db)
+        return np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=shape)
+
+    def _recover(self) -> None:
+        """Rebuild the free list from the stored rows; rows half-written by a crash are cleared."""
+        np = _numpy()
+        stored = {slot for (slot,) in self._db.execute("SELECT slot FROM answers")}
+        occupied = set(np.flatnonzero(self._times[:, 0]).tolist())
+        for slot in occupied - stored:
+            self._clear_row(slot)
+        orphans = stored - occupied
+        if orphans:
+            self._db.executemany("DELETE FROM answers WHERE slot = ?", [(slot,) for slot in orphans])
+            self._db.commit()
+        live = sorted(occupied & stored)
+        self._count = len(live)
+        self._high = live[-1] + 1 if live else 0
+        live_set = set(live)
+        self._free = [slot for slot in range(self._high - 1, -1, -1) if slot not in live_set]
+
+    def _clear_row(self, slot: int) -> None:
+        self._vectors[slot] = 0.0
+        self._times[slot] = 0.0
+
+    def _release(self, slot: int) -> None:
+        self._clear_row(slot)
+        self._db.execute("DELETE FROM answers WHERE slot = ?", (slot,))
+        self._db.commit()
+        self._free.append(slot)
+        self._count -= 1
+
+    def lookup(self, question: str, namespace: str) -> Optional[str]:
+        """The cached answer to the closest earlier question, if it is close enough."""
+        with self._lock:
+            self._open()
+            np = _numpy()
+            if self._count:
+                query = self.vectorizer(question)
+                terms = set(self.vectorizer.words(question))
+                scores = self._vectors[:self._high] @ query
+                k = min(self.top_k, self._high)
+                candidates = np.argpartition(scores, -k)[-k:]
+                now = self._clock()
+                for slot in candidates[np.argsort(scores[candidates])[::-1]].tolist():
+                    if scores[slot] < self.threshold:
+                        break
+                    if now - self._times[slot, 0] > self.ttl_seconds:
+                        self._release(slot)
+                        self.stats.evictions += 1
+                        continue
+                    row = self._db.execute("SELECT namespace, question, answer FROM answers WHERE slot = ?",
+                                           (slot,)).fetchone()
+                    if row is not None and row[0] == namespace and not conflicting(
+                            terms, set(self.vectorizer.words(row[1]))):
+                        self._times[slot, 1] = now
+                        self.stats.hits += 1
+                        return row[2]
+            self.stats.misses += 1
+            return None
+
+    def add(self, question: str, answer: str, namespace: str) -> None:
+        with self._lock:
+            self._open()
+            np = _numpy()
+            vector = self.vectorizer(question)
+            if not vector.any():
+                return
+            if self._free:
+                slot = self._free.pop()
+            elif self._high < self.capacity:
+                slot = self._high
+                self._high += 1
+            else:
+                slot = int(np.argmin(self._times[:, 1]))
+                self._release(slot)
+                self._free.pop()
+                self.stats.evictions += 1
+            now = self._clock()
+            self._db.execute("INSERT OR REPLACE INTO answers (slot, namespace, question, answer) VALUES (?, ?, ?, ?)",
+                             (slot, namespace, question, answer))
+            self._db.commit()
+            self._vectors[slot] = vector
+            self._times[slot] = (now, now)
+            self._count += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            if self._vectors is None:
+                return
+            self._vectors[:] = 0.0
+            self._times[:] = 0.0
+            self._db.execute("DELETE FROM answers")
+            self._db.commit()
+            self._high, self._count, self._free = 0, 0, []
+
+    def close(self) -> None:
+        with self._lock:
+            if self._vectors is None:
+                return
+            if self.path is not None:
+                self._vectors.flush()
+                self._times.flush()
+            self._db.close()
+            self._vectors = self._times = self._db = None
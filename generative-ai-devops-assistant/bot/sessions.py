@@ -0,0 +1,280 @@
+# bot/sessions.py
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+from bot.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOpsSession:
+    """State of one user's ChatOps conversation: which flow, which state, and the answers so far."""
+
+    __slots__ = ("user_id", "flow", "stage", "data", "updated_at")
+
+    def __init__(self, user_id: int, flow: Optional[str] = None, stage: Optional[str] = None,
+                 data: Optional[dict] = None, updated_at: float = 0.0):
+        self.user_id = user_id
+        self.flow = flow
+        self.stage = stage
+        self.data = data if data is not None else {}
+        self.updated_at = updated_at
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatOpsSession":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+    def __repr__(self) -> str:
+        return f"ChatOpsSession(user_id={self.user_id}, stage={self.stage})"
+
+
+class MemorySessionBackend:
+    """Process-local sessions; lost on restart."""
+
+    def __init__(self):
+        self._sessions: dict[int, ChatOpsSession] = {}
+
+    def get(self, user_id: int) -> Optional[ChatOpsSession]:
+        return self._sessions.get(user_id)
+
+    def put(self, session: ChatOpsSession) -> None:
+        self._sessions[session.user_id] = session
+
+    def delete(self, user_id: int) -> None:
+        self._sessions.pop(user_id, None)
+
+    def purge_idle(self, cutoff: float) -> int:
+        stale = [uid for uid, s in self._sessions.items() if s.updated_at < cutoff]
+        for uid in stale:
+            del self._sessions[uid]
+        return len(stale)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SqliteSessionBackend:
+    """Sessions persisted in a local sqlite file so in-progress flows survive restarts."""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chatops_sessions ("
+            "user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS chatops_sessions_updated ON chatops_sessions (updated_at)"
+        )
+        self._conn.commit()
+
+    def get(self, user_id: int) -> Optional[ChatOpsSession]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM chatops_sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return ChatOpsSession.from_dict(json.loads(row[0])) if row else None
+
+    def put(self, session: ChatOpsSession) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chatops_sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (session.user_id, json.dumps(session.to_dict()), session.updated_at),
+            )
+            self._conn.commit()
+
+    def delete(self, user_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chatops_sessions WHERE user_id = ?", (user_id,))
+            self._conn.commit()
+
+    def purge_idle(self, cutoff: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM chatops_sessions WHERE updated_at < ?", (cutoff,))
+            self._conn.commit()
+            return cur.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chatops_sessions").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSessionBackend:
+    """
+    Sessions in Redis (or anything speaking the same get/set/delete API). Idle expiry is
+    delegated to Redis key TTLs, so purge_idle has nothing to do.
+    """
+
+    def __init__(self, client, idle_ttl: float, prefix: str = "chatops:session:"):
+        self.client = client
+        self.idle_ttl = idle_ttl
+        self.prefix = prefix
+
+    def _key(self, user_id: int) -> str:
+        return f"{self.prefix}{user_id}"
+
+    def get(self, user_id: int) -> Optional[ChatOpsSession]:
+        raw = self.client.get(self._key(user_id))
+        return ChatOpsSession.from_dict(json.loads(raw)) if raw else None
+
+    def put(self, session: ChatOpsSession) -> None:
+        self.client.set(self._key(session.user_id), json.dumps(session.to_dict()), ex=int(self.idle_ttl))
+
+    def delete(self, user_id: int) -> None:
+        self.client.delete(self._key(user_id))
+
+    def purge_idle(self, cutoff: float) -> int:
+        return 0
+
+
+class SessionStore:
+    """
+    ChatOps session store with idle-TTL eviction and per-user locking.
+
+    Sessions untouched for `idle_ttl` seconds are treated as gone on read and removed by
+    a background sweeper. `lock(user_id)` serializes message handling per user, so two
+    quick messages cannot both act on the same stage. The locks live in this process: with
+    sharding, a user's messages are serialized within a guild (or DMs), which Discord always
+    routes to one shard, but not across guilds served by different processes. Given a
+    `backend_factory` instead of a backend, the backend (a sqlite file, a Redis client) is
+    created by `open()` or on first use.
+    """
+
+    def __init__(self, backend=None, idle_ttl: Optional[float] = None,
+                 sweep_interval: Optional[float] = None, clock=time.time, backend_factory=None):
+        settings = get_settings()
+        self._backend = backend
+        self._backend_factory = backend_factory
+        self.idle_ttl = settings.session_idle_ttl_seconds if idle_ttl is None else idle_ttl
+        self.sweep_interval = settings.session_sweep_interval_seconds if sweep_interval is None else sweep_interval
+        self._clock = clock
+        # user_id -> [lock, tasks holding or waiting on it]
+        self._locks: dict[int, list] = {}
+        self._sweeper: Optional[asyncio.Task] = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = self._backend_factory()
+        return self._backend
+
+    @backend.setter
+    def backend(self, backend) -> None:
+        self._backend = backend
+
+    @property
+    def is_open(self) -> bool:
+        return self._backend is not None
+
+    def open(self) -> None:
+        """Create the backend now, from the startup hook, instead of on the first ChatOps message."""
+        self.backend
+
+    def close(self) -> None:
+        """Release the backend's connection, if it holds one."""
+        close = getattr(self._backend, "close", None)
+        if close is not None:
+            close()
+        self._backend = None
+
+    @asynccontextmanager
+    async def lock(self, user_id: int):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = [asyncio.Lock(), 0]
+        # Counted before waiting, so the sweeper never drops a lock a woken waiter is about to take.
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+
+    def get(self, user_id: int) -> Optional[ChatOpsSession]:
+        session = self.backend.get(user_id)
+        if session is not None and session.updated_at < self._clock() - self.idle_ttl:
+            self.backend.delete(user_id)
+            return None
+        return session
+
+    def start(self, user_id: int, flow: Optional[str] = None, stage: Optional[str] = None) -> ChatOpsSession:
+        session = ChatOpsSession(user_id, flow=flow, stage=stage)
+        self.save(session)
+        return session
+
+    def save(self, session: ChatOpsSession) -> None:
+        session.updated_at = self._clock()
+        self.backend.put(session)
+
+    def end(self, user_id: int) -> None:
+        self.backend.delete(user_id)
+
+    def sweep(self) -> int:
+        """Drop idle sessions and the locks nobody holds or waits on; returns sessions removed."""
+        removed = self.backend.purge_idle(self._clock() - self.idle_ttl)
+        for user_id in [uid for uid, (_, users) in self._locks.items() if not users]:
+            del self._locks[user_id]
+        return removed
+
+    async def _sweep_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = self.sweep()
+                if removed:
+                    logger.info("Evicted %d idle ChatOps session(s)", removed)
+            except Exception as e:
+                logger.warning("Sweep failed: %s", e)
+
+    def start_sweeper(self) -> None:
+        if self._sweeper is None or self._sweeper.done():
+            self._sweeper = asyncio.get_running_loop().create_task(self._sweep_forever())
+
+    async def stop_sweeper(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            try:
+                await self._sweeper
+            except asyncio.CancelledError:
+                pass
+            self._sweeper = None
+
+
+def create_session_backend():
+    """Build the backend for the configured SESSION_BACKEND (memory, sqlite or redis)."""
+    settings = get_settings()
+    if settings.session_backend == "sqlite":
+        backend = SqliteSessionBackend(settings.session_sqlite_path)
+    elif settings.session_backend == "redis":
+        import redis  # Only needed when the redis backend is selected.
+        backend = RedisSessionBackend(redis.Redis.from_url(settings.session_redis_url), settings.session_idle_ttl_seconds)
+    elif settings.session_backend == "memory":
+        backend = MemorySessionBackend()
+    else:
+        raise ValueError(f"Unknown SESSION_BACKEND: {settings.session_backend}")
+    return backend
+
+
+def create_session_store() -> SessionStore:
+    """A store for the configured SESSION_BACKEND; the backend itself is created when the store is opened."""
+    backend = get_settings().session_backend
+    if backend not in ("memory", "sqlite", "redis"):
+        raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
+    return SessionStore(backend_factory=create_session_backend)
@@ -0,0 +1,138 @@
+# bot/sharding.py
+"""
+Multi-process runner for large guild counts. The bot's shards are split into contiguous
+groups, one per process; each process runs an AutoShardedClient for its group with its own
+event loop, CPU worker pool and metrics port. ChatOps sessions (and, if LLM_CACHE_PATH is
+set, cached responses) live in a backend every process can reach. The semantic cache's
+memory-mapped index belongs to one process, so each process gets its own directory under
+SEMANTIC_CACHE_PATH.
+
+Per-user session locks are held in each process. Discord sends all of a guild's events to one
+shard, and DMs to shard 0, so a user's messages within one guild (or in DMs) are still handled
+one at a time; messages from the same user in guilds served by different processes are not.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from multiprocessing.connection import wait
+from typing import Optional
+import aiohttp
+from bot.config import Settings, get_settings, use_settings
+from bot.tracing import setup_logging
+
+logger = logging.getLogger(__name__)
+
+DISCORD_API_URL = "https://discord.com/api/v10"
+
+
+def parse_shard_count(value: Optional[str]) -> Optional[int]:
+    """SHARD_COUNT as a number of shards; None for "auto" (or unset)."""
+    if value is None or value == "auto":
+        return None
+    count = int(value)
+    if count < 1:
+        raise ValueError(f"SHARD_COUNT must be at least 1, got {count}")
+    return count
+
+
+def plan_shards(shard_count: int, processes: int) -> list[list[int]]:
+    """Contiguous groups of shard IDs, one per process, whose sizes differ by at most one."""
+    processes = max(1, min(processes, shard_count))
+    size, extra = divmod(shard_count, processes)
+    groups, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        groups.append(list(range(start, end)))
+        start = end
+    return groups
+
+
+def shard_for_guild(guild_id: Optional[int], shard_count: int) -> int:
+    """The shard Discord sends a guild's events to; DMs (no guild) go to shard 0."""
+    if guild_id is None:
+        return 0
+    return (guild_id >> 22) % shard_count
+
+
+async def recommended_shard_count(token: str) -> int:
+    """Ask Discord how many shards the bot should run (GET /gateway/bot)."""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{DISCORD_API_URL}/gateway/bot", headers={"Authorization": f"Bot {token}"}) as resp:
+            if resp.status != 200:
+                raise RuntimeError(f"Discord returned HTTP {resp.status} for /gateway/bot")
+            return int((await resp.json())["shards"])
+
+
+def check_shared_backends(processes: int) -> None:
+    """Refuse setups where processes would each keep their own copy of per-user state."""
+    settings = get_settings()
+    if processes > 1 and settings.session_backend == "memory":
+        raise ValueError("SESSION_BACKEND=memory keeps ChatOps sessions inside one process; "
+                         "use sqlite or redis when SHARD_PROCESSES > 1")
+    if processes > 1 and not settings.llm_cache_path:
+        logger.warning("LLM_CACHE_PATH is not set; each process keeps its own response cache")
+
+
+def process_settings(settings: Settings, process_index: int) -> Settings:
+    """Settings for one process of the group: its own semantic cache directory, if one is set."""
+    if not settings.semantic_cache_path:
+        return settings
+    return settings.replace(semantic_cache_path=os.path.join(settings.semantic_cache_path, f"process-{process_index}"))
+
+
+def _run_shard_group(settings: Settings, shard_ids: list[int], shard_count: int, process_index: int) -> None:
+    # Installed before the bot is imported, since its shared clients are built at import.
+    use_settings(process_settings(settings, process_index))
+    from bot.discord_bot import run
+    run(get_settings(), sharded=True, shard_count=shard_count, shard_ids=shard_ids, process_index=process_index)
+
+
+def run_sharded(settings: Settings, shard_count: Optional[int], processes: int, restart_delay: float = 5.0) -> None:
+    """
+    Start one process per shard group and keep them running: a process that exits with an
+    error is restarted after `restart_delay` seconds (its shards resume their sessions); one
+    that exits cleanly is not. Ctrl-C stops them all.
+    """
+    setup_logging(settings.log_format)
+    check_shared_backends(processes)
+    if shard_count is None:
+        shard_count = asyncio.run(recommended_shard_count(settings.discord_token))
+    groups = plan_shards(shard_count, processes)
+    logger.info("Running %d shard(s) in %d process(es): %s", shard_count, len(groups), groups)
+
+    # Spawned children re-import the bot with the settings passed to them.
+    context = multiprocessing.get_context("spawn")
+
+    def spawn(index: int):
+        shard_ids = groups[index]
+        process = context.Process(
+            target=_run_shard_group,
+            args=(settings, shard_ids, shard_count, index),
+            name=f"shards-{shard_ids[0]}-{shard_ids[-1]}",
+        )
+        process.start()
+        return process
+
+    running = {index: spawn(index) for index in range(len(groups))}
+    try:
+        while running:
+            wait([process.sentinel for process in running.values()])
+            for index, process in list(running.items()):
+                if process.is_alive():
+                    continue
+                if process.exitcode == 0:
+                    del running[index]
+                    continue
+                logger.warning("%s exited with code %s; restarting in %.0fs", process.name, process.exitcode,
+                               restart_delay)
+                time.sleep(restart_delay)
+                running[index] = spawn(index)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in running.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
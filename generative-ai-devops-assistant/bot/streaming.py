@@ -0,0 +1,110 @@
+# bot/streaming.py
+import time
+import discord
+from bot.outbound import Attachment, outbox
+
+DISCORD_MSG_LIMIT = 2000
+OVERFLOW_NOTE = "\n\n*(Response continues in the attached file.)*"
+
+
+def _split_point(text: str, limit: int) -> int:
+    """Cut at the last newline inside the limit when it keeps at least half the message."""
+    newline = text.rfind("\n", 0, limit)
+    return newline + 1 if newline >= limit // 2 else limit
+
+
+class DiscordStreamWriter:
+    """
+    Show streamed LLM output in Discord as it arrives.
+
+    The first chunk is posted immediately; after that the message is edited at most once
+    per `edit_interval` seconds. Text past the 2000-character limit rolls over into
+    continuation messages, and once `max_messages` are used up the writer stops editing
+    and attaches the complete answer as a file when the stream finishes.
+    """
+
+    def __init__(
+        self,
+        channel: discord.abc.Messageable,
+        edit_interval: float = 1.0,
+        max_messages: int = 3,
+        max_len: int = DISCORD_MSG_LIMIT,
+        attachment_name: str = "response.txt",
+        clock=time.monotonic,
+    ):
+        self.channel = channel
+        self.edit_interval = edit_interval
+        self.max_messages = max_messages
+        self.max_len = max_len
+        self.attachment_name = attachment_name
+        self._clock = clock
+        self._parts: list[str] = []
+        self._text = ""
+        self._segment_start = 0
+        self._message = None
+        self._shown = ""
+        self._last_content = ""
+        self._last_flush = 0.0
+        self.messages: list[discord.Message] = []
+        self.overflowed = False
+
+    @property
+    def text(self) -> str:
+        if self._parts:
+            self._text += "".join(self._parts)
+            self._parts.clear()
+        return self._text
+
+    async def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        self._parts.append(chunk)
+        if self.overflowed:
+            return
+        if self._message is None or self._clock() - self._last_flush >= self.edit_interval:
+            await self._flush()
+
+    async def finish(self) -> str:
+        """Flush whatever is left and return the complete text."""
+        if not self.overflowed:
+            await self._flush()
+        if self.overflowed:
+            await outbox.send(
+                self.channel,
+                "Response was too long for chat. See attached file for the full answer.",
+                attachments=[Attachment(self.attachment_name, self.text)],
+            )
+        return self.text
+
+    async def _flush(self) -> None:
+        segment = self.text[self._segment_start:]
+        while len(segment) > self.max_len:
+            if len(self.messages) >= self.max_messages:
+                await self._overflow()
+                return
+            cut = _split_point(segment, self.max_len)
+            await self._show(segment[:cut])
+            self._segment_start += cut
+            self._message = None
+            self._shown = ""
+            segment = segment[cut:]
+        await self._show(segment)
+        self._last_flush = self._clock()
+
+    async def _show(self, content: str) -> None:
+        if not content.strip() or content == self._shown:
+            return
+        if self._message is None:
+            # Never merged with other replies: this message is edited as the answer grows.
+            self._message = await outbox.send(self.channel, content, merge=False)
+            self.messages.append(self._message)
+        else:
+            await outbox.edit(self._message, content)
+        self._shown = content
+        self._last_content = content
+
+    async def _overflow(self) -> None:
+        self.overflowed = True
+        if self.messages:
+            room = self.max_len - len(OVERFLOW_NOTE)
+            await outbox.edit(self.messages[-1], self._last_content[:room] + OVERFLOW_NOTE)
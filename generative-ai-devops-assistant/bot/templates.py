@@ -0,0 +1,726 @@
+# bot/templates.py
+import json
+import re
+from typing import Callable, Optional
+from bot.extraction import DOCKERFILE, GITHUB_WORKFLOW, GITLAB_PIPELINE, JENKINSFILE, K8S_MANIFEST, ArtifactKind
+from bot.fingerprint import FileIndex, RepoFingerprint, common_root, fingerprint_repository
+from bot.metrics import registry
+
+# Deterministic generators for the requests the bot sees most: a pipeline, Dockerfile or manifest
+# for a common stack. A Stack is worked out from a repository fingerprint or from keywords in the
+# request; anything the templates can't be sure of is left as None, and the caller asks the model.
+
+TEMPLATE_REQUESTS = registry.counter(
+    "bot_template_requests_total",
+    "Generation requests by how they were answered: template, customized (template plus model) or model.",
+    ("handler", "path"))
+
+PYTHON, NODE, GO, JAVA = "python", "node", "go", "java"
+
+DEFAULT_VERSIONS = {PYTHON: "3.12", NODE: "20", GO: "1.22", JAVA: "21"}
+LANGUAGE_NAMES = {PYTHON: "Python", NODE: "Node.js", GO: "Go", JAVA: "Java"}
+# Fingerprint language names the templates cover.
+FINGERPRINT_LANGUAGES = {"Python": PYTHON, "Node.js": NODE, "TypeScript": NODE, "Go": GO, "Java": JAVA, "Kotlin": JAVA}
+# Frameworks that say the service listens on a port, with the port their defaults use.
+SERVER_FRAMEWORKS = {
+    "FastAPI": 8000, "Flask": 8000, "Django": 8000,
+    "Express": 3000, "Next.js": 3000, "NestJS": 3000,
+    "Gin": 8080, "Echo": 8080, "Fiber": 8080, "Spring Boot": 8080,
+}
+
+
+class Stack:
+    """
+    What the templates need to know about a service. `entrypoint` and `port` are only known for
+    repositories the templates can containerize; pipelines need just the language and build tool.
+    """
+
+    __slots__ = ("language", "build_tool", "version", "framework", "entrypoint", "port", "name",
+                 "lockfile", "build_script", "packages")
+
+    def __init__(self, language: str, build_tool: str, version: Optional[str] = None,
+                 framework: Optional[str] = None, entrypoint: Optional[str] = None, port: Optional[int] = None,
+                 name: str = "app", lockfile: Optional[bool] = None, build_script: Optional[bool] = None,
+                 packages: tuple = ()):
+        self.language = language
+        self.build_tool = build_tool
+        self.version = version or DEFAULT_VERSIONS[language]
+        self.framework = framework
+        self.entrypoint = entrypoint
+        self.port = port
+        self.name = name
+        self.lockfile = lockfile
+        # None when unknown (stacks parsed from text): pipelines then assume a lockfile, and npm
+        # and pnpm build only if there is a build script.
+        self.build_script = build_script
+        # Python app servers the template installs because the dependencies don't list them.
+        self.packages = packages
+
+    @property
+    def deployable(self) -> bool:
+        return self.entrypoint is not None and self.port is not None
+
+    @property
+    def label(self) -> str:
+        language = f"{LANGUAGE_NAMES[self.language]} {self.version}"
+        details = [d for d in (self.framework, self.build_tool) if d and d not in ("pip", "go")]
+        return f"{language} ({', '.join(details)})" if details else language
+
+    def __repr__(self) -> str:
+        return f"Stack({self.label}, entrypoint={self.entrypoint!r}, port={self.port})"
+
+
+# --- Stacks from repositories ---
+
+def _root_path(index: FileIndex, root: str, relative: str) -> Optional[str]:
+    """Original path of `relative` (lowercase, below the common root), if the repository has it."""
+    basename = relative.rsplit("/", 1)[-1]
+    for path in index.basenames.get(basename, ()):
+        if path[len(root):].lower() == relative:
+            return path
+    return None
+
+
+def _first(index: FileIndex, root: str, candidates) -> Optional[str]:
+    """The first candidate (relative path) present in the repository."""
+    for relative in candidates:
+        if _root_path(index, root, relative):
+            return relative
+    return None
+
+
+def _python_stack(index, root, read, fingerprint, framework) -> Optional[Stack]:
+    names = {d.name for d in fingerprint.build_tools}
+    if "Poetry" in names and _root_path(index, root, "pyproject.toml"):
+        build_tool, manifest = "poetry", "pyproject.toml"
+    elif _root_path(index, root, "requirements.txt"):
+        build_tool, manifest = "pip", "requirements.txt"
+    elif _root_path(index, root, "pyproject.toml"):
+        build_tool, manifest = "pyproject", "pyproject.toml"
+    else:
+        return None
+    stack = Stack(PYTHON, build_tool, framework=framework, lockfile=bool(_root_path(index, root, "poetry.lock")))
+    server = None
+    if framework == "Django":
+        settings = [p[len(root):].lower() for p in index.basenames.get("wsgi.py", ())]
+        settings = [p for p in settings if p.count("/") == 1]
+        if len(settings) == 1 and _root_path(index, root, "manage.py"):
+            stack.entrypoint = settings[0][:-len(".py")].replace("/", ".") + ":application"
+            server = "gunicorn"
+    elif framework in ("FastAPI", "Flask"):
+        modules = ("main", "app", "server", "api", "asgi", "wsgi") if framework == "FastAPI" \
+            else ("app", "wsgi", "main", "server", "api")
+        found = _first(index, root, [f"{m}.py" for m in modules] + [f"{d}/{m}.py" for d in ("app", "src") for m in modules])
+        if found:
+            stack.entrypoint = found[:-len(".py")].replace("/", ".") + ":app"
+        server = "uvicorn" if framework == "FastAPI" else "gunicorn"
+    if stack.entrypoint:
+        stack.port = SERVER_FRAMEWORKS[framework]
+        path = _root_path(index, root, manifest)
+        text = (read(path) or "").lower() if path and read else ""
+        if not re.search(rf"(?<![\w-]){server}(?![\w-])", text):
+            stack.packages = (server,)
+    return stack
+
+
+def _node_stack(index, root, read, fingerprint, framework) -> Optional[Stack]:
+    path = _root_path(index, root, "package.json")
+    text = read(path) if path and read else None
+    if not text:
+        return None
+    try:
+        scripts = json.loads(text).get("scripts") or {}
+    except (ValueError, AttributeError):
+        return None
+    build_tool, lockfile = "npm", bool(_root_path(index, root, "package-lock.json"))
+    for lock, tool in (("yarn.lock", "yarn"), ("pnpm-lock.yaml", "pnpm")):
+        if _root_path(index, root, lock):
+            build_tool, lockfile = tool, True
+    stack = Stack(NODE, build_tool, framework=framework, lockfile=lockfile, build_script="build" in scripts)
+    if "start" in scripts:
+        stack.entrypoint = "start"
+    elif not stack.build_script:
+        stack.entrypoint = _first(index, root, ("server.js", "index.js", "app.js", "main.js"))
+    if stack.entrypoint and framework:
+        stack.port = SERVER_FRAMEWORKS[framework]
+    return stack
+
+
+def _go_stack(index, root, read, fingerprint, framework) -> Optional[Stack]:
+    path = _root_path(index, root, "go.mod")
+    if not path:
+        return None
+    match = re.search(r"^go\s+(\d+\.\d+)", (read(path) or "") if read else "", re.M)
+    stack = Stack(GO, "go", version=match.group(1) if match else None, framework=framework,
+                  lockfile=bool(_root_path(index, root, "go.sum")))
+    if _root_path(index, root, "main.go"):
+        stack.entrypoint = "."
+    else:
+        commands = [p[len(root):] for p in index.basenames.get("main.go", ())
+                    if re.fullmatch(r"cmd/[^/]+/main\.go", p[len(root):].lower())]
+        if len(commands) == 1:
+            stack.entrypoint = "./" + commands[0][:-len("/main.go")]
+    if stack.entrypoint and framework:
+        stack.port = SERVER_FRAMEWORKS[framework]
+    return stack
+
+
+def _java_stack(index, root, read, fingerprint, framework) -> Optional[Stack]:
+    if _root_path(index, root, "pom.xml"):
+        build_tool, manifest = "maven", "pom.xml"
+    elif _root_path(index, root, "build.gradle") or _root_path(index, root, "build.gradle.kts"):
+        build_tool = "gradlew" if _root_path(index, root, "gradlew") else "gradle"
+        manifest = "build.gradle" if _root_path(index, root, "build.gradle") else "build.gradle.kts"
+    else:
+        return None
+    path = _root_path(index, root, manifest)
+    text = (read(path) or "") if read else ""
+    match = re.search(r"<java\.version>(\d+)</java\.version>|languageVersion\s*(?:=|\.set\()\s*JavaLanguageVersion\.of\((\d+)\)", text)
+    stack = Stack(JAVA, build_tool, version=match and (match.group(1) or match.group(2)), framework=framework)
+    if framework == "Spring Boot":
+        stack.entrypoint, stack.port = "jar", SERVER_FRAMEWORKS[framework]
+    return stack
+
+
+STACK_BUILDERS = {PYTHON: _python_stack, NODE: _node_stack, GO: _go_stack, JAVA: _java_stack}
+
+
+def detect_stack(file_list, read_file: Optional[Callable[[str], Optional[str]]] = None, name: str = "app",
+                 fingerprint: Optional[RepoFingerprint] = None) -> Optional[Stack]:
+    """
+    The Stack of a repository, or None when the templates don't cover it (unsupported language,
+    documentation site, or a service nested below the repository root). Pass the fingerprint when
+    one was already computed; `read_file` is only asked for root-level manifests.
+    """
+    index = file_list if isinstance(file_list, FileIndex) else FileIndex(file_list)
+    fingerprint = fingerprint or fingerprint_repository(index, read_file)
+    if fingerprint.is_documentation or fingerprint.language is None:
+        return None
+    language = FINGERPRINT_LANGUAGES.get(fingerprint.language.name)
+    if language is None:
+        return None
+    framework = next((d.name for d in fingerprint.frameworks if d.confidence >= 0.5 and d.name in SERVER_FRAMEWORKS),
+                     None)
+    stack = STACK_BUILDERS[language](index, common_root(index.paths), read_file, fingerprint, framework)
+    if stack is not None:
+        stack.name = service_name(name)
+    return stack
+
+
+def service_name(name: str) -> str:
+    """A Kubernetes object name (DNS label) for a repository or folder name."""
+    name = re.sub(r"[^a-z0-9-]+", "-", name.lower()).strip("-")[:63].rstrip("-")
+    return name or "app"
+
+
+# --- Stacks from requests ---
+
+LANGUAGE_KEYWORDS = {
+    PYTHON: ("python", "django", "flask", "fastapi", "pytest", "poetry", "pip"),
+    NODE: ("node", "nodejs", "node.js", "npm", "yarn", "pnpm", "javascript", "typescript", "express",
+           "react", "next.js", "nextjs", "nestjs", "vue"),
+    GO: ("golang",),
+    JAVA: ("java", "maven", "gradle", "spring", "kotlin"),
+}
+# "go" alone is too common a word; it counts next to a noun that makes it a language.
+_GO_RE = re.compile(r"\bgo\s+(?:service|app|application|api|module|project|binary|microservice|code|backend|server|cli)s?\b"
+                    r"|\b(?:in|with|using|for)\s+go(?![\w-])|\bgo\s+\d+\.\d+")
+_VERSION_RE = re.compile(r"\b(python|node(?:\.?js)?|golang|go|java|jdk)\s*v?(\d+(?:\.\d+)?)\b")
+_VERSION_LANGUAGES = {"python": PYTHON, "node": NODE, "nodejs": NODE, "node.js": NODE, "golang": GO, "go": GO,
+                      "java": JAVA, "jdk": JAVA}
+_URL_RE = re.compile(r"https?://\S+")
+_WORD_RE = re.compile(r"[a-z][a-z0-9.+#-]*")
+# Words a routine request is made of. Anything else ("helm", "sonarqube", "nightly", "staging")
+# means the request wants more than the template, and the model customizes it.
+ROUTINE_WORDS = frozenset("""
+a an the and or for with to of on in into at by from my our your me us i we it its this that these please
+can could would you create generate make write give set up setup need want add provide simple basic standard
+default usual typical new using use via every each whenever when is are so then also just
+ci cd ci/cd cicd pipeline pipelines workflow workflows file yaml yml config configuration jenkinsfile
+github actions action gitlab gitlab-ci jenkins
+build building test testing tested unit lint linting check compile run install dependencies deps
+commit pull request merge main master branch
+service services app application project repo repository api backend microservice server code
+docker dockerfile image images container containers containerize containerized push publish registry
+python node nodejs node.js npm yarn pnpm javascript typescript js ts golang go java maven gradle gradlew
+spring boot kotlin django flask fastapi express react next.js nextjs nestjs vue pytest poetry pip jdk
+""".split())
+_DOCKER_WORDS = ("docker", "image", "container", "registry")
+
+
+def stack_from_text(text: str) -> Optional[Stack]:
+    """
+    The Stack a request names ("GitLab CI for a Node 20 app with pnpm"), or None when it names no
+    language or more than one.
+    """
+    lowered = _URL_RE.sub(" ", text.lower())
+    words = set(_WORD_RE.findall(lowered))
+    languages = {language for language, keywords in LANGUAGE_KEYWORDS.items() if not words.isdisjoint(keywords)}
+    if _GO_RE.search(lowered):
+        languages.add(GO)
+    if len(languages) != 1:
+        return None
+    language = languages.pop()
+    version = next((v for name, v in _VERSION_RE.findall(lowered) if _VERSION_LANGUAGES[name] == language), None)
+    if language == PYTHON:
+        build_tool = "poetry" if "poetry" in words else "pip"
+    elif language == NODE:
+        build_tool = "pnpm" if "pnpm" in words else "yarn" if "yarn" in words else "npm"
+    elif language == JAVA:
+        build_tool = "gradle" if "gradle" in words or "gradlew" in words else "maven"
+    else:
+        build_tool = "go"
+    return Stack(language, build_tool, version=version)
+
+
+def extra_requirements(text: str) -> list[str]:
+    """Words of a request that no template covers; empty for a routine request."""
+    lowered = _URL_RE.sub(" ", text.lower())
+    extras = []
+    for word in _WORD_RE.findall(lowered):
+        word = word.strip(".-")
+        if word.endswith("s") and word[:-1] in ROUTINE_WORDS:
+            continue
+        if len(word) > 2 and word not in ROUTINE_WORDS and not _VERSION_RE.fullmatch(word) and word not in extras:
+            extras.append(word)
+    return extras
+
+
+def wants_image(text: str) -> bool:
+    lowered = text.lower()
+    return any(word in lowered for word in _DOCKER_WORDS)
+
+
+# --- Dockerfiles ---
+
+def _python_dockerfile(stack: Stack) -> str:
+    if stack.build_tool == "poetry":
+        install = ("COPY pyproject.toml poetry.lock* ./\n"
+                   "RUN pip install --no-cache-dir poetry \\\n"
+                   " && poetry config virtualenvs.create false \\\n"
+                   " && poetry install --only main --no-root --no-interaction")
+    elif stack.build_tool == "pip":
+        install = "COPY requirements.txt .\nRUN pip install --no-cache-dir -r requirements.txt"
+    else:
+        install = "COPY . .\nRUN pip install --no-cache-dir ."
+    if stack.packages:
+        install += f"\nRUN pip install --no-cache-dir {' '.join(stack.packages)}"
+    if stack.framework == "FastAPI":
+        command = f'["uvicorn", "{stack.entrypoint}", "--host", "0.0.0.0", "--port", "{stack.port}"]'
+    else:
+        command = f'["gunicorn", "--bind", "0.0.0.0:{stack.port}", "--workers", "2", "{stack.entrypoint}"]'
+    return f"""# {stack.label} service, served by {"Uvicorn" if stack.framework == "FastAPI" else "Gunicorn"}.
+# Dependencies are installed before the source is copied, so code changes reuse the cached layer.
+FROM python:{stack.version}-slim
+
+ENV PYTHONDONTWRITEBYTECODE=1 \\
+    PYTHONUNBUFFERED=1
+
+WORKDIR /app
+{install}
+COPY . .
+
+# Run as an unprivileged user.
+RUN useradd --create-home --uid 10001 app
+USER 10001
+
+EXPOSE {stack.port}
+CMD {command}
+"""
+
+
+_NODE_INSTALL = {
+    "npm": ("npm ci", "npm install"),
+    "yarn": ("yarn install --frozen-lockfile", "yarn install"),
+    "pnpm": ("corepack pnpm install --frozen-lockfile", "corepack pnpm install"),
+}
+_NODE_RUN = {"npm": "npm run", "yarn": "yarn run", "pnpm": "corepack pnpm run"}
+_NODE_LOCKFILES = {"npm": "package-lock.json", "yarn": "yarn.lock", "pnpm": "pnpm-lock.yaml"}
+
+
+def _node_dockerfile(stack: Stack) -> str:
+    install = _NODE_INSTALL[stack.build_tool][0 if stack.lockfile else 1]
+    if stack.build_script:
+        # The build usually needs devDependencies, which NODE_ENV=production leaves out.
+        install = f"NODE_ENV=development {install}"
+    lockfile = f" {_NODE_LOCKFILES[stack.build_tool]}" if stack.lockfile else ""
+    build = f"RUN {_NODE_RUN[stack.build_tool]} build\n" if stack.build_script else ""
+    if stack.entrypoint == "start":
+        # npm runs the start script whichever package manager installed the dependencies.
+        command = '["npm", "start"]'
+    else:
+        command = json.dumps(["node", stack.entrypoint])
+    return f"""# {stack.label} service.
+# Dependencies are installed before the source is copied, so code changes reuse the cached layer.
+FROM node:{stack.version}-alpine
+
+ENV NODE_ENV=production
+WORKDIR /app
+COPY package.json{lockfile} ./
+RUN {install}
+COPY . .
+{build}
+# The node image's unprivileged "node" user.
+USER 1000
+
+EXPOSE {stack.port}
+CMD {command}
+"""
+
+
+def _go_dockerfile(stack: Stack) -> str:
+    sums = " go.sum" if stack.lockfile else ""
+    return f"""# {stack.label} service: compiled in a build stage, shipped as a static binary on distroless.
+FROM golang:{stack.version}-alpine AS build
+WORKDIR /src
+COPY go.mod{sums} ./
+RUN go mod download
+COPY . .
+RUN CGO_ENABLED=0 go build -trimpath -ldflags="-s -w" -o /out/app {stack.entrypoint}
+
+FROM gcr.io/distroless/static-debian12
+COPY --from=build /out/app /app
+USER 65532:65532
+EXPOSE {stack.port}
+ENTRYPOINT ["/app"]
+"""
+
+
+def _java_dockerfile(stack: Stack) -> str:
+    if stack.build_tool == "maven":
+        build = f"""FROM maven:3.9-eclipse-temurin-{stack.version} AS build
+WORKDIR /src
+COPY pom.xml .
+RUN mvn -B -q dependency:go-offline
+COPY src ./src
+RUN mvn -B -q package -DskipTests
+RUN cp target/*.jar /app.jar"""
+    else:
+        gradle = "./gradlew" if stack.build_tool == "gradlew" else "gradle"
+        build = f"""FROM gradle:8-jdk{stack.version} AS build
+WORKDIR /src
+COPY . .
+RUN {gradle} bootJar --no-daemon
+RUN cp build/libs/*.jar /app.jar"""
+    return f"""# {stack.label} service: the jar is built in a build stage and run on a JRE-only image.
+{build}
+
+FROM eclipse-temurin:{stack.version}-jre
+WORKDIR /app
+COPY --from=build /app.jar app.jar
+USER 10001
+EXPOSE {stack.port}
+ENTRYPOINT ["java", "-XX:MaxRAMPercentage=75", "-jar", "/app/app.jar"]
+"""
+
+
+DOCKERFILES = {PYTHON: _python_dockerfile, NODE: _node_dockerfile, GO: _go_dockerfile, JAVA: _java_dockerfile}
+
+
+def render_dockerfile(stack: Stack) -> str:
+    return DOCKERFILES[stack.language](stack)
+
+
+# --- Kubernetes ---
+
+def render_k8s_manifest(stack: Stack) -> str:
+    memory = "1Gi" if stack.language == JAVA else "512Mi"
+    delay = 30 if stack.language == JAVA else 5
+    return f"""# {stack.label} service: a Deployment of two replicas behind a ClusterIP Service on port 80.
+# Replace the image with the one your pipeline pushes.
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: {stack.name}
+  labels:
+    app: {stack.name}
+spec:
+  replicas: 2
+  selector:
+    matchLabels:
+      app: {stack.name}
+  template:
+    metadata:
+      labels:
+        app: {stack.name}
+    spec:
+      securityContext:
+        runAsNonRoot: true
+      containers:
+        - name: {stack.name}
+          image: {stack.name}:latest
+          ports:
+            - containerPort: {stack.port}
+          readinessProbe:
+            tcpSocket:
+              port: {stack.port}
+            initialDelaySeconds: {delay}
+            periodSeconds: 10
+          livenessProbe:
+            tcpSocket:
+              port: {stack.port}
+            initialDelaySeconds: {delay + 10}
+            periodSeconds: 20
+          resources:
+            requests:
+              cpu: 100m
+              memory: 128Mi
+            limits:
+              cpu: 500m
+              memory: {memory}
+---
+apiVersion: v1
+kind: Service
+metadata:
+  name: {stack.name}
+  labels:
+    app: {stack.name}
+spec:
+  selector:
+    app: {stack.name}
+  ports:
+    - port: 80
+      targetPort: {stack.port}
+"""
+
+
+def render_deployment(stack: Stack) -> dict[ArtifactKind, str]:
+    """Dockerfile and manifest for a deployable stack."""
+    return {DOCKERFILE: render_dockerfile(stack), K8S_MANIFEST: render_k8s_manifest(stack)}
+
+
+# --- Pipelines ---
+
+class Recipe:
+    """The language half of a pipeline: the image or setup step, and the commands of each stage."""
+
+    __slots__ = ("image", "setup", "install", "test", "build", "cache", "variables")
+
+    def __init__(self, image: str, setup: str, install: list, test: list, build: list = (),
+                 cache: str = "", variables: Optional[dict] = None):
+        self.image = image
+        # The actions/setup-* step for GitHub Actions, as YAML lines below `steps:`.
+        self.setup = setup
+        self.install = list(install)
+        self.test = list(test)
+        self.build = list(build)
+        # Directory GitLab caches between jobs, and the variables that point tools at it.
+        self.cache = cache
+        self.variables = variables or {}
+
+
+def _python_recipe(stack: Stack) -> Recipe:
+    # A virtualenv in the workspace works whether the job runs as root or not (Jenkins agents don't).
+    if stack.build_tool == "poetry":
+        install = ["python -m venv .venv", ".venv/bin/pip install poetry",
+                   "POETRY_VIRTUALENVS_IN_PROJECT=true .venv/bin/poetry install --no-interaction"]
+    elif stack.build_tool == "pip":
+        install = ["python -m venv .venv", ".venv/bin/pip install -r requirements.txt pytest"]
+    else:
+        install = ["python -m venv .venv", ".venv/bin/pip install . pytest"]
+    setup = f"""      - uses: actions/setup-python@v5
+        with:
+          python-version: "{stack.version}"
+          cache: pip"""
+    return Recipe(f"python:{stack.version}-slim", setup, install, [".venv/bin/python -m pytest"],
+                  cache=".cache/pip", variables={"PIP_CACHE_DIR": "$CI_PROJECT_DIR/.cache/pip"})
+
+
+def _node_recipe(stack: Stack) -> Recipe:
+    install = _NODE_INSTALL[stack.build_tool][0 if stack.lockfile is not False else 1]
+    run = _NODE_RUN[stack.build_tool]
+    if stack.build_tool == "npm":
+        build = ["npm run build" if stack.build_script else "npm run build --if-present"]
+    elif stack.build_tool == "pnpm":
+        build = ["corepack pnpm run build" if stack.build_script else "corepack pnpm run --if-present build"]
+    else:
+        build = ["yarn run build"] if stack.build_script else []
+    cache = {"npm": "\n          cache: npm", "yarn": "\n          cache: yarn", "pnpm": ""}[stack.build_tool]
+    setup = f"""      - uses: actions/setup-node@v4
+        with:
+          node-version: "{stack.version}\"{cache}"""
+    return Recipe(f"node:{stack.version}", setup, [install], [run.replace(" run", " test")], build,
+                  cache=".npm", variables={"npm_config_cache": "$CI_PROJECT_DIR/.npm"})
+
+
+def _go_recipe(stack: Stack) -> Recipe:
+    setup = f"""      - uses: actions/setup-go@v5
+        with:
+          go-version: "{stack.version}\""""
+    return Recipe(f"golang:{stack.version}", setup, ["go mod download"], ["go vet ./...", "go test -race ./..."],
+                  ["go build ./..."], cache=".go", variables={"GOPATH": "$CI_PROJECT_DIR/.go"})
+
+
+def _java_recipe(stack: Stack) -> Recipe:
+    tool = "maven" if stack.build_tool == "maven" else "gradle"
+    setup = f"""      - uses: actions/setup-java@v4
+        with:
+          distribution: temurin
+          java-version: "{stack.version}"
+          cache: {tool}"""
+    if tool == "maven":
+        return Recipe(f"maven:3.9-eclipse-temurin-{stack.version}", setup, [], ["mvn -B verify"],
+                      cache=".m2/repository", variables={"MAVEN_OPTS": "-Dmaven.repo.local=$CI_PROJECT_DIR/.m2/repository"})
+    gradle = "./gradlew" if stack.build_tool == "gradlew" else "gradle"
+    return Recipe(f"gradle:8-jdk{stack.version}", setup, [], [f"{gradle} build --no-daemon"],
+                  cache=".gradle", variables={"GRADLE_USER_HOME": "$CI_PROJECT_DIR/.gradle"})
+
+
+RECIPES = {PYTHON: _python_recipe, NODE: _node_recipe, GO: _go_recipe, JAVA: _java_recipe}
+
+
+def _run(commands: list, indent: str) -> str:
+    """A GitHub Actions `run:` value: inline for one command, a literal block for several."""
+    if len(commands) == 1:
+        return f"run: {_yaml_scalar(commands[0])}"
+    return "run: |\n" + "\n".join(f"{indent}  {command}" for command in commands)
+
+
+def _yaml_scalar(value: str) -> str:
+    if re.search(r":\s|\s#|^[\s\[\]{}&*!|>'\"%@`-]", value):
+        return json.dumps(value)
+    return value
+
+
+def _github_workflow(stack: Stack, recipe: Recipe, image: bool) -> str:
+    steps = ["      - uses: actions/checkout@v4", recipe.setup]
+    for name, commands in (("Install dependencies", recipe.install), ("Test", recipe.test), ("Build", recipe.build)):
+        if commands:
+            steps.append(f"      - name: {name}\n        {_run(commands, '        ')}")
+    text = f"""# CI for a {stack.label} service: install, test and build on every push and pull request.
+name: CI
+
+on:
+  push:
+    branches: [main]
+  pull_request:
+
+jobs:
+  build:
+    runs-on: ubuntu-latest
+    steps:
+{chr(10).join(steps)}
+"""
+    if image:
+        text += """
+  # Builds the image on every run and pushes it to GitHub Container Registry from main.
+  image:
+    needs: build
+    runs-on: ubuntu-latest
+    permissions:
+      contents: read
+      packages: write
+    steps:
+      - uses: actions/checkout@v4
+      - uses: docker/login-action@v3
+        if: github.event_name == 'push'
+        with:
+          registry: ghcr.io
+          username: ${{ github.actor }}
+          password: ${{ secrets.GITHUB_TOKEN }}
+      - uses: docker/build-push-action@v6
+        with:
+          push: ${{ github.event_name == 'push' }}
+          tags: ghcr.io/${{ github.repository }}:${{ github.sha }}
+"""
+    return text
+
+
+def _gitlab_pipeline(stack: Stack, recipe: Recipe, image: bool) -> str:
+    stages = ["test"] + (["build"] if recipe.build else []) + (["image"] if image else [])
+    variables = "".join(f'\n  {name}: "{value}"' for name, value in recipe.variables.items())
+    variables = f"\nvariables:{variables}\n" if variables else ""
+    script = lambda commands: "".join(f"\n    - {_yaml_scalar(command)}" for command in recipe.install + commands)
+    text = f"""# CI for a {stack.label} service: install, test and build on every push and merge request.
+stages:{"".join(f"{chr(10)}  - {stage}" for stage in stages)}
+
+default:
+  image: {recipe.image}
+{variables}
+# Dependency downloads are cached per branch.
+cache:
+  key: "$CI_COMMIT_REF_SLUG"
+  paths:
+    - {recipe.cache}/
+
+test:
+  stage: test
+  script:{script(recipe.test)}
+"""
+    if recipe.build:
+        text += f"""
+build:
+  stage: build
+  script:{script(recipe.build)}
+"""
+    if image:
+        text += """
+# Builds the image and pushes it to the project's container registry from the default branch.
+image:
+  stage: image
+  image: docker:27
+  services:
+    - docker:27-dind
+  variables:
+    DOCKER_TLS_CERTDIR: "/certs"
+  cache: {}
+  rules:
+    - if: $CI_COMMIT_BRANCH == $CI_DEFAULT_BRANCH
+  script:
+    - docker login -u "$CI_REGISTRY_USER" -p "$CI_REGISTRY_PASSWORD" "$CI_REGISTRY"
+    - docker build -t "$CI_REGISTRY_IMAGE:$CI_COMMIT_SHORT_SHA" .
+    - docker push "$CI_REGISTRY_IMAGE:$CI_COMMIT_SHORT_SHA"
+"""
+    return text
+
+
+def _groovy(command: str) -> str:
+    return "'" + command.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def _jenkinsfile(stack: Stack, recipe: Recipe, image: bool) -> str:
+    stages = []
+    for name, commands in (("Install", recipe.install), ("Test", recipe.test), ("Build", recipe.build)):
+        if commands:
+            steps = "\n".join(f"                sh {_groovy(command)}" for command in commands)
+            stages.append(f"""        stage('{name}') {{
+            steps {{
+{steps}
+            }}
+        }}""")
+    if image:
+        stages.append("""        // Builds the image on the main branch, on an agent with Docker.
+        stage('Image') {
+            when { branch 'main' }
+            agent any
+            steps {
+                sh 'docker build -t ${IMAGE_NAME}:${BUILD_NUMBER} .'
+            }
+        }""")
+    return f"""// CI for a {stack.label} service: install, test and build in a {recipe.image} container.
+pipeline {{
+    agent {{
+        docker {{ image '{recipe.image}' }}
+    }}
+    environment {{
+        // Tool caches go to the workspace; the container's user has no home directory.
+        HOME = "${{env.WORKSPACE}}"
+        IMAGE_NAME = '{stack.name}'
+    }}
+    options {{
+        timeout(time: 30, unit: 'MINUTES')
+    }}
+    stages {{
+{chr(10).join(stages)}
+    }}
+}}
+"""
+
+
+PIPELINES = {GITHUB_WORKFLOW: _github_workflow, GITLAB_PIPELINE: _gitlab_pipeline, JENKINSFILE: _jenkinsfile}
+
+
+def render_pipeline(kind: ArtifactKind, stack: Stack, image: bool = False) -> str:
+    """A pipeline of `kind` that installs, tests and builds the stack, plus a Docker image when `image`."""
+    return PIPELINES[kind](stack, RECIPES[stack.language](stack), image)
+
@@ -0,0 +1,93 @@
+# bot/tracing.py
+import json
+import logging
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from bot.metrics import REQUEST_SECONDS, STAGE_ERRORS, STAGE_SECONDS
+
+logger = logging.getLogger("bot")
+
+# Set per Discord message; inherited by every task the handler spawns.
+current_trace_id: ContextVar[Optional[str]] = ContextVar("current_trace_id", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(8)
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    """Log `event` with structured fields; the JSON formatter adds the current trace ID."""
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+def setup_logging(log_format: str = "text") -> None:
+    """Log INFO and up to stderr through discord.py's handler; "json" for one JSON object per line."""
+    import discord
+    if log_format == "json":
+        discord.utils.setup_logging(formatter=JsonFormatter())
+    else:
+        discord.utils.setup_logging()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace_id and any event fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None) or current_trace_id.get()
+        if trace_id:
+            entry["trace_id"] = trace_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+@contextmanager
+def trace_request(handler: str, **fields):
+    """
+    Give one Discord message a trace ID and time it end to end under `handler`.
+    Yields the trace ID.
+    """
+    trace_id = new_trace_id()
+    token = current_trace_id.set(trace_id)
+    started = time.perf_counter()
+    log_event("request.start", handler=handler, **fields)
+    outcome = "ok"
+    try:
+        yield trace_id
+    except BaseException as e:
+        outcome = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        REQUEST_SECONDS.labels(handler=handler).observe(elapsed)
+        log_event("request.end", handler=handler, seconds=round(elapsed, 4), outcome=outcome)
+        current_trace_id.reset(token)
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """Time one stage of a request (prompt_build, llm_call, parse, upload, ...)."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.labels(stage=name).inc()
+        log_event("stage.error", logging.WARNING, stage=name, error=f"{type(e).__name__}: {e}", **fields)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        log_event("stage", logging.DEBUG, stage=name, seconds=round(elapsed, 4), **fields)
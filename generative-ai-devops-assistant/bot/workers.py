@@ -0,0 +1,74 @@
+# bot/workers.py
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Optional
+from bot.config import get_settings
+from bot.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class CpuPool:
+    """
+    Worker processes for CPU-bound steps, so zip inspection and parsing model output don't
+    hold up the event loop that also serves gateway traffic. Functions and arguments must be
+    picklable. Workers are spawned on first use; with max_workers=0 everything runs inline.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = get_settings().cpu_workers if max_workers is None else max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.submitted = 0
+        self.inline = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_workers > 0
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Spawn rather than fork: the parent has an event loop and threads running.
+            self._executor = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run(self, func, *args):
+        """Run func(*args) in a worker process and return its result; exceptions are re-raised here."""
+        if not self.enabled:
+            self.inline += 1
+            return func(*args)
+        self.submitted += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self.executor, partial(func, *args))
+        except BrokenProcessPool as e:
+            # A worker died (OOM, kill); start a fresh pool next time and do this one inline.
+            logger.warning("Process pool broke, restarting it: %s", e)
+            self._executor = None
+            self.inline += 1
+            return func(*args)
+
+    async def warm_up(self) -> None:
+        """Start every worker now instead of on the first zip or reply."""
+        if self.enabled:
+            await asyncio.gather(*(self.run(int) for _ in range(self.max_workers)))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared pool for the process's handlers.
+cpu_pool = CpuPool()
+
+
+@registry.register_collector
+def _worker_metrics():
+    yield "bot_cpu_pool_workers", "Worker processes for CPU-heavy steps (0 = inline).", {}, cpu_pool.max_workers
+    yield "bot_cpu_pool_submitted", "CPU-heavy steps sent to worker processes.", {}, cpu_pool.submitted
+    yield "bot_cpu_pool_inline", "CPU-heavy steps run on the event loop instead.", {}, cpu_pool.inline
@@ -1,4 +1,4 @@
-from bot.discord_bot import run
+from bot.app import main
 
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,121 @@
+import io
+import os
+import unittest
+import zipfile
+from unittest import mock
+
+from bot import archive as archive_module
+from bot.archive import ArchiveError, RepoArchive, inspect_archive, inspect_zip_attachment
+
+
+def make_zip(files: dict) -> io.BytesIO:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    buf.seek(0)
+    return buf
+
+
+class TestRepoArchive(unittest.TestCase):
+
+    def test_lists_files_and_reads_manifests_on_demand(self):
+        buf = make_zip({
+            "app/": "",
+            "app/requirements.txt": "fastapi\nuvicorn\n",
+            "app/main.py": "print('hi')",
+            "app/vendor/requirements.txt": "requests\n",
+        })
+        with RepoArchive(buf) as archive:
+            self.assertEqual(len(archive.file_list), 3)
+            self.assertEqual(archive.find("requirements.txt"), "app/requirements.txt")
+            self.assertIn("fastapi", archive.read_manifest("requirements.txt"))
+            self.assertEqual(set(archive.manifests()), {"requirements.txt"})
+
+    def test_entry_count_limit(self):
+        buf = make_zip({f"f{i}.txt": "x" for i in range(5)})
+        with self.assertRaises(ArchiveError):
+            RepoArchive(buf, max_entries=4)
+
+    def test_zip_bomb_ratio_limit(self):
+        buf = make_zip({"bomb.txt": "0" * (4 * 1024 * 1024)})
+        with self.assertRaises(ArchiveError):
+            RepoArchive(buf, max_compression_ratio=100)
+
+    def test_total_uncompressed_size_limit(self):
+        buf = make_zip({"a.txt": "a" * 1000, "b.txt": "b" * 1000})
+        with self.assertRaises(ArchiveError):
+            RepoArchive(buf, max_uncompressed_bytes=1500)
+
+    def test_oversized_manifest_is_not_read(self):
+        buf = make_zip({"package.json": "{" + " " * 2000 + "}"})
+        with RepoArchive(buf, manifest_max_bytes=100) as archive:
+            self.assertIsNone(archive.read_manifest("package.json"))
+
+    def test_invalid_zip(self):
+        with self.assertRaises(ArchiveError):
+            RepoArchive(io.BytesIO(b"not a zip"))
+
+
+class FakeContent:
+    def __init__(self, data):
+        self.data = data
+
+    async def iter_chunked(self, size):
+        for start in range(0, len(self.data), size):
+            yield self.data[start:start + size]
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.status = 200
+        self.content_length = len(data)
+        self.content = FakeContent(data)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+
+class FakeSession:
+    def __init__(self, data):
+        self.data = data
+
+    def get(self, url):
+        return FakeResponse(self.data)
+
+
+class TestInspectZipAttachment(unittest.IsolatedAsyncioTestCase):
+
+    async def inspect(self, data, size=None):
+        seen = []
+
+        async def run(func, source, name):
+            seen.append(source)
+            return func(source, name)
+
+        pool = mock.Mock(enabled=True, run=run)
+        with mock.patch.object(archive_module, "cpu_pool", pool):
+            file_list, description, _ = await inspect_zip_attachment(FakeSession(data), "https://cdn/app.zip",
+                                                                     size=size)
+        self.assertEqual(sorted(file_list), ["app/app.py", "app/requirements.txt"])
+        self.assertEqual(inspect_archive(data)[1], description)
+        return seen[0]
+
+    async def test_small_uploads_stay_in_memory(self):
+        data = make_zip({"app/requirements.txt": "flask\n", "app/app.py": "x"}).getvalue()
+        self.assertEqual(await self.inspect(data, size=len(data)), data)
+
+    async def test_large_or_unknown_uploads_reach_workers_as_a_removed_path(self):
+        data = make_zip({"app/requirements.txt": "flask\n", "app/app.py": "x"}).getvalue()
+        for size in (None, archive_module.SPOOL_MEMORY_BYTES + 1):
+            with self.subTest(size=size):
+                source = await self.inspect(data, size=size)
+                self.assertIsInstance(source, str)
+                self.assertFalse(os.path.exists(source))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import asyncio
+import time
+import unittest
+
+from bot.artifacts import (
+    ArtifactSpec,
+    deploy_artifact_specs,
+    generate_artifact,
+    generate_artifacts,
+    repair_artifacts,
+)
+from bot.extraction import DOCKERFILE, K8S_MANIFEST, extract_artifacts
+from bot.llm_client import ErrorReply
+
+
+class TestArtifacts(unittest.IsolatedAsyncioTestCase):
+
+    async def test_artifacts_run_concurrently_and_are_delivered_as_ready(self):
+        delays = {"slow": 0.1, "fast": 0.05}
+        delivered = []
+
+        async def generate(prompt):
+            await asyncio.sleep(delays[prompt])
+            return f"content of {prompt}"
+
+        async def on_ready(result):
+            delivered.append(result.spec.name)
+
+        specs = [ArtifactSpec("slow", "slow.txt", "slow"), ArtifactSpec("fast", "fast.txt", "fast")]
+        started = time.monotonic()
+        results = await generate_artifacts(specs, on_ready=on_ready, generate=generate)
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.14)
+        self.assertEqual(delivered, ["fast", "slow"])
+        self.assertEqual([r.content for r in results], ["content of slow", "content of fast"])
+
+    async def test_one_failure_does_not_affect_the_others(self):
+        async def generate(prompt):
+            if prompt == "bad":
+                return ErrorReply("Sorry, I encountered an error generating your file.")
+            return "Sorry for the wait: ok"
+
+        specs = [ArtifactSpec("good", "g", "good", retries=0), ArtifactSpec("bad", "b", "bad", retries=1)]
+        good, bad = await generate_artifacts(specs, generate=generate)
+        self.assertEqual(good.content, "Sorry for the wait: ok")
+        self.assertFalse(bad.ok)
+        self.assertEqual(bad.attempts, 2)
+
+    async def test_timeout_is_per_artifact_and_retried(self):
+        calls = 0
+
+        async def generate(prompt):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(1)
+            return "FROM python"
+
+        result = await generate_artifact(ArtifactSpec("Dockerfile", "Dockerfile", "p", timeout=0.01, retries=1),
+                                         generate=generate)
+        self.assertEqual((result.content, result.attempts), ("FROM python", 2))
+
+    async def test_invalid_artifact_is_re_asked_with_its_problems(self):
+        prompts = []
+
+        async def generate(prompt):
+            prompts.append(prompt)
+            return "```dockerfile\nFROM python:3.12\nRUN pip install .\n```" if len(prompts) > 1 \
+                else "```dockerfile\nRUN pip install .\n```"
+
+        result = await generate_artifact(ArtifactSpec.for_kind(DOCKERFILE, "make a Dockerfile", retries=1),
+                                         generate=generate)
+        self.assertEqual((result.content, result.problems), ("FROM python:3.12\nRUN pip install .", []))
+        self.assertIn("RUN before the first FROM", prompts[1])
+
+    async def test_repair_re_asks_only_the_broken_artifact(self):
+        reply = "### Dockerfile\n```dockerfile\nFROM node:20\n```\n### Kubernetes manifest\n```yaml\nkind: [\n```"
+        prompts = []
+
+        async def generate(prompt):
+            prompts.append(prompt)
+            return "```yaml\napiVersion: v1\nkind: Service\nmetadata:\n  name: web\n```"
+
+        extraction = await repair_artifacts(extract_artifacts(reply, [DOCKERFILE, K8S_MANIFEST]), "ctx", generate)
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("Kubernetes manifest", prompts[0])
+        self.assertEqual(extraction.get("Dockerfile").content, "FROM node:20")
+        self.assertTrue(extraction.get("Kubernetes manifest").ok)
+
+    def test_deploy_specs_skip_pipeline_when_declined(self):
+        self.assertEqual([s.filename for s in deploy_artifact_specs("Go", False, "none")],
+                         ["Dockerfile", "kubernetes.yaml"])
+        self.assertEqual(deploy_artifact_specs("Go", True, "gitlab")[-1].filename, ".gitlab-ci.yml")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+
+from bot.llm_client import FakeBackend, LLMClient
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class TestAsyncLLMClient(unittest.IsolatedAsyncioTestCase):
+
+    async def test_generate_uses_backend(self):
+        backend = FakeBackend(reply=lambda prompt: prompt.upper())
+        client = LLMClient(backend, model_name="fake-model")
+        self.assertEqual(await client.generate("hello"), "HELLO")
+        self.assertEqual(backend.calls, [("hello", "fake-model")])
+
+    async def test_concurrency_is_bounded(self):
+        peak = 0
+        client = None
+
+        def reply(prompt):
+            nonlocal peak
+            peak = max(peak, client.in_flight)
+            return prompt
+
+        client = LLMClient(FakeBackend(reply=reply, latency=0.01), max_concurrency=2)
+        await asyncio.gather(*(client.generate(str(i)) for i in range(6)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(client.in_flight, 0)
+
+    async def test_retries_rate_limit_then_succeeds(self):
+        backend = FakeBackend(errors=[HTTPError(429), HTTPError(503)])
+        client = LLMClient(backend, max_retries=3, backoff_base=0.001)
+        self.assertEqual(await client.generate("x"), "echo: x")
+        self.assertEqual(len(backend.calls), 3)
+
+    async def test_non_retryable_error_raises_immediately(self):
+        backend = FakeBackend(errors=[HTTPError(400)])
+        client = LLMClient(backend, max_retries=3, backoff_base=0.001)
+        with self.assertRaises(HTTPError):
+            await client.generate("x")
+        self.assertEqual(len(backend.calls), 1)
+
+    async def test_timeout_is_retried_then_raised(self):
+        backend = FakeBackend(latency=0.05)
+        client = LLMClient(backend, timeout=0.01, max_retries=1, backoff_base=0.001)
+        with self.assertRaises(asyncio.TimeoutError):
+            await client.generate("x")
+        self.assertEqual(len(backend.calls), 2)
+
+    async def test_stream_yields_chunks_and_retries_before_first_chunk(self):
+        backend = FakeBackend(reply=lambda prompt: "abcdefgh", errors=[HTTPError(503)], chunk_size=3)
+        client = LLMClient(backend, backoff_base=0.001)
+        chunks = [chunk async for chunk in client.stream("x")]
+        self.assertEqual(chunks, ["abc", "def", "gh"])
+        self.assertEqual(len(backend.calls), 2)
+        self.assertEqual(client.in_flight, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
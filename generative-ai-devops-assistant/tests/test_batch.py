@@ -0,0 +1,149 @@
+import asyncio
+import io
+import os
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+
+from bot import batch
+from bot.batch import BatchService, BundleWriter, parse_pipeline, run_batch, run_cli, services_from_zip, split_services
+from bot.config import override_settings
+from bot.extraction import extract_artifacts
+from bot.generator import GENERATED_KINDS
+from bot.workers import cpu_pool
+
+REPLY = (
+    "## Dockerfile\n```dockerfile\nFROM python:3.12-slim\nCMD [\"python\", \"app.py\"]\n```\n"
+    "## Kubernetes manifest\n```yaml\napiVersion: v1\nkind: Service\nmetadata:\n  name: web\n"
+    "spec:\n  ports:\n    - port: 80\n```\n"
+)
+
+
+def make_zip(files: dict) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        for name, data in files.items():
+            zf.writestr(name, data)
+    return buf.getvalue()
+
+
+class FakeGenerator:
+    def __init__(self, delay=0.01):
+        self.prompts = []
+        self.active = 0
+        self.peak = 0
+        self.delay = delay
+
+    async def __call__(self, prompt):
+        self.prompts.append(prompt)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return extract_artifacts(REPLY, GENERATED_KINDS)
+
+
+class TestSplitServices(unittest.TestCase):
+
+    def test_each_outermost_folder_with_a_manifest_is_a_service(self):
+        services = split_services([
+            "mono-main/README.md",
+            "mono-main/services/api/requirements.txt", "mono-main/services/api/app.py",
+            "mono-main/services/api/tools/setup.py",
+            "mono-main/web/package.json", "mono-main/web/node_modules/x/package.json",
+        ])
+        self.assertEqual(sorted(services), ["services/api", "web"])
+        self.assertEqual(services["services/api"], ["requirements.txt", "app.py", "tools/setup.py"])
+        self.assertIn("node_modules/x/package.json", services["web"])
+
+    def test_one_service_zip_stays_whole(self):
+        self.assertEqual(split_services(["app/requirements.txt", "app/main.py"]),
+                         {"app": ["requirements.txt", "main.py"]})
+
+    def test_pipeline_named_next_to_urls(self):
+        self.assertIsNone(parse_pipeline("!batch https://github.com/o/a https://github.com/o/b"))
+        self.assertEqual(parse_pipeline("!batch gitlab https://github.com/o/a"), "gitlab")
+        self.assertEqual(parse_pipeline("!batch github actions https://github.com/o/a"), "github actions")
+
+
+class TestRunBatch(unittest.IsolatedAsyncioTestCase):
+
+    async def test_identical_profiles_share_a_generation(self):
+        services = [BatchService("a", "Python application", "prompt one"),
+                    BatchService("b", "Python application", "prompt one"),
+                    BatchService("c", "Go application", "prompt two")]
+        generator = FakeGenerator()
+        bundle = BundleWriter(io.BytesIO())
+        progress = []
+
+        async def on_progress(done, total):
+            progress.append((done, total))
+
+        with mock.patch.object(batch, "generate_deployment_files", generator):
+            report = await run_batch(services, bundle, concurrency=1, on_progress=on_progress)
+        fileobj = bundle.close()
+
+        self.assertEqual(sorted(generator.prompts), ["prompt one", "prompt two"])
+        self.assertEqual(generator.peak, 1)
+        self.assertEqual(progress[-1], (2, 2))
+        self.assertEqual((report.services, report.generations, report.failed), (3, 2, 0))
+        with zipfile.ZipFile(fileobj) as zf:
+            names = set(zf.namelist())
+            self.assertEqual(names, {f"{s}/{f}" for s in "abc" for f in ("Dockerfile", "kubernetes.yaml")}
+                             | {"REPORT.txt"})
+            self.assertIn("b: Python application (same as a)", zf.read("REPORT.txt").decode())
+
+    async def test_failed_generation_is_reported_per_service(self):
+        async def broken(prompt):
+            raise RuntimeError("model down")
+
+        bundle = BundleWriter(io.BytesIO())
+        with mock.patch.object(batch, "generate_deployment_files", broken):
+            report = await run_batch([BatchService("api", "x", "p"), BatchService("api", "x", "q")], bundle)
+        with zipfile.ZipFile(bundle.close()) as zf:
+            text = zf.read("REPORT.txt").decode()
+        self.assertEqual(report.failed, 2)
+        self.assertIn("api: failed: model down", text)
+        self.assertIn("api-2: failed: model down", text)
+
+    async def test_zip_of_services_is_fingerprinted_per_service(self):
+        data = make_zip({
+            "repo/api/requirements.txt": "flask\n", "repo/api/app.py": "",
+            "repo/web/package.json": '{"dependencies": {"express": "4"}}', "repo/web/index.js": "",
+        })
+        with mock.patch.object(cpu_pool, "max_workers", 0):
+            services = await services_from_zip(io.BytesIO(data), pipeline="gitlab")
+        by_name = {service.name: service for service in services}
+        self.assertEqual(set(by_name), {"api", "web"})
+        self.assertIn("Flask", by_name["api"].repo_type)
+        self.assertIn("Express", by_name["web"].repo_type)
+        self.assertIn("GitLab", by_name["api"].pipeline_prompt)
+        self.assertNotEqual(by_name["api"].profile, by_name["web"].profile)
+
+    async def test_zip_is_passed_to_workers_by_path(self):
+        data = make_zip({"repo/api/go.mod": "module api\n", "repo/api/main.go": "package main\n"})
+        with tempfile.NamedTemporaryFile(suffix=".zip", delete=False) as fh:
+            fh.write(data)
+        self.addCleanup(os.remove, fh.name)
+        self.addCleanup(cpu_pool.shutdown)
+        with mock.patch.object(cpu_pool, "run", wraps=cpu_pool.run) as run:
+            services = await services_from_zip(fh.name)
+        self.assertEqual(run.call_args.args[1], fh.name)
+        self.assertEqual([service.name for service in services], ["repo"])
+
+
+class TestRunCli(unittest.IsolatedAsyncioTestCase):
+
+    async def test_missing_credentials_fail_before_any_work(self):
+        services_from_urls = mock.AsyncMock()
+        with override_settings(gemini_api_key=None, github_token="token"), \
+                mock.patch.object(batch, "services_from_urls", services_from_urls):
+            with self.assertRaises(ValueError) as raised:
+                await run_cli(["https://github.com/octo/app"], "bundle.zip")
+        self.assertIn("GEMINI_API_KEY", str(raised.exception))
+        services_from_urls.assert_not_awaited()
+
+
+if __name__ == '__main__':
+    unittest.main()
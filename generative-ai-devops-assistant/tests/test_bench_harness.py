@@ -0,0 +1,55 @@
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest import mock
+
+from benchmarks.harness import ProfiledBackend, compare_counts, compare_timings, percentile, run_load
+from bot.llm_client import llm_client
+
+
+class TestHarness(unittest.IsolatedAsyncioTestCase):
+
+    async def run_quietly(self, scenario, **kwargs):
+        with redirect_stdout(StringIO()):
+            return await run_load(scenario, **kwargs)
+
+    async def test_every_handler_succeeds_offline(self):
+        for scenario in ("chat", "chat-stream", "generator-github", "generator-zip", "cicd"):
+            with self.subTest(scenario=scenario):
+                result = await self.run_quietly(scenario, requests=6, concurrency=3,
+                                                backend=ProfiledBackend(latency=0.001))
+                self.assertEqual(result.outcomes, {"ok": 6})
+                self.assertEqual(len(result.latencies), 6)
+
+    async def test_failed_calls_are_counted(self):
+        backend = ProfiledBackend(latency=0, error_rate=1.0)
+        with mock.patch.object(llm_client, "max_retries", 0):
+            result = await self.run_quietly("chat", requests=3, concurrency=3, backend=backend)
+        self.assertEqual(result.outcomes, {"error": 3})
+
+
+class TestReport(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [0.01 * i for i in range(1, 101)]
+        self.assertAlmostEqual(percentile(values, 50), 0.5)
+        self.assertAlmostEqual(percentile(values, 99), 0.99)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_compare_to_baseline(self):
+        base = {"p95_ms": 100, "p99_ms": 120, "peak_rss_mb": 100, "throughput_rps": 50,
+                "errors": 0, "rejected": 0, "ok": 10}
+        same = dict(base, p95_ms=140)
+        slower = dict(base, p95_ms=200, throughput_rps=20)
+        worse = dict(base, errors=1, ok=9)
+        self.assertEqual(compare_counts({"chat": same}, {"chat": base}), [])
+        self.assertEqual(compare_timings({"chat": same}, {"chat": base}), [])
+        # Timings are reported but never fail the check on their own.
+        self.assertEqual(compare_counts({"chat": slower}, {"chat": base}), [])
+        self.assertEqual(len(compare_timings({"chat": slower}, {"chat": base})), 2)
+        self.assertEqual(len(compare_counts({"chat": worse}, {"chat": base})), 2)
+        self.assertEqual(compare_counts({"cicd": worse}, {"chat": base}), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+from unittest import mock
+
+from benchmarks.bench_import import time_import
+from bot import discord_bot
+from bot.config import Settings
+from bot.github_client import github_client
+from bot.llm_client import FakeBackend, llm_client, openai_client
+from bot.sessions import MemorySessionBackend, SessionStore
+
+
+class TestImports(unittest.TestCase):
+
+    def test_import_needs_no_credentials_and_defers_the_sdk(self):
+        _, eager = time_import("bot.discord_bot")
+        self.assertEqual(eager, [])
+
+
+class TestSettings(unittest.TestCase):
+
+    def test_validate_names_missing_credentials(self):
+        with self.assertRaises(ValueError) as raised:
+            Settings("discord", None, "").validate()
+        self.assertIn("GEMINI_API_KEY, GITHUB_TOKEN", str(raised.exception))
+        # The OpenAI key is optional; it is only needed when a route uses that provider.
+        Settings("discord", "gemini", "github").validate()
+
+    def test_from_env(self):
+        env = {"DISCORD_TOKEN": "d", "GEMINI_API_KEY": "g", "GITHUB_TOKEN": "h"}
+        with mock.patch.dict("os.environ", env):
+            settings = Settings.from_env()
+        self.assertEqual((settings.discord_token, settings.gemini_api_key, settings.github_token), ("d", "g", "h"))
+
+
+class WarmBackend(FakeBackend):
+
+    def __init__(self, api_key=None):
+        super().__init__()
+        self.api_key = api_key
+        self.warmed = []
+
+    async def warm_up(self, model_name):
+        self.warmed.append(model_name)
+
+
+class TestStartup(unittest.IsolatedAsyncioTestCase):
+
+    async def test_startup_wires_settings_and_warms_up(self):
+        store = SessionStore(backend_factory=MemorySessionBackend)
+        github_warm_up = mock.AsyncMock()
+        with mock.patch.object(llm_client, "backend"), mock.patch.object(github_client, "token", None), \
+                mock.patch.object(openai_client.backend, "api_key", None), \
+                mock.patch.object(discord_bot, "GeminiBackend", WarmBackend), \
+                mock.patch.object(discord_bot, "session_store", store), \
+                mock.patch.object(github_client, "warm_up", github_warm_up):
+            self.assertFalse(store.is_open)
+            settings = Settings("d", "gemini-key", "gh-token", "openai-key", metrics_enabled=False)
+            metrics_server = await discord_bot.startup(settings, warm_up=True)
+            self.assertIsNone(metrics_server)
+            self.assertEqual(llm_client.backend.api_key, "gemini-key")
+            self.assertEqual(openai_client.backend.api_key, "openai-key")
+            # Both default routes go to Gemini: the fast model for chat, the stronger one for generation.
+            self.assertEqual(llm_client.backend.warmed, ["gemini-2.5-flash", "gemini-2.5-pro"])
+            self.assertEqual(github_client.token, "gh-token")
+            github_warm_up.assert_awaited_once()
+            self.assertTrue(store.is_open)
+            await discord_bot.shutdown()
+            self.assertFalse(store.is_open)
+
+    async def test_failed_warm_up_does_not_stop_startup(self):
+        github_warm_up = mock.AsyncMock(side_effect=OSError("no network"))
+        with mock.patch.object(llm_client, "backend"), mock.patch.object(github_client, "token", None), \
+                mock.patch.object(discord_bot, "GeminiBackend", WarmBackend), \
+                mock.patch.object(discord_bot, "session_store", SessionStore(MemorySessionBackend())), \
+                mock.patch.object(github_client, "warm_up", github_warm_up):
+            await discord_bot.startup(Settings("d", "g", "h", metrics_enabled=False), warm_up=True)
+            self.assertEqual(llm_client.backend.warmed, ["gemini-2.5-flash", "gemini-2.5-pro"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from bot import llm_client as llm_module
+from bot.cache import ResponseCache, make_cache_key
+from bot.config import override_settings
+from bot.llm_client import FakeBackend, get_gemini_file_response
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def test_key_normalizes_whitespace_and_includes_model(self):
+        self.assertEqual(
+            make_cache_key("github actions  for\nflask ", "m1"),
+            make_cache_key("github actions for flask", "m1"),
+        )
+        self.assertNotEqual(make_cache_key("prompt", "m1"), make_cache_key("prompt", "m2"))
+
+    def test_hit_miss_and_ttl_expiry(self):
+        clock = FakeClock()
+        cache = ResponseCache(ttl_seconds=10, clock=clock)
+        self.assertIsNone(cache.get("k"))
+        cache.set("k", "value")
+        self.assertEqual(cache.get("k"), "value")
+        clock.now += 11
+        self.assertIsNone(cache.get("k"))
+        self.assertEqual(cache.stats.hits, 1)
+        self.assertEqual(cache.stats.misses, 2)
+
+    def test_lru_eviction_by_size(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.set("a", "aaaa")
+        cache.set("b", "bbbb")
+        cache.get("a")  # "b" becomes least recently used
+        cache.set("c", "cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "aaaa")
+        self.assertEqual(cache.get("c"), "cccc")
+        self.assertEqual(cache.stats.evictions, 1)
+        self.assertLessEqual(cache.size_bytes, 10)
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            first = ResponseCache(disk_path=path)
+            first.set("k", "persisted")
+            first.close()
+
+            second = ResponseCache(disk_path=path)
+            self.assertEqual(second.get("k"), "persisted")
+            self.assertEqual(second.stats.disk_hits, 1)
+            second.close()
+
+    def test_clear_empties_both_tiers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(disk_path=os.path.join(tmp, "cache.sqlite3"))
+            cache.set("k", "stale")
+            cache.clear()
+            self.assertIsNone(cache.get("k"))
+            self.assertEqual(cache.stats.disk_hits, 0)
+            cache.close()
+
+
+
+class TestAsyncDiskTier(unittest.IsolatedAsyncioTestCase):
+
+    async def test_sqlite_work_runs_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ResponseCache(disk_path=os.path.join(tmp, "cache.sqlite3"))
+            self.addCleanup(cache.close)
+            threads = []
+            disk = cache._disk
+            for name in ("get", "set"):
+                method = getattr(disk, name)
+
+                def record(*args, method=method):
+                    threads.append(threading.current_thread())
+                    return method(*args)
+
+                setattr(disk, name, record)
+
+            await cache.aset("k", "persisted")
+            cache._remove("k")  # Only the disk tier has it now.
+            self.assertEqual(await cache.aget("k"), "persisted")
+            self.assertIsNone(await cache.aget("missing"))
+            self.assertEqual((cache.stats.disk_hits, cache.stats.misses), (1, 1))
+            self.assertEqual(len(threads), 3)
+            self.assertNotIn(threading.main_thread(), threads)
+            self.assertEqual(cache.get("k"), "persisted")  # Promoted into memory.
+
+class TestOnlyErrorRepliesSkipTheCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_answers_starting_with_sorry_are_cached(self):
+        backend = FakeBackend(reply=lambda prompt: "Sorry to say: ports below 1024 need root.")
+        with mock.patch.object(llm_module.llm_client, "backend", backend), \
+                mock.patch.object(llm_module, "response_cache", ResponseCache()), \
+                override_settings(llm_cache_enabled=True):
+            await get_gemini_file_response("why can't my container bind port 80?")
+            await get_gemini_file_response("why can't my container bind port 80?")
+            self.assertEqual(len(backend.calls), 1)
+
+            backend.reply = lambda prompt: ""
+            first = await get_gemini_file_response("empty please")
+            await get_gemini_file_response("empty please")
+            self.assertTrue(first.startswith("Sorry"))
+            self.assertEqual(len(backend.calls), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import unittest
+from unittest import mock
+
+import discord
+
+from bot import llm_client as llm_module
+from bot.conversations import ConversationStore, conversation_key
+from bot.llm_client import FakeBackend, get_gemini_response
+from bot.prompts import SYSTEM_PROMPT
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingSummarizer:
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, summary, turns, max_tokens):
+        self.calls.append((summary, [turn.question for turn in turns]))
+        if self.fail:
+            raise RuntimeError("model down")
+        return f"{summary} discussed {', '.join(turn.question for turn in turns)}".strip()
+
+
+async def settle():
+    # Let background summaries run.
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+class TestConversationStore(unittest.IsolatedAsyncioTestCase):
+
+    async def test_history_grows_at_its_end(self):
+        store = ConversationStore(summarize=RecordingSummarizer(), max_tokens=1000)
+        self.assertEqual(store.history("c"), "")
+        store.record("c", "how do I tag an image?", "docker tag src dst")
+        first = store.history("c")
+        store.record("c", "and push it?", "docker push dst")
+        second = store.history("c")
+        self.assertTrue(second.startswith(first))
+        self.assertIn("User: and push it?\nAssistant: docker push dst", second)
+
+    async def test_old_turns_are_summarized_in_the_background(self):
+        summarizer = RecordingSummarizer()
+        store = ConversationStore(summarize=summarizer, max_tokens=40)
+        for i in range(6):
+            store.record("c", f"question {i}", "x" * 40)
+        await settle()
+        conversation = store.get("c")
+        self.assertLessEqual(conversation.tokens, 40)
+        self.assertFalse(conversation.pending)
+        self.assertTrue(summarizer.calls)
+        history = store.history("c")
+        self.assertTrue(history.startswith("Summary of the earlier conversation:"))
+        self.assertIn("question 0", history)
+        self.assertIn("User: question 5", history)
+        self.assertEqual(store.size_bytes, conversation.size)
+
+    async def test_failed_summary_keeps_the_questions(self):
+        store = ConversationStore(summarize=RecordingSummarizer(fail=True), max_tokens=40)
+        for i in range(4):
+            store.record("c", f"question {i}", "x" * 40)
+        await settle()
+        self.assertEqual(store.summary_failures, 1)
+        self.assertIn("Earlier the user asked: question 0", store.get("c").summary)
+
+    async def test_pasted_logs_are_clipped(self):
+        store = ConversationStore(summarize=RecordingSummarizer(), max_tokens=400)
+        store.record("c", "log line\n" * 10_000, "looks like OOM")
+        turn = store.get("c").turns[0]
+        self.assertLess(len(turn.question), 500)
+        self.assertIn("more characters not kept", turn.question)
+
+    async def test_idle_conversations_expire(self):
+        clock = FakeClock()
+        store = ConversationStore(summarize=RecordingSummarizer(), idle_ttl=60, clock=clock)
+        store.record("a", "q", "a")
+        store.record("b", "q", "a")
+        clock.now = 30
+        store.record("b", "q2", "a2")
+        clock.now = 70
+        self.assertEqual(store.sweep(), 1)
+        self.assertEqual(store.history("a"), "")
+        self.assertIn("q2", store.history("b"))
+        clock.now = 200
+        self.assertIsNone(store.get("b"))
+        self.assertEqual((len(store), store.size_bytes), (0, 0))
+
+    async def test_least_recently_used_go_first_past_the_cap(self):
+        store = ConversationStore(summarize=RecordingSummarizer(), max_bytes=100)
+        store.record("a", "q" * 30, "a" * 10)
+        store.record("b", "q" * 30, "a" * 10)
+        store.record("a", "more", "more")
+        store.record("c", "q" * 30, "a" * 10)
+        self.assertIsNone(store.get("b"))
+        self.assertIsNotNone(store.get("a"))
+        self.assertEqual(store.evictions, 1)
+        self.assertLessEqual(store.size_bytes, 100)
+
+    def test_thread_is_one_conversation_channel_is_per_user(self):
+        thread = mock.Mock(spec=discord.Thread, id=5)
+        channel = mock.Mock(spec=discord.TextChannel, id=7)
+        author = mock.Mock(id=42)
+        self.assertEqual(conversation_key(mock.Mock(channel=thread, author=author)), "thread:5")
+        self.assertEqual(conversation_key(mock.Mock(channel=channel, author=author)), "channel:7:42")
+
+
+class TestChatWithHistory(unittest.IsolatedAsyncioTestCase):
+
+    async def test_follow_up_prompt_keeps_the_chat_prefix_and_records_answers(self):
+        backend = FakeBackend()
+        answers = []
+        with mock.patch.object(llm_module.llm_client, "backend", backend):
+            await get_gemini_response("and the port?", use_cache=False,
+                                      history="User: flask app?\nAssistant: use gunicorn", on_answer=answers.append)
+            backend.errors = [ValueError("bad request")]
+            await get_gemini_response("again?", use_cache=False, history="x", on_answer=answers.append)
+        prompt = backend.calls[0][0]
+        self.assertTrue(prompt.startswith(SYSTEM_PROMPT))
+        self.assertTrue(prompt.endswith("Assistant: use gunicorn\nUser: and the port?"))
+        self.assertEqual(len(answers), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
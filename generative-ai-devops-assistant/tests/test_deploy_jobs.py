@@ -0,0 +1,217 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.deploy import GUILD, USER, DeployTarget, DeployTargetStore, parse_target
+from bot.deploy_jobs import DeployTracker
+from bot.github_client import GitHubClient
+from bot.http_client import HttpClient
+from bot.outbound import outbox
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class FakeStatusMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = []
+
+    async def edit(self, content):
+        self.content = content
+        self.edits.append(content)
+
+
+class FakeChannel:
+    id = 7
+
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content, **kwargs):
+        message = FakeStatusMessage(content)
+        self.messages.append(message)
+        return message
+
+
+class TestDeployTracker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.clock = FakeClock()
+        self.runs = {}
+        self.create_runs = True
+        self.dispatch_status = 204
+        self.list_requests = []
+
+        async def dispatch(request):
+            if self.dispatch_status != 204:
+                return web.json_response({"message": "Not Found"}, status=self.dispatch_status)
+            payload = await request.json()
+            if self.create_runs:
+                self.add_run(request.match_info["workflow"], payload["ref"],
+                             " ".join((payload.get("inputs") or {}).values()) or "Deploy")
+            return web.Response(status=204)
+
+        async def list_runs(request):
+            workflow = request.match_info["workflow"]
+            self.list_requests.append((workflow, dict(request.query)))
+            runs = sorted((run for run in self.runs.values() if run["workflow"] == workflow),
+                          key=lambda run: run["id"], reverse=True)
+            etag = f'"{hash(repr(runs))}"'
+            if request.headers.get("If-None-Match") == etag:
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.json_response({"workflow_runs": runs}, headers={"ETag": etag})
+
+        app = web.Application()
+        app.router.add_post("/repos/{owner}/{repo}/actions/workflows/{workflow}/dispatches", dispatch)
+        app.router.add_get("/repos/{owner}/{repo}/actions/workflows/{workflow}/runs", list_runs)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.http = HttpClient()
+        self.github = GitHubClient(self.http, token="t", api_url=str(self.server.make_url("")))
+        # A long interval keeps the background loop asleep; the tests poll by hand.
+        self.tracker = DeployTracker(self.github, id_input="", min_interval=3600, max_interval=7200,
+                                     correlation_timeout=60, clock=self.clock)
+        self.channel = FakeChannel()
+        # Status messages go out unpaced; tests/test_outbound.py covers the pacing.
+        for patch in (mock.patch.object(outbox, "burst", 0), mock.patch.object(outbox, "_pacers", {})):
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def asyncTearDown(self):
+        await self.tracker.shutdown()
+        await self.http.close()
+        await self.server.close()
+
+    def add_run(self, workflow, branch, title):
+        run_id = len(self.runs) + 1
+        self.runs[run_id] = {
+            "id": run_id, "run_number": run_id, "workflow": workflow, "head_branch": branch,
+            "display_title": title, "status": "queued", "conclusion": None,
+            "html_url": f"https://github.com/octo/app/actions/runs/{run_id}",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(self.clock.now)),
+        }
+        return run_id
+
+    async def test_active_runs_of_a_workflow_share_one_poll(self):
+        jobs = [await self.tracker.start(DeployTarget("octo/app", "ci.yml", "main"), self.channel, user)
+                for user in (1, 2, 3)]
+        other = await self.tracker.start(DeployTarget("octo/app", "release.yml", "main"), self.channel, 4)
+        self.assertEqual(self.tracker.active, 4)
+
+        self.assertEqual(await self.tracker.poll(force=True), 2)
+        self.assertEqual(len(self.list_requests), 2)
+        self.assertEqual(self.list_requests[0][1]["event"], "workflow_dispatch")
+        self.assertEqual([job.run_id for job in jobs + [other]], [1, 2, 3, 4])
+        self.assertIn("run #1 queued", self.channel.messages[0].content)
+
+        for run in self.runs.values():
+            run.update(status="completed", conclusion="success")
+        self.runs[2]["conclusion"] = "failure"
+        await self.tracker.poll(force=True)
+        self.assertIn("✅ run #1 succeeded", self.channel.messages[0].content)
+        self.assertIn("❌ run #2 finished with `failure`", self.channel.messages[1].content)
+        self.assertEqual(self.tracker.active, 0)
+        self.assertEqual(self.tracker.finished, {"success": 3, "failure": 1})
+
+    async def test_unchanged_runs_cost_no_edits_and_back_off(self):
+        await self.tracker.start(DeployTarget("octo/app", "ci.yml", "main"), self.channel, 1)
+        await self.tracker.poll(force=True)
+        message = self.channel.messages[0]
+        edits = len(message.edits)
+        group = next(iter(self.tracker._groups.values()))
+        interval = group.interval
+        await self.tracker.poll(force=True)
+        self.assertEqual(len(message.edits), edits)
+        self.assertGreater(group.interval, interval)
+        self.assertEqual(self.list_requests[0][1], self.list_requests[1][1])
+
+    async def test_runs_are_matched_by_job_id_when_the_workflow_reports_it(self):
+        self.tracker.id_input = "deploy_id"
+        self.create_runs = False
+        job = await self.tracker.start(DeployTarget("octo/app", "ci.yml", "main"), self.channel, 1)
+        # Someone else's dispatch on the same branch lands first.
+        self.add_run("ci.yml", "main", "manual run")
+        mine = self.add_run("ci.yml", "main", f"Deploy {job.id}")
+        await self.tracker.poll(force=True)
+        self.assertEqual(job.run_id, mine)
+
+    async def test_dispatch_without_a_run_times_out(self):
+        self.create_runs = False
+        job = await self.tracker.start(DeployTarget("octo/app", "ci.yml", "main"), self.channel, 1)
+        await self.tracker.poll(force=True)
+        self.assertEqual(self.tracker.active, 1)
+        self.clock.now += 61
+        await self.tracker.poll(force=True)
+        self.assertEqual(self.tracker.active, 0)
+        self.assertIn("no workflow run showed up", job.message.content)
+
+    async def test_failed_dispatch_is_reported_and_not_tracked(self):
+        self.dispatch_status = 404
+        job = await self.tracker.start(DeployTarget("octo/missing", "ci.yml", "main"), self.channel, 1)
+        self.assertEqual(self.tracker.active, 0)
+        self.assertIn("could not dispatch the workflow (HTTP 404)", job.message.content)
+
+    async def test_same_target_is_found_while_running(self):
+        target = DeployTarget("octo/app", "ci.yml", "main")
+        job = await self.tracker.start(target, self.channel, 1)
+        self.assertIs(self.tracker.find_active(1, DeployTarget("octo/app", "ci.yml", "main")), job)
+        self.assertIsNone(self.tracker.find_active(2, target))
+
+
+class TestDeployTargets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = DeployTargetStore(os.path.join(self.tmp.name, "targets.sqlite3"), default_repo="octo/default")
+
+    def tearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    def test_user_target_wins_over_server_over_default(self):
+        self.assertEqual(self.store.resolve(1, 10).repo, "octo/default")
+        self.store.set(GUILD, 10, DeployTarget("octo/server", "deploy.yml", "prod"))
+        self.assertEqual(self.store.resolve(1, 10), DeployTarget("octo/server", "deploy.yml", "prod"))
+        self.store.set(USER, 1, parse_target("octo/mine"))
+        self.assertEqual(self.store.resolve(1, 10).repo, "octo/mine")
+        self.assertEqual(self.store.resolve(2, 10).repo, "octo/server")
+        self.store.clear(USER, 1)
+        self.assertEqual(self.store.resolve(1, None).repo, "octo/default")
+
+    def test_parse_target(self):
+        self.assertEqual(parse_target("octo/app deploy.yml v2").key, ("octo/app", "deploy.yml", "v2"))
+        for text in ("", "octo", "octo/app a b c", "https://github.com/octo/app"):
+            with self.assertRaises(ValueError):
+                parse_target(text)
+
+
+class TestDeployStep(unittest.IsolatedAsyncioTestCase):
+
+    async def test_deploy_reply_can_name_the_target(self):
+        from bot import chatops
+        from bot.flows import FlowContext
+        from bot.sessions import ChatOpsSession
+
+        session = ChatOpsSession(9, "deploy", "deploy")
+        session.data["cicd"] = "github actions"
+        message = mock.Mock(content="deploy octo/app deploy.yml prod", channel=FakeChannel(), guild=None)
+        ctx = FlowContext(message, session)
+        target = chatops._parse_deploy_choice(ctx)
+        with mock.patch.object(chatops.deploy_tracker, "start") as start:
+            await chatops._trigger_deploy(ctx, target)
+        start.assert_awaited_once_with(DeployTarget("octo/app", "deploy.yml", "prod"), message.channel, 9)
+
+
+if __name__ == '__main__':
+    unittest.main()
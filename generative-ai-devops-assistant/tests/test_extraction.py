@@ -0,0 +1,134 @@
+import unittest
+from unittest import mock
+
+from bot import extraction
+from bot.extraction import (
+    CODE,
+    DOCKERFILE,
+    GITHUB_WORKFLOW,
+    HEADER,
+    JENKINSFILE,
+    K8S_MANIFEST,
+    TEXT,
+    build_repair_prompt,
+    extract_artifacts,
+    tokenize,
+    validate_dockerfile,
+    validate_github_workflow,
+    validate_jenkinsfile,
+    validate_k8s_manifest,
+)
+from bot.prompts import PromptRegistry, parse_versions
+
+REPLY = """Here are your files.
+
+### Dockerfile
+```dockerfile
+FROM python:3.12-slim
+# install deps
+RUN pip install \\
+    flask
+CMD ["flask", "run"]
+```
+
+### Kubernetes manifest
+```yaml
+apiVersion: apps/v1
+kind: Deployment
+metadata:
+  name: web
+---
+apiVersion: v1
+kind: Service
+metadata:
+  name: web
+```
+```yaml
+apiVersion: networking.k8s.io/v1
+kind: Ingress
+metadata:
+  name: web
+```
+"""
+
+
+class TestTokenizer(unittest.TestCase):
+
+    def test_headers_code_and_prose(self):
+        kinds = [token.kind for token in tokenize(REPLY)]
+        self.assertEqual(kinds, [TEXT, HEADER, CODE, TEXT, HEADER, CODE, CODE])
+
+    def test_comments_inside_fences_are_not_headers(self):
+        tokens = tokenize("```dockerfile\n# Dockerfile\nFROM x\n```")
+        self.assertEqual([(t.kind, t.lang) for t in tokens], [(CODE, "dockerfile")])
+
+    def test_unterminated_fence_keeps_its_code(self):
+        self.assertEqual(tokenize("```yaml\nkind: Pod")[-1].text, "kind: Pod")
+
+
+class TestExtraction(unittest.TestCase):
+
+    def test_multi_document_manifest_survives(self):
+        result = extract_artifacts(REPLY, [DOCKERFILE, K8S_MANIFEST])
+        self.assertEqual(result.needs_repair, [])
+        manifest = result.get("Kubernetes manifest").content
+        self.assertEqual(manifest.count("kind:"), 3)
+        self.assertTrue(result.get("Dockerfile").content.startswith("FROM python"))
+
+    def test_blocks_without_headers_are_assigned_by_content(self):
+        reply = "```\napiVersion: v1\nkind: Service\nmetadata: {name: a}\n```\n```\nFROM alpine\n```"
+        result = extract_artifacts(reply, [DOCKERFILE, K8S_MANIFEST])
+        self.assertEqual(result.get("Dockerfile").content, "FROM alpine")
+        self.assertTrue(result.get("Kubernetes manifest").ok)
+
+    def test_missing_artifact_is_reported(self):
+        result = extract_artifacts("### Dockerfile\n```\nFROM alpine\n```", [DOCKERFILE, K8S_MANIFEST])
+        self.assertEqual(result.missing, [K8S_MANIFEST])
+
+    def test_single_kind_takes_unstructured_reply(self):
+        result = extract_artifacts("FROM alpine\nCMD [\"sh\"]", [DOCKERFILE])
+        self.assertTrue(result.get("Dockerfile").ok)
+
+
+class TestValidators(unittest.TestCase):
+
+    def test_dockerfile_lint(self):
+        self.assertEqual(validate_dockerfile("ARG V=3\nFROM python:$V\nRUN <<EOF\nnot an instruction\nEOF\n"), [])
+        self.assertEqual(validate_dockerfile("COPY . .\nFORM x"),
+                         ["line 1: COPY before the first FROM", "line 2: unknown instruction 'FORM'",
+                          "no FROM instruction"])
+
+    def test_k8s_manifest(self):
+        self.assertEqual(validate_k8s_manifest("apiVersion: v1\nkind: Service\n"),
+                         ["document 1 (Service) is missing metadata"])
+        self.assertTrue(validate_k8s_manifest("kind: [")[0].startswith("invalid YAML"))
+
+    def test_github_workflow(self):
+        workflow = "on: push\njobs:\n  build:\n    runs-on: ubuntu-latest\n    steps:\n      - run: make\n"
+        self.assertEqual(validate_github_workflow(workflow), [])
+        self.assertEqual(validate_github_workflow("jobs:\n  build: {}\n"),
+                         ["missing 'on' trigger", "job 'build' needs runs-on and steps"])
+        self.assertEqual(extract_artifacts(workflow, [GITHUB_WORKFLOW]).needs_repair, [])
+
+    def test_jenkinsfile(self):
+        self.assertEqual(validate_jenkinsfile("pipeline {\n  agent any\n  stages { }\n}"), [])
+        self.assertEqual(validate_jenkinsfile("pipeline {\n  agent any\n"), ["unbalanced braces"])
+        self.assertTrue(extract_artifacts("```groovy\npipeline {\n}\n```", [JENKINSFILE]).get("Jenkins pipeline").ok)
+
+
+
+class TestRepairPrompts(unittest.TestCase):
+
+    def test_missing_artifact_prompt_is_registered_and_can_be_pinned(self):
+        self.assertEqual(build_repair_prompt(DOCKERFILE, None, "Generate files.\n"),
+                         "Generate files.\n\nYour previous reply did not include the Dockerfile. "
+                         "Reply with only the Dockerfile, in a single code block.")
+        registry = PromptRegistry(pins=parse_versions("repair.missing=1"))
+        registry.register("repair.missing", 1, "", "v1 {context} {kind}")
+        registry.register("repair.missing", 2, "", "v2 {context} {kind}")
+        with mock.patch.object(extraction, "prompt_registry", registry):
+            self.assertEqual(build_repair_prompt(DOCKERFILE, None, "ctx"), "v1 ctx Dockerfile")
+
+
+if __name__ == '__main__':
+    unittest.main()
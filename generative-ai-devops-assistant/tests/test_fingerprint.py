@@ -0,0 +1,49 @@
+import unittest
+from bot.fingerprint import FileIndex, fingerprint_repository
+
+
+class TestFingerprint(unittest.TestCase):
+
+    def test_python_framework_from_requirements(self):
+        files = ["app-main/requirements.txt", "app-main/main.py", "app-main/api/routes.py"]
+        contents = {"app-main/requirements.txt": "FastAPI==0.110\nuvicorn\n"}
+        fingerprint = fingerprint_repository(files, contents.get)
+        self.assertEqual(fingerprint.language.name, "Python")
+        self.assertEqual([d.name for d in fingerprint.frameworks], ["FastAPI"])
+        self.assertEqual(fingerprint.describe(), "Python web application (FastAPI)")
+
+    def test_docs_folder_does_not_hide_real_app(self):
+        files = ["package.json", "index.js", "src/server.js", "docs/guide.md", "docs/api.md"]
+        fingerprint = fingerprint_repository(files)
+        self.assertFalse(fingerprint.is_documentation)
+        self.assertEqual(fingerprint.language.name, "Node.js")
+
+    def test_mkdocs_project_is_documentation(self):
+        files = ["mkdocs.yml", "requirements.txt", "docs/index.md", "docs/setup.md"]
+        fingerprint = fingerprint_repository(files)
+        self.assertTrue(fingerprint.is_documentation)
+        self.assertIn("MkDocs", fingerprint.describe())
+
+    def test_java_maven_spring(self):
+        files = ["pom.xml", "src/main/java/App.java"]
+        contents = {"pom.xml": "<artifactId>spring-boot-starter-web</artifactId>"}
+        fingerprint = fingerprint_repository(files, contents.get)
+        names = {d.name for d in fingerprint.detections}
+        self.assertTrue({"Java", "Maven", "Spring Boot"} <= names)
+
+    def test_go_rust_dotnet(self):
+        self.assertEqual(fingerprint_repository(["go.mod", "main.go"]).language.name, "Go")
+        self.assertEqual(fingerprint_repository(["Cargo.toml", "src/main.rs"]).language.name, "Rust")
+        self.assertEqual(fingerprint_repository(["App.csproj", "Program.cs"]).language.name, ".NET")
+
+    def test_unknown_repo(self):
+        self.assertEqual(fingerprint_repository(["README", "LICENSE"]).describe(), "unspecified application")
+
+    def test_index_strips_wrapping_folder(self):
+        index = FileIndex(["repo-main/", "repo-main/docs/a.md", "repo-main/setup.py"])
+        self.assertTrue(index.has_dir("docs"))
+        self.assertEqual(index.path("setup.py"), "repo-main/setup.py")
+
+
+if __name__ == '__main__':
+    unittest.main()
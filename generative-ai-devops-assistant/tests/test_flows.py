@@ -0,0 +1,125 @@
+import unittest
+from unittest.mock import patch
+
+from bot.outbound import outbox
+from bot.flows import END, ChoiceMatcher, Flow, FlowEngine, InvalidInput, State
+from bot.sessions import MemorySessionBackend, SessionStore
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+        self.files = []
+
+    async def send(self, content=None, file=None, files=(), **kwargs):
+        self.sent.append(content)
+        self.files.extend([file] if file is not None else files)
+
+
+class FakeAuthor:
+    def __init__(self, user_id):
+        self.id = user_id
+
+
+class FakeMessage:
+    def __init__(self, content, channel, user_id=1):
+        self.content = content
+        self.channel = channel
+        self.author = FakeAuthor(user_id)
+
+
+def _parse_size(ctx):
+    if ctx.content_lower not in ("small", "large"):
+        raise InvalidInput("Pick small or large.")
+    return ctx.content_lower
+
+
+class TestFlowEngine(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.store = SessionStore(MemorySessionBackend())
+        self.engine = FlowEngine(self.store)
+        self.channel = FakeChannel()
+        self.finished = []
+
+        async def record(ctx, value):
+            self.finished.append(dict(ctx.data))
+
+        self.engine.register_flow(Flow("scale", triggers=("!scale",), states=[
+            State("name", question=lambda ctx: "Which service?", field="service", next="size"),
+            State("size", question=lambda ctx: "How big?", parse=_parse_size, field="size",
+                  next=END, actions=(record,)),
+        ]))
+
+    async def say(self, text):
+        return await self.engine.handle(FakeMessage(text, self.channel))
+
+    async def test_registered_flow_runs_to_completion(self):
+        await self.say("!scale now")
+        await self.say("api")
+        await self.say("large")
+        self.assertEqual(self.finished, [{"service": "api", "size": "large"}])
+        self.assertEqual(self.channel.sent, ["<@1> Which service?", "<@1> How big?"])
+        self.assertIsNone(self.store.get(1))
+
+    async def test_invalid_input_stays_in_state(self):
+        await self.say("!scale")
+        await self.say("api")
+        await self.say("huge")
+        self.assertEqual(self.channel.sent[-1], "Pick small or large.")
+        self.assertEqual(self.store.get(1).stage, "size")
+
+    async def test_messages_without_session_are_not_claimed(self):
+        message = FakeMessage("hello", self.channel)
+        self.assertFalse(self.engine.wants(message))
+        self.assertFalse(await self.engine.handle(message))
+
+    async def test_longest_trigger_wins(self):
+        self.engine.register_flow(Flow("scale-down", triggers=("!scale-down",), states=[State("only")]))
+        self.assertEqual(self.engine.match_trigger("!scale-down api").name, "scale-down")
+        self.assertEqual(self.engine.match_trigger("!scale api").name, "scale")
+
+
+class TestDeployFlow(unittest.IsolatedAsyncioTestCase):
+
+    async def test_deploy_flow_generates_files_then_skips(self):
+        from bot import artifacts, chatops
+
+        chatops.session_store.backend = MemorySessionBackend()
+        channel = FakeChannel()
+        for unpaced in (patch.object(outbox, "burst", 0), patch.object(outbox, "_pacers", {})):
+            unpaced.start()
+            self.addCleanup(unpaced.stop)
+
+        replies = {
+            "Dockerfile": "```dockerfile\nFROM python\n```",
+            "Kubernetes": "apiVersion: v1\nkind: Service\nmetadata:\n  name: web\n",
+            "pipeline": "on: push\njobs:\n  build:\n    runs-on: ubuntu-latest\n    steps: []\n",
+        }
+
+        async def generate(prompt):
+            return next(reply for key, reply in replies.items() if key in prompt)
+
+        with patch.object(artifacts, "get_gemini_file_response", side_effect=generate) as gen:
+            for text in ("!deploy", "Flask", "yes https", "github", "yes", "skip"):
+                await chatops.flow_engine.handle(FakeMessage(text, channel, user_id=9))
+
+        self.assertEqual(gen.call_count, 3)
+        self.assertTrue(all("Flask" in call.args[0] for call in gen.call_args_list))
+        self.assertIn("CI/CD platform: github actions", channel.sent[3])
+        # Files finished together may share a message; each is attached once.
+        self.assertTrue(any(text.startswith("<@9> Here is your Dockerfile:") for text in channel.sent))
+        self.assertEqual(sorted(file.filename for file in channel.files),
+                         ["Dockerfile", "ci.yml", "kubernetes.yaml"])
+        self.assertEqual(channel.sent[-1], "<@9> Deployment skipped. Session finished.")
+        self.assertIsNone(chatops.session_store.get(9))
+
+    def test_choice_matcher(self):
+        matcher = ChoiceMatcher(["github actions", "jenkins", "gitlab", "none"])
+        self.assertEqual(matcher.match("GitHub Actions"), "github actions")
+        self.assertEqual(matcher.match("jenkins please"), "jenkins")
+        self.assertIsNone(matcher.match("git"))
+
+
+if __name__ == '__main__':
+    unittest.main()
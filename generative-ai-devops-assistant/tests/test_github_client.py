@@ -0,0 +1,58 @@
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.github_client import GitHubClient
+from bot.http_client import HttpClient
+
+
+class TestGitHubClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.dispatches = []
+        self.secondary_limited = 1
+
+        async def dispatch(request):
+            if self.secondary_limited:
+                self.secondary_limited -= 1
+                return web.json_response(
+                    {"message": "You have exceeded a secondary rate limit"},
+                    status=403, headers={"Retry-After": "0"},
+                )
+            self.dispatches.append((request.match_info["repo"], await request.json()))
+            return web.Response(status=204, headers={
+                "X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": "1700000000",
+            })
+
+        app = web.Application()
+        app.router.add_post("/repos/{owner}/{repo}/actions/workflows/{workflow}/dispatches", dispatch)
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.http = HttpClient()
+        self.github = GitHubClient(self.http, token="t", api_url=str(self.server.make_url("")))
+
+    async def asyncTearDown(self):
+        await self.http.close()
+        await self.server.close()
+
+    async def test_secondary_rate_limit_is_retried_and_headroom_tracked(self):
+        status, _ = await self.github.dispatch_workflow("octo/app", "ci.yml", "main")
+        self.assertEqual(status, 204)
+        self.assertEqual(self.dispatches, [("app", {"ref": "main"})])
+        self.assertEqual(self.github.rate_limit.remaining, 4999)
+
+    async def test_dispatch_many_runs_concurrently_and_keeps_order(self):
+        self.secondary_limited = 0
+        results = await self.github.dispatch_many([("octo/a", "ci.yml", "main"), ("octo/b", "ci.yml", "dev")])
+        self.assertEqual([status for status, _ in results], [204, 204])
+        self.assertEqual(sorted(repo for repo, _ in self.dispatches), ["a", "b"])
+
+    async def test_session_is_reused(self):
+        self.secondary_limited = 0
+        session = self.http.session
+        await self.github.dispatch_workflow("octo/app", "ci.yml")
+        self.assertIs(self.http.session, session)
+
+
+if __name__ == '__main__':
+    unittest.main()
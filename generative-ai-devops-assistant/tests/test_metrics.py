@@ -0,0 +1,107 @@
+import asyncio
+import json
+import logging
+import unittest
+from unittest import mock
+import aiohttp
+
+from bot import llm_client
+from bot.metrics import MetricsServer, Registry
+from bot.tracing import JsonFormatter, current_trace_id, log_event, logger, stage, trace_request
+
+
+class TestRegistry(unittest.TestCase):
+
+    def test_histogram_and_counter_exposition(self):
+        registry = Registry()
+        seconds = registry.histogram("demo_seconds", "Demo latency.", ("stage",), buckets=(0.1, 1.0))
+        seconds.labels(stage="llm").observe(0.05)
+        seconds.labels(stage="llm").observe(1.0)
+        seconds.labels(stage="llm").observe(3.0)
+        registry.counter("demo_total", "Demo count.").inc(2)
+        text = registry.render()
+
+        self.assertIn("# TYPE demo_seconds histogram", text)
+        self.assertIn('demo_seconds_bucket{stage="llm",le="0.1"} 1', text)
+        self.assertIn('demo_seconds_bucket{stage="llm",le="1"} 2', text)
+        self.assertIn('demo_seconds_bucket{stage="llm",le="+Inf"} 3', text)
+        self.assertIn('demo_seconds_count{stage="llm"} 3', text)
+        self.assertIn("demo_total 2", text)
+
+    def test_collectors_are_read_at_scrape_time(self):
+        registry = Registry()
+        depth = {"value": 1}
+        registry.register_collector(lambda: [("demo_queue", "Queue depth.", {"pool": "llm"}, depth["value"])])
+        depth["value"] = 4
+        self.assertIn('demo_queue{pool="llm"} 4', registry.render())
+
+    def test_failing_collector_does_not_break_the_scrape(self):
+        registry = Registry()
+        registry.counter("demo_total", "Demo count.").inc()
+
+        def broken():
+            raise RuntimeError("boom")
+
+        registry.register_collector(broken)
+        self.assertIn("demo_total 1", registry.render())
+
+
+class TestMetricsServer(unittest.IsolatedAsyncioTestCase):
+
+    async def test_serves_metrics(self):
+        registry = Registry()
+        registry.gauge("demo_sessions", "Sessions.").set(3)
+        server = MetricsServer(registry, port=0)
+        await server.start()
+        try:
+            port = server._runner.addresses[0][1]
+            async with aiohttp.ClientSession() as session:
+                async with session.get(f"http://127.0.0.1:{port}/metrics") as resp:
+                    body = await resp.text()
+            self.assertEqual(resp.status, 200)
+            self.assertIn("demo_sessions 3", body)
+        finally:
+            await server.stop()
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.records = []
+        handler = logging.Handler()
+        handler.emit = lambda record: self.records.append(JsonFormatter().format(record))
+        logger.addHandler(handler)
+        logger.setLevel(logging.DEBUG)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(logger.setLevel, logging.NOTSET)
+
+    def test_request_events_share_a_trace_id(self):
+        with trace_request("chatbot", user_id=1) as trace_id:
+            with stage("llm_call"):
+                log_event("cache.miss", key="abc")
+        events = [json.loads(line) for line in self.records]
+        self.assertEqual([e["msg"] for e in events], ["request.start", "cache.miss", "stage", "request.end"])
+        self.assertTrue(all(e["trace_id"] == trace_id for e in events))
+        self.assertEqual(events[2]["stage"], "llm_call")
+        self.assertIsNone(current_trace_id.get())
+
+    def test_failed_request_records_outcome(self):
+        with self.assertRaises(ValueError):
+            with trace_request("generator"):
+                raise ValueError("bad zip")
+        self.assertEqual(json.loads(self.records[-1])["outcome"], "ValueError")
+
+    def test_module_diagnostics_carry_the_trace_id(self):
+        async def fail(prompt, purpose):
+            raise RuntimeError("provider down")
+
+        with mock.patch.object(llm_client.router, "generate", fail):
+            with trace_request("chatbot") as trace_id:
+                reply = asyncio.run(llm_client._generate_chat_response("hi"))
+        self.assertTrue(reply.startswith("Sorry"))
+        error = next(json.loads(line) for line in self.records if "provider down" in line)
+        self.assertEqual((error["logger"], error["level"], error["trace_id"]), ("bot.llm_client", "error", trace_id))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+import discord
+
+from bot.outbound import Attachment, Outbox
+
+
+class FakeMessage:
+    def __init__(self, channel, content, files):
+        self.channel = channel
+        self.content = content
+        self.files = files
+        self.edits = []
+
+    async def edit(self, content):
+        await self.channel.gate.wait()
+        self.content = content
+        self.edits.append(content)
+
+
+class FakeChannel:
+    """Holds every call until `gate` is set, so messages queue up behind the first one."""
+
+    def __init__(self, id, errors=()):
+        self.id = id
+        self.gate = asyncio.Event()
+        self.gate.set()
+        self.errors = list(errors)
+        self.messages = []
+        self.sent_at = []
+
+    async def send(self, content=None, file=None, files=None):
+        await self.gate.wait()
+        if self.errors:
+            raise self.errors.pop(0)
+        message = FakeMessage(self, content, [file] if file is not None else list(files or ()))
+        self.messages.append(message)
+        self.sent_at.append(time.monotonic())
+        return message
+
+
+def too_many_requests(retry_after: str) -> discord.HTTPException:
+    response = mock.Mock(status=429, reason="Too Many Requests", headers={"Retry-After": retry_after})
+    return discord.HTTPException(response, "You are being rate limited.")
+
+
+class TestOutbox(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.outbox = Outbox(burst=0)
+        self.channel = FakeChannel(1)
+
+    async def release(self):
+        await asyncio.sleep(0)  # let the tasks just created queue their messages
+        self.channel.gate.set()
+
+    async def hold(self):
+        """Start a send that stays in flight until release()."""
+        self.channel.gate.clear()
+        first = asyncio.create_task(self.outbox.send(self.channel, "first", key="other"))
+        await asyncio.sleep(0)
+        return first
+
+    async def test_status_lines_share_one_message_and_the_reply_supersedes_unsent_ones(self):
+        self.outbox.status(self.channel, "Downloading...", key=1)
+        await self.outbox.flush()
+        self.outbox.status(self.channel, "Generating...", key=1)
+        await self.outbox.flush()
+        self.assertEqual(len(self.channel.messages), 1)
+        self.assertEqual(self.channel.messages[0].content, "Generating...")
+
+        first = await self.hold()
+        self.outbox.status(self.channel, "Still generating...", key=1)
+        self.outbox.status(self.channel, "Almost done...", key=1)
+        reply = asyncio.create_task(self.outbox.send(self.channel, "Here you go", key=1))
+        await self.release()
+        await asyncio.gather(first, reply)
+        self.assertEqual([m.content for m in self.channel.messages], ["Generating...", "first", "Here you go"])
+        self.assertEqual(self.outbox.saved["coalesced"], 1)
+        self.assertEqual(self.outbox.saved["superseded"], 1)
+
+        # After the reply, the next status line is a new message below it.
+        self.outbox.status(self.channel, "Regenerating...", key=1)
+        await self.outbox.flush()
+        self.assertEqual(self.channel.messages[-1].content, "Regenerating...")
+
+    async def test_queued_replies_to_one_request_are_merged_within_the_file_limit(self):
+        first = await self.hold()
+        replies = [asyncio.create_task(self.outbox.send(self.channel, f"<@1> file {i}", key=1,
+                                                        attachments=[Attachment(f"f{i}.txt", "x")]))
+                   for i in range(12)]
+        other = asyncio.create_task(self.outbox.send(self.channel, "<@2> yours", key=2))
+        await self.release()
+        results = await asyncio.gather(*replies)
+        await asyncio.gather(first, other)
+
+        first_batch, second_batch, theirs = self.channel.messages[1:]
+        self.assertEqual(len(first_batch.files), 10)
+        self.assertTrue(first_batch.content.startswith("<@1> file 0\nfile 1\n"))
+        self.assertEqual(len(second_batch.files), 2)
+        self.assertIs(results[0], first_batch)
+        self.assertIs(results[11], second_batch)
+        self.assertEqual(theirs.content, "<@2> yours")
+        self.assertEqual(self.outbox.calls["send"], 4)
+
+    async def test_one_send_over_the_limit_is_split(self):
+        files = [Attachment(f"f{i}.txt", b"x" * 10) for i in range(3)]
+        self.outbox.max_upload_bytes = 25
+        await self.outbox.send(self.channel, "bundle", attachments=files)
+        self.assertEqual([len(m.files) for m in self.channel.messages], [2, 1])
+        self.assertEqual([m.content for m in self.channel.messages], ["bundle", None])
+
+    async def test_queued_edits_of_one_message_collapse(self):
+        message = await self.outbox.send(self.channel, "v1", merge=False)
+        first = await self.hold()
+        edits = [asyncio.create_task(self.outbox.edit(message, f"v{i}")) for i in range(2, 6)]
+        await self.release()
+        await asyncio.gather(first, *edits)
+        self.assertEqual(message.edits, ["v5"])
+
+    async def test_attachments_are_encoded_once(self):
+        attachment = Attachment("ci.yml", "on: push\n")
+        for channel in (self.channel, FakeChannel(2)):
+            await self.outbox.send(channel, "pipeline", attachments=[attachment])
+            self.assertEqual(channel.messages[0].files[0].fp.read(), b"on: push\n")
+        self.assertIsInstance(attachment.data, bytes)
+
+
+class TestPacing(unittest.IsolatedAsyncioTestCase):
+
+    async def test_sends_are_paced_per_channel_without_blocking_others(self):
+        outbox = Outbox(burst=2, window=0.2)
+        busy, quiet = FakeChannel(1), FakeChannel(2)
+        started = time.monotonic()
+        sends = [asyncio.create_task(outbox.send(busy, f"m{i}", merge=False)) for i in range(4)]
+        await asyncio.sleep(0.01)
+        await outbox.send(quiet, "hello")
+        self.assertLess(quiet.sent_at[0] - started, 0.05)
+        await asyncio.gather(*sends)
+        # Two go out at once, the other two at the bucket's rate of 10 per second.
+        self.assertGreaterEqual(busy.sent_at[3] - started, 0.18)
+
+    async def test_rate_limit_headers_hold_the_channel(self):
+        outbox = Outbox(burst=0)
+        channel = FakeChannel(42)
+        outbox.observe("POST", "/api/v10/channels/42/messages",
+                       {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "0.15"})
+        outbox.observe("POST", "/api/v10/guilds/1/roles", {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset-After": "9"})
+        started = time.monotonic()
+        await outbox.send(channel, "after the reset")
+        self.assertGreaterEqual(channel.sent_at[0] - started, 0.14)
+
+    async def test_429_is_retried_after_retry_after(self):
+        outbox = Outbox(burst=0)
+        channel = FakeChannel(1, errors=[too_many_requests("0.05")])
+        await outbox.send(channel, "eventually")
+        self.assertEqual([m.content for m in channel.messages], ["eventually"])
+        self.assertEqual((outbox.rate_limited, outbox.calls["send"]), (1, 2))
+
+        channel.errors = [too_many_requests("0")] * 3
+        with self.assertRaises(discord.HTTPException):
+            await outbox.send(channel, "never")
+
+
+if __name__ == '__main__':
+    unittest.main()
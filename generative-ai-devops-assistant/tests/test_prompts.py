@@ -0,0 +1,89 @@
+import unittest
+
+from bot.generator import build_structure_prompt, build_url_prompt, fit_file_list
+from bot.prompts import (
+    GENERATOR_PREFIX, PromptRegistry, budget_file_list, parse_versions, path_importance, prompt_registry,
+)
+
+
+class TestPromptRegistry(unittest.TestCase):
+
+    def test_render_puts_the_fixed_prefix_first(self):
+        registry = PromptRegistry()
+        registry.register("greet", 1, "You are helpful.\n", "Say hi to {name}.")
+        self.assertEqual(registry.render("greet", name="Ada"), "You are helpful.\nSay hi to Ada.")
+        self.assertEqual(registry.get("greet").fields, {"name"})
+
+    def test_missing_and_unsupported_placeholders(self):
+        registry = PromptRegistry()
+        registry.register("greet", 1, "", "Hi {name}")
+        with self.assertRaises(ValueError):
+            registry.render("greet")
+        with self.assertRaises(ValueError):
+            registry.register("bad", 1, "", "Hi {name!r}")
+        with self.assertRaises(ValueError):
+            registry.register("greet", 1, "", "again")
+
+    def test_newest_version_unless_pinned(self):
+        registry = PromptRegistry(pins=parse_versions("greet=1"))
+        registry.register("greet", 1, "", "v1 {name}")
+        registry.register("greet", 2, "", "v2 {name}")
+        self.assertEqual(registry.render("greet", name="x"), "v1 x")
+        registry.pins.clear()
+        self.assertEqual(registry.render("greet", name="x"), "v2 x")
+        with self.assertRaises(KeyError):
+            registry.get("greet", 3)
+        with self.assertRaises(ValueError):
+            parse_versions("greet")
+
+    def test_generator_prompts_share_a_prefix(self):
+        url_prompt = build_url_prompt("https://github.com/o/r")
+        structure_prompt = build_structure_prompt("Source code", "app.py", "Python application")
+        self.assertTrue(url_prompt.startswith(GENERATOR_PREFIX))
+        self.assertTrue(structure_prompt.startswith(GENERATOR_PREFIX))
+        self.assertTrue(structure_prompt.endswith("appears to be a Python application."))
+
+    def test_request_text_comes_last(self):
+        for name, values in (("chat", {"question": "Q?"}),
+                             ("cicd", {"description": "a GitLab CI YAML pipeline configuration", "request": "Q?"})):
+            self.assertTrue(prompt_registry.render(name, **values).endswith("Q?"), name)
+
+
+class TestFileListBudget(unittest.TestCase):
+
+    def test_small_listing_is_unchanged(self):
+        self.assertEqual(budget_file_list(["a.py", "b/c.py"], max_tokens=100), "a.py\nb/c.py")
+
+    def test_important_paths_survive_anywhere_in_the_list(self):
+        noise = [f"node_modules/pkg{i}/index.js" for i in range(500)]
+        assets = [f"static/img/icon{i}.png" for i in range(100)]
+        listing = budget_file_list(noise + assets + ["src/main.py", "requirements.txt", "Dockerfile"],
+                                   max_tokens=200)
+        lines = listing.splitlines()
+        self.assertIn("requirements.txt", lines)
+        self.assertIn("Dockerfile", lines)
+        self.assertIn("src/main.py", lines)
+        self.assertLessEqual(len(listing) / 4, 200)
+        self.assertRegex(lines[-1], r"^\.\.\.and \d+ more files, mostly under node_modules/ \(\d+\)")
+
+    def test_kept_paths_keep_their_order(self):
+        files = ["z/app.py", "a/big.png", "pyproject.toml"] + [f"vendor/x{i}.go" for i in range(200)]
+        lines = budget_file_list(files, max_tokens=60).splitlines()
+        self.assertEqual(lines[:3], ["z/app.py", "a/big.png", "pyproject.toml"])
+        self.assertTrue(lines[-1].startswith("...and "))
+
+    def test_importance(self):
+        self.assertGreater(path_importance("package.json"), path_importance("src/util.js"))
+        self.assertGreater(path_importance("src/util.js"), path_importance("node_modules/x/package.json"))
+        self.assertGreater(path_importance("app/main.py"), path_importance("docs/img/logo.png"))
+
+
+class TestFitFileList(unittest.IsolatedAsyncioTestCase):
+
+    async def test_large_listing_matches_inline_result(self):
+        files = [f"pkg{i}/module{j}.py" for i in range(300) for j in range(10)] + ["Dockerfile"]
+        self.assertEqual(await fit_file_list(files), budget_file_list(files))
+
+
+if __name__ == '__main__':
+    unittest.main()
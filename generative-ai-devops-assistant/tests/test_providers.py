@@ -0,0 +1,207 @@
+import json
+import unittest
+from unittest import mock
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot import llm_client as llm_module
+from bot.http_client import HttpClient
+from bot.llm_client import FakeBackend, LLMClient, is_retryable_error
+from bot.providers import (
+    CHAT, GENERATION, LLMRouter, OpenAICompatibleBackend, Provider, ProviderError, Route, parse_route,
+)
+
+
+class HTTPError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_router(primary_errors=(), clock=None, **provider_kwargs):
+    primary = FakeBackend(reply=lambda prompt: f"primary: {prompt}", errors=primary_errors)
+    fallback = FakeBackend(reply=lambda prompt: f"fallback: {prompt}")
+    kwargs = {"clock": clock or FakeClock(), **provider_kwargs}
+    providers = [
+        Provider("primary", LLMClient(primary, max_retries=0), **kwargs),
+        Provider("fallback", LLMClient(fallback, max_retries=0), **kwargs),
+    ]
+    routes = {
+        CHAT: [Route("primary", "fast"), Route("fallback", "fast-2")],
+        GENERATION: [Route("primary", "strong"), Route("fallback", "strong-2")],
+    }
+    return LLMRouter(providers, routes), primary, fallback
+
+
+class TestRouting(unittest.IsolatedAsyncioTestCase):
+
+    async def test_each_request_type_uses_its_model(self):
+        router, primary, _ = make_router()
+        await router.generate("q", CHAT)
+        await router.generate("g", GENERATION)
+        self.assertEqual(primary.calls, [("q", "fast"), ("g", "strong")])
+
+    async def test_fails_over_to_next_provider(self):
+        router, primary, fallback = make_router(primary_errors=[HTTPError(503)])
+        self.assertEqual(await router.generate("q", GENERATION), "fallback: q")
+        self.assertEqual(fallback.calls, [("q", "strong-2")])
+        self.assertEqual(router.failovers, 1)
+        self.assertEqual(router.providers["primary"].stats.failures, 1)
+
+    async def test_last_target_error_is_raised(self):
+        router, primary, fallback = make_router()
+        fallback.errors = [HTTPError(500)]
+        router.routes[CHAT] = [Route("fallback", "fast-2")]
+        with self.assertRaises(HTTPError):
+            await router.generate("q", CHAT)
+
+    async def test_unhealthy_provider_is_skipped_until_cooldown(self):
+        clock = FakeClock()
+        router, primary, fallback = make_router(primary_errors=[HTTPError(503)] * 3, clock=clock,
+                                                min_samples=3, max_error_rate=0.5, cooldown=30)
+        for _ in range(3):
+            await router.generate("q", CHAT)
+        self.assertFalse(router.providers["primary"].available)
+        self.assertEqual(router.providers["primary"].trips, 1)
+
+        await router.generate("q", CHAT)
+        self.assertEqual(len(primary.calls), 3)
+
+        clock.now += 31
+        self.assertEqual(await router.generate("q", CHAT), "primary: q")
+        self.assertEqual(len(primary.calls), 4)
+
+    async def test_slow_provider_is_taken_out_of_rotation(self):
+        clock = FakeClock()
+        router, primary, _ = make_router(clock=clock, min_samples=1, max_latency=5)
+
+        def slow(prompt):
+            clock.now += 10
+            return "slow"
+
+        primary.reply = slow
+        await router.generate("q", CHAT)
+        self.assertFalse(router.providers["primary"].available)
+        self.assertEqual(await router.generate("q", CHAT), "fallback: q")
+
+    async def test_all_unhealthy_still_tries_the_route(self):
+        router, primary, _ = make_router()
+        for provider in router.providers.values():
+            provider.tripped_until = float("inf")
+        self.assertEqual(await router.generate("q", CHAT), "primary: q")
+
+    async def test_stream_fails_over_only_before_first_chunk(self):
+        router, primary, fallback = make_router(primary_errors=[HTTPError(503)])
+        chunks = [chunk async for chunk in router.stream("q", CHAT)]
+        self.assertEqual("".join(chunks), "fallback: q")
+
+        async def broken_stream(prompt, model_name):
+            yield "partial"
+            raise HTTPError(503)
+
+        primary.stream = broken_stream
+        received = []
+        with self.assertRaises(HTTPError):
+            async for chunk in router.stream("q", CHAT):
+                received.append(chunk)
+        self.assertEqual(received, ["partial"])
+        self.assertEqual(fallback.calls, [("q", "fast-2")])
+
+    async def test_accounting(self):
+        router, _, _ = make_router()
+        router.routes[CHAT] = [Route("primary", "gemini-2.5-pro")]
+        await router.generate("x" * 4000, CHAT)
+        stats = router.stats()["primary"]
+        self.assertEqual((stats["calls"], stats["failures"]), (1, 0))
+        self.assertEqual(stats["input_tokens"], 1000)
+        self.assertGreater(stats["output_tokens"], 1000)
+        self.assertGreater(stats["cost_usd"], 0)
+        self.assertTrue(stats["available"])
+
+    def test_parse_route_and_unknown_provider(self):
+        self.assertEqual(repr(parse_route("gemini:gemini-2.5-flash, openai:gpt-4o-mini")),
+                         "[gemini:gemini-2.5-flash, openai:gpt-4o-mini]")
+        with self.assertRaises(ValueError):
+            parse_route("gemini")
+        with self.assertRaises(ValueError):
+            LLMRouter([], {CHAT: parse_route("nowhere:model")})
+
+
+class TestModuleRouting(unittest.IsolatedAsyncioTestCase):
+
+    async def test_chat_and_file_helpers_use_their_routes(self):
+        backend = FakeBackend()
+        with mock.patch.object(llm_module.llm_client, "backend", backend):
+            await llm_module.get_gemini_response("hi", use_cache=False)
+            await llm_module.get_gemini_file_response("make a Dockerfile", use_cache=False)
+        self.assertEqual([model for _, model in backend.calls],
+                         [llm_module.router.primary(CHAT).model, llm_module.router.primary(GENERATION).model])
+
+
+def make_openai_app(status=200):
+    seen = []
+
+    async def completions(request):
+        body = await request.json()
+        seen.append((request.headers.get("Authorization"), body))
+        if status != 200:
+            return web.Response(status=status, text="overloaded")
+        text = body["messages"][-1]["content"].upper()
+        if not body["stream"]:
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": text}}]})
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        for start in range(0, len(text), 3):
+            event = {"choices": [{"delta": {"content": text[start:start + 3]}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    return app, seen
+
+
+class TestOpenAICompatibleBackend(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.http = HttpClient()
+
+    async def asyncTearDown(self):
+        await self.http.close()
+
+    async def start(self, status=200):
+        app, seen = make_openai_app(status)
+        server = TestServer(app)
+        await server.start_server()
+        self.addAsyncCleanup(server.close)
+        backend = OpenAICompatibleBackend(str(server.make_url("/v1")), api_key="sk-test", http=self.http)
+        return backend, seen
+
+    async def test_generate_and_stream(self):
+        backend, seen = await self.start()
+        self.assertEqual(await backend.generate("hello", "gpt-4o-mini"), "HELLO")
+        self.assertEqual(seen[0][0], "Bearer sk-test")
+        self.assertEqual(seen[0][1]["model"], "gpt-4o-mini")
+        chunks = [chunk async for chunk in backend.stream("streamed text", "gpt-4o-mini")]
+        self.assertEqual(chunks, ["STR", "EAM", "ED ", "TEX", "T"])
+
+    async def test_error_status_is_retryable(self):
+        backend, _ = await self.start(status=503)
+        with self.assertRaises(ProviderError) as raised:
+            await backend.generate("hello", "gpt-4o-mini")
+        self.assertEqual(raised.exception.status, 503)
+        self.assertTrue(is_retryable_error(raised.exception))
+
+
+if __name__ == '__main__':
+    unittest.main()
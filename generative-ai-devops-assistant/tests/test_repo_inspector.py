@@ -0,0 +1,93 @@
+import unittest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from bot.github_client import GitHubClient
+from bot.http_client import HttpClient
+from bot.repo_inspector import RepoInspectionError, RepoInspector, parse_github_url
+
+SHA = "a" * 40
+
+
+def make_stub_github():
+    hits = {"repo": 0, "commit": 0, "tree": 0, "contents": 0, "not_modified": 0}
+
+    def conditional(request, etag, payload):
+        if request.headers.get("If-None-Match") == etag:
+            hits["not_modified"] += 1
+            return web.Response(status=304)
+        return web.json_response(payload, headers={"ETag": etag})
+
+    async def repo(request):
+        hits["repo"] += 1
+        return conditional(request, '"repo-v1"', {"default_branch": "main"})
+
+    async def commit(request):
+        hits["commit"] += 1
+        return conditional(request, '"commit-v1"', {"sha": SHA})
+
+    async def tree(request):
+        hits["tree"] += 1
+        return web.json_response({
+            "truncated": False,
+            "tree": [
+                {"path": "src", "type": "tree"},
+                {"path": "requirements.txt", "type": "blob", "size": 20},
+                {"path": "src/app.py", "type": "blob", "size": 100},
+            ],
+        })
+
+    async def contents(request):
+        hits["contents"] += 1
+        if request.match_info["path"] == "requirements.txt":
+            return web.Response(text="flask==3.0\ngunicorn\n")
+        return web.Response(status=404)
+
+    app = web.Application()
+    app.router.add_get("/repos/{owner}/{repo}", repo)
+    app.router.add_get("/repos/{owner}/{repo}/commits/{ref}", commit)
+    app.router.add_get("/repos/{owner}/{repo}/git/trees/{sha}", tree)
+    app.router.add_get("/repos/{owner}/{repo}/contents/{path:.+}", contents)
+    return app, hits
+
+
+class TestRepoInspector(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        app, self.hits = make_stub_github()
+        self.server = TestServer(app)
+        await self.server.start_server()
+        self.http = HttpClient()
+        self.inspector = RepoInspector(GitHubClient(self.http, token="t", api_url=str(self.server.make_url(""))))
+
+    async def asyncTearDown(self):
+        await self.http.close()
+        await self.server.close()
+
+    async def test_fetches_tree_and_manifests(self):
+        snapshot = await self.inspector.inspect("https://github.com/octo/app")
+        self.assertEqual(snapshot.sha, SHA)
+        self.assertEqual(snapshot.file_list, ["requirements.txt", "src/app.py"])
+        self.assertIn("flask", snapshot.read_file("requirements.txt"))
+
+    async def test_unchanged_repo_uses_conditional_requests_and_sha_cache(self):
+        await self.inspector.inspect("https://github.com/octo/app")
+        await self.inspector.inspect("https://github.com/octo/app")
+        self.assertEqual(self.hits["tree"], 1)
+        self.assertEqual(self.hits["contents"], 1)
+        self.assertEqual(self.hits["not_modified"], 2)
+
+    async def test_missing_repo_raises(self):
+        inspector = RepoInspector(GitHubClient(self.http, token=None, api_url=str(self.server.make_url("/missing"))))
+        with self.assertRaises(RepoInspectionError):
+            await inspector.inspect("https://github.com/octo/app")
+
+    def test_parse_github_url(self):
+        self.assertEqual(parse_github_url("https://github.com/octo/app.git"), ("octo", "app", None))
+        self.assertEqual(parse_github_url("https://github.com/octo/app/tree/dev"), ("octo", "app", "dev"))
+        with self.assertRaises(RepoInspectionError):
+            parse_github_url("https://gitlab.com/octo/app")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,207 @@
+import asyncio
+import time
+import unittest
+from unittest import mock
+
+from bot import discord_bot, llm_client
+from bot.scheduler import (
+    BULK,
+    INTERACTIVE,
+    FairScheduler,
+    Overloaded,
+    QueueFull,
+    RateLimited,
+    RateLimiter,
+    RequestContext,
+    request_context,
+    current_request,
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_user_bucket_refills(self):
+        clock = FakeClock()
+        limiter = RateLimiter(user_per_minute=60, user_burst=2, channel_per_minute=600, channel_burst=100, clock=clock)
+        limiter.check(1, 10)
+        limiter.check(1, 10)
+        with self.assertRaises(RateLimited) as raised:
+            limiter.check(1, 10)
+        self.assertAlmostEqual(raised.exception.retry_after, 1.0)
+        limiter.check(2, 10)  # Other users are unaffected.
+        clock.now += 1
+        limiter.check(1, 10)
+
+    def test_channel_limit_does_not_spend_user_tokens(self):
+        clock = FakeClock()
+        limiter = RateLimiter(user_per_minute=60, user_burst=1, channel_per_minute=60, channel_burst=1, clock=clock)
+        limiter.check(1, 10)
+        with self.assertRaises(RateLimited):
+            limiter.check(2, 10)
+        limiter.check(2, 20)
+
+
+class TestFairScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def run_jobs(self, scheduler, jobs):
+        order = []
+        gate = asyncio.Event()
+
+        async def job(name, ctx):
+            async with scheduler.slot(ctx):
+                order.append(name)
+                await gate.wait()
+
+        tasks = [asyncio.create_task(job(name, ctx)) for name, ctx in jobs]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    async def test_users_take_turns(self):
+        scheduler = FairScheduler(max_concurrency=1, max_queue=10, shed_latency=0)
+        noisy = RequestContext(user_id=1)
+        quiet = RequestContext(user_id=2)
+        jobs = [("noisy-0", noisy), ("noisy-1", noisy), ("noisy-2", noisy), ("noisy-3", noisy), ("quiet", quiet)]
+        order = await self.run_jobs(scheduler, jobs)
+        self.assertEqual(order, ["noisy-0", "noisy-1", "quiet", "noisy-2", "noisy-3"])
+        self.assertEqual((scheduler.active, scheduler.queued), (0, 0))
+
+    async def test_interactive_goes_before_bulk(self):
+        scheduler = FairScheduler(max_concurrency=1, max_queue=10, shed_latency=0)
+        jobs = [("first", RequestContext(1, priority=BULK)), ("bulk", RequestContext(2, priority=BULK)),
+                ("chat", RequestContext(3, priority=INTERACTIVE))]
+        self.assertEqual(await self.run_jobs(scheduler, jobs), ["first", "chat", "bulk"])
+
+    async def test_queue_is_bounded_and_reports_position(self):
+        scheduler = FairScheduler(max_concurrency=1, max_queue=1, shed_latency=0)
+        positions = []
+
+        async def on_queued(position):
+            positions.append(position)
+
+        release = asyncio.Event()
+
+        async def hold(ctx):
+            async with scheduler.slot(ctx):
+                await release.wait()
+
+        running = asyncio.create_task(hold(RequestContext(1)))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold(RequestContext(2, on_queued=on_queued)))
+        await asyncio.sleep(0)
+        with self.assertRaises(QueueFull):
+            async with scheduler.slot(RequestContext(3)):
+                pass
+        release.set()
+        await asyncio.gather(running, waiting)
+        self.assertEqual(positions, [1])
+
+    async def test_cancelled_waiter_gives_up_its_place(self):
+        scheduler = FairScheduler(max_concurrency=1, max_queue=5, shed_latency=0)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot(RequestContext(1)):
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.queued, 0)
+        release.set()
+        await running
+        self.assertEqual(scheduler.active, 0)
+
+    async def test_slow_upstream_sheds_bulk_first(self):
+        clock = FakeClock()
+        scheduler = FairScheduler(max_concurrency=2, shed_latency=10, latency_alpha=1.0, clock=clock)
+        async with scheduler.slot(RequestContext(1)):
+            clock.now += 15
+        async with scheduler.slot(RequestContext(1, priority=INTERACTIVE)):
+            clock.now += 15
+        with self.assertRaises(Overloaded):
+            async with scheduler.slot(RequestContext(1, priority=BULK)):
+                pass
+        clock.now += 120  # The estimate decays while idle.
+        async with scheduler.slot(RequestContext(1, priority=BULK)):
+            pass
+
+    async def test_request_context_is_inherited_by_tasks(self):
+        async def read():
+            return current_request.get()
+
+        with request_context(7, 8, BULK):
+            ctx = await asyncio.create_task(read())
+        self.assertEqual((ctx.user_id, ctx.channel_id, ctx.priority), (7, 8, BULK))
+        self.assertIsNone(current_request.get())
+
+
+
+class TestStreamingHoldsTheSlotOnlyForTheProvider(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.scheduler = FairScheduler(max_concurrency=1, max_queue=0, shed_latency=0, latency_alpha=1.0,
+                                       clock=time.monotonic)
+
+        async def stream(prompt, purpose):
+            for chunk in ("a", "b", "c"):
+                await asyncio.sleep(0.001)
+                yield chunk
+
+        patches = (mock.patch.object(llm_client, "scheduler", self.scheduler),
+                   mock.patch.object(llm_client.router, "stream", stream))
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    async def test_a_slow_reader_does_not_keep_the_slot(self):
+        chunks = []
+        async for chunk in llm_client.stream_gemini_response("hi", use_cache=False):
+            chunks.append(chunk)
+            await asyncio.sleep(0.05)  # Discord pacing
+            if len(chunks) == 1:
+                self.assertEqual(self.scheduler.active, 0)
+        self.assertEqual(chunks, ["a", "b", "c"])
+        self.assertLess(self.scheduler.latency, 0.04)
+
+    async def test_rejections_still_reach_the_caller(self):
+        async with self.scheduler.slot(RequestContext(1)):
+            with self.assertRaises(QueueFull):
+                async for _ in llm_client.stream_gemini_response("hi", use_cache=False):
+                    pass
+
+
+class TestChatOpsIsRateLimited(unittest.IsolatedAsyncioTestCase):
+
+    async def test_a_limited_user_is_refused_before_the_flow_runs(self):
+        limiter = RateLimiter(user_per_minute=60, user_burst=1, channel_per_minute=600, channel_burst=100,
+                              clock=FakeClock())
+        flow_engine = mock.Mock(wants=mock.Mock(return_value=True), handle=mock.AsyncMock())
+        send = mock.AsyncMock()
+        channel = mock.Mock(id=10)
+        channel.name = "general"
+        message = mock.Mock(content="deploy", channel=channel, created_at=None, author=mock.Mock(id=1, bot=False))
+        with mock.patch.object(discord_bot, "rate_limiter", limiter), \
+                mock.patch.object(discord_bot, "flow_engine", flow_engine), \
+                mock.patch.object(discord_bot.outbox, "send", send):
+            await discord_bot.on_message(message)
+            await discord_bot.on_message(message)
+        flow_engine.handle.assert_awaited_once_with(message)
+        send.assert_awaited_once()
+        self.assertIn("too quickly", send.await_args.args[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from bot import llm_client as llm_module
+from bot.cache import ResponseCache
+from bot.config import override_settings
+from bot.llm_client import FakeBackend, get_gemini_response, stream_gemini_response
+from bot.semantic_cache import HashedVectorizer, SemanticCache
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+QUESTION = "How do I set resource limits in k8s for a python app?"
+
+
+class TestHashedVectorizer(unittest.TestCase):
+
+    def test_vectors_are_unit_length_and_aliases_match(self):
+        vectorize = HashedVectorizer(dim=256)
+        a = vectorize("resource limits for k8s pods")
+        b = vectorize("kubernetes pod resource limit")
+        self.assertAlmostEqual(float((a * a).sum()), 1.0, places=5)
+        self.assertAlmostEqual(float(a @ b), 1.0, places=5)
+        self.assertFalse(vectorize("how do I?").any())
+
+    def test_cpu_and_memory_are_resources(self):
+        vectorize = HashedVectorizer()
+        self.assertEqual(sorted(vectorize.words("configure cpu/memory limits")),
+                         sorted(vectorize.words("setting resource limits")))
+
+
+class TestSemanticCache(unittest.TestCase):
+
+    def test_reworded_question_hits_and_a_different_one_misses(self):
+        cache = SemanticCache(capacity=10)
+        cache.add(QUESTION, "answer", "m1")
+        self.assertEqual(cache.lookup("setting resource limits on kubernetes for python apps", "m1"), "answer")
+        self.assertIsNone(cache.lookup("How do I roll back a deployment in k8s for a python app?", "m1"))
+        self.assertIsNone(cache.lookup(QUESTION, "m2"))
+        self.assertEqual((cache.stats.hits, cache.stats.misses), (1, 2))
+
+    def test_near_misses_with_a_different_key_term_miss(self):
+        pairs = [
+            ("set memory limits for a pod in k8s", "set cpu limits for a pod in k8s"),
+            ("how do I enable caching in github actions", "how do I disable caching in github actions"),
+            ("write a dockerfile for a flask app", "write a dockerfile for a django app"),
+            ("how to cache npm dependencies in github actions", "how to cache pip dependencies in github actions"),
+            ("deploy to kubernetes", "deploy to kubernetes with helm"),
+            ("run tests in github actions", "run tests in github actions on windows"),
+        ]
+        for stored, asked in pairs:
+            with self.subTest(asked=asked):
+                cache = SemanticCache(capacity=10)
+                cache.add(stored, "answer", "m1")
+                self.assertIsNone(cache.lookup(asked, "m1"))
+                self.assertEqual(cache.lookup(stored, "m1"), "answer")
+
+    def test_paraphrase_with_extra_context_hits(self):
+        cache = SemanticCache(capacity=10)
+        cache.add("how do I set resource limits in k8s", "answer", "m1")
+        self.assertEqual(cache.lookup("configure cpu/memory limits for kubernetes pods", "m1"), "answer")
+        self.assertIsNone(cache.lookup("caching cpu/memory limits for kubernetes pods", "m1"))
+
+    def test_entries_expire(self):
+        clock = FakeClock()
+        cache = SemanticCache(capacity=10, ttl_seconds=10, clock=clock)
+        cache.add(QUESTION, "answer", "m1")
+        clock.now += 11
+        self.assertIsNone(cache.lookup(QUESTION, "m1"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_entry_is_replaced_when_full(self):
+        clock = FakeClock()
+        cache = SemanticCache(capacity=2, clock=clock)
+        cache.add("cache pip dependencies in github actions", "pip", "m1")
+        clock.now += 1
+        cache.add("rotate secrets in vault", "vault", "m1")
+        clock.now += 1
+        cache.lookup("cache pip dependencies in github actions", "m1")
+        clock.now += 1
+        cache.add("terraform remote state on s3", "s3", "m1")
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats.evictions, 1)
+        self.assertIsNone(cache.lookup("rotate secrets in vault", "m1"))
+        self.assertEqual(cache.lookup("cache pip dependencies in github actions", "m1"), "pip")
+
+    def test_index_survives_a_restart(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        cache = SemanticCache(path, capacity=10)
+        cache.add(QUESTION, "answer", "m1")
+        cache.add("rotate secrets in vault", "vault", "m1")
+        cache.close()
+
+        reopened = SemanticCache(path, capacity=10)
+        self.assertEqual(len(reopened), 2)
+        self.assertEqual(reopened.lookup(QUESTION, "m1"), "answer")
+        reopened.add("terraform remote state on s3", "s3", "m1")
+        self.assertEqual(reopened.lookup("rotate secrets in vault", "m1"), "vault")
+        reopened.close()
+
+        # A different size starts a fresh index instead of misreading the old one.
+        resized = SemanticCache(path, capacity=20)
+        self.assertEqual(len(resized), 0)
+        resized.close()
+
+
+class TestChatUsesSemanticCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.backend = FakeBackend()
+        patches = (mock.patch.object(llm_module.llm_client, "backend", self.backend),
+                   mock.patch.object(llm_module, "response_cache", ResponseCache()),
+                   mock.patch.object(llm_module, "semantic_cache", SemanticCache(capacity=10)),
+                   override_settings(llm_cache_enabled=True, semantic_cache_enabled=True))
+        for patch in patches:
+            self.enterContext(patch)
+
+    async def test_reworded_first_question_is_answered_without_the_model(self):
+        first = await get_gemini_response(QUESTION)
+        again = "".join([chunk async for chunk in stream_gemini_response("set resource limits in kubernetes, python app")])
+        self.assertEqual(again, first)
+        self.assertEqual(len(self.backend.calls), 1)
+
+    async def test_follow_ups_and_opted_out_calls_skip_it(self):
+        await get_gemini_response(QUESTION)
+        await get_gemini_response("resource limits in kubernetes for a python app", use_cache=False)
+        await get_gemini_response("resource limits in kubernetes for a python app", history="User: hi")
+        self.assertEqual(len(self.backend.calls), 3)
+        self.assertEqual(len(llm_module.semantic_cache), 1)
+
+    async def test_a_failing_cache_is_a_miss(self):
+        with mock.patch.object(llm_module.semantic_cache, "lookup", side_effect=OSError("disk gone")):
+            answer = await get_gemini_response(QUESTION)
+        self.assertFalse(answer.startswith("Sorry"))
+        self.assertEqual(len(self.backend.calls), 1)
+        self.assertEqual(llm_module.semantic_cache.stats.misses, 1)
+
+    async def test_without_numpy_questions_go_to_the_model(self):
+        cache = SemanticCache(capacity=10)
+        with mock.patch.object(llm_module, "semantic_cache", cache), \
+                mock.patch("importlib.util.find_spec", return_value=None), \
+                mock.patch("bot.semantic_cache._np", None):
+            await get_gemini_response(QUESTION)
+            await get_gemini_response("resource limits in kubernetes for a python app")
+            self.assertEqual(len(cache), 0)
+        self.assertEqual(len(self.backend.calls), 2)
+        self.assertFalse(cache.available)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from bot.sessions import (
+    ChatOpsSession,
+    MemorySessionBackend,
+    RedisSessionBackend,
+    SessionStore,
+    SqliteSessionBackend,
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class LocalRedis:
+    """Stand-in for a redis client: get/set(ex=)/delete on a dict, honouring expiry."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def get(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= self.clock():
+            self.data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value, ex=None):
+        self.data[key] = (value, self.clock() + ex if ex else None)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+class TestSessionStore(unittest.IsolatedAsyncioTestCase):
+
+    def check_backend(self, backend, clock):
+        store = SessionStore(backend, idle_ttl=60, clock=clock)
+        session = store.start(42)
+        session.data["framework"] = "Flask"
+        session.stage = "https"
+        store.save(session)
+
+        loaded = store.get(42)
+        self.assertEqual((loaded.stage, loaded.data["framework"]), ("https", "Flask"))
+
+        clock.now += 61
+        self.assertIsNone(store.get(42))
+
+    def test_memory_backend(self):
+        self.check_backend(MemorySessionBackend(), FakeClock())
+
+    def test_sqlite_backend_survives_restart(self):
+        clock = FakeClock()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sessions.sqlite3")
+            backend = SqliteSessionBackend(path)
+            SessionStore(backend, clock=clock).start(7)
+            backend.close()
+
+            reopened = SqliteSessionBackend(path)
+            self.assertIsNotNone(SessionStore(reopened, clock=clock).get(7))
+            self.check_backend(reopened, clock)
+            reopened.close()
+
+    def test_redis_backend(self):
+        clock = FakeClock()
+        self.check_backend(RedisSessionBackend(LocalRedis(clock), idle_ttl=60), clock)
+
+    def test_sweep_evicts_idle_sessions(self):
+        clock = FakeClock()
+        backend = MemorySessionBackend()
+        store = SessionStore(backend, idle_ttl=60, clock=clock)
+        store.start(1)
+        clock.now += 30
+        store.start(2)
+        clock.now += 45
+        self.assertEqual(store.sweep(), 1)
+        self.assertEqual(len(backend), 1)
+
+    async def test_per_user_lock_serializes_messages(self):
+        store = SessionStore(MemorySessionBackend())
+        order = []
+
+        async def handle(tag):
+            async with store.lock(1):
+                order.append(f"{tag}-start")
+                await asyncio.sleep(0.01)
+                order.append(f"{tag}-end")
+
+        await asyncio.gather(handle("a"), handle("b"))
+        self.assertEqual(order, ["a-start", "a-end", "b-start", "b-end"])
+
+    async def test_sweep_keeps_a_lock_with_a_woken_waiter(self):
+        store = SessionStore(MemorySessionBackend())
+        order = []
+
+        async def handle(tag):
+            async with store.lock(1):
+                order.append(f"{tag}-start")
+                await asyncio.sleep(0.01)
+                order.append(f"{tag}-end")
+
+        async def first():
+            async with store.lock(1):
+                await asyncio.sleep(0.01)
+            # "b" has been woken but hasn't run yet; the sweep must not hand "c" a fresh lock.
+            store.sweep()
+            return asyncio.create_task(handle("c"))
+
+        first_task = asyncio.create_task(first())
+        await asyncio.sleep(0)
+        second_task = asyncio.create_task(handle("b"))
+        await second_task
+        await (await first_task)
+        self.assertEqual(order, ["b-start", "b-end", "c-start", "c-end"])
+        store.sweep()
+        self.assertEqual(store._locks, {})
+
+    def test_session_record_roundtrip(self):
+        session = ChatOpsSession(5, flow="deploy", stage="cicd", data={"framework": "Go", "https": True}, updated_at=1.0)
+        self.assertEqual(ChatOpsSession.from_dict(session.to_dict()).to_dict(), session.to_dict())
+        with self.assertRaises(AttributeError):
+            session.unexpected = True
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import io
+import pickle
+import unittest
+import zipfile
+
+from bot import discord_bot, sharding
+from bot.archive import ArchiveError, inspect_archive
+from bot.config import Settings, override_settings
+from bot.extraction import DOCKERFILE, K8S_MANIFEST, extract_artifacts
+from bot.workers import CpuPool
+
+
+def make_zip(files: dict) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, text in files.items():
+            archive.writestr(name, text)
+    return buffer.getvalue()
+
+
+def square(value):
+    return value * value
+
+
+class TestShardPlan(unittest.TestCase):
+
+    def test_groups_are_contiguous_and_balanced(self):
+        self.assertEqual(sharding.plan_shards(10, 3), [[0, 1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        self.assertEqual(sharding.plan_shards(2, 4), [[0], [1]])
+        self.assertEqual(sharding.plan_shards(1, 1), [[0]])
+
+    def test_parse_shard_count(self):
+        self.assertIsNone(sharding.parse_shard_count("auto"))
+        self.assertEqual(sharding.parse_shard_count("8"), 8)
+        with self.assertRaises(ValueError):
+            sharding.parse_shard_count("0")
+
+    def test_multiple_processes_need_a_shared_session_backend(self):
+        with override_settings(session_backend="memory"):
+            with self.assertRaises(ValueError):
+                sharding.check_shared_backends(2)
+            sharding.check_shared_backends(1)
+
+    def test_each_process_gets_its_own_semantic_cache(self):
+        settings = Settings("d", "g", "h", semantic_cache_path="data/semantic")
+        paths = {sharding.process_settings(settings, index).semantic_cache_path for index in range(3)}
+        self.assertEqual(len(paths), 3)
+        self.assertIsNone(sharding.process_settings(Settings("d", "g", "h"), 1).semantic_cache_path)
+
+    def test_a_guild_and_dms_are_each_served_by_one_process(self):
+        # Session locks are per process; this routing is what keeps them sufficient within a
+        # guild and within DMs. The same user in guilds on different processes is not serialized.
+        groups = sharding.plan_shards(8, 3)
+
+        def process_of(guild_id):
+            shard = sharding.shard_for_guild(guild_id, 8)
+            return next(index for index, group in enumerate(groups) if shard in group)
+
+        guild = 81384788765712384
+        self.assertEqual(sharding.shard_for_guild(guild, 8), (guild >> 22) % 8)
+        self.assertEqual(process_of(None), 0)
+        self.assertEqual(len({process_of(guild_id << 22) for guild_id in range(8)}), 3)
+
+    def test_sharded_client(self):
+        client = discord_bot.create_client(sharded=True, shard_count=4, shard_ids=[2, 3])
+        self.assertEqual((client.shard_count, client.shard_ids), (4, [2, 3]))
+        self.assertIs(client.on_message, discord_bot.on_message)
+
+
+class TestCpuPool(unittest.IsolatedAsyncioTestCase):
+
+    async def test_runs_in_worker_processes(self):
+        pool = CpuPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        self.assertEqual(await pool.run(square, 7), 49)
+        self.assertEqual((pool.submitted, pool.inline), (1, 0))
+
+    async def test_inline_when_disabled(self):
+        pool = CpuPool(max_workers=0)
+        self.assertEqual(await pool.run(square, 3), 9)
+        self.assertEqual(pool.inline, 1)
+
+    async def test_archive_summary_and_errors_cross_the_process_boundary(self):
+        pool = CpuPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+        data = make_zip({"app/requirements.txt": "flask\n", "app/app.py": "print()\n"})
+        file_list, description, _ = await pool.run(inspect_archive, data)
+        self.assertEqual(sorted(file_list), ["app/app.py", "app/requirements.txt"])
+        self.assertIn("Flask", description)
+        with self.assertRaises(ArchiveError):
+            await pool.run(inspect_archive, b"not a zip")
+
+
+class TestPicklableResults(unittest.TestCase):
+
+    def test_kinds_round_trip_as_the_same_objects(self):
+        reply = "### Dockerfile\n```dockerfile\nFROM python\n```\n"
+        extraction = pickle.loads(pickle.dumps(extract_artifacts(reply, (DOCKERFILE, K8S_MANIFEST))))
+        self.assertIs(extraction.get("Dockerfile").kind, DOCKERFILE)
+        self.assertEqual(extraction.needs_repair, [K8S_MANIFEST])
+
+
+if __name__ == '__main__':
+    unittest.main()
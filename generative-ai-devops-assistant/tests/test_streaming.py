@@ -0,0 +1,76 @@
+import unittest
+from bot.streaming import DiscordStreamWriter, OVERFLOW_NOTE
+
+
+class FakeMessage:
+    def __init__(self, content):
+        self.content = content
+        self.edits = 0
+
+    async def edit(self, content):
+        self.content = content
+        self.edits += 1
+
+
+class FakeChannel:
+    def __init__(self):
+        self.messages = []
+        self.files = []
+
+    async def send(self, content=None, file=None):
+        if file is not None:
+            self.files.append(file)
+        message = FakeMessage(content)
+        self.messages.append(message)
+        return message
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestDiscordStreamWriter(unittest.IsolatedAsyncioTestCase):
+
+    async def test_first_chunk_sent_immediately_then_edits_are_throttled(self):
+        channel, clock = FakeChannel(), FakeClock()
+        writer = DiscordStreamWriter(channel, edit_interval=1.0, clock=clock)
+        await writer.feed("Hello")
+        self.assertEqual(channel.messages[0].content, "Hello")
+
+        await writer.feed(" world")
+        self.assertEqual(channel.messages[0].edits, 0)
+        clock.now = 1.5
+        await writer.feed("!")
+        self.assertEqual(channel.messages[0].content, "Hello world!")
+
+        self.assertEqual(await writer.finish(), "Hello world!")
+        self.assertEqual(len(channel.messages), 1)
+
+    async def test_rolls_over_into_continuation_messages(self):
+        channel = FakeChannel()
+        writer = DiscordStreamWriter(channel, edit_interval=0, max_len=10, max_messages=5)
+        for chunk in ["aaaa\n", "bbbb\n", "cccc\n"]:
+            await writer.feed(chunk)
+        await writer.finish()
+        self.assertEqual([m.content for m in channel.messages], ["aaaa\nbbbb\n", "cccc\n"])
+        self.assertTrue(all(len(m.content) <= 10 for m in channel.messages))
+
+    async def test_switches_to_attachment_after_max_messages(self):
+        channel = FakeChannel()
+        writer = DiscordStreamWriter(channel, edit_interval=0, max_len=40, max_messages=1)
+        await writer.feed("x" * 30)
+        await writer.feed("y" * 30)
+        await writer.feed("z" * 30)
+        text = await writer.finish()
+        self.assertTrue(writer.overflowed)
+        self.assertEqual(len(text), 90)
+        self.assertTrue(channel.messages[0].content.endswith(OVERFLOW_NOTE))
+        self.assertEqual(len(channel.files), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+import io
+import unittest
+import zipfile
+from unittest import mock
+
+from bot import cicd_generator
+from bot.archive import inspect_archive
+from bot.artifacts import ArtifactResult
+from bot.config import override_settings
+from bot.extraction import (
+    DOCKERFILE, GITHUB_WORKFLOW, GITLAB_PIPELINE, JENKINSFILE, K8S_MANIFEST, validate_dockerfile,
+    validate_github_workflow, validate_gitlab_pipeline, validate_jenkinsfile, validate_k8s_manifest,
+)
+from bot.templates import (
+    GO, JAVA, NODE, PYTHON, Stack, detect_stack, extra_requirements, render_deployment, render_pipeline,
+    stack_from_text, wants_image,
+)
+
+VALIDATORS = {GITHUB_WORKFLOW: validate_github_workflow, GITLAB_PIPELINE: validate_gitlab_pipeline,
+              JENKINSFILE: validate_jenkinsfile, DOCKERFILE: validate_dockerfile, K8S_MANIFEST: validate_k8s_manifest}
+
+REPOS = {
+    "fastapi": {"svc/requirements.txt": "fastapi\nuvicorn\n", "svc/app/main.py": "", "svc/app/__init__.py": ""},
+    "flask": {"requirements.txt": "flask==3.0\n", "app.py": ""},
+    "django": {"pyproject.toml": "[tool.poetry]\n[tool.poetry.dependencies]\ndjango = '5'\ngunicorn = '22'\n",
+               "poetry.lock": "", "manage.py": "", "shop/wsgi.py": "", "shop/settings.py": ""},
+    "express": {"package.json": '{"dependencies": {"express": "4"}, "scripts": {"start": "node server.js"}}',
+                "package-lock.json": "{}", "server.js": ""},
+    "gin": {"go.mod": "module x\n\ngo 1.21\n\nrequire github.com/gin-gonic/gin v1.9.1\n", "go.sum": "",
+            "cmd/api/main.go": "", "internal/h.go": ""},
+    "spring": {"pom.xml": "<java.version>17</java.version><artifactId>spring-boot-starter-web</artifactId>",
+               "src/main/java/App.java": ""},
+}
+
+
+def stack_of(files: dict, name: str = "svc") -> Stack:
+    return detect_stack(list(files), files.get, name=name)
+
+
+class TestRepositoryStacks(unittest.TestCase):
+
+    def test_common_services_get_valid_deployment_files(self):
+        expected = {"fastapi": (PYTHON, "app.main:app", 8000), "flask": (PYTHON, "app:app", 8000),
+                    "django": (PYTHON, "shop.wsgi:application", 8000), "express": (NODE, "start", 3000),
+                    "gin": (GO, "./cmd/api", 8080), "spring": (JAVA, "jar", 8080)}
+        for name, files in REPOS.items():
+            stack = stack_of(files)
+            self.assertEqual((stack.language, stack.entrypoint, stack.port), expected[name], name)
+            for kind, text in render_deployment(stack).items():
+                self.assertEqual(VALIDATORS[kind](text), [], f"{name} {kind.name}")
+
+    def test_versions_and_app_servers_come_from_the_manifests(self):
+        self.assertEqual(stack_of(REPOS["gin"]).version, "1.21")
+        self.assertEqual(stack_of(REPOS["spring"]).version, "17")
+        self.assertEqual(stack_of(REPOS["flask"]).packages, ("gunicorn",))
+        self.assertEqual(stack_of(REPOS["django"]).packages, ())
+        self.assertIn("poetry install", render_deployment(stack_of(REPOS["django"]))[DOCKERFILE])
+
+    def test_gaps_are_left_to_the_model(self):
+        # A plain script: the language is known (pipelines work) but not how it is served.
+        script = stack_of({"requirements.txt": "requests\n", "job.py": ""})
+        self.assertFalse(script.deployable)
+        self.assertIsNone(stack_of({"Cargo.toml": "", "src/main.rs": ""}))
+        self.assertIsNone(stack_of({"mkdocs.yml": "", "docs/index.md": "", "docs/a.md": ""}))
+        # Without the package.json contents nothing can be said about a Node app.
+        self.assertIsNone(detect_stack(["package.json", "index.js"]))
+
+    def test_service_name_is_a_valid_object_name(self):
+        manifest = render_deployment(stack_of(REPOS["flask"], name="My_Service.v2"))[K8S_MANIFEST]
+        self.assertIn("name: my-service-v2", manifest)
+
+    def test_zip_inspection_reports_the_stack(self):
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for path, text in REPOS["express"].items():
+                archive.writestr(f"web-main/{path}", text)
+        file_list, description, stack = inspect_archive(buffer.getvalue(), name="web")
+        self.assertIn("Express", description)
+        self.assertEqual((stack.name, stack.entrypoint), ("web", "start"))
+
+
+class TestRequestStacks(unittest.TestCase):
+
+    def test_every_pipeline_template_validates(self):
+        for text in ("python", "python with poetry", "node 18 with pnpm", "yarn", "golang", "java with maven",
+                     "gradle"):
+            stack = stack_from_text(text)
+            for kind in (GITHUB_WORKFLOW, GITLAB_PIPELINE, JENKINSFILE):
+                for image in (False, True):
+                    self.assertEqual(VALIDATORS[kind](render_pipeline(kind, stack, image)), [], f"{text} {kind.name}")
+
+    def test_keywords(self):
+        self.assertEqual(stack_from_text("GitLab CI for a Node 18 app with pnpm").label, "Node.js 18 (pnpm)")
+        self.assertEqual(stack_from_text("a Go service on jenkins").language, GO)
+        self.assertEqual(stack_from_text("Jenkinsfile for Spring Boot, Java 17").version, "17")
+        self.assertIsNone(stack_from_text("let's go and build it"))
+        self.assertIsNone(stack_from_text("a Python backend and a React frontend"))
+        self.assertTrue(wants_image("build and push the docker image"))
+
+    def test_routine_requests_have_no_extras(self):
+        self.assertEqual(extra_requirements("Can you write a GitHub Actions workflow that lints and tests my "
+                                            "Flask API on every pull request? https://github.com/o/r"), [])
+        self.assertEqual(extra_requirements("gitlab for python, deploy to EKS with helm"), ["deploy", "eks", "helm"])
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, content=None, file=None, **kwargs):
+        self.sent.append((content, file))
+
+
+class TestCicdHandler(unittest.IsolatedAsyncioTestCase):
+
+    async def handle(self, content, reply="pipeline:\n  script: x"):
+        message = mock.Mock(content=content, channel=FakeChannel())
+        prompts = []
+
+        async def generate(spec):
+            prompts.append(spec.prompt)
+            return ArtifactResult(spec, content=reply)
+
+        with mock.patch.object(cicd_generator, "generate_artifact", generate):
+            await cicd_generator.handle_cicd_request(message)
+        return message.channel.sent, prompts
+
+    async def test_routine_request_is_answered_from_the_template(self):
+        sent, prompts = await self.handle("GitLab CI to build and test a Python service")
+        self.assertEqual(prompts, [])
+        content, file = sent[-1]
+        self.assertIn("Python 3.12 template", content)
+        self.assertEqual(file.filename, ".gitlab-ci.yml")
+
+    async def test_extras_customize_the_template(self):
+        sent, prompts = await self.handle("github actions for go, and deploy to fly.io on tags")
+        self.assertEqual(len(prompts), 1)
+        self.assertIn("actions/setup-go", prompts[0])
+        self.assertTrue(prompts[0].endswith("deploy to fly.io on tags"))
+
+    async def test_unknown_stack_goes_to_the_model(self):
+        sent, prompts = await self.handle("a Jenkins pipeline for a Rust crate")
+        self.assertEqual(len(prompts), 1)
+        self.assertNotIn("Starting point", prompts[0])
+
+    async def test_templates_can_be_turned_off(self):
+        with override_settings(templates_enabled=False):
+            sent, prompts = await self.handle("GitLab CI to build and test a Python service")
+        self.assertEqual(len(prompts), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()